@@ -1,9 +1,10 @@
 # main/admin.py
 from django.contrib import admin
 from django.utils.html import format_html
+from django.utils.timezone import localtime
 from django.conf import settings
 from django import forms
-from .models import Room, Guest, ReviewCSVUpload, TTLock, AuditLog, PopularEvent, GuestIDUpload, TTLockToken, RoomICalConfig, Reservation, MessageTemplate, PendingEnrichment, EnrichmentLog, CSVEnrichmentLog
+from .models import Room, Guest, ReviewCSVUpload, TTLock, AuditLog, PopularEvent, GuestIDUpload, TTLockToken, RoomICalConfig, Reservation, MessageTemplate, PendingEnrichment, EnrichmentLog, CSVEnrichmentLog, BookingEmail, LockKeyboardPassword, UnlockCommand, LockEvent, DailyDashboardSnapshot
 from .ttlock_utils import TTLockClient
 import logging
 import random  # Added for randint
@@ -146,9 +147,10 @@ class ReviewCSVUploadAdmin(admin.ModelAdmin):
         self.message_user(request, "CSV processed and stored as JSON successfully.")
 
 class TTLockAdmin(admin.ModelAdmin):
-    list_display = ('name', 'lock_id', 'is_front_door')
+    list_display = ('name', 'lock_id', 'is_front_door', 'pins_synced_at', 'pins_sync_error')
     search_fields = ('name', 'lock_id')
     list_filter = ('is_front_door',)
+    readonly_fields = ('pins_synced_at', 'pins_sync_error')
 
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'user', 'action', 'object_type', 'object_id', 'details')
@@ -179,12 +181,14 @@ class TTLockTokenAdmin(admin.ModelAdmin):
         return False
 
 class RoomICalConfigAdmin(admin.ModelAdmin):
-    list_display = ('room', 'booking_status_display', 'airbnb_status_display', 'updated_at')
+    list_display = ('room', 'booking_status_display', 'airbnb_status_display', 'booking_schedule_display', 'airbnb_schedule_display', 'updated_at')
     list_filter = ('booking_active', 'airbnb_active')
     search_fields = ('room__name', 'booking_ical_url', 'airbnb_ical_url')
     readonly_fields = (
         'booking_last_synced', 'booking_last_sync_status',
+        'booking_next_poll_at', 'booking_poll_interval', 'booking_last_changed_at', 'booking_consecutive_errors',
         'airbnb_last_synced', 'airbnb_last_sync_status',
+        'airbnb_next_poll_at', 'airbnb_poll_interval', 'airbnb_last_changed_at', 'airbnb_consecutive_errors',
         'created_at', 'updated_at'
     )
 
@@ -192,9 +196,15 @@ class RoomICalConfigAdmin(admin.ModelAdmin):
         ('Booking.com Configuration', {
             'fields': ('booking_ical_url', 'booking_active', 'booking_last_synced', 'booking_last_sync_status')
         }),
+        ('Booking.com Polling Schedule', {
+            'fields': ('booking_next_poll_at', 'booking_poll_interval', 'booking_last_changed_at', 'booking_consecutive_errors')
+        }),
         ('Airbnb Configuration', {
             'fields': ('airbnb_ical_url', 'airbnb_active', 'airbnb_last_synced', 'airbnb_last_sync_status')
         }),
+        ('Airbnb Polling Schedule', {
+            'fields': ('airbnb_next_poll_at', 'airbnb_poll_interval', 'airbnb_last_changed_at', 'airbnb_consecutive_errors')
+        }),
         ('Room', {
             'fields': ('room',)
         }),
@@ -211,6 +221,8 @@ class RoomICalConfigAdmin(admin.ModelAdmin):
             return "🟡 Never synced"
         if "success" in obj.booking_last_sync_status.lower():
             return format_html('<span style="color: green;">✅ Active</span>')
+        elif "unchanged" in obj.booking_last_sync_status.lower():
+            return format_html('<span style="color: green;">✅ Active (unchanged)</span>')
         elif "error" in obj.booking_last_sync_status.lower():
             return format_html('<span style="color: red;">❌ Error</span>')
         return obj.booking_last_sync_status
@@ -223,15 +235,39 @@ class RoomICalConfigAdmin(admin.ModelAdmin):
             return "🟡 Never synced"
         if "success" in obj.airbnb_last_sync_status.lower():
             return format_html('<span style="color: green;">✅ Active</span>')
+        elif "unchanged" in obj.airbnb_last_sync_status.lower():
+            return format_html('<span style="color: green;">✅ Active (unchanged)</span>')
         elif "error" in obj.airbnb_last_sync_status.lower():
             return format_html('<span style="color: red;">❌ Error</span>')
         return obj.airbnb_last_sync_status
     airbnb_status_display.short_description = "Airbnb"
 
+    def _schedule_display(self, active, next_poll_at, interval, errors):
+        if not active:
+            return "-"
+        if not next_poll_at:
+            return "Next run"
+        label = f"{localtime(next_poll_at).strftime('%d %b %H:%M')} (every {interval // 60} min)"
+        if errors:
+            return format_html('<span style="color: red;">{} - {} error(s)</span>', label, errors)
+        return label
+
+    def booking_schedule_display(self, obj):
+        return self._schedule_display(obj.booking_active, obj.booking_next_poll_at, obj.booking_poll_interval, obj.booking_consecutive_errors)
+    booking_schedule_display.short_description = "Booking.com next poll"
+
+    def airbnb_schedule_display(self, obj):
+        return self._schedule_display(obj.airbnb_active, obj.airbnb_next_poll_at, obj.airbnb_poll_interval, obj.airbnb_consecutive_errors)
+    airbnb_schedule_display.short_description = "Airbnb next poll"
+
     actions = ['sync_now']
 
     def sync_now(self, request, queryset):
-        """Manually trigger immediate sync for selected rooms (runs synchronously)"""
+        """Manually trigger immediate sync for selected rooms (runs synchronously)
+
+        Uses force=True so the feed is fully re-processed even if its
+        ETag/content hash says nothing changed since the last poll.
+        """
         from main.services.ical_service import sync_reservations_for_room
         
         total_created = 0
@@ -245,7 +281,7 @@ class RoomICalConfigAdmin(admin.ModelAdmin):
             if config.booking_active and config.booking_ical_url:
                 try:
                     logger.info(f"Admin: Syncing Booking.com for {config.room.name}")
-                    result = sync_reservations_for_room(config.id, platform='booking')
+                    result = sync_reservations_for_room(config.id, platform='booking', force=True)
                     if result['success']:
                         total_created += result['created']
                         total_updated += result['updated']
@@ -266,7 +302,7 @@ class RoomICalConfigAdmin(admin.ModelAdmin):
             if config.airbnb_active and config.airbnb_ical_url:
                 try:
                     logger.info(f"Admin: Syncing Airbnb for {config.room.name}")
-                    result = sync_reservations_for_room(config.id, platform='airbnb')
+                    result = sync_reservations_for_room(config.id, platform='airbnb', force=True)
                     if result['success']:
                         total_created += result['created']
                         total_updated += result['updated']
@@ -422,6 +458,56 @@ class CSVEnrichmentLogAdmin(admin.ModelAdmin):
         # Logs should be auto-created via XLS upload page
         return False
 
+class BookingEmailAdmin(admin.ModelAdmin):
+    list_display = ('received_at', 'email_type', 'booking_reference', 'check_in_date', 'is_unread', 'subject')
+    list_filter = ('email_type', 'is_unread', 'received_at')
+    search_fields = ('booking_reference', 'subject', 'message_id')
+    readonly_fields = ('message_id', 'subject', 'email_type', 'booking_reference', 'check_in_date', 'received_at', 'is_unread', 'created_at', 'updated_at')
+
+    def has_add_permission(self, request):
+        # Rows are mirrored from Gmail by sync_booking_email_index
+        return False
+
+class LockKeyboardPasswordAdmin(admin.ModelAdmin):
+    list_display = ('lock', 'keyboard_pwd_id', 'pin', 'name', 'start_date', 'end_date', 'is_orphan', 'synced_at')
+    list_filter = ('is_orphan', 'lock')
+    search_fields = ('keyboard_pwd_id', 'pin', 'name')
+    readonly_fields = ('lock', 'keyboard_pwd_id', 'pin', 'name', 'pwd_type', 'start_date', 'end_date', 'created_on_lock', 'is_orphan', 'synced_at')
+
+    def has_add_permission(self, request):
+        # Rows are mirrored from TTLock by sync_lock_keyboard_passwords
+        return False
+
+class UnlockCommandAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'lock', 'door_type', 'guest', 'status', 'completed_at', 'error')
+    list_filter = ('status', 'door_type', 'lock')
+    search_fields = ('guest__reservation_number', 'guest__full_name')
+    readonly_fields = ('lock', 'guest', 'door_type', 'status', 'error', 'created_at', 'started_at', 'completed_at')
+
+    def has_add_permission(self, request):
+        # Commands are queued from the guest room page
+        return False
+
+class LockEventAdmin(admin.ModelAdmin):
+    list_display = ('occurred_at', 'lock_id', 'record_type', 'keyboard_pwd', 'keyboard_pwd_id', 'success', 'username', 'battery')
+    list_filter = ('record_type', 'success', 'lock_id')
+    search_fields = ('keyboard_pwd', 'keyboard_pwd_id', 'username')
+    date_hierarchy = 'occurred_at'
+    readonly_fields = ('lock_id', 'record_type', 'keyboard_pwd', 'keyboard_pwd_id', 'success', 'username', 'battery', 'occurred_at', 'received_at')
+
+    def has_add_permission(self, request):
+        # Rows come from the TTLock callback
+        return False
+
+class DailyDashboardSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('date', 'in_house', 'checking_in_today', 'checking_out_today', 'occupied_rooms', 'total_rooms', 'pending_checkins', 'rebuilt_at')
+    date_hierarchy = 'date'
+    readonly_fields = ('date', 'in_house', 'checking_in_today', 'checking_out_today', 'total_rooms', 'occupied_rooms', 'pending_checkins', 'rebuilt_at')
+
+    def has_add_permission(self, request):
+        # Rebuilt from guests and reservations
+        return False
+
 # ✅ Register models
 admin.site.register(Room, RoomAdmin)
 admin.site.register(Guest, GuestAdmin)
@@ -436,3 +522,8 @@ admin.site.register(MessageTemplate, MessageTemplateAdmin)
 admin.site.register(PendingEnrichment, PendingEnrichmentAdmin)
 admin.site.register(EnrichmentLog, EnrichmentLogAdmin)
 admin.site.register(CSVEnrichmentLog, CSVEnrichmentLogAdmin)
+admin.site.register(BookingEmail, BookingEmailAdmin)
+admin.site.register(LockKeyboardPassword, LockKeyboardPasswordAdmin)
+admin.site.register(UnlockCommand, UnlockCommandAdmin)
+admin.site.register(LockEvent, LockEventAdmin)
+admin.site.register(DailyDashboardSnapshot, DailyDashboardSnapshotAdmin)
@@ -7,9 +7,10 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
 from django_ratelimit.decorators import ratelimit
-from main.models import Guest, Reservation, CheckInAnalytics, GuestIDUpload
+from main.models import Guest, Reservation, CheckInAnalytics, GuestIDUpload, PinProvisioningJob
 from main.phone_utils import normalize_phone_to_e164, validate_phone_number
 from main.tasks import generate_checkin_pin_background
+from main.services.pin_provisioning import claim_preprovisioned_job
 import pytz
 import datetime
 import logging
@@ -122,7 +123,8 @@ def checkin_step1(request):
 def checkin_details(request):
     """
     Step 2: Guest Details (Name, Phone, Email)
-    After submission, triggers background PIN generation
+    After submission, claims the pre-provisioned PIN (next-day arrivals) or
+    triggers background PIN generation
     """
     flow_data = request.session.get('checkin_flow')
     if not flow_data:
@@ -164,27 +166,37 @@ def checkin_details(request):
             messages.error(request, "Phone number is required.")
             return render(request, 'main/checkin_step2.html', {'flow_data': flow_data})
         
+        # 🔥 START BACKGROUND PIN GENERATION
+        # Ensure session exists so the job can be tied to it
+        if not request.session.session_key:
+            request.session.create()
+        session_key = request.session.session_key
+
+        # PINs for tomorrow's arrivals are created the evening before - claim them if ready
+        job = claim_preprovisioned_job(flow_data['reservation_id'], session_key, full_name)
+        if job is None:
+            job = PinProvisioningJob.objects.create(
+                reservation_id=flow_data['reservation_id'],
+                session_key=session_key,
+                guest_name=full_name,
+            )
+
         # Update flow data
         flow_data.update({
             'full_name': full_name,
             'phone_number': phone_number,
             'email': email,
+            'pin_job_id': job.id,
             'step': 2
         })
         request.session['checkin_flow'] = flow_data
         request.session.modified = True
         
-        # 🔥 START BACKGROUND PIN GENERATION
-        # Ensure session exists before triggering task
-        if not request.session.session_key:
-            request.session.create()
-        session_key = request.session.session_key
-        
-        # Save session immediately before triggering background task
-        request.session.save()
-        
-        generate_checkin_pin_background.delay(session_key)
-        logger.info(f"Triggered background PIN generation for session {session_key}")
+        if job.status == 'ready':
+            logger.info(f"Claimed pre-provisioned PIN job {job.id} for session {session_key}")
+        else:
+            generate_checkin_pin_background.delay(job.id)
+            logger.info(f"Triggered background PIN generation job {job.id} for session {session_key}")
         
         return redirect('checkin_parking')
     
@@ -272,13 +284,24 @@ def checkin_parking(request):
     })
 
 
+def _get_pin_job(request, flow_data):
+    """PIN provisioning job started at Step 2 for this session (or None)"""
+    job_id = flow_data.get('pin_job_id')
+    if not job_id or not request.session.session_key:
+        return None
+    return PinProvisioningJob.objects.filter(
+        id=job_id,
+        session_key=request.session.session_key
+    ).first()
+
+
 def checkin_confirm(request):
     """
     Step 4: Confirmation Summary
     Check if PIN is ready (from background task)
     - If ready: Create guest immediately and redirect to room_detail
     - If failed: Show error page with contact info
-    - If still generating: Wait briefly and check again
+    - If still generating: Back to the Step 4 page, which waits on checkin_pin_status
     """
     flow_data = request.session.get('checkin_flow')
     if not flow_data or flow_data.get('step', 0) < 3:
@@ -303,9 +326,10 @@ def checkin_confirm(request):
         return redirect('checkin')
     
     if request.method == 'POST':
-        pin_status = flow_data.get('pin_generated')
+        job = _get_pin_job(request, flow_data)
+        pin_status = job.status if job else None
         
-        if pin_status == True:
+        if pin_status == 'ready':
             # ✅ PIN READY! Create guest
             try:
                 guest = Guest.objects.create(
@@ -319,9 +343,9 @@ def checkin_confirm(request):
                     car_registration=flow_data.get('car_registration'),
                     early_checkin_time=reservation.early_checkin_time,
                     late_checkout_time=reservation.late_checkout_time,
-                    front_door_pin=flow_data['pin'],
-                    front_door_pin_id=flow_data['front_door_pin_id'],
-                    room_pin_id=flow_data['room_pin_id'],
+                    front_door_pin=job.pin,
+                    front_door_pin_id=job.front_door_pin_id,
+                    room_pin_id=job.room_pin_id,
                 )
                 
                 # Save ID image if uploaded (using GuestIDUpload model)
@@ -351,9 +375,10 @@ def checkin_confirm(request):
                 except Exception as e:
                     logger.warning(f"Failed to update analytics: {str(e)}")
                 
-                # Clean up session
+                # Clean up session (and the job - the PIN now lives on the Guest)
                 del request.session['checkin_flow']
                 request.session['reservation_number'] = guest.reservation_number
+                job.delete()
                 
                 logger.info(f"✅ Guest {guest.full_name} created via multi-step check-in")
                 
@@ -366,26 +391,21 @@ def checkin_confirm(request):
                 messages.error(request, "Failed to complete check-in. Please contact support.")
                 return redirect('checkin_error')
         
-        elif pin_status == False:
+        elif pin_status == 'failed':
             # ❌ PIN GENERATION FAILED
             logger.error(f"PIN generation failed for booking {flow_data['booking_ref']}")
             return redirect('checkin_error')
         
-        else:
+        elif pin_status == 'pending':
             # ⏳ STILL GENERATING (guest was very fast)
-            # Wait 2 seconds and check again
-            import time
-            time.sleep(2)
-            
-            # Reload session data
-            flow_data = request.session.get('checkin_flow', {})
-            if flow_data.get('pin_generated') == True:
-                # Ready now - process again
-                request.session['checkin_flow'] = flow_data
-                return checkin_confirm(request)
-            
-            # Still not ready - show error
-            logger.warning(f"PIN still generating after wait for booking {flow_data.get('booking_ref')}")
+            # Never block the request - the Step 4 page keeps checking the status
+            logger.info(f"PIN still generating for booking {flow_data.get('booking_ref')}, returning to Step 4")
+            messages.info(request, "Your access PIN is still being prepared. It will be ready in a moment.")
+            return redirect('checkin_confirm')
+        
+        else:
+            # No job for this session (e.g. Step 2 not submitted from this browser)
+            logger.warning(f"No PIN provisioning job for booking {flow_data.get('booking_ref')}")
             return redirect('checkin_error')
     
     # GET request - show confirmation page
@@ -399,13 +419,18 @@ def checkin_pin_status(request):
     """
     AJAX endpoint to check PIN generation status
     Returns JSON with ready/failed/error status
+
+    Answers immediately from the job row (indexed lookup, no session decode
+    of the task's writes); retry_after_ms tells the page when to ask again.
     """
     flow_data = request.session.get('checkin_flow', {})
+    job = _get_pin_job(request, flow_data)
     
     return JsonResponse({
-        'ready': flow_data.get('pin_generated') == True,
-        'failed': flow_data.get('pin_generated') == False,
-        'error': flow_data.get('pin_error'),
+        'ready': job is not None and job.status == 'ready',
+        'failed': job is None or job.status == 'failed',
+        'error': (job.error if job else 'PIN generation was not started') or None,
+        'retry_after_ms': 1000,
     })
 
 
@@ -415,8 +440,9 @@ def checkin_error(request):
     Displays contact information for manual assistance
     """
     flow_data = request.session.get('checkin_flow', {})
+    job = _get_pin_job(request, flow_data)
     
     return render(request, 'main/checkin_error.html', {
         'booking_ref': flow_data.get('booking_ref'),
-        'error': flow_data.get('pin_error', 'Unknown error'),
+        'error': (job.error if job else '') or 'Unknown error',
     })
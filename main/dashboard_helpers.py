@@ -2,8 +2,9 @@
 Helper functions for Admin Dashboard "Current Guests" feature
 """
 from datetime import date
-from django.db.models import Q
+from django.db.models import Count, Q
 from .models import Guest, Reservation, Room
+from .services.dashboard_snapshot import get_dashboard_stats
 
 
 def get_current_guests_data(today=None):
@@ -35,8 +36,8 @@ def get_current_guests_data(today=None):
         guest__isnull=True
     ).select_related('room').order_by('check_out_date')
     
-    # Calculate dashboard stats
-    dashboard_stats = calculate_dashboard_stats(today, current_guests, current_reservations)
+    # Dashboard stats from today's snapshot (one query)
+    dashboard_stats = get_dashboard_stats(today)
     
     return {
         'current_guests': current_guests,
@@ -45,46 +46,30 @@ def get_current_guests_data(today=None):
     }
 
 
-def calculate_dashboard_stats(today, current_guests, current_reservations):
-    """Calculate dashboard summary statistics"""
-    
-    # Currently In House (checked in before today, not yet checked out)
-    in_house_count = current_guests.filter(check_in_date__lt=today).count()
-    
-    # Checking In Today
-    checking_in_today_guests = Guest.objects.filter(
-        is_archived=False,
-        check_in_date=today
-    ).count()
-    
-    checking_in_today_reservations = Reservation.objects.filter(
-        check_in_date=today,
-        status='confirmed',
-        guest__isnull=True
-    ).count()
-    
-    checking_in_today = checking_in_today_guests + checking_in_today_reservations
-    
-    # Checking Out Today
-    checking_out_today = Guest.objects.filter(
-        is_archived=False,
-        check_out_date=today
-    ).count()
-    
-    # Room Occupancy
-    total_rooms = Room.objects.count()
-    occupied_rooms = current_guests.values('assigned_room').distinct().count()
-    
-    # Pending Check-Ins (unenriched reservations)
-    pending_checkins = current_reservations.count()
-    
+def calculate_dashboard_stats(today):
+    """Calculate dashboard summary statistics (three aggregate queries)"""
+    guests = Guest.objects.filter(is_archived=False).aggregate(
+        # Currently In House (checked in before today, not yet checked out)
+        in_house=Count('id', filter=Q(check_in_date__lt=today, check_out_date__gte=today)),
+        checking_in_today=Count('id', filter=Q(check_in_date=today)),
+        checking_out_today=Count('id', filter=Q(check_out_date=today)),
+        # Room Occupancy
+        occupied_rooms=Count('assigned_room', distinct=True, filter=Q(check_in_date__lte=today, check_out_date__gte=today)),
+    )
+
+    # Unenriched reservations: arriving today, and Pending Check-Ins (all current ones)
+    reservations = Reservation.objects.filter(status='confirmed', guest__isnull=True).aggregate(
+        checking_in_today=Count('id', filter=Q(check_in_date=today)),
+        pending_checkins=Count('id', filter=Q(check_in_date__lte=today, check_out_date__gte=today)),
+    )
+
     return {
-        'in_house': in_house_count,
-        'checking_in_today': checking_in_today,
-        'checking_out_today': checking_out_today,
-        'total_rooms': total_rooms,
-        'occupied_rooms': occupied_rooms,
-        'pending_checkins': pending_checkins,
+        'in_house': guests['in_house'],
+        'checking_in_today': guests['checking_in_today'] + reservations['checking_in_today'],
+        'checking_out_today': guests['checking_out_today'],
+        'total_rooms': Room.objects.count(),
+        'occupied_rooms': guests['occupied_rooms'],
+        'pending_checkins': reservations['pending_checkins'],
     }
 
 
@@ -50,6 +50,17 @@ ICAL_SYNC_RETRY_SCHEDULE = [
     # If no match after 18 min, alert sent (total 24 min from email)
 ]
 
+# Adaptive iCal polling (seconds)
+# poll_all_ical_feeds runs every ICAL_POLL_MIN_INTERVAL and only syncs feeds whose
+# next poll time has passed. Busy feeds are polled often, quiet ones back off.
+ICAL_POLL_MIN_INTERVAL = 300        # Feed just changed, or arrivals soon
+ICAL_POLL_BASE_INTERVAL = 900       # Starting point (the old fixed 15 min)
+ICAL_POLL_ARRIVALS_MAX_INTERVAL = 900   # Backoff ceiling when a check-in is within the window below
+ICAL_POLL_MAX_INTERVAL = 7200       # Backoff ceiling for quiet feeds (2 hours)
+ICAL_POLL_ERROR_MAX_INTERVAL = 3600  # Backoff ceiling after repeated fetch/sync errors
+ICAL_POLL_RECENT_CHANGE_HOURS = 6   # A change within this window keeps the feed "hot"
+ICAL_POLL_ARRIVALS_WINDOW_HOURS = 48  # Upcoming check-ins within this window keep the feed "hot"
+
 # Security: Whitelisted numbers and emails for SMS/Email replies
 WHITELISTED_SMS_NUMBERS = ['+447539029629']
 WHITELISTED_EMAILS = ['easybulb@gmail.com']
@@ -63,3 +74,5 @@ ADMIN_EMAIL = 'easybulb@gmail.com'
 EMAIL_SEARCH_MAX_RESULTS = 100  # Generous limit - we filter smartly by temporal proximity
 EMAIL_SEARCH_LOOKBACK_DAYS = 30  # Only search emails from last N days
 EMAIL_TEMPORAL_THRESHOLD_HOURS = 48  # Warn if email >48 hours away from iCal sync time
+EMAIL_MATCH_ALERT_AFTER_MINUTES = 10  # Alert if no email matched this long after the iCal sync
+EMAIL_INDEX_MAX_FETCH_ATTEMPTS = 5  # Index syncs a Gmail message may fail before it is skipped (lets the historyId move on)
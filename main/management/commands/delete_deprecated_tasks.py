@@ -15,6 +15,7 @@ class Command(BaseCommand):
             'main.tasks.sync_booking_com_rooms_for_enrichment',
             'main.tasks.match_pending_to_reservation',
             'main.tasks.send_enrichment_failure_alert',
+            'main.tasks.sync_booking_email_index',  # index is synced by match_unenriched_reservations
         ]
         
         # Find and delete deprecated tasks
@@ -0,0 +1,35 @@
+"""
+Management command to rebuild the room occupancy index from Guests and Reservations.
+Only needed after rows were changed outside the ORM (raw SQL, loaddata).
+Usage: python manage.py rebuild_occupancy [--years 2025 2026]
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from main.models import Guest, Reservation, Room
+from main.services.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the room occupancy index (all years with stays, or --years)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', nargs='+', type=int, help='Years to rebuild (default: every year with a stay)')
+
+    def handle(self, *args, **options):
+        years = sorted(options['years'] or [])
+        if not years:
+            bounds = [
+                Guest.objects.aggregate(first=Min('check_in_date'), last=Max('check_out_date')),
+                Reservation.objects.aggregate(first=Min('check_in_date'), last=Max('check_out_date')),
+            ]
+            firsts = [b['first'] for b in bounds if b['first']]
+            lasts = [b['last'] for b in bounds if b['last']]
+            if not firsts:
+                self.stdout.write('No stays to index.')
+                return
+            years = list(range(min(firsts).year, max(lasts).year + 1))
+
+        rooms = Room.objects.all()
+        for room in rooms:
+            rebuild_occupancy(room.id, years)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt occupancy for {rooms.count()} room(s), years {years[0]}-{years[-1]}'))
@@ -81,11 +81,20 @@ class Command(BaseCommand):
             ('cleanup_old_enrichment_logs', 'Daily cleanup - enrichment logs'),
             ('archive_past_guests', 'Archive guests after checkout (3x daily)'),
             ('trigger_enrichment_workflow', 'NEW: iCal -> email search workflow'),
-            ('search_email_for_reservation', 'NEW: Search Gmail for booking ref'),
+            ('match_unenriched_reservations', 'NEW: Global email matcher (every 2 min)'),
+            ('trigger_enrichment_workflow_batch', 'NEW: Batched iCal -> email search (one per sync)'),
             ('send_collision_alert_ical', 'NEW: Alert for multiple bookings'),
             ('send_multi_room_confirmation_sms', 'NEW: Multi-room booking confirmation'),
             ('send_email_not_found_alert', 'NEW: Alert when email not found'),
             ('generate_checkin_pin_background', 'Check-in PIN generation'),
+            ('preprovision_next_day_pins', 'NEW: Next-day PIN pre-provisioning (every 15 min)'),
+            ('release_preprovisioned_pins', 'NEW: Release pre-provisioned PINs of cancelled bookings'),
+            ('process_pin_teardowns', 'NEW: Checkout PIN deletion queue (every 5 min)'),
+            ('send_post_stay_message', 'NEW: Post-stay message after archiving'),
+            ('execute_unlock_command', 'NEW: Remote unlock from the room page (unlock queue)'),
+            ('rebuild_dashboard_snapshots', 'NEW: Dashboard snapshot safety-net rebuild (daily 00:05)'),
+            ('flush_lock_events', 'NEW: TTLock callback events -> LockEvent (every minute)'),
+            ('sync_lock_keyboard_passwords', 'NEW: Lock PIN mirror + orphan reconciliation (every 30 min)'),
         ]
         
         for task_name, description in expected_tasks:
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0034_alter_popularevent_options_popularevent_description_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='airbnb_content_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the last successfully synced Airbnb feed body', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='airbnb_etag',
+            field=models.CharField(blank=True, help_text='ETag returned by the last Airbnb feed fetch', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='airbnb_last_modified',
+            field=models.CharField(blank=True, help_text='Last-Modified header returned by the last Airbnb feed fetch', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='booking_content_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the last successfully synced Booking.com feed body', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='booking_etag',
+            field=models.CharField(blank=True, help_text='ETag returned by the last Booking.com feed fetch', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='booking_last_modified',
+            field=models.CharField(blank=True, help_text='Last-Modified header returned by the last Booking.com feed fetch', max_length=64),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0035_roomicalconfig_feed_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='airbnb_consecutive_errors',
+            field=models.PositiveIntegerField(default=0, help_text='Airbnb sync failures in a row (drives error backoff)'),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='airbnb_last_changed_at',
+            field=models.DateTimeField(blank=True, help_text='Last time a Airbnb sync actually changed reservations', null=True),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='airbnb_next_poll_at',
+            field=models.DateTimeField(blank=True, help_text='When the adaptive scheduler will next poll the Airbnb feed (empty = next run)', null=True),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='airbnb_poll_interval',
+            field=models.PositiveIntegerField(default=900, help_text='Current Airbnb polling interval in seconds (adaptive)'),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='booking_consecutive_errors',
+            field=models.PositiveIntegerField(default=0, help_text='Booking.com sync failures in a row (drives error backoff)'),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='booking_last_changed_at',
+            field=models.DateTimeField(blank=True, help_text='Last time a Booking.com sync actually changed reservations', null=True),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='booking_next_poll_at',
+            field=models.DateTimeField(blank=True, help_text='When the adaptive scheduler will next poll the Booking.com feed (empty = next run)', null=True),
+        ),
+        migrations.AddField(
+            model_name='roomicalconfig',
+            name='booking_poll_interval',
+            field=models.PositiveIntegerField(default=900, help_text='Current Booking.com polling interval in seconds (adaptive)'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0036_roomicalconfig_adaptive_polling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.CharField(help_text='Gmail message ID', max_length=64, unique=True)),
+                ('subject', models.CharField(blank=True, max_length=500)),
+                ('email_type', models.CharField(blank=True, db_index=True, help_text='Parsed type (new, new_lastminute, modification, cancellation) or empty if not a reservation email', max_length=20)),
+                ('booking_reference', models.CharField(blank=True, db_index=True, max_length=50)),
+                ('check_in_date', models.DateField(blank=True, db_index=True, null=True)),
+                ('received_at', models.DateTimeField(db_index=True)),
+                ('is_unread', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Booking Email',
+                'verbose_name_plural': 'Booking Emails',
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GmailSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_history_id', models.CharField(blank=True, help_text='Gmail historyId the index is current up to', max_length=32)),
+                ('last_full_sync_at', models.DateTimeField(blank=True, null=True)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Gmail Sync State',
+                'verbose_name_plural': 'Gmail Sync State',
+            },
+        ),
+    ]
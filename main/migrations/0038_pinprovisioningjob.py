@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0037_bookingemail_gmailsyncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PinProvisioningJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(db_index=True, help_text="Django session key of the guest's check-in", max_length=40)),
+                ('guest_name', models.CharField(blank=True, help_text='Name used in the TTLock PIN labels', max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('pin', models.CharField(blank=True, max_length=10)),
+                ('front_door_pin_id', models.CharField(blank=True, max_length=50)),
+                ('room_pin_id', models.CharField(blank=True, max_length=50)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pin_jobs', to='main.reservation')),
+            ],
+            options={
+                'verbose_name': 'PIN Provisioning Job',
+                'verbose_name_plural': 'PIN Provisioning Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0038_pinprovisioningjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pinprovisioningjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Pre-provisioning attempts made'),
+        ),
+        migrations.AddField(
+            model_name='pinprovisioningjob',
+            name='is_preprovisioned',
+            field=models.BooleanField(default=False, help_text='Created ahead of arrival by the scheduled pre-provisioning job'),
+        ),
+        migrations.AddField(
+            model_name='pinprovisioningjob',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, help_text='TTLock PIN start (pre-provisioned jobs)', null=True),
+        ),
+        migrations.AddField(
+            model_name='pinprovisioningjob',
+            name='valid_until',
+            field=models.DateTimeField(blank=True, help_text='TTLock PIN end (pre-provisioned jobs)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='pinprovisioningjob',
+            name='session_key',
+            field=models.CharField(blank=True, db_index=True, help_text="Django session key of the guest's check-in (blank = pre-provisioned, not claimed yet)", max_length=40),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0039_pinprovisioningjob_preprovisioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PinTeardownJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reservation_number', models.CharField(blank=True, help_text='Kept for logs if the guest is deleted', max_length=15)),
+                ('front_door_lock_id', models.IntegerField(blank=True, null=True)),
+                ('front_door_pin_id', models.CharField(blank=True, max_length=50)),
+                ('front_door_deleted', models.BooleanField(default=False)),
+                ('room_lock_id', models.IntegerField(blank=True, null=True)),
+                ('room_pin_id', models.CharField(blank=True, max_length=50)),
+                ('room_deleted', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('lease_until', models.DateTimeField(blank=True, help_text='Claimed by a worker (or waiting to retry) until then', null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('guest', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pin_teardowns', to='main.guest')),
+            ],
+            options={
+                'verbose_name': 'PIN Teardown Job',
+                'verbose_name_plural': 'PIN Teardown Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-17 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0040_pinteardownjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pinteardownjob',
+            name='pin',
+            field=models.CharField(blank=True, help_text='Kept out of new allocations until deleted', max_length=10),
+        ),
+    ]
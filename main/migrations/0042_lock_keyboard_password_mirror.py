@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-17 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0041_pinteardownjob_pin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ttlock',
+            name='pins_sync_error',
+            field=models.TextField(blank=True, help_text='Error of the last mirror sync (mirror kept as of pins_synced_at)'),
+        ),
+        migrations.AddField(
+            model_name='ttlock',
+            name='pins_synced_at',
+            field=models.DateTimeField(blank=True, help_text='Last successful keyboard password mirror sync', null=True),
+        ),
+        migrations.CreateModel(
+            name='LockKeyboardPassword',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyboard_pwd_id', models.CharField(help_text='TTLock keyboardPwdId', max_length=50)),
+                ('pin', models.CharField(blank=True, max_length=20)),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('pwd_type', models.PositiveSmallIntegerField(blank=True, help_text='TTLock keyboardPwdType (2 = permanent, 3 = period)', null=True)),
+                ('start_date', models.DateTimeField(blank=True, null=True)),
+                ('end_date', models.DateTimeField(blank=True, null=True)),
+                ('created_on_lock', models.DateTimeField(blank=True, help_text='TTLock sendDate', null=True)),
+                ('is_orphan', models.BooleanField(db_index=True, default=False, help_text='Not held by any guest, check-in job or pending teardown')),
+                ('synced_at', models.DateTimeField()),
+                ('lock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keyboard_passwords', to='main.ttlock')),
+            ],
+            options={
+                'verbose_name': 'Lock Keyboard Password',
+                'verbose_name_plural': 'Lock Keyboard Passwords',
+                'ordering': ['lock', 'start_date'],
+                'unique_together': {('lock', 'keyboard_pwd_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-17 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0042_lock_keyboard_password_mirror'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnlockCommand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('door_type', models.CharField(help_text="'front' or 'room'", max_length=10)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('guest', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='unlock_commands', to='main.guest')),
+                ('lock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unlock_commands', to='main.ttlock')),
+            ],
+            options={
+                'verbose_name': 'Unlock Command',
+                'verbose_name_plural': 'Unlock Commands',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['lock', 'created_at'], name='main_unlock_lock_id_aa9238_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-17 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0043_unlockcommand'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lock_id', models.BigIntegerField(help_text='TTLock lockId')),
+                ('record_type', models.SmallIntegerField(help_text='TTLock recordType (4 = unlock by keyboard password)')),
+                ('keyboard_pwd', models.CharField(blank=True, help_text='PIN entered (PIN unlocks)', max_length=20)),
+                ('keyboard_pwd_id', models.CharField(blank=True, help_text='TTLock keyboardPwdId (from the callback or the lock PIN mirror)', max_length=50)),
+                ('success', models.BooleanField(default=True)),
+                ('username', models.CharField(blank=True, max_length=100)),
+                ('battery', models.PositiveSmallIntegerField(blank=True, help_text='electricQuantity (%) reported with the record', null=True)),
+                ('occurred_at', models.DateTimeField(help_text='lockDate - when it happened at the lock')),
+                ('received_at', models.DateTimeField(help_text='serverDate - when TTLock received it')),
+            ],
+            options={
+                'verbose_name': 'Lock Event',
+                'verbose_name_plural': 'Lock Events',
+                'ordering': ['-occurred_at'],
+                'indexes': [models.Index(fields=['keyboard_pwd', 'occurred_at'], name='main_lockev_keyboar_e97f07_idx')],
+                'unique_together': {('lock_id', 'occurred_at', 'record_type', 'keyboard_pwd')},
+            },
+        ),
+    ]
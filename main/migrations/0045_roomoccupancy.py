@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-17 13:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0044_lockevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('source', models.CharField(help_text="'guest' or a Reservation platform", max_length=20)),
+                ('nights', models.BinaryField(help_text='Occupied nights (little-endian bitset)')),
+                ('arrivals', models.BinaryField(help_text='Check-in days; for platforms only unenriched reservations')),
+                ('rebuilt_at', models.DateTimeField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='main.room')),
+            ],
+            options={
+                'verbose_name': 'Room Occupancy',
+                'verbose_name_plural': 'Room Occupancy',
+                'indexes': [models.Index(fields=['year'], name='main_roomoc_year_88b16f_idx')],
+                'unique_together': {('room', 'year', 'source')},
+            },
+        ),
+    ]
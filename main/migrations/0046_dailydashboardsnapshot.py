@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-17 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0045_roomoccupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('in_house', models.PositiveIntegerField(default=0)),
+                ('checking_in_today', models.PositiveIntegerField(default=0)),
+                ('checking_out_today', models.PositiveIntegerField(default=0)),
+                ('total_rooms', models.PositiveIntegerField(default=0)),
+                ('occupied_rooms', models.PositiveIntegerField(default=0)),
+                ('pending_checkins', models.PositiveIntegerField(default=0)),
+                ('rebuilt_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Dashboard Snapshot',
+                'verbose_name_plural': 'Daily Dashboard Snapshots',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-17 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0046_dailydashboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['check_in_date', 'id'], name='main_reserv_check_i_313506_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-17 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0047_reservation_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gmailsyncstate',
+            name='failed_fetches',
+            field=models.JSONField(blank=True, default=dict, help_text='Gmail message ID -> index syncs its fetch failed in (skipped from EMAIL_INDEX_MAX_FETCH_ATTEMPTS on)'),
+        ),
+    ]
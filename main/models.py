@@ -23,6 +23,8 @@ class TTLock(models.Model):
     lock_id = models.IntegerField(unique=True)
     name = models.CharField(max_length=100)
     is_front_door = models.BooleanField(default=False)
+    pins_synced_at = models.DateTimeField(null=True, blank=True, help_text="Last successful keyboard password mirror sync")
+    pins_sync_error = models.TextField(blank=True, help_text="Error of the last mirror sync (mirror kept as of pins_synced_at)")
 
     def __str__(self):
         return f"{self.name} (Lock ID: {self.lock_id})"
@@ -525,12 +527,26 @@ class RoomICalConfig(models.Model):
     booking_active = models.BooleanField(default=False, help_text="Enable Booking.com polling")
     booking_last_synced = models.DateTimeField(null=True, blank=True, help_text="Last Booking.com sync timestamp")
     booking_last_sync_status = models.CharField(max_length=255, blank=True, help_text="Booking.com last sync status")
+    booking_etag = models.CharField(max_length=255, blank=True, help_text="ETag returned by the last Booking.com feed fetch")
+    booking_last_modified = models.CharField(max_length=64, blank=True, help_text="Last-Modified header returned by the last Booking.com feed fetch")
+    booking_content_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the last successfully synced Booking.com feed body")
+    booking_next_poll_at = models.DateTimeField(null=True, blank=True, help_text="When the adaptive scheduler will next poll the Booking.com feed (empty = next run)")
+    booking_poll_interval = models.PositiveIntegerField(default=900, help_text="Current Booking.com polling interval in seconds (adaptive)")
+    booking_last_changed_at = models.DateTimeField(null=True, blank=True, help_text="Last time a Booking.com sync actually changed reservations")
+    booking_consecutive_errors = models.PositiveIntegerField(default=0, help_text="Booking.com sync failures in a row (drives error backoff)")
 
     # Airbnb configuration
     airbnb_ical_url = models.URLField(max_length=500, blank=True, null=True, help_text="Airbnb iCal feed URL")
     airbnb_active = models.BooleanField(default=False, help_text="Enable Airbnb polling")
     airbnb_last_synced = models.DateTimeField(null=True, blank=True, help_text="Last Airbnb sync timestamp")
     airbnb_last_sync_status = models.CharField(max_length=255, blank=True, help_text="Airbnb last sync status")
+    airbnb_etag = models.CharField(max_length=255, blank=True, help_text="ETag returned by the last Airbnb feed fetch")
+    airbnb_last_modified = models.CharField(max_length=64, blank=True, help_text="Last-Modified header returned by the last Airbnb feed fetch")
+    airbnb_content_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the last successfully synced Airbnb feed body")
+    airbnb_next_poll_at = models.DateTimeField(null=True, blank=True, help_text="When the adaptive scheduler will next poll the Airbnb feed (empty = next run)")
+    airbnb_poll_interval = models.PositiveIntegerField(default=900, help_text="Current Airbnb polling interval in seconds (adaptive)")
+    airbnb_last_changed_at = models.DateTimeField(null=True, blank=True, help_text="Last time a Airbnb sync actually changed reservations")
+    airbnb_consecutive_errors = models.PositiveIntegerField(default=0, help_text="Airbnb sync failures in a row (drives error backoff)")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -587,6 +603,7 @@ class Reservation(models.Model):
             models.Index(fields=['ical_uid']),
             models.Index(fields=['booking_reference']),
             models.Index(fields=['check_in_date']),
+            models.Index(fields=['check_in_date', 'id']),  # all_reservations keyset pagination
             models.Index(fields=['status']),
         ]
 
@@ -600,6 +617,62 @@ class Reservation(models.Model):
         return self.guest is not None
 
 
+class DailyDashboardSnapshot(models.Model):
+    """
+    Admin dashboard summary counts for one date
+    Refreshed by Guest/Reservation/Room changes touching the date and rebuilt nightly
+    (main/services/dashboard_snapshot.py) - the dashboard reads one row instead of counting.
+    """
+    date = models.DateField(unique=True)
+    in_house = models.PositiveIntegerField(default=0)
+    checking_in_today = models.PositiveIntegerField(default=0)
+    checking_out_today = models.PositiveIntegerField(default=0)
+    total_rooms = models.PositiveIntegerField(default=0)
+    occupied_rooms = models.PositiveIntegerField(default=0)
+    pending_checkins = models.PositiveIntegerField(default=0)
+    rebuilt_at = models.DateTimeField(auto_now=True)
+
+    STAT_FIELDS = ('in_house', 'checking_in_today', 'checking_out_today', 'total_rooms', 'occupied_rooms', 'pending_checkins')
+
+    class Meta:
+        verbose_name = "Daily Dashboard Snapshot"
+        verbose_name_plural = "Daily Dashboard Snapshots"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Dashboard {self.date}"
+
+    def as_stats(self):
+        return {field: getattr(self, field) for field in self.STAT_FIELDS}
+
+
+class RoomOccupancy(models.Model):
+    """
+    Occupied nights of one room in one year, as bitsets (bit n = night starting on day n of the year)
+    One row per source: 'guest' (Guest stays) and each platform (confirmed Reservations).
+    Rebuilt from those rows by main/services/occupancy.py - never edited directly.
+    """
+    GUEST_SOURCE = 'guest'
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='occupancy')
+    year = models.PositiveSmallIntegerField()
+    source = models.CharField(max_length=20, help_text="'guest' or a Reservation platform")
+    nights = models.BinaryField(help_text="Occupied nights (little-endian bitset)")
+    arrivals = models.BinaryField(help_text="Check-in days; for platforms only unenriched reservations")
+    rebuilt_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Room Occupancy"
+        verbose_name_plural = "Room Occupancy"
+        unique_together = [('room', 'year', 'source')]
+        indexes = [
+            models.Index(fields=['year']),
+        ]
+
+    def __str__(self):
+        return f"{self.room} {self.year} ({self.source})"
+
+
 class MessageTemplate(models.Model):
     """
     Editable message templates for guest communications
@@ -845,3 +918,238 @@ class CheckInAnalytics(models.Model):
     def __str__(self):
         status = "Completed" if self.completed else f"Dropped at Step {self.step_reached}"
         return f"{self.booking_reference or 'Unknown'} - {status} ({self.device_type})"
+
+
+class PinProvisioningJob(models.Model):
+    """
+    Background TTLock PIN generation for one check-in (Step 2 -> Step 4)
+
+    Written by generate_checkin_pin_background, read by checkin_confirm and
+    checkin_pin_status. Replaces passing results back through the session row.
+
+    Pre-provisioned jobs are created by preprovision_next_day_pins the evening
+    before arrival (no session yet); Step 2 claims one by setting session_key.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name='pin_jobs')
+    session_key = models.CharField(max_length=40, blank=True, db_index=True, help_text="Django session key of the guest's check-in (blank = pre-provisioned, not claimed yet)")
+    guest_name = models.CharField(max_length=100, blank=True, help_text="Name used in the TTLock PIN labels")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    is_preprovisioned = models.BooleanField(default=False, help_text="Created ahead of arrival by the scheduled pre-provisioning job")
+    pin = models.CharField(max_length=10, blank=True)
+    front_door_pin_id = models.CharField(max_length=50, blank=True)
+    room_pin_id = models.CharField(max_length=50, blank=True)
+    valid_from = models.DateTimeField(null=True, blank=True, help_text="TTLock PIN start (pre-provisioned jobs)")
+    valid_until = models.DateTimeField(null=True, blank=True, help_text="TTLock PIN end (pre-provisioned jobs)")
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Pre-provisioning attempts made")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "PIN Provisioning Job"
+        verbose_name_plural = "PIN Provisioning Jobs"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"PIN job {self.id} for reservation {self.reservation_id} ({self.status})"
+
+
+class PinTeardownJob(models.Model):
+    """
+    Deletion of one archived guest's TTLock PINs (front door + room)
+
+    Enqueued by archive_past_guests in the same transaction that archives the
+    guest, worked by process_pin_teardowns. Lock and PIN ids are copied here
+    because the guest's PIN fields are cleared on archive.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    guest = models.ForeignKey(Guest, on_delete=models.SET_NULL, null=True, blank=True, related_name='pin_teardowns')
+    reservation_number = models.CharField(max_length=15, blank=True, help_text="Kept for logs if the guest is deleted")
+    pin = models.CharField(max_length=10, blank=True, help_text="Kept out of new allocations until deleted")
+    front_door_lock_id = models.IntegerField(null=True, blank=True)
+    front_door_pin_id = models.CharField(max_length=50, blank=True)
+    front_door_deleted = models.BooleanField(default=False)
+    room_lock_id = models.IntegerField(null=True, blank=True)
+    room_pin_id = models.CharField(max_length=50, blank=True)
+    room_deleted = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    lease_until = models.DateTimeField(null=True, blank=True, help_text="Claimed by a worker (or waiting to retry) until then")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "PIN Teardown Job"
+        verbose_name_plural = "PIN Teardown Jobs"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"PIN teardown {self.id} for guest {self.reservation_number} ({self.status})"
+
+
+class UnlockCommand(models.Model):
+    """
+    One remote unlock request (guest room page)
+
+    Created by room_detail and executed by execute_unlock_command on the
+    'unlock' queue; the page polls unlock_status for the result. A tap by a
+    guest who already has a recent command for the lock returns that command.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    lock = models.ForeignKey(TTLock, on_delete=models.CASCADE, related_name='unlock_commands')
+    guest = models.ForeignKey(Guest, on_delete=models.SET_NULL, null=True, blank=True, related_name='unlock_commands')
+    door_type = models.CharField(max_length=10, help_text="'front' or 'room'")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Unlock Command"
+        verbose_name_plural = "Unlock Commands"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['lock', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Unlock {self.id} of lock {self.lock_id} ({self.status})"
+
+
+class LockEvent(models.Model):
+    """
+    One lock record pushed by the TTLock callback (unlock by PIN, app, card...)
+
+    The webhook parses callbacks into a Redis buffer; flush_lock_events
+    bulk-inserts them here. Retried callbacks are ignored by the unique key.
+    """
+    # TTLock recordType values used in queries
+    KEYBOARD_PWD_UNLOCK = 4
+
+    lock_id = models.BigIntegerField(help_text="TTLock lockId")
+    record_type = models.SmallIntegerField(help_text="TTLock recordType (4 = unlock by keyboard password)")
+    keyboard_pwd = models.CharField(max_length=20, blank=True, help_text="PIN entered (PIN unlocks)")
+    keyboard_pwd_id = models.CharField(max_length=50, blank=True, help_text="TTLock keyboardPwdId (from the callback or the lock PIN mirror)")
+    success = models.BooleanField(default=True)
+    username = models.CharField(max_length=100, blank=True)
+    battery = models.PositiveSmallIntegerField(null=True, blank=True, help_text="electricQuantity (%) reported with the record")
+    occurred_at = models.DateTimeField(help_text="lockDate - when it happened at the lock")
+    received_at = models.DateTimeField(help_text="serverDate - when TTLock received it")
+
+    class Meta:
+        verbose_name = "Lock Event"
+        verbose_name_plural = "Lock Events"
+        ordering = ['-occurred_at']
+        # Also the (lock, time) index for per-lock queries
+        unique_together = [('lock_id', 'occurred_at', 'record_type', 'keyboard_pwd')]
+        indexes = [
+            models.Index(fields=['keyboard_pwd', 'occurred_at']),
+        ]
+
+    def __str__(self):
+        return f"Lock {self.lock_id} record {self.record_type} at {self.occurred_at}"
+
+
+class LockKeyboardPassword(models.Model):
+    """
+    Local mirror of the keyboard passwords (PINs) on each TTLock
+
+    Rebuilt lock by lock by the sync_lock_keyboard_passwords task from
+    /lock/listKeyboardPwd, then reconciled against guests and PIN jobs.
+    Admin screens read lock state here instead of calling TTLock live.
+    """
+    lock = models.ForeignKey(TTLock, on_delete=models.CASCADE, related_name='keyboard_passwords')
+    keyboard_pwd_id = models.CharField(max_length=50, help_text="TTLock keyboardPwdId")
+    pin = models.CharField(max_length=20, blank=True)
+    name = models.CharField(max_length=200, blank=True)
+    pwd_type = models.PositiveSmallIntegerField(null=True, blank=True, help_text="TTLock keyboardPwdType (2 = permanent, 3 = period)")
+    start_date = models.DateTimeField(null=True, blank=True)
+    end_date = models.DateTimeField(null=True, blank=True)
+    created_on_lock = models.DateTimeField(null=True, blank=True, help_text="TTLock sendDate")
+    is_orphan = models.BooleanField(default=False, db_index=True, help_text="Not held by any guest, check-in job or pending teardown")
+    synced_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Lock Keyboard Password"
+        verbose_name_plural = "Lock Keyboard Passwords"
+        unique_together = [('lock', 'keyboard_pwd_id')]
+        ordering = ['lock', 'start_date']
+
+    def __str__(self):
+        return f"PIN {self.keyboard_pwd_id} on lock {self.lock_id}"
+
+
+class BookingEmail(models.Model):
+    """
+    Local index of Booking.com notification emails in Gmail
+
+    Kept current by the email matcher's index sync (Gmail historyId based),
+    so enrichment, collision detection and mark-as-read query this table
+    instead of listing and fetching messages from the Gmail API every time.
+    """
+    message_id = models.CharField(max_length=64, unique=True, help_text="Gmail message ID")
+    subject = models.CharField(max_length=500, blank=True)
+    email_type = models.CharField(max_length=20, blank=True, db_index=True, help_text="Parsed type (new, new_lastminute, modification, cancellation) or empty if not a reservation email")
+    booking_reference = models.CharField(max_length=50, blank=True, db_index=True)
+    check_in_date = models.DateField(null=True, blank=True, db_index=True)
+    received_at = models.DateTimeField(db_index=True)
+    is_unread = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Booking Email"
+        verbose_name_plural = "Booking Emails"
+        ordering = ['-received_at']
+
+    def __str__(self):
+        return f"{self.subject[:60]} ({'unread' if self.is_unread else 'read'})"
+
+    def as_email_data(self):
+        """Same dict shape as GmailClient.get_recent_booking_emails() items"""
+        return {
+            'id': self.message_id,
+            'subject': self.subject,
+            'received_at': self.received_at,
+            'is_unread': self.is_unread,
+        }
+
+
+class GmailSyncState(models.Model):
+    """Single-row checkpoint for the incremental Gmail -> BookingEmail sync"""
+    last_history_id = models.CharField(max_length=32, blank=True, help_text="Gmail historyId the index is current up to")
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    failed_fetches = models.JSONField(default=dict, blank=True, help_text="Gmail message ID -> index syncs its fetch failed in (skipped from EMAIL_INDEX_MAX_FETCH_ATTEMPTS on)")
+
+    class Meta:
+        verbose_name = "Gmail Sync State"
+        verbose_name_plural = "Gmail Sync State"
+
+    def __str__(self):
+        return f"Gmail sync at historyId {self.last_history_id or 'none'}"
+
+    @classmethod
+    def get_state(cls):
+        """Get (or create) the single sync state row"""
+        state, _ = cls.objects.get_or_create(pk=1)
+        return state
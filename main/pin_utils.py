@@ -2,35 +2,134 @@
 import random
 
 
-def generate_memorable_4digit_pin():
+def is_memorable_pin(pin):
     """
-    Generate a memorable 4-digit PIN avoiding patterns like:
+    True if a 4-digit PIN avoids patterns like:
     - All same digits (1111, 2222, etc.)
     - Sequential ascending (1234, 5678, etc.)
     - Sequential descending (4321, 8765, etc.)
     - Repeating pairs (1212, 3434, etc.)
     """
-    while True:
-        pin = str(random.randint(1000, 9999))
+    # Check if all digits are the same
+    if len(set(pin)) == 1:
+        return False
 
-        # Check if all digits are the same
-        if len(set(pin)) == 1:
-            continue
+    # Check for sequential ascending (e.g., 1234, 5678)
+    if all(int(pin[i]) + 1 == int(pin[i + 1]) for i in range(3)):
+        return False
 
-        # Check for sequential ascending (e.g., 1234, 5678)
-        if all(int(pin[i]) + 1 == int(pin[i + 1]) for i in range(3)):
-            continue
+    # Check for sequential descending (e.g., 4321, 8765)
+    if all(int(pin[i]) - 1 == int(pin[i + 1]) for i in range(3)):
+        return False
 
-        # Check for sequential descending (e.g., 4321, 8765)
-        if all(int(pin[i]) - 1 == int(pin[i + 1]) for i in range(3)):
-            continue
+    # Check for repeating pairs (e.g., 1212, 3434)
+    if pin[0] == pin[2] and pin[1] == pin[3]:
+        return False
 
-        # Check for repeating pairs (e.g., 1212, 3434)
-        if pin[0] == pin[2] and pin[1] == pin[3]:
-            continue
+    # If it passes all checks, it's memorable enough
+    return True
 
-        # If it passes all checks, it's memorable enough
-        return pin
+
+# Every valid PIN, computed once at import
+MEMORABLE_PINS = tuple(pin for pin in map(str, range(1000, 10000)) if is_memorable_pin(pin))
+
+# Random draws before falling back to listing the free PINs (only reached when
+# a large share of the PIN space is active)
+MAX_PIN_DRAWS = 32
+
+
+def active_pins_by_lock():
+    """
+    PINs currently on each TTLock, from guest and reservation state
+
+    - Current guests: front door + their room's lock
+    - PIN provisioning jobs holding a PIN (check-ins in progress, pre-provisioned
+      next-day PINs): front door + the reservation's room lock
+    - Archived guests whose PINs aren't deleted yet (pending PinTeardownJob)
+
+    Returns:
+        dict: TTLock.lock_id -> set of 4-digit PINs
+    """
+    from collections import defaultdict
+    from main.models import Guest, PinProvisioningJob, PinTeardownJob, TTLock
+
+    index = defaultdict(set)
+    front_door_ids = list(TTLock.objects.filter(is_front_door=True).values_list('lock_id', flat=True))
+
+    def _add(pin, room_lock_id):
+        for lock_id in front_door_ids:
+            index[lock_id].add(pin)
+        if room_lock_id is not None:
+            index[room_lock_id].add(pin)
+
+    for pin, room_lock_id in Guest.objects.filter(
+        is_archived=False,
+        front_door_pin__isnull=False,
+    ).exclude(front_door_pin='').values_list('front_door_pin', 'assigned_room__ttlock__lock_id'):
+        _add(pin, room_lock_id)
+
+    for pin, room_lock_id in PinProvisioningJob.objects.filter(
+        status__in=['pending', 'ready'],
+    ).exclude(pin='').values_list('pin', 'reservation__room__ttlock__lock_id'):
+        _add(pin, room_lock_id)
+
+    for pin, front_door_lock_id, room_lock_id in PinTeardownJob.objects.filter(
+        status__in=['pending', 'failed'],
+    ).exclude(pin='').values_list('pin', 'front_door_lock_id', 'room_lock_id'):
+        if front_door_lock_id is not None:
+            index[front_door_lock_id].add(pin)
+        if room_lock_id is not None:
+            index[room_lock_id].add(pin)
+
+    return index
+
+
+def active_pins(lock_ids=None):
+    """
+    PINs active on the given locks
+
+    Args:
+        lock_ids: TTLock.lock_id values (default: every lock)
+
+    Returns:
+        set: 4-digit PINs
+    """
+    index = active_pins_by_lock()
+    if lock_ids is None:
+        lock_ids = index.keys()
+    return set().union(*(index.get(lock_id, set()) for lock_id in lock_ids))
+
+
+def generate_memorable_4digit_pin(exclude=None):
+    """
+    Pick a memorable 4-digit PIN that isn't already active
+
+    Every PIN goes on the shared front door, so by default it avoids the PINs
+    active on any lock (see active_pins_by_lock). With a few dozen active PINs
+    in a space of ~9,800 a draw is accepted almost always, so the cost stays
+    constant as occupancy grows.
+
+    Args:
+        exclude: PINs to avoid (default: active_pins(), one index build)
+
+    Returns:
+        str: 4-digit PIN
+
+    Raises:
+        ValueError: If every memorable PIN is excluded
+    """
+    if exclude is None:
+        exclude = active_pins()
+
+    for _ in range(MAX_PIN_DRAWS):
+        pin = random.choice(MEMORABLE_PINS)
+        if pin not in exclude:
+            return pin
+
+    free = [pin for pin in MEMORABLE_PINS if pin not in exclude]
+    if not free:
+        raise ValueError("No memorable PIN left that isn't already active")
+    return random.choice(free)
 
 
 def add_wakeup_prefix(pin):
@@ -0,0 +1,260 @@
+"""
+Local index of Booking.com emails (BookingEmail table)
+
+Enrichment, collision detection and mark-as-read query this index instead of
+listing + fetching messages from Gmail on every search attempt. The index is
+kept current incrementally with the Gmail historyId:
+
+- First run (or expired history): record the mailbox historyId, then upsert
+  the last EMAIL_SEARCH_LOOKBACK_DAYS of Booking.com emails.
+- Every later run: users.history.list since the stored historyId - usually a
+  single API call that returns no changes.
+
+The historyId only moves once every new message in the history was fetched
+(or failed permanently, e.g. 404 = deleted since); a rate-limited or failed
+fetch leaves it in place so the same history is replayed on the next run.
+A message that keeps failing is counted in GmailSyncState.failed_fetches and
+skipped after EMAIL_INDEX_MAX_FETCH_ATTEMPTS runs, so it can't hold the
+index back forever.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from main.enrichment_config import (
+    EMAIL_SEARCH_MAX_RESULTS, EMAIL_SEARCH_LOOKBACK_DAYS, EMAIL_INDEX_MAX_FETCH_ATTEMPTS,
+)
+
+logger = logging.getLogger('main')
+
+
+def _booking_email_fields(email_data):
+    """Map a GmailClient email dict to BookingEmail field values (subject parsed once here)"""
+    from main.services.email_parser import parse_booking_com_email_subject
+
+    parsed = parse_booking_com_email_subject(email_data['subject'])
+    email_type, booking_ref, check_in_date = parsed if parsed else ('', '', None)
+
+    return {
+        'subject': email_data['subject'][:500],
+        'email_type': email_type,
+        'booking_reference': booking_ref,
+        'check_in_date': check_in_date,
+        'received_at': email_data['received_at'],
+        'is_unread': email_data['is_unread'],
+    }
+
+
+def _upsert_emails(emails):
+    """Create or update BookingEmail rows from GmailClient email dicts"""
+    from main.models import BookingEmail
+
+    for email_data in emails:
+        BookingEmail.objects.update_or_create(
+            message_id=email_data['id'],
+            defaults=_booking_email_fields(email_data),
+        )
+
+
+def _skipped_ids(state):
+    """Message IDs that failed in EMAIL_INDEX_MAX_FETCH_ATTEMPTS syncs - no longer fetched"""
+    return {
+        message_id for message_id, attempts in state.failed_fetches.items()
+        if attempts >= EMAIL_INDEX_MAX_FETCH_ATTEMPTS
+    }
+
+
+def _record_failed_fetches(failed_ids):
+    """Count one more failed sync for each message ID (GmailFetchIncomplete.failed_ids)"""
+    from main.models import GmailSyncState
+
+    with transaction.atomic():
+        state = GmailSyncState.objects.select_for_update().get(pk=1)
+        for message_id in failed_ids:
+            attempts = state.failed_fetches.get(message_id, 0) + 1
+            state.failed_fetches[message_id] = attempts
+            if attempts == EMAIL_INDEX_MAX_FETCH_ATTEMPTS:
+                logger.error(
+                    f"❌ Gmail message {message_id} failed to fetch in {attempts} index syncs - "
+                    f"skipping it so the index can move on"
+                )
+        state.save(update_fields=['failed_fetches'])
+
+
+def _fetch_full(gmail, skipped_ids=()):
+    """Read the recent window of Booking.com emails from a Gmail search (no DB writes)"""
+    # historyId first: anything arriving while we search is replayed next run
+    history_id = gmail.get_history_id()
+
+    emails = gmail.get_recent_booking_emails(
+        max_results=EMAIL_SEARCH_MAX_RESULTS,
+        lookback_days=EMAIL_SEARCH_LOOKBACK_DAYS,
+        exclude_ids=skipped_ids,
+    )
+    return {'mode': 'full', 'history_id': history_id, 'emails': emails, 'unread': {}, 'deleted': set()}
+
+
+def _fetch_incremental(gmail, start_history_id, skipped_ids=()):
+    """
+    Read Gmail history since start_history_id (no DB writes)
+
+    Raises:
+        GmailHistoryExpired: If start_history_id is too old
+        GmailFetchIncomplete: If some new messages could not be fetched - the
+            historyId must not move past them
+    """
+    from main.models import BookingEmail
+
+    changes, history_id = gmail.list_history_changes(start_history_id)
+
+    # New messages: history doesn't say who sent them, so fetch headers only (batched).
+    # get_booking_emails skips permanent failures (404 = deleted since) and raises on transient ones.
+    new_ids = changes['added'] - changes['deleted']
+    known_ids = set(BookingEmail.objects.filter(message_id__in=new_ids).values_list('message_id', flat=True))
+    emails = gmail.get_booking_emails(new_ids - known_ids - set(skipped_ids))
+
+    return {
+        'mode': 'incremental',
+        'history_id': history_id,
+        'emails': emails,
+        'unread': changes['unread'],
+        'deleted': changes['deleted'],
+    }
+
+
+def _apply(fetched, state):
+    """Write fetched changes to the index and move the checkpoint (call with the state row locked)"""
+    from main.models import BookingEmail
+
+    # Label changes on messages we already know about (read/unread in Gmail UI)
+    label_changes = 0
+    for message_id, is_unread in fetched['unread'].items():
+        label_changes += BookingEmail.objects.filter(message_id=message_id).update(is_unread=is_unread)
+
+    _upsert_emails(fetched['emails'])
+    deleted, _ = BookingEmail.objects.filter(message_id__in=fetched['deleted']).delete()
+
+    state.last_history_id = fetched['history_id']
+    # Messages that failed before but made it this time start from zero again
+    state.failed_fetches = {
+        message_id: attempts for message_id, attempts in state.failed_fetches.items()
+        if attempts >= EMAIL_INDEX_MAX_FETCH_ATTEMPTS
+    }
+    if fetched['mode'] == 'full':
+        state.last_full_sync_at = timezone.now()
+        logger.info(f"Booking email index full sync: {len(fetched['emails'])} email(s), historyId {fetched['history_id']}")
+    elif fetched['emails'] or deleted or label_changes:
+        logger.info(
+            f"Booking email index: +{len(fetched['emails'])} email(s), -{deleted}, "
+            f"{label_changes} label change(s), historyId {fetched['history_id']}"
+        )
+    return {'mode': fetched['mode'], 'upserted': len(fetched['emails']), 'deleted': deleted, 'label_changes': label_changes}
+
+
+def sync_booking_email_index(gmail=None):
+    """
+    Bring the BookingEmail index up to date with Gmail
+
+    Gmail is read outside any transaction; the sync state row is then locked
+    only to compare-and-set last_history_id and write the changes. If another
+    caller (email matcher, SMS commands) moved the checkpoint in the
+    meantime, its sync already covered ours and nothing is written.
+
+    Args:
+        gmail: Optional GmailClient to reuse (one is created if not given)
+
+    Returns:
+        dict: mode ('full'/'incremental'/'skipped'), upserted, deleted,
+            label_changes, pruned
+
+    Raises:
+        GmailFetchIncomplete: If new messages could not be fetched (the
+            checkpoint is left where it was, so they are retried next run,
+            up to EMAIL_INDEX_MAX_FETCH_ATTEMPTS times each)
+    """
+    from main.models import BookingEmail, GmailSyncState
+    from main.services.gmail_client import GmailClient, GmailFetchIncomplete, GmailHistoryExpired
+
+    if gmail is None:
+        gmail = GmailClient()
+
+    state = GmailSyncState.get_state()
+    start_history_id = state.last_history_id
+    skipped_ids = _skipped_ids(state)
+
+    try:
+        if start_history_id:
+            try:
+                fetched = _fetch_incremental(gmail, start_history_id, skipped_ids)
+            except GmailHistoryExpired:
+                # Gmail keeps roughly a week of history - fall back to a full sync
+                logger.warning(f"Gmail history {start_history_id} expired, running full index sync")
+                fetched = _fetch_full(gmail, skipped_ids)
+        else:
+            fetched = _fetch_full(gmail, skipped_ids)
+    except GmailFetchIncomplete as e:
+        _record_failed_fetches(e.failed_ids)
+        raise
+
+    with transaction.atomic():
+        state = GmailSyncState.objects.select_for_update().get(pk=1)
+
+        if state.last_history_id != start_history_id:
+            logger.info(
+                f"Booking email index already synced to historyId {state.last_history_id} "
+                f"by another worker, discarding sync from {start_history_id or 'scratch'}"
+            )
+            return {'mode': 'skipped', 'upserted': 0, 'deleted': 0, 'label_changes': 0, 'pruned': 0}
+
+        result = _apply(fetched, state)
+
+        # Keep the index to the same window enrichment searches
+        cutoff = timezone.now() - timedelta(days=EMAIL_SEARCH_LOOKBACK_DAYS)
+        result['pruned'], _ = BookingEmail.objects.filter(received_at__lt=cutoff).delete()
+
+        state.last_synced_at = timezone.now()
+        state.save()
+
+    return result
+
+
+def get_indexed_booking_emails(max_results=EMAIL_SEARCH_MAX_RESULTS, lookback_days=EMAIL_SEARCH_LOOKBACK_DAYS):
+    """
+    Indexed equivalent of GmailClient.get_recent_booking_emails()
+
+    Args:
+        max_results: Number of most recent emails to return
+        lookback_days: Only return emails from last N days
+
+    Returns:
+        list: Email dicts (id, subject, received_at, is_unread) sorted unread
+            first, then newest first
+    """
+    from main.models import BookingEmail
+
+    cutoff = timezone.now() - timedelta(days=lookback_days)
+    rows = BookingEmail.objects.filter(received_at__gte=cutoff).order_by('-received_at')[:max_results]
+
+    emails = [row.as_email_data() for row in rows]
+    emails.sort(key=lambda x: (not x['is_unread'], -x['received_at'].timestamp()))
+    return emails
+
+
+def mark_booking_email_read(gmail, message_id):
+    """
+    Mark an email as read in Gmail and in the index
+
+    Args:
+        gmail: GmailClient
+        message_id: Gmail message ID
+
+    Raises:
+        HttpError: If Gmail rejects the change (index is left untouched)
+    """
+    from main.models import BookingEmail
+
+    gmail.mark_as_read(message_id)
+    BookingEmail.objects.filter(message_id=message_id).update(is_unread=False)
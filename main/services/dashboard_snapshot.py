@@ -0,0 +1,102 @@
+"""
+Daily admin dashboard snapshot (DailyDashboardSnapshot)
+
+The dashboard header reads one snapshot row instead of counting guests and
+reservations on every load. A snapshot is refreshed whenever something that
+can move its numbers changes:
+
+- Guest / Reservation saves and deletes (main/signals.py) and the iCal sync's
+  bulk writes refresh the snapshots of the dates their old and new stays
+  touch; Room creation/deletion refreshes them all (total_rooms)
+- rebuild_dashboard_snapshots rebuilds yesterday, today and tomorrow
+  nightly, in case a change slipped past the hooks (raw SQL, QuerySet.update)
+
+Only snapshots from today on are refreshed by the hooks; older ones are the
+final figures of their day. A date without a snapshot is built on first read.
+"""
+
+import logging
+from datetime import date, timedelta
+
+logger = logging.getLogger('main')
+
+
+def _as_date(value):
+    return date.fromisoformat(str(value)) if isinstance(value, str) else value
+
+
+def rebuild_dashboard_snapshot(day):
+    """
+    Recount one date's stats into its snapshot
+
+    Returns:
+        DailyDashboardSnapshot
+    """
+    from main.dashboard_helpers import calculate_dashboard_stats
+    from main.models import DailyDashboardSnapshot
+
+    snapshot, _ = DailyDashboardSnapshot.objects.update_or_create(
+        date=day, defaults=calculate_dashboard_stats(day),
+    )
+    return snapshot
+
+
+def get_dashboard_stats(day):
+    """
+    Dashboard summary stats for a date (one query once the snapshot exists)
+
+    Returns:
+        dict: in_house, checking_in_today, checking_out_today, total_rooms,
+            occupied_rooms, pending_checkins
+    """
+    from main.models import DailyDashboardSnapshot
+
+    snapshot = DailyDashboardSnapshot.objects.filter(date=day).first()
+    if snapshot is None:
+        snapshot = rebuild_dashboard_snapshot(day)
+    return snapshot.as_stats()
+
+
+def refresh_dashboard_snapshots(stays=None, today=None):
+    """
+    Rebuild the existing snapshots (today onwards) that some stays touch
+
+    A stay touches every date from check-in to check-out inclusive.
+
+    Args:
+        stays: (check_in_date, check_out_date) tuples, None entries ignored;
+            None refreshes every snapshot from today on
+        today: Reference date (defaults to today)
+    """
+    from main.models import DailyDashboardSnapshot
+
+    today = today or date.today()
+    days = DailyDashboardSnapshot.objects.filter(date__gte=today).values_list('date', flat=True)
+    if stays is not None:
+        ranges = [
+            (_as_date(check_in), _as_date(check_out))
+            for check_in, check_out in (stay for stay in stays if stay is not None)
+        ]
+        if not ranges:
+            return
+        days = days.filter(
+            date__gte=min(check_in for check_in, _ in ranges),
+            date__lte=max(check_out for _, check_out in ranges),
+        )
+        days = [day for day in days if any(check_in <= day <= check_out for check_in, check_out in ranges)]
+    for day in days:
+        rebuild_dashboard_snapshot(day)
+
+
+def rebuild_recent_dashboard_snapshots(today=None):
+    """
+    Nightly safety net: rebuild yesterday's (final), today's and tomorrow's snapshots
+
+    Returns:
+        int: snapshots rebuilt
+    """
+    today = today or date.today()
+    days = [today - timedelta(days=1), today, today + timedelta(days=1)]
+    for day in days:
+        rebuild_dashboard_snapshot(day)
+    return len(days)
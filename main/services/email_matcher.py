@@ -0,0 +1,311 @@
+"""
+Global email matcher for iCal-driven enrichment
+
+Replaces the per-reservation retry chains (search_email_for_reservation) with
+one pass over ALL unenriched Booking.com reservations and ALL unmatched parsed
+emails in the BookingEmail index:
+
+1. Group reservations and emails by check-in date
+2. Per date, rank the candidate emails by temporal proximity to the iCal sync
+3. One email  -> enrich every unenriched room on that date (multi-room if >1)
+   Several    -> TRUE collision (different customers, same date) - alert once
+   None yet   -> left for the next run; alerted once the grace period passes
+
+Three queries load the inputs regardless of how many reservations/emails there
+are (the old per-email Reservation.exists() check is a single IN query here).
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from main.enrichment_config import EMAIL_TEMPORAL_THRESHOLD_HOURS, EMAIL_MATCH_ALERT_AFTER_MINUTES
+
+logger = logging.getLogger('main')
+
+
+def unenriched_reservations(today=None):
+    """Confirmed Booking.com reservations from today on still waiting for a booking ref"""
+    from main.models import Reservation
+
+    if today is None:
+        today = timezone.localdate()
+
+    return Reservation.objects.filter(
+        platform='booking',
+        status='confirmed',
+        guest__isnull=True,
+        booking_reference='',  # Unenriched
+        check_in_date__gte=today,
+    )
+
+
+def load_match_inputs(today=None):
+    """
+    Load everything the matcher needs
+
+    Args:
+        today: Date to treat as today (default: local date)
+
+    Returns:
+        tuple: (unenriched Reservations, candidate BookingEmails, set of booking
+            refs that already belong to a Booking.com reservation)
+    """
+    from main.models import Reservation, BookingEmail
+
+    reservations = list(
+        unenriched_reservations(today).select_related('room').order_by('check_in_date', 'created_at', 'pk')
+    )
+    if not reservations:
+        return [], [], set()
+
+    # Cancellations never enrich; emails without a parsed type aren't reservations
+    emails = list(
+        BookingEmail.objects.filter(
+            check_in_date__in={r.check_in_date for r in reservations}
+        ).exclude(email_type__in=['', 'cancellation'])
+    )
+
+    existing_refs = set(
+        Reservation.objects.filter(
+            platform='booking',
+            booking_reference__in={e.booking_reference for e in emails},
+        ).values_list('booking_reference', flat=True)
+    )
+
+    return reservations, emails, existing_refs
+
+
+def plan_email_matches(reservations, emails, existing_refs):
+    """
+    Solve the reservation <-> email assignment in memory (no queries)
+
+    Args:
+        reservations: Unenriched Reservations
+        emails: Parsed BookingEmails for their check-in dates
+        existing_refs: Booking refs already used by a reservation (emails for
+            these are matched already and are not candidates)
+
+    Returns:
+        dict with lists:
+            - matched: {check_in_date, email, reservations, time_diff_hours}
+            - collisions: {check_in_date, emails (ranked), reservations, time_diff_hours {ref: hours}}
+            - unmatched: Reservations with no candidate email yet
+    """
+    reservations_by_date = defaultdict(list)
+    for reservation in reservations:
+        reservations_by_date[reservation.check_in_date].append(reservation)
+
+    emails_by_date = defaultdict(list)
+    for email in emails:
+        if email.booking_reference and email.booking_reference not in existing_refs:
+            emails_by_date[email.check_in_date].append(email)
+
+    plan = {'matched': [], 'collisions': [], 'unmatched': []}
+
+    for check_in_date, date_reservations in sorted(reservations_by_date.items()):
+        # Temporal anchor: when iCal first showed a room for this date
+        synced_at = min(r.created_at for r in date_reservations)
+
+        def _hours_from_sync(email):
+            return abs((email.received_at - synced_at).total_seconds()) / 3600
+
+        # One candidate per booking ref (a "new" + "modification" pair is one booking)
+        closest = {}
+        for email in sorted(emails_by_date.get(check_in_date, []), key=_hours_from_sync):
+            closest.setdefault(email.booking_reference, email)
+        ranked = list(closest.values())
+
+        if not ranked:
+            plan['unmatched'].extend(date_reservations)
+        elif len(ranked) == 1:
+            plan['matched'].append({
+                'check_in_date': check_in_date,
+                'email': ranked[0],
+                'reservations': date_reservations,
+                'time_diff_hours': _hours_from_sync(ranked[0]),
+            })
+        else:
+            plan['collisions'].append({
+                'check_in_date': check_in_date,
+                'emails': ranked,
+                'reservations': date_reservations,
+                'time_diff_hours': {e.booking_reference: _hours_from_sync(e) for e in ranked},
+            })
+
+    return plan
+
+
+def _apply_match(match, gmail):
+    """Enrich the reservations of one matched date; returns number of rooms enriched"""
+    from main.models import Reservation, EnrichmentLog
+    from main.services.booking_email_index import mark_booking_email_read
+    from main.tasks import send_multi_room_confirmation_sms
+
+    email = match['email']
+    booking_ref = email.booking_reference
+    check_in_date = match['check_in_date']
+    reservations = match['reservations']
+
+    logger.info(
+        f"✅ TEMPORAL MATCH: Ref {booking_ref}, Check-in {check_in_date}, "
+        f"Email arrived {match['time_diff_hours']:.2f}h from iCal sync, "
+        f"Unread: {email.is_unread}"
+    )
+
+    # Sanity check: Warn if email timing seems suspicious
+    if match['time_diff_hours'] > EMAIL_TEMPORAL_THRESHOLD_HOURS:
+        logger.warning(
+            f"⚠️ Temporal anomaly: Email arrived {match['time_diff_hours']:.1f}h from iCal sync "
+            f"(threshold: {EMAIL_TEMPORAL_THRESHOLD_HOURS}h). This might be delayed sync or wrong match."
+        )
+
+    # Guarded update: a concurrent run (or manual SMS enrichment) may have got there first
+    room_count = Reservation.objects.filter(
+        id__in=[r.id for r in reservations],
+        guest__isnull=True,
+        booking_reference='',
+    ).update(
+        booking_reference=booking_ref,
+        guest_name=f"Guest {booking_ref}",
+        updated_at=timezone.now(),
+    )
+    if not room_count:
+        return 0
+
+    try:
+        mark_booking_email_read(gmail, email.message_id)
+    except Exception as e:
+        # The match stands - an unread email only affects inbox tidiness
+        logger.warning(f"Could not mark email {email.message_id} as read: {str(e)}")
+
+    reservation = reservations[0]
+    if room_count > 1:
+        EnrichmentLog.objects.create(
+            reservation=reservation,
+            action='email_found_multi_room',
+            booking_reference=booking_ref,
+            room=reservation.room,
+            method='email_search',
+            details={
+                'room_count': room_count,
+                'rooms': [r.room.name for r in reservations],
+                'check_in_date': str(check_in_date),
+                'time_diff_hours': round(match['time_diff_hours'], 2),
+            }
+        )
+        logger.info(f"✅ Multi-room enrichment! {room_count} rooms enriched with ref {booking_ref}")
+        send_multi_room_confirmation_sms.delay(booking_ref, check_in_date.isoformat())
+    else:
+        EnrichmentLog.objects.create(
+            reservation=reservation,
+            action='email_found_matched',
+            booking_reference=booking_ref,
+            room=reservation.room,
+            method='email_search',
+            details={
+                'check_in_date': str(check_in_date),
+                'time_diff_hours': round(match['time_diff_hours'], 2),
+            }
+        )
+        logger.info(f"✅ Email found! Enriched reservation {reservation.id} with ref {booking_ref}")
+
+    return room_count
+
+
+def _apply_collision(collision, alerted_ids):
+    """Log + alert a TRUE collision once (alerted_ids: reservations already collision-logged)"""
+    from main.models import EnrichmentLog
+    from main.tasks import send_true_collision_alert
+
+    reservations = collision['reservations']
+    if any(r.id in alerted_ids for r in reservations):
+        return False
+
+    booking_refs = [e.booking_reference for e in collision['emails']]
+    logger.error(
+        f"🚨 TRUE COLLISION: Found {len(booking_refs)} DIFFERENT emails "
+        f"for check-in date {collision['check_in_date']}: "
+        + ', '.join(f"{ref} ({collision['time_diff_hours'][ref]:.1f}h from iCal sync)" for ref in booking_refs)
+    )
+
+    EnrichmentLog.objects.bulk_create([
+        EnrichmentLog(
+            reservation=reservation,
+            action='collision_detected',
+            booking_reference='',
+            room=reservation.room,
+            method='email_collision',
+            details={
+                'collision_count': len(booking_refs),
+                'check_in_date': str(collision['check_in_date']),
+                'booking_refs': booking_refs,
+                'temporal_scores': {
+                    ref: f"{hours:.2f}h" for ref, hours in collision['time_diff_hours'].items()
+                }
+            }
+        )
+        for reservation in reservations
+    ])
+
+    send_true_collision_alert.delay(collision['check_in_date'].isoformat(), booking_refs)
+    return True
+
+
+def run_email_matcher(gmail, now=None):
+    """
+    One global matching pass (caller syncs the BookingEmail index first)
+
+    Args:
+        gmail: GmailClient (used to mark matched emails as read)
+        now: Current time (default: timezone.now())
+
+    Returns:
+        dict: counts of matched, rooms_enriched, collisions, collisions_alerted,
+            unmatched, not_found_alerted
+    """
+    from main.models import EnrichmentLog
+    from main.tasks import _alert_email_not_found
+
+    if now is None:
+        now = timezone.now()
+
+    reservations, emails, existing_refs = load_match_inputs(today=timezone.localdate(now))
+    plan = plan_email_matches(reservations, emails, existing_refs)
+
+    # Which reservations already went through collision / not-found alerting
+    logged = defaultdict(set)
+    if plan['collisions'] or plan['unmatched']:
+        for reservation_id, action in EnrichmentLog.objects.filter(
+            reservation_id__in=[r.id for r in reservations],
+            action__in=['email_search_started', 'collision_detected', 'email_not_found_alerted'],
+        ).values_list('reservation_id', 'action'):
+            logged[action].add(reservation_id)
+
+    rooms_enriched = sum(_apply_match(match, gmail) for match in plan['matched'])
+    collisions_alerted = sum(_apply_collision(c, logged['collision_detected']) for c in plan['collisions'])
+
+    # Same grace period the old retry chain had (attempts at 0/2/5/10 min).
+    # Only reservations that entered the email workflow are alerted, so rows
+    # from before it existed don't trigger a burst of SMS.
+    alert_cutoff = now - timedelta(minutes=EMAIL_MATCH_ALERT_AFTER_MINUTES)
+    not_found_alerted = 0
+    for reservation in plan['unmatched']:
+        if (
+            reservation.created_at <= alert_cutoff
+            and reservation.id in logged['email_search_started']
+            and reservation.id not in logged['email_not_found_alerted']
+        ):
+            _alert_email_not_found(reservation)
+            not_found_alerted += 1
+
+    return {
+        'matched': len(plan['matched']),
+        'rooms_enriched': rooms_enriched,
+        'collisions': len(plan['collisions']),
+        'collisions_alerted': collisions_alerted,
+        'unmatched': len(plan['unmatched']),
+        'not_found_alerted': not_found_alerted,
+    }
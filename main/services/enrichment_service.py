@@ -14,6 +14,7 @@ from main.models import (
     Room,
     EnrichmentLog
 )
+from main.services.occupancy import rooms_with_arrivals
 
 logger = logging.getLogger('main')
 
@@ -176,16 +177,9 @@ def detect_multi_room_booking(check_in_date, platform='booking'):
         platform (str): Platform ('booking' or 'airbnb')
 
     Returns:
-        int: Number of unenriched reservations for that date
+        int: Number of rooms with an unenriched reservation checking in that date
     """
-    count = Reservation.objects.filter(
-        check_in_date=check_in_date,
-        platform=platform,
-        booking_reference__isnull=True,
-        status='confirmed'
-    ).count()
-
-    return count
+    return rooms_with_arrivals(check_in_date, platform)
 
 
 def get_collision_bookings(check_in_date):
@@ -6,7 +6,9 @@ Handles reading emails from Gmail using the Gmail API
 import os
 import base64
 import logging
-from datetime import datetime, timezone
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from email.utils import parsedate_to_datetime
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
@@ -20,17 +22,210 @@ logger = logging.getLogger('main')
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly',
           'https://www.googleapis.com/auth/gmail.modify']
 
+# Only these headers are used - fetched with format='metadata' instead of 'full'
+METADATA_HEADERS = ['Subject', 'Date']
+
+# Batch items hit by 429 / 5xx / transport errors are re-batched this many
+# rounds in total, sleeping BACKOFF, 2*BACKOFF, ... seconds between rounds
+BATCH_RETRY_ATTEMPTS = 3
+BATCH_RETRY_BACKOFF_SECONDS = 1
+
+# Refresh cached credentials when they expire within this margin
+CREDENTIAL_REFRESH_MARGIN = timedelta(minutes=5)
+
+# Per-process cache of the authenticated Gmail service (see GmailClient._get_cached_service)
+# Keyed by PID so a forked Celery worker never reuses its parent's HTTP connections.
+_service_cache = {'pid': None, 'service': None, 'creds': None}
+_service_cache_lock = threading.Lock()
+_service_cache_stats = {'hits': 0, 'misses': 0, 'refreshes': 0}
+
+
+def get_service_cache_stats():
+    """
+    Counters for the per-process Gmail service cache
+
+    Returns:
+        dict: hits, misses, refreshes since the process started
+    """
+    with _service_cache_lock:
+        return dict(_service_cache_stats)
+
+
+def reset_service_cache():
+    """Drop the cached Gmail service (next GmailClient() re-authenticates)"""
+    with _service_cache_lock:
+        _service_cache.update(pid=None, service=None, creds=None)
+
+
+class GmailHistoryExpired(Exception):
+    """startHistoryId is too old for users.history.list - a full resync is needed"""
+
+
+class GmailFetchIncomplete(Exception):
+    """Some messages could not be fetched (not 404) even after retrying"""
+
+    def __init__(self, failed_ids):
+        self.failed_ids = set(failed_ids)
+        super().__init__(f"{len(self.failed_ids)} message(s) could not be fetched: {', '.join(sorted(self.failed_ids))}")
+
 
 class GmailClient:
     """
     Gmail API client for reading Booking.com confirmation emails
     """
 
-    def __init__(self):
-        """Initialize Gmail API client with credentials"""
-        self.service = None
+    def __init__(self, service=None, batch_size=None):
+        """
+        Initialize Gmail API client with credentials
+
+        Args:
+            service: Optional prebuilt Gmail service (skips OAuth - used by tests)
+            batch_size: Messages per batch HTTP request (default: settings.GMAIL_BATCH_SIZE)
+        """
+        from django.conf import settings
+
+        self.service = service
         self.creds = None
-        self._authenticate()
+        self.batch_size = batch_size or getattr(settings, 'GMAIL_BATCH_SIZE', 50)
+        if self.service is None:
+            self._get_cached_service()
+
+    def _get_cached_service(self):
+        """
+        Reuse this process's authenticated Gmail service, building it on first use
+
+        Skips _authenticate() (token file handling + discovery build) for every
+        GmailClient after the first one in a worker process. Credentials are
+        refreshed in place when close to expiry; the cached service's HTTP
+        client holds the same credentials object so it picks the new token up.
+        """
+        with _service_cache_lock:
+            if _service_cache['pid'] == os.getpid() and _service_cache['service'] is not None:
+                creds = _service_cache['creds']
+                if self._credentials_expiring(creds):
+                    try:
+                        creds.refresh(Request())
+                    except Exception as e:
+                        logger.error(f"Error refreshing cached Gmail credentials: {str(e)}")
+                        _service_cache.update(pid=None, service=None, creds=None)
+                        raise
+                    _service_cache_stats['refreshes'] += 1
+                    self._save_token(creds)
+                    logger.info("Refreshed cached Gmail credentials")
+
+                _service_cache_stats['hits'] += 1
+                self.service = _service_cache['service']
+                self.creds = creds
+                return
+
+            _service_cache_stats['misses'] += 1
+            self._authenticate()
+            _service_cache.update(pid=os.getpid(), service=self.service, creds=self.creds)
+            logger.info(f"Gmail service cache miss - built new service (stats: {_service_cache_stats})")
+
+    @staticmethod
+    def _credentials_expiring(creds):
+        """True if creds are invalid or expire within CREDENTIAL_REFRESH_MARGIN"""
+        if creds is None or not creds.refresh_token:
+            return False
+        if not creds.valid:
+            return True
+        if creds.expiry is None:
+            return False
+        # google-auth stores expiry as naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now < CREDENTIAL_REFRESH_MARGIN
+
+    @staticmethod
+    def _save_token(creds):
+        """Persist refreshed credentials to gmail_token.json"""
+        token_path = os.path.join(os.getcwd(), 'gmail_token.json')
+        try:
+            with open(token_path, 'w') as token:
+                token.write(creds.to_json())
+        except Exception as e:
+            logger.error(f"Error saving credentials: {str(e)}")
+
+    def _get_messages_metadata(self, message_ids, headers=METADATA_HEADERS):
+        """
+        Fetch messages with format='metadata' through the Gmail batch endpoint
+
+        One HTTP round-trip per batch_size messages instead of one per message.
+        Messages that fail permanently (404 = deleted, or any other 4xx) are
+        logged and skipped - retrying would not help. Items that hit a rate
+        limit (429), a server error (5xx) or a transport error are re-batched
+        with exponential backoff, up to BATCH_RETRY_ATTEMPTS rounds.
+
+        Args:
+            message_ids: Gmail message IDs
+            headers: Header names to include (metadataHeaders)
+
+        Returns:
+            list: Gmail message resources (id, labelIds, payload.headers) in input order
+
+        Raises:
+            GmailFetchIncomplete: If some messages still had transient errors after the retries
+        """
+        message_ids = list(dict.fromkeys(message_ids))  # batch request_ids must be unique
+        results = {}
+        retry = []
+        failed = {}
+
+        def _callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+                return
+            status = getattr(getattr(exception, 'resp', None), 'status', None)
+            if not isinstance(exception, HttpError) or status == 429 or (status or 0) >= 500:
+                retry.append(request_id)
+                failed[request_id] = exception
+            elif status == 404:
+                logger.error(f"Message {request_id} not found (deleted), skipping")
+            else:
+                logger.error(f"❌ Error fetching message {request_id}, skipping: {str(exception)}")
+
+        pending = message_ids
+        for attempt in range(BATCH_RETRY_ATTEMPTS):
+            if attempt:
+                delay = BATCH_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                logger.warning(f"Retrying {len(pending)} Gmail message fetch(es) in {delay}s (attempt {attempt + 1}/{BATCH_RETRY_ATTEMPTS})")
+                time.sleep(delay)
+            retry.clear()
+            for start in range(0, len(pending), self.batch_size):
+                batch = self.service.new_batch_http_request(callback=_callback)
+                for message_id in pending[start:start + self.batch_size]:
+                    failed.pop(message_id, None)
+                    batch.add(
+                        self.service.users().messages().get(
+                            userId='me',
+                            id=message_id,
+                            format='metadata',
+                            metadataHeaders=headers,
+                        ),
+                        request_id=message_id,
+                    )
+                batch.execute()
+            if not retry:
+                break
+            pending = list(retry)
+
+        if failed:
+            for message_id, exception in failed.items():
+                logger.error(f"❌ Giving up on message {message_id}: {str(exception)}")
+            raise GmailFetchIncomplete(failed)
+
+        return [results[message_id] for message_id in message_ids if message_id in results]
+
+    def _emails_from_messages(self, messages):
+        """Convert metadata message resources to email dicts, skipping ones without a subject"""
+        emails = []
+        for message in self._get_messages_metadata([msg['id'] for msg in messages]):
+            email_data = self._email_from_message(message)
+            if not email_data['subject']:
+                logger.warning(f"Email {message['id']} has no subject, skipping")
+                continue
+            emails.append(email_data)
+        return emails
 
     def _authenticate(self):
         """
@@ -169,51 +364,8 @@ class GmailClient:
 
             logger.info(f"Found {len(messages)} unread Booking.com email(s)")
 
-            # Fetch full details for each message
-            emails = []
-            for msg in messages:
-                try:
-                    message = self.service.users().messages().get(
-                        userId='me',
-                        id=msg['id'],
-                        format='full'
-                    ).execute()
-
-                    # Extract headers
-                    headers = message['payload']['headers']
-                    subject = None
-                    date_str = None
-
-                    for header in headers:
-                        if header['name'].lower() == 'subject':
-                            subject = header['value']
-                        elif header['name'].lower() == 'date':
-                            date_str = header['value']
-
-                    if not subject:
-                        logger.warning(f"Email {msg['id']} has no subject, skipping")
-                        continue
-
-                    # Parse date
-                    received_at = None
-                    if date_str:
-                        try:
-                            received_at = parsedate_to_datetime(date_str)
-                        except Exception as e:
-                            logger.warning(f"Could not parse date '{date_str}': {str(e)}")
-                            received_at = datetime.now(timezone.utc)
-                    else:
-                        received_at = datetime.now(timezone.utc)
-
-                    emails.append({
-                        'id': msg['id'],
-                        'subject': subject,
-                        'received_at': received_at,
-                    })
-
-                except HttpError as e:
-                    logger.error(f"Error fetching message {msg['id']}: {str(e)}")
-                    continue
+            # Fetch Subject/Date headers for all messages in batched round-trips
+            emails = self._emails_from_messages(messages)
 
             return emails
 
@@ -224,7 +376,7 @@ class GmailClient:
             logger.error(f"Error getting unread Booking.com emails: {str(e)}")
             raise
 
-    def get_recent_booking_emails(self, max_results=10, lookback_days=30):
+    def get_recent_booking_emails(self, max_results=10, lookback_days=30, exclude_ids=()):
         """
         Get recent Booking.com emails (read OR unread)
         
@@ -236,6 +388,7 @@ class GmailClient:
         Args:
             max_results: Number of recent emails to fetch (default: 10)
             lookback_days: Only search emails from last N days (default: 30)
+            exclude_ids: Message IDs to leave out (not fetched)
         
         Returns:
             list: Recent emails sorted by date (newest first) with keys:
@@ -262,7 +415,7 @@ class GmailClient:
                 maxResults=max_results
             ).execute()
             
-            messages = results.get('messages', [])
+            messages = [msg for msg in results.get('messages', []) if msg['id'] not in exclude_ids]
             
             if not messages:
                 logger.info("No recent Booking.com emails found")
@@ -270,56 +423,9 @@ class GmailClient:
             
             logger.info(f"Found {len(messages)} recent Booking.com email(s)")
             
-            # Fetch full details for each message
-            emails = []
-            for msg in messages:
-                try:
-                    message = self.service.users().messages().get(
-                        userId='me',
-                        id=msg['id'],
-                        format='full'
-                    ).execute()
-                    
-                    # Extract headers and check if unread
-                    headers = message['payload']['headers']
-                    label_ids = message.get('labelIds', [])
-                    is_unread = 'UNREAD' in label_ids
-                    
-                    subject = None
-                    date_str = None
-                    
-                    for header in headers:
-                        if header['name'].lower() == 'subject':
-                            subject = header['value']
-                        elif header['name'].lower() == 'date':
-                            date_str = header['value']
-                    
-                    if not subject:
-                        logger.warning(f"Email {msg['id']} has no subject, skipping")
-                        continue
-                    
-                    # Parse date
-                    received_at = None
-                    if date_str:
-                        try:
-                            received_at = parsedate_to_datetime(date_str)
-                        except Exception as e:
-                            logger.warning(f"Could not parse date '{date_str}': {str(e)}")
-                            received_at = datetime.now(timezone.utc)
-                    else:
-                        received_at = datetime.now(timezone.utc)
-                    
-                    emails.append({
-                        'id': msg['id'],
-                        'subject': subject,
-                        'received_at': received_at,
-                        'is_unread': is_unread,
-                    })
-                
-                except HttpError as e:
-                    logger.error(f"Error fetching message {msg['id']}: {str(e)}")
-                    continue
-            
+            # Fetch Subject/Date headers + labels for all messages in batched round-trips
+            emails = self._emails_from_messages(messages)
+
             # Sort by unread first, then by date descending (newest first)
             # This prioritizes unread emails when there are multiple matches
             emails.sort(key=lambda x: (not x['is_unread'], -x['received_at'].timestamp()))
@@ -334,6 +440,120 @@ class GmailClient:
             logger.error(f"Error getting recent Booking.com emails: {str(e)}")
             raise
     
+    def get_history_id(self):
+        """
+        Get the mailbox's current historyId (checkpoint for incremental sync)
+
+        Returns:
+            str: Gmail historyId
+        """
+        profile = self.service.users().getProfile(userId='me').execute()
+        return str(profile['historyId'])
+
+    def list_history_changes(self, start_history_id):
+        """
+        List mailbox changes since a historyId (users.history.list, all pages)
+
+        Args:
+            start_history_id: historyId from the previous sync
+
+        Returns:
+            tuple: (changes dict, new historyId str) where changes has keys:
+                - added: set of message IDs added to the mailbox
+                - deleted: set of message IDs deleted
+                - unread: dict of message ID -> bool for UNREAD label changes
+
+        Raises:
+            GmailHistoryExpired: If start_history_id is no longer available (HTTP 404)
+        """
+        changes = {'added': set(), 'deleted': set(), 'unread': {}}
+        new_history_id = str(start_history_id)
+        page_token = None
+
+        try:
+            while True:
+                response = self.service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved'],
+                    pageToken=page_token,
+                ).execute()
+
+                for record in response.get('history', []):
+                    for item in record.get('messagesAdded', []):
+                        changes['added'].add(item['message']['id'])
+                    for item in record.get('messagesDeleted', []):
+                        changes['deleted'].add(item['message']['id'])
+                    for item in record.get('labelsAdded', []):
+                        if 'UNREAD' in item.get('labelIds', []):
+                            changes['unread'][item['message']['id']] = True
+                    for item in record.get('labelsRemoved', []):
+                        if 'UNREAD' in item.get('labelIds', []):
+                            changes['unread'][item['message']['id']] = False
+
+                new_history_id = str(response.get('historyId', new_history_id))
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as e:
+            if getattr(e, 'resp', None) is not None and e.resp.status == 404:
+                raise GmailHistoryExpired(f"History {start_history_id} expired") from e
+            logger.error(f"Gmail history API error: {str(e)}")
+            raise
+
+        return changes, new_history_id
+
+    def get_booking_emails(self, message_ids):
+        """
+        Fetch headers for arbitrary messages (e.g. from history) and keep Booking.com ones
+
+        Args:
+            message_ids: Gmail message IDs
+
+        Returns:
+            list: Email dicts (id, subject, received_at, is_unread) for messages
+                sent by noreply@booking.com
+
+        Raises:
+            GmailFetchIncomplete: If some messages could not be fetched (404s are skipped)
+        """
+        emails = []
+        for message in self._get_messages_metadata(message_ids, headers=METADATA_HEADERS + ['From']):
+            headers = self._headers(message)
+            if 'noreply@booking.com' not in headers.get('from', '').lower():
+                continue
+            emails.append(self._email_from_message(message))
+        return emails
+
+    @staticmethod
+    def _headers(message):
+        """Lower-cased header name -> value for a message resource"""
+        return {h['name'].lower(): h['value'] for h in message.get('payload', {}).get('headers', [])}
+
+    def _email_from_message(self, message):
+        """Build the email dict used by the enrichment code from a message resource"""
+        return self._email_from_headers(message['id'], self._headers(message), message.get('labelIds', []))
+
+    @staticmethod
+    def _email_from_headers(message_id, headers, label_ids):
+        """Build the email dict used by the enrichment code from lower-cased headers"""
+        received_at = None
+        date_str = headers.get('date')
+        if date_str:
+            try:
+                received_at = parsedate_to_datetime(date_str)
+            except Exception as e:
+                logger.warning(f"Could not parse date '{date_str}': {str(e)}")
+        if received_at is None:
+            received_at = datetime.now(timezone.utc)
+
+        return {
+            'id': message_id,
+            'subject': headers.get('subject', ''),
+            'received_at': received_at,
+            'is_unread': 'UNREAD' in label_ids,
+        }
+
     def mark_as_read(self, message_id):
         """
         Mark an email as read
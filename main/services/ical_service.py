@@ -3,15 +3,31 @@ iCal Service Layer for PickARooms
 Handles fetching, parsing, and syncing iCal feeds from Booking.com and Airbnb
 """
 
+import hashlib
 import logging
 import re
+import threading
+import time
+import pytz
 import requests
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 from icalendar import Calendar
 from django.utils import timezone
 from django.db import transaction
-
-from main.models import RoomICalConfig, Reservation, Room
+from django.db.models import Q
+
+from main.models import RoomICalConfig, Reservation, Room, PinProvisioningJob
+from main.services.reservation_overlaps import upcoming_overlaps
+from main.services.occupancy import refresh_occupancy
+from main.services.dashboard_snapshot import refresh_dashboard_snapshots
+from main.enrichment_config import (
+    ICAL_POLL_MIN_INTERVAL, ICAL_POLL_BASE_INTERVAL, ICAL_POLL_ARRIVALS_MAX_INTERVAL,
+    ICAL_POLL_MAX_INTERVAL, ICAL_POLL_ERROR_MAX_INTERVAL, ICAL_POLL_RECENT_CHANGE_HOURS,
+    ICAL_POLL_ARRIVALS_WINDOW_HOURS,
+)
 
 logger = logging.getLogger('main')
 
@@ -30,17 +46,143 @@ def fetch_ical_feed(url, timeout=30):
     Raises:
         requests.RequestException: If fetch fails
     """
+    return fetch_ical_feed_conditional(url, timeout=timeout)['data']
+
+
+def fetch_ical_feed_conditional(url, etag=None, last_modified=None, timeout=30, session=None):
+    """
+    Fetch iCal feed from URL using HTTP conditional GET
+
+    Sends If-None-Match / If-Modified-Since when validators from the previous
+    fetch are available, so the platform can answer 304 Not Modified instead
+    of sending the whole calendar again.
+
+    Args:
+        url (str): iCal feed URL
+        etag (str): ETag from the previous fetch (optional)
+        last_modified (str): Last-Modified from the previous fetch (optional)
+        timeout (int): Request timeout in seconds
+        session (requests.Session): Keep-alive session to reuse (optional)
+
+    Returns:
+        dict: {
+            'not_modified': bool (True on HTTP 304),
+            'data': str or None (raw iCal data, None when not modified),
+            'etag': str (validator to store for the next fetch),
+            'last_modified': str (validator to store for the next fetch)
+        }
+
+    Raises:
+        requests.RequestException: If fetch fails
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
     try:
-        logger.info(f"Fetching iCal feed from: {url}")
-        response = requests.get(url, timeout=timeout)
+        logger.info(f"Fetching iCal feed from: {url} (conditional={bool(headers)})")
+        response = (session or requests).get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304:
+            logger.info("iCal feed not modified (304)")
+            return {
+                'not_modified': True,
+                'data': None,
+                # Servers may omit validators on 304 - keep the ones we sent
+                'etag': response.headers.get('ETag', etag or ''),
+                'last_modified': response.headers.get('Last-Modified', last_modified or ''),
+            }
+
         response.raise_for_status()
         logger.info(f"Successfully fetched iCal feed ({len(response.text)} bytes)")
-        return response.text
+        return {
+            'not_modified': False,
+            'data': response.text,
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+        }
     except requests.RequestException as e:
         logger.error(f"Failed to fetch iCal feed from {url}: {str(e)}")
         raise
 
 
+def fetch_feeds_concurrently(jobs, max_workers=8, per_host_limit=2, timeout=30, deadline=None):
+    """
+    Fetch many iCal feeds in parallel with per-host connection reuse and caps
+
+    One keep-alive requests.Session is shared per host (Booking.com, Airbnb, ...)
+    and a per-host semaphore bounds how many requests hit the same host at once,
+    so total wall-clock is roughly that of the slowest feed without hammering
+    a single platform.
+
+    Args:
+        jobs (list): Dicts with 'key', 'url', 'etag', 'last_modified'
+        max_workers (int): Thread pool size
+        per_host_limit (int): Max in-flight requests per host
+        timeout (int): Per-request timeout in seconds
+        deadline (float): time.monotonic() value after which jobs still waiting
+            for their host are not started (optional)
+
+    Returns:
+        dict: {job key: fetch_ical_feed_conditional() result or the Exception raised};
+            jobs skipped because of the deadline are left out
+    """
+    if not jobs:
+        return {}
+
+    sessions = {}
+    semaphores = {}
+    for job in jobs:
+        host = urlsplit(job['url']).netloc
+        if host not in sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=per_host_limit)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            sessions[host] = session
+            semaphores[host] = threading.BoundedSemaphore(per_host_limit)
+
+    def _fetch(job):
+        host = urlsplit(job['url']).netloc
+        with semaphores[host]:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            try:
+                return fetch_ical_feed_conditional(
+                    job['url'],
+                    etag=job.get('etag'),
+                    last_modified=job.get('last_modified'),
+                    timeout=timeout,
+                    session=sessions[host],
+                )
+            except Exception as e:
+                # Returned, not raised - the sync step records it as that feed's error
+                return e
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+            results = executor.map(_fetch, jobs)
+            return {job['key']: result for job, result in zip(jobs, results) if result is not None}
+    finally:
+        for session in sessions.values():
+            session.close()
+
+
+def compute_ical_hash(ical_data):
+    """
+    Compute SHA-256 hex digest of a raw iCal feed body
+
+    Args:
+        ical_data (str): Raw iCal data
+
+    Returns:
+        str: 64-character hex digest
+    """
+    return hashlib.sha256(ical_data.encode('utf-8')).hexdigest()
+
+
 def extract_booking_reference(text):
     """
     Extract booking reference from text using regex
@@ -77,10 +219,151 @@ def extract_booking_reference(text):
     return None
 
 
+# VEVENT blocks sliced straight from the feed text (events cannot nest)
+_VEVENT_RE = re.compile(r'^BEGIN:VEVENT[ \t]*\r?\n(.*?)^END:VEVENT(?=[ \t]*\r?$)', re.MULTILINE | re.DOTALL | re.IGNORECASE)
+_FOLD_RE = re.compile(r'\r?\n[ \t]')
+_ESCAPE_RE = re.compile(r'\\([\\;,nN])')
+_STREAM_FIELDS = ('UID', 'SUMMARY', 'DTSTART', 'DTEND', 'STATUS')
+
+
+class _StreamParseError(Exception):
+    """Input the streaming extractor won't guess about - parse_ical falls back to icalendar"""
+
+
+def _unescape_text(value):
+    """Undo RFC 5545 TEXT escaping (backslash-escaped backslash, semicolon, comma and newline)"""
+    return _ESCAPE_RE.sub(lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def _split_property(line):
+    """
+    Split an unfolded content line into (NAME, value)
+
+    Params are skipped; the value starts at the first ':' outside a quoted param.
+    """
+    in_quotes = False
+    for i, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            name = line[:i].split(';', 1)[0].strip().upper()
+            return name, line[i + 1:]
+    raise _StreamParseError(f"Content line without value: {line[:50]}")
+
+
+def _parse_ical_date(value):
+    """DATE or DATE-TIME value -> date (local date as written, like icalendar's .dt.date())"""
+    value = value.strip()
+    try:
+        parsed = datetime.strptime(value[:8], '%Y%m%d').date()
+    except ValueError:
+        raise _StreamParseError(f"Unsupported date value: {value}")
+    if len(value) > 8 and not re.fullmatch(r'T\d{6}Z?', value[8:]):
+        raise _StreamParseError(f"Unsupported date-time value: {value}")
+    return parsed
+
+
+def iter_vevents(ical_data):
+    """
+    Stream VEVENTs out of raw iCal text without building a Calendar object
+
+    Only the fields the sync uses (UID, SUMMARY, DTSTART, DTEND, STATUS) are read.
+    'raw' is the event text sliced from the input buffer.
+
+    Args:
+        ical_data (str): Raw iCal data
+
+    Yields:
+        dict: Same shape as parse_ical() items
+
+    Raises:
+        _StreamParseError: If the input is not something this extractor handles
+    """
+    if not ical_data.lstrip().upper().startswith('BEGIN:VCALENDAR'):
+        raise _StreamParseError("Missing BEGIN:VCALENDAR")
+
+    matched = 0
+    for match in _VEVENT_RE.finditer(ical_data):
+        matched += 1
+        fields = {}
+        depth = 0
+        for line in _FOLD_RE.sub('', match.group(1)).splitlines():
+            if not line.strip():
+                continue
+            name, value = _split_property(line)
+            if name == 'BEGIN':
+                depth += 1  # nested component (e.g. VALARM) - ignore its properties
+            elif name == 'END':
+                depth -= 1
+            elif depth == 0 and name in _STREAM_FIELDS and name not in fields:
+                fields[name] = value
+
+        if depth != 0:
+            raise _StreamParseError("Unbalanced nested component inside VEVENT")
+
+        uid = _unescape_text(fields.get('UID', ''))
+        dtstart = _parse_ical_date(fields['DTSTART']) if fields.get('DTSTART') else None
+        dtend = _parse_ical_date(fields['DTEND']) if fields.get('DTEND') else None
+
+        # Skip if missing required fields
+        if not uid or not dtstart or not dtend:
+            logger.warning(f"Skipping event with missing required fields: UID={uid}")
+            continue
+
+        yield {
+            'uid': uid,
+            'summary': _unescape_text(fields.get('SUMMARY', '')),
+            'dtstart': dtstart,
+            'dtend': dtend,
+            'status': _unescape_text(fields.get('STATUS', 'CONFIRMED')).upper(),
+            'raw': match.group(0),
+        }
+
+    # Every BEGIN:VEVENT must have been consumed by a well-formed block
+    if matched != len(re.findall(r'^BEGIN:VEVENT[ \t]*\r?$', ical_data, re.MULTILINE | re.IGNORECASE)):
+        raise _StreamParseError("Unterminated VEVENT")
+
+
 def parse_ical(ical_data):
     """
     Parse iCal data and extract event information
 
+    Uses the streaming extractor (iter_vevents) and falls back to the full
+    icalendar parser for input it doesn't handle.
+
+    Args:
+        ical_data (str): Raw iCal data
+
+    Returns:
+        list: List of dicts containing event data:
+            {
+                'uid': str,
+                'summary': str,
+                'dtstart': date,
+                'dtend': date,
+                'status': str,
+                'raw': str (raw event data for debugging)
+            }
+
+    Raises:
+        ValueError: If iCal data is invalid
+    """
+    try:
+        events = list(iter_vevents(ical_data))
+    except _StreamParseError as e:
+        logger.warning(f"Streaming iCal parse failed ({str(e)}), falling back to icalendar")
+        return _parse_ical_with_icalendar(ical_data)
+
+    logger.info(f"Parsed {len(events)} events from iCal feed")
+    return events
+
+
+def _parse_ical_with_icalendar(ical_data):
+    """
+    Parse iCal data with the full icalendar object model
+
+    Fallback for parse_ical() when the streaming extractor cannot handle the input.
+
     Args:
         ical_data (str): Raw iCal data
 
@@ -143,25 +426,207 @@ def parse_ical(ical_data):
         raise ValueError(f"Invalid iCal data: {str(e)}")
 
 
-def sync_reservations_for_room(config_id, platform='booking'):
+# Reservation fields the iCal sync is allowed to write
+_SNAPSHOT_FIELDS = (
+    'ical_uid', 'booking_reference', 'guest_name',
+    'check_in_date', 'check_out_date', 'status', 'raw_ical_data',
+)
+
+
+def _snapshot(reservation):
+    """Tuple of the sync-controlled fields, used to detect rows that actually changed"""
+    return tuple(getattr(reservation, field) for field in _SNAPSHOT_FIELDS)
+
+
+def _load_sync_candidates(room, platform, events, current_uids):
+    """
+    Load every Reservation the sync plan for one feed can touch, in a single query
+
+    Covers the three matching methods and the cancellation sweep:
+    - same room + any check-in date present in the feed (booking_ref / collision matches)
+    - same room + platform + confirmed (cancellation of rows missing from the feed)
+    - any room with a UID present in the feed (ical_uid matches)
+
+    Returns:
+        list: Reservation instances
+    """
+    check_in_dates = {event['dtstart'] for event in events}
+    query = (
+        Q(room=room, check_in_date__in=check_in_dates)
+        | Q(room=room, platform=platform, status='confirmed')
+        | Q(ical_uid__in=current_uids)
+    )
+    # pk as tie-breaker keeps "first match" deterministic across runs
+    return list(
+        Reservation.objects.filter(query).select_related('room').order_by('-check_in_date', 'pk')
+    )
+
+
+class _ReservationIndex:
+    """
+    In-memory lookups replacing the per-event Reservation queries in sync_reservations_for_room
+
+    Rows must be discard()-ed before their indexed fields change and add()-ed
+    back afterwards, so later events in the same feed see earlier changes
+    exactly as the sequential save() implementation did.
+    """
+
+    def __init__(self, room_id, reservations):
+        self.room_id = room_id
+        self._by_uid = {}
+        self._by_reference = {}
+        self._by_dates = {}
+        self._room_rows = []
+        for reservation in reservations:
+            self.add(reservation)
+
+    def add(self, reservation):
+        self._by_uid[reservation.ical_uid] = reservation
+        if reservation.room_id != self.room_id:
+            return
+        self._room_rows.append(reservation)
+        self._by_reference.setdefault(
+            (reservation.booking_reference, reservation.check_in_date), []
+        ).append(reservation)
+        self._by_dates.setdefault(
+            (reservation.check_in_date, reservation.check_out_date), []
+        ).append(reservation)
+
+    def discard(self, reservation):
+        if self._by_uid.get(reservation.ical_uid) is reservation:
+            del self._by_uid[reservation.ical_uid]
+        if reservation.room_id != self.room_id:
+            return
+        self._remove(self._room_rows, reservation)
+        self._remove(self._by_reference.get((reservation.booking_reference, reservation.check_in_date), []), reservation)
+        self._remove(self._by_dates.get((reservation.check_in_date, reservation.check_out_date), []), reservation)
+
+    @staticmethod
+    def _remove(bucket, reservation):
+        for i, item in enumerate(bucket):
+            if item is reservation:
+                del bucket[i]
+                return
+
+    def by_uid(self, uid):
+        return self._by_uid.get(uid)
+
+    def by_reference(self, booking_ref, check_in_date):
+        bucket = self._by_reference.get((booking_ref, check_in_date))
+        return bucket[0] if bucket else None
+
+    def collision(self, check_in_date, check_out_date, exclude_uid):
+        for reservation in self._by_dates.get((check_in_date, check_out_date), []):
+            if reservation.status == 'confirmed' and reservation.ical_uid != exclude_uid:
+                return reservation
+        return None
+
+    def room_rows(self):
+        return list(self._room_rows)
+
+
+def has_arrivals_soon(room, now=None):
+    """
+    True if the room has a confirmed check-in within ICAL_POLL_ARRIVALS_WINDOW_HOURS
+
+    Args:
+        room (Room): Room to check
+        now (datetime): Reference time (defaults to timezone.now())
+
+    Returns:
+        bool
+    """
+    now = now or timezone.now()
+    uk_tz = pytz.timezone("Europe/London")
+    today = now.astimezone(uk_tz).date()
+    window_end = (now + timedelta(hours=ICAL_POLL_ARRIVALS_WINDOW_HOURS)).astimezone(uk_tz).date()
+    return Reservation.objects.filter(
+        room=room,
+        status='confirmed',
+        check_in_date__gte=today,
+        check_in_date__lte=window_end,
+    ).exists()
+
+
+def plan_next_poll(config, platform, outcome, now=None):
+    """
+    Compute the adaptive polling schedule for one feed after a sync attempt
+
+    - 'changed': poll again after ICAL_POLL_MIN_INTERVAL
+    - 'unchanged': double the interval, capped lower if the feed is "hot"
+      (changed recently or a check-in is coming up), otherwise at ICAL_POLL_MAX_INTERVAL
+    - 'error': exponential backoff from the base interval up to ICAL_POLL_ERROR_MAX_INTERVAL
+
+    Args:
+        config (RoomICalConfig): Feed configuration (read only)
+        platform (str): 'booking' or 'airbnb'
+        outcome (str): 'changed', 'unchanged' or 'error'
+        now (datetime): Reference time (defaults to timezone.now())
+
+    Returns:
+        dict: Platform-prefixed RoomICalConfig field values to save
+    """
+    now = now or timezone.now()
+    interval = getattr(config, f'{platform}_poll_interval') or ICAL_POLL_BASE_INTERVAL
+    last_changed_at = getattr(config, f'{platform}_last_changed_at')
+    errors = getattr(config, f'{platform}_consecutive_errors')
+
+    if outcome == 'error':
+        errors += 1
+        interval = min(ICAL_POLL_BASE_INTERVAL * 2 ** (errors - 1), ICAL_POLL_ERROR_MAX_INTERVAL)
+    elif outcome == 'changed':
+        errors = 0
+        last_changed_at = now
+        interval = ICAL_POLL_MIN_INTERVAL
+    else:
+        errors = 0
+        recently_changed = last_changed_at and now - last_changed_at < timedelta(hours=ICAL_POLL_RECENT_CHANGE_HOURS)
+        if recently_changed:
+            ceiling = ICAL_POLL_MIN_INTERVAL
+        elif has_arrivals_soon(config.room, now):
+            ceiling = ICAL_POLL_ARRIVALS_MAX_INTERVAL
+        else:
+            ceiling = ICAL_POLL_MAX_INTERVAL
+        interval = max(ICAL_POLL_MIN_INTERVAL, min(interval * 2, ceiling))
+
+    return {
+        f'{platform}_poll_interval': interval,
+        f'{platform}_next_poll_at': now + timedelta(seconds=interval),
+        f'{platform}_last_changed_at': last_changed_at,
+        f'{platform}_consecutive_errors': errors,
+    }
+
+
+def is_feed_due(config, platform, now=None):
+    """True if the adaptive scheduler says this platform feed should be polled now"""
+    next_poll_at = getattr(config, f'{platform}_next_poll_at')
+    return next_poll_at is None or next_poll_at <= (now or timezone.now())
+
+
+def sync_reservations_for_room(config_id, platform='booking', force=False, prefetched=None):
     """
     Sync reservations for a specific room from its iCal feed for a specific platform
 
     This is the main sync function that:
-    1. Fetches the platform-specific iCal feed
-    2. Parses events
-    3. Creates/updates reservations with platform label
-    4. Marks cancelled reservations
-    5. Updates platform-specific sync status
+    1. Fetches the platform-specific iCal feed (conditional GET)
+    2. Short-circuits if the feed is unchanged (304 or same SHA-256)
+    3. Parses events
+    4. Creates/updates reservations with platform label
+    5. Marks cancelled reservations
+    6. Updates platform-specific sync status, feed validators and next poll time
 
     Args:
         config_id (int): RoomICalConfig ID
         platform (str): 'booking' or 'airbnb'
+        force (bool): Ignore stored validators and always re-process the feed
+        prefetched (dict or Exception): Result of an earlier fetch_ical_feed_conditional()
+            call (e.g. from fetch_feeds_concurrently); skips the HTTP request
 
     Returns:
         dict: Sync results with counts
             {
                 'success': bool,
+                'unchanged': bool,
                 'created': int,
                 'updated': int,
                 'cancelled': int,
@@ -176,9 +641,15 @@ def sync_reservations_for_room(config_id, platform='booking'):
         if platform == 'booking':
             ical_url = config.booking_ical_url
             is_active = config.booking_active
+            stored_etag = config.booking_etag
+            stored_last_modified = config.booking_last_modified
+            stored_hash = config.booking_content_hash
         elif platform == 'airbnb':
             ical_url = config.airbnb_ical_url
             is_active = config.airbnb_active
+            stored_etag = config.airbnb_etag
+            stored_last_modified = config.airbnb_last_modified
+            stored_hash = config.airbnb_content_hash
         else:
             return {
                 'success': False,
@@ -210,8 +681,60 @@ def sync_reservations_for_room(config_id, platform='booking'):
 
         logger.info(f"Starting {platform} sync for room: {config.room.name}")
 
-        # Fetch and parse iCal feed
-        ical_data = fetch_ical_feed(ical_url)
+        if force:
+            stored_etag = stored_last_modified = stored_hash = ''
+
+        # Fetch iCal feed (conditional GET using validators from the last sync)
+        if prefetched is None:
+            fetch_result = fetch_ical_feed_conditional(
+                ical_url,
+                etag=stored_etag,
+                last_modified=stored_last_modified,
+            )
+        elif isinstance(prefetched, Exception):
+            raise prefetched
+        else:
+            fetch_result = prefetched
+
+        content_hash = None
+        if fetch_result['not_modified']:
+            unchanged_reason = "not modified (304)"
+        else:
+            content_hash = compute_ical_hash(fetch_result['data'])
+            unchanged_reason = "content hash match" if content_hash == stored_hash else None
+
+        # Most polls are no-ops - skip parsing and all reservation writes
+        if unchanged_reason:
+            sync_time = timezone.now()
+            sync_status = f"Unchanged: {unchanged_reason}"
+            schedule = plan_next_poll(config, platform, 'unchanged', sync_time)
+            if platform == 'booking':
+                RoomICalConfig.objects.filter(id=config.id).update(
+                    **schedule,
+                    booking_last_synced=sync_time,
+                    booking_last_sync_status=sync_status,
+                    booking_etag=fetch_result['etag'],
+                    booking_last_modified=fetch_result['last_modified'],
+                )
+            else:
+                RoomICalConfig.objects.filter(id=config.id).update(
+                    **schedule,
+                    airbnb_last_synced=sync_time,
+                    airbnb_last_sync_status=sync_status,
+                    airbnb_etag=fetch_result['etag'],
+                    airbnb_last_modified=fetch_result['last_modified'],
+                )
+            logger.info(f"{platform.capitalize()} feed unchanged for {config.room.name} ({unchanged_reason}), skipping sync")
+            return {
+                'success': True,
+                'unchanged': True,
+                'created': 0,
+                'updated': 0,
+                'cancelled': 0,
+                'errors': []
+            }
+
+        ical_data = fetch_result['data']
         events = parse_ical(ical_data)
 
         created_count = 0
@@ -220,13 +743,19 @@ def sync_reservations_for_room(config_id, platform='booking'):
         errors = []
 
         # Track current event UIDs to detect cancellations
-        current_uids = set()
+        current_uids = {event['uid'] for event in events}
 
         with transaction.atomic():
+            # Load every row the plan can touch in ONE query and index it in memory.
+            # Replaces the 3 lookups + save() (+ pre_save SELECT) per VEVENT.
+            candidates = _load_sync_candidates(config.room, platform, events, current_uids)
+            index = _ReservationIndex(config.room.id, candidates)
+            original_state = {r.pk: _snapshot(r) for r in candidates}
+            to_create = []
+
             for event in events:
                 try:
                     uid = event['uid']
-                    current_uids.add(uid)
 
                     # Extract booking reference from summary
                     booking_ref = extract_booking_reference(event['summary'])
@@ -239,40 +768,28 @@ def sync_reservations_for_room(config_id, platform='booking'):
                     # 1. Match by booking_reference + room + check_in (catches XLS-created reservations)
                     # 2. Match by ical_uid (catches iCal-created reservations)
                     reservation = None
-                    created = False
                     match_method = None
 
                     # Method 1: Try matching by booking_reference + room + check_in_date
                     # This prevents duplicates when XLS upload happens before iCal sync
                     if booking_ref and len(booking_ref) >= 5:
-                        reservation = Reservation.objects.filter(
-                            booking_reference=booking_ref,
-                            room=config.room,
-                            check_in_date=event['dtstart']
-                        ).first()
+                        reservation = index.by_reference(booking_ref, event['dtstart'])
                         if reservation:
                             match_method = 'booking_ref'
                             logger.info(f"Found existing reservation by booking_ref: {booking_ref}")
 
                     # Method 2: Try matching by ical_uid (standard iCal behavior)
                     if not reservation:
-                        try:
-                            reservation = Reservation.objects.get(ical_uid=uid)
+                        reservation = index.by_uid(uid)
+                        if reservation:
                             match_method = 'ical_uid'
                             logger.info(f"Found existing reservation by ical_uid: {uid}")
-                        except Reservation.DoesNotExist:
-                            pass
 
                     # Method 3: COLLISION DETECTION
                     # Before creating a new reservation, check if room+dates are already occupied
                     # This prevents iCal from creating "CLOSED - Not available" duplicates after XLS upload
                     if not reservation:
-                        collision = Reservation.objects.filter(
-                            room=config.room,
-                            check_in_date=event['dtstart'],
-                            check_out_date=event['dtend'],
-                            status='confirmed'
-                        ).exclude(ical_uid=uid).first()
+                        collision = index.collision(event['dtstart'], event['dtend'], exclude_uid=uid)
 
                         if collision:
                             # Room+dates already occupied by a different reservation
@@ -304,6 +821,15 @@ def sync_reservations_for_room(config_id, platform='booking'):
                                 match_method = 'collision_update'
 
                     if reservation:
+                        # ical_uid is unique - refuse to relink onto a UID another row already owns
+                        # (a save() here used to fail with IntegrityError for the same reason)
+                        relink_uid = match_method == 'booking_ref' and reservation.ical_uid != uid
+                        owner = index.by_uid(uid) if relink_uid else None
+                        if owner is not None and owner is not reservation:
+                            raise ValueError(f"ical_uid {uid} already belongs to reservation {owner.pk}")
+
+                        index.discard(reservation)
+
                         # UPDATE EXISTING: Preserve XLS-enriched data
                         # Only update fields that iCal should control (dates, status, raw data)
                         reservation.check_in_date = event['dtstart']
@@ -313,7 +839,7 @@ def sync_reservations_for_room(config_id, platform='booking'):
 
                         # IMPORTANT: Update ical_uid if matched by booking_ref
                         # This links XLS-created reservations to iCal feed for future updates
-                        if match_method == 'booking_ref' and reservation.ical_uid != uid:
+                        if relink_uid:
                             old_uid = reservation.ical_uid
                             reservation.ical_uid = uid
                             logger.info(f"Updated ical_uid: {old_uid} → {uid}")
@@ -333,13 +859,12 @@ def sync_reservations_for_room(config_id, platform='booking'):
                             # Preserve XLS-enriched data (booking_reference >= 5 chars)
                             logger.info(f"Preserved XLS-enriched booking_ref: {reservation.booking_reference}")
 
-                        reservation.save()
-                        updated_count += 1
-                        logger.info(f"Updated reservation (method={match_method}, preserved enrichments): {reservation}")
+                        index.add(reservation)
+                        logger.info(f"Planned update (method={match_method}, preserved enrichments): {reservation}")
 
                     else:
                         # CREATE NEW: First time seeing this iCal event
-                        reservation = Reservation.objects.create(
+                        reservation = Reservation(
                             ical_uid=uid,
                             room=config.room,
                             platform=platform,
@@ -350,15 +875,9 @@ def sync_reservations_for_room(config_id, platform='booking'):
                             status=event_status,
                             raw_ical_data=event['raw']
                         )
-                        created_count += 1
-                        logger.info(f"Created new reservation: {reservation}")
-                        
-                        # NEW: Trigger enrichment workflow after creating reservation
-                        # Only for Booking.com platform (we need emails for enrichment)
-                        if platform == 'booking' and event_status == 'confirmed':
-                            # Import here to avoid circular imports
-                            from main.tasks import trigger_enrichment_workflow
-                            trigger_enrichment_workflow.delay(reservation.id)
+                        to_create.append(reservation)
+                        index.add(reservation)
+                        logger.info(f"Planned new reservation: {reservation}")
 
                 except Exception as e:
                     error_msg = f"Error processing event {event.get('uid', 'unknown')}: {str(e)}"
@@ -367,32 +886,126 @@ def sync_reservations_for_room(config_id, platform='booking'):
 
             # Mark reservations as cancelled if they're no longer in the feed
             # Includes both enriched and unenriched reservations
-            # Signal handler will automatically trigger cancellation task for enriched ones
             # IMPORTANT: Exclude XLS-created reservations (ical_uid starts with 'xls_')
             # XLS reservations are managed by XLS uploads, not iCal sync
-            missing_reservations = Reservation.objects.filter(
-                room=config.room,
-                platform=platform,
-                status='confirmed',
-            ).exclude(ical_uid__in=current_uids).exclude(ical_uid__startswith='xls_')
-
-            for reservation in missing_reservations:
-                reservation.status = 'cancelled'
-                reservation.save()  # Triggers signal if enriched
-                cancelled_count += 1
-                enrichment_status = "enriched" if reservation.guest else "unenriched"
-                logger.info(f"Marked as cancelled (removed from feed, {enrichment_status}): {reservation}")
+            swept_ids = set()
+            for reservation in index.room_rows():
+                if (
+                    reservation.pk is not None
+                    and reservation.platform == platform
+                    and reservation.status == 'confirmed'
+                    and reservation.ical_uid not in current_uids
+                    and not reservation.ical_uid.startswith('xls_')
+                ):
+                    reservation.status = 'cancelled'
+                    swept_ids.add(reservation.pk)
+                    cancelled_count += 1
+                    enrichment_status = "enriched" if reservation.guest_id else "unenriched"
+                    logger.info(f"Marked as cancelled (removed from feed, {enrichment_status}): {reservation}")
+
+            # Apply the plan: one INSERT batch + one UPDATE batch
+            now = timezone.now()
+            to_update = []
+            status_pos = _SNAPSHOT_FIELDS.index('status')
+            newly_cancelled_enriched = []
+            for reservation in candidates:
+                before = original_state[reservation.pk]
+                if _snapshot(reservation) == before:
+                    continue
+                reservation.updated_at = now  # bulk_update() skips auto_now
+                to_update.append(reservation)
+                # Rows cancelled only because they vanished from the feed are reported as cancelled, not updated
+                after = _snapshot(reservation)
+                if reservation.pk not in swept_ids or after[:status_pos] + after[status_pos + 1:] != before[:status_pos] + before[status_pos + 1:]:
+                    updated_count += 1
+                # bulk_update() bypasses the post_save signal, so dispatch
+                # cancellation handling ourselves (same rule as main/signals.py)
+                old_status = before[status_pos]
+                if reservation.guest_id and old_status and old_status != 'cancelled' and reservation.status == 'cancelled':
+                    newly_cancelled_enriched.append(reservation.pk)
+
+            if to_create:
+                Reservation.objects.bulk_create(to_create, batch_size=500)
+            if to_update:
+                Reservation.objects.bulk_update(to_update, list(_SNAPSHOT_FIELDS) + ['updated_at'], batch_size=500)
+
+            created_count = len(to_create)
+
+            # bulk_create()/bulk_update() skip the signals that keep the occupancy index and dashboard snapshots current
+            check_in_pos = _SNAPSHOT_FIELDS.index('check_in_date')
+            check_out_pos = _SNAPSHOT_FIELDS.index('check_out_date')
+            changed_stays = (
+                [(r.room_id, r.check_in_date, r.check_out_date) for r in to_create + to_update]
+                + [(r.room_id, original_state[r.pk][check_in_pos], original_state[r.pk][check_out_pos]) for r in to_update]
+            )
+            refresh_occupancy(changed_stays)
+            refresh_dashboard_snapshots([stay[1:] for stay in changed_stays])
+
+            # Warn about double bookings this feed just created or moved (same sweep as the dashboard)
+            changed_ids = {r.pk for r in to_create if r.status == 'confirmed'} | {r.pk for r in to_update if r.status == 'confirmed'}
+            if changed_ids:
+                for first, second in upcoming_overlaps(room_ids=[config.room_id]):
+                    if first.pk in changed_ids or second.pk in changed_ids:
+                        logger.warning(
+                            f"⚠️ OVERLAP: {config.room.name} booked on {first.platform} ({first.guest_name}, "
+                            f"{first.check_in_date} to {first.check_out_date}) and {second.platform} "
+                            f"({second.guest_name}, {second.check_in_date} to {second.check_out_date})"
+                        )
+
+            # Tomorrow's arrivals may hold unclaimed pre-provisioned PINs
+            newly_cancelled = [
+                r.pk for r in to_update
+                if r.status == 'cancelled' and original_state[r.pk][status_pos] != 'cancelled'
+            ]
+            if newly_cancelled and PinProvisioningJob.objects.filter(
+                reservation_id__in=newly_cancelled, is_preprovisioned=True, session_key=''
+            ).exists():
+                from main.tasks import release_preprovisioned_pins
+                transaction.on_commit(lambda: release_preprovisioned_pins.delay(newly_cancelled))
+
+            if newly_cancelled_enriched:
+                # Import here to avoid circular imports
+                from main.tasks import handle_reservation_cancellation
+                for reservation_id in newly_cancelled_enriched:
+                    logger.info(f"Reservation {reservation_id} status changed to cancelled with enriched guest. Triggering cancellation task.")
+                    transaction.on_commit(lambda rid=reservation_id: handle_reservation_cancellation.delay(rid))
+
+            # NEW: Trigger enrichment workflow after creating reservations
+            # Only for Booking.com platform (we need emails for enrichment)
+            # One batched job per sync, dispatched after commit so the worker sees the rows
+            new_booking_ids = [r.id for r in to_create if r.status == 'confirmed'] if platform == 'booking' else []
+            if new_booking_ids:
+                # Import here to avoid circular imports
+                from main.tasks import trigger_enrichment_workflow_batch
+                transaction.on_commit(lambda: trigger_enrichment_workflow_batch.delay(new_booking_ids))
 
         # Update platform-specific sync status
         sync_time = timezone.now()
         sync_status = f"Success: {created_count} created, {updated_count} updated, {cancelled_count} cancelled"
 
+        # Only remember validators when every event was applied cleanly,
+        # otherwise the next poll must re-process the feed to retry failures
+        if errors:
+            new_etag, new_last_modified, new_hash = '', '', ''
+        else:
+            new_etag, new_last_modified, new_hash = fetch_result['etag'], fetch_result['last_modified'], content_hash
+
         if platform == 'booking':
             config.booking_last_synced = sync_time
             config.booking_last_sync_status = sync_status
+            config.booking_etag = new_etag
+            config.booking_last_modified = new_last_modified
+            config.booking_content_hash = new_hash
         elif platform == 'airbnb':
             config.airbnb_last_synced = sync_time
             config.airbnb_last_sync_status = sync_status
+            config.airbnb_etag = new_etag
+            config.airbnb_last_modified = new_last_modified
+            config.airbnb_content_hash = new_hash
+
+        outcome = 'changed' if (created_count or updated_count or cancelled_count) else 'unchanged'
+        for field, value in plan_next_poll(config, platform, outcome, sync_time).items():
+            setattr(config, field, value)
 
         config.save()
 
@@ -400,6 +1013,7 @@ def sync_reservations_for_room(config_id, platform='booking'):
 
         return {
             'success': True,
+            'unchanged': False,
             'created': created_count,
             'updated': updated_count,
             'cancelled': cancelled_count,
@@ -429,6 +1043,9 @@ def sync_reservations_for_room(config_id, platform='booking'):
                 config.booking_last_sync_status = error_status
             elif platform == 'airbnb':
                 config.airbnb_last_sync_status = error_status
+            if platform in ('booking', 'airbnb'):
+                for field, value in plan_next_poll(config, platform, 'error').items():
+                    setattr(config, field, value)
             config.save()
         except Exception:
             pass
@@ -0,0 +1,258 @@
+"""
+TTLock callback event store (LockEvent)
+
+The webhook only parses the callback and appends the records to a Redis list
+(the Celery broker), so a burst of callbacks costs one RPUSH each.
+flush_lock_events drains the list in batches and bulk-inserts them - every
+minute, or as soon as LOCK_EVENT_FLUSH_SIZE records are waiting. If Redis
+is unreachable the webhook writes its records directly instead of dropping
+them.
+
+On top of the table:
+- first_entries: when each guest first opened a door with their PIN (real
+  check-in time, no TTLock polling)
+- lock_usage: per-lock event / PIN unlock counts and last activity
+"""
+
+import datetime
+import json
+import logging
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+logger = logging.getLogger('main')
+
+BUFFER_KEY = 'ttlock:lock_events'
+
+
+def _ms_to_datetime(ms):
+    return datetime.datetime.fromtimestamp(int(ms) / 1000, tz=datetime.timezone.utc)
+
+
+def parse_callback(body, post=None):
+    """
+    Lock records of one TTLock callback (no queries)
+
+    TTLock posts form fields lockId, notifyType and records (a JSON array
+    string); a JSON body with the same keys is accepted too.
+
+    Args:
+        body: Raw request body (str)
+        post: request.POST (form-encoded callbacks)
+
+    Returns:
+        list: event dicts (LockEvent field values, datetimes as ms)
+    """
+    payload = dict(post.items()) if post else {}
+    if not payload.get('records'):
+        try:
+            payload = json.loads(body)
+        except (TypeError, ValueError):
+            return []
+        if not isinstance(payload, dict):
+            return []
+
+    records = payload.get('records') or []
+    if isinstance(records, str):
+        try:
+            records = json.loads(records)
+        except ValueError:
+            return []
+
+    events = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        lock_id = record.get('lockId') or payload.get('lockId')
+        lock_date = record.get('lockDate') or record.get('serverDate')
+        if lock_id is None or record.get('recordType') is None or not lock_date:
+            continue
+        try:
+            events.append({
+                'lock_id': int(lock_id),
+                'record_type': int(record['recordType']),
+                'keyboard_pwd': str(record.get('keyboardPwd') or '')[:20],
+                'keyboard_pwd_id': str(record.get('keyboardPwdId') or '')[:50],
+                'success': record.get('success', 1) in (1, '1', True),
+                'username': str(record.get('username') or '')[:100],
+                'battery': int(record['electricQuantity']) if record.get('electricQuantity') is not None else None,
+                'occurred_at': int(lock_date),
+                'received_at': int(record.get('serverDate') or lock_date),
+            })
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping malformed TTLock lock record: {record}")
+    return events
+
+
+@lru_cache(maxsize=1)
+def _redis():
+    import redis
+
+    return redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=2, socket_connect_timeout=2)
+
+
+def buffer_lock_events(events):
+    """
+    Queue parsed events for the next bulk insert
+
+    Returns:
+        int: events waiting in the buffer (0 if they were written directly)
+    """
+    from main.tasks import flush_lock_events
+
+    if not events:
+        return 0
+    try:
+        waiting = _redis().rpush(BUFFER_KEY, *[json.dumps(event) for event in events])
+    except Exception as e:
+        logger.warning(f"Lock event buffer unavailable, writing {len(events)} event(s) directly: {str(e)}")
+        write_lock_events(events)
+        return 0
+
+    # Crossed the batch size with this callback: flush now instead of waiting for beat
+    if waiting >= settings.LOCK_EVENT_FLUSH_SIZE > waiting - len(events):
+        flush_lock_events.delay()
+    return waiting
+
+
+def write_lock_events(events):
+    """
+    Bulk-insert event dicts (duplicates from retried callbacks are skipped)
+
+    PIN unlocks without a keyboardPwdId get it from the lock PIN mirror.
+
+    Returns:
+        int: events written
+    """
+    from main.models import LockEvent, LockKeyboardPassword
+
+    if not events:
+        return 0
+
+    pwd_ids = {}
+    unresolved = {(e['lock_id'], e['keyboard_pwd']) for e in events if e['keyboard_pwd'] and not e['keyboard_pwd_id']}
+    if unresolved:
+        for lock_id, pin, pwd_id in LockKeyboardPassword.objects.filter(
+            lock__lock_id__in={lock_id for lock_id, _ in unresolved},
+            pin__in={pin for _, pin in unresolved},
+        ).values_list('lock__lock_id', 'pin', 'keyboard_pwd_id'):
+            pwd_ids[(lock_id, pin)] = pwd_id
+
+    rows = [
+        LockEvent(
+            lock_id=e['lock_id'],
+            record_type=e['record_type'],
+            keyboard_pwd=e['keyboard_pwd'],
+            keyboard_pwd_id=e['keyboard_pwd_id'] or pwd_ids.get((e['lock_id'], e['keyboard_pwd']), ''),
+            success=e['success'],
+            username=e['username'],
+            battery=e['battery'],
+            occurred_at=_ms_to_datetime(e['occurred_at']),
+            received_at=_ms_to_datetime(e['received_at']),
+        )
+        for e in events
+    ]
+    LockEvent.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+    return len(rows)
+
+
+def drain_lock_event_buffer(batch_size):
+    """
+    Move buffered events into LockEvent, one bulk insert per batch
+
+    A batch that fails to insert is pushed back for the next run.
+
+    Returns:
+        int: events written
+    """
+    client = _redis()
+    written = 0
+    while True:
+        pipe = client.pipeline(transaction=True)
+        pipe.lrange(BUFFER_KEY, 0, batch_size - 1)
+        pipe.ltrim(BUFFER_KEY, batch_size, -1)
+        raw, _ = pipe.execute()
+        if not raw:
+            return written
+        try:
+            written += write_lock_events([json.loads(item) for item in raw])
+        except Exception:
+            client.rpush(BUFFER_KEY, *raw)
+            raise
+        if len(raw) < batch_size:
+            return written
+
+
+def first_entries(guests):
+    """
+    When each guest first opened a door with their PIN
+
+    One query for all guests: successful PIN unlocks with the guest's PIN
+    within their stay (check-in day to the day after check-out).
+
+    Args:
+        guests: Guests with front_door_pin set
+
+    Returns:
+        dict: guest id -> first unlock datetime (guests with none are left out)
+    """
+    from main.models import LockEvent
+
+    guests = [g for g in guests if g.front_door_pin]
+    if not guests:
+        return {}
+
+    windows = {
+        g.id: (
+            timezone.make_aware(datetime.datetime.combine(g.check_in_date, datetime.time.min)),
+            timezone.make_aware(datetime.datetime.combine(g.check_out_date + datetime.timedelta(days=1), datetime.time.min)),
+        )
+        for g in guests
+    }
+    events = LockEvent.objects.filter(
+        record_type=LockEvent.KEYBOARD_PWD_UNLOCK,
+        success=True,
+        keyboard_pwd__in={g.front_door_pin for g in guests},
+        occurred_at__gte=min(start for start, _ in windows.values()),
+        occurred_at__lt=max(end for _, end in windows.values()),
+    ).order_by('occurred_at').values_list('keyboard_pwd', 'occurred_at')
+
+    times_by_pin = defaultdict(list)
+    for pin, occurred_at in events:
+        times_by_pin[pin].append(occurred_at)
+
+    entries = {}
+    for guest in guests:
+        start, end = windows[guest.id]
+        first = next((t for t in times_by_pin[guest.front_door_pin] if start <= t < end), None)
+        if first is not None:
+            entries[guest.id] = first
+    return entries
+
+
+def lock_usage(since, until=None):
+    """
+    Per-lock activity between two times
+
+    Returns:
+        list: {lock_id, events, pin_unlocks, failed, last_event_at}
+            per lock, busiest first
+    """
+    from main.models import LockEvent
+
+    events = LockEvent.objects.filter(occurred_at__gte=since)
+    if until is not None:
+        events = events.filter(occurred_at__lt=until)
+
+    return list(
+        events.values('lock_id').annotate(
+            events=Count('id'),
+            pin_unlocks=Count('id', filter=Q(success=True, record_type=LockEvent.KEYBOARD_PWD_UNLOCK)),
+            failed=Count('id', filter=Q(success=False)),
+            last_event_at=Max('occurred_at'),
+        ).order_by('-events')
+    )
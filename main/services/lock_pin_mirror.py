@@ -0,0 +1,325 @@
+"""
+Local mirror of the keyboard passwords on every TTLock (LockKeyboardPassword)
+
+sync_lock_keyboard_passwords pages /lock/listKeyboardPwd for all locks
+concurrently (one thread per lock, pages in sequence), replaces each lock's
+mirror rows, then reconciles the mirror against what the database says
+should be on the locks:
+
+- Orphan: a PIN on a lock that no current guest, PIN provisioning job or
+  pending teardown holds (e.g. a delete that failed before teardown jobs
+  existed). Flagged on the row; deleted only if LOCK_PIN_DELETE_ORPHANS is on
+- Missing: a PIN id a current guest or ready job holds that the lock doesn't
+  have (the guest's code won't open the door). Reported only
+
+A lock whose sync failed keeps its previous rows and is left out of the
+reconciliation, so a TTLock outage never shows up as missing PINs.
+"""
+
+import datetime
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.utils import timezone
+
+from main.services.pin_teardown import LIST_PAGE_SIZE, RateLimiter, delete_pin_idempotent
+
+logger = logging.getLogger('main')
+
+
+def _ms_to_datetime(ms):
+    """TTLock millisecond timestamp -> aware datetime (0/None = not set)"""
+    if not ms:
+        return None
+    return datetime.datetime.fromtimestamp(ms / 1000, tz=datetime.timezone.utc)
+
+
+def fetch_lock_passwords(ttlock_client, lock_id):
+    """
+    All keyboard passwords of one lock (pages fetched in sequence)
+
+    Returns:
+        list: TTLock keyboard password dicts
+    """
+    records = []
+    page_no = 1
+    while True:
+        response = ttlock_client.list_keyboard_passwords(lock_id, page_no=page_no, page_size=LIST_PAGE_SIZE)
+        records.extend(response.get('list', []))
+        if page_no >= response.get('pages', 1):
+            return records
+        page_no += 1
+
+
+def _fetch_or_error(ttlock_client, lock_id):
+    """(records, None) or (None, error message) - never raises, runs in a worker thread"""
+    try:
+        return fetch_lock_passwords(ttlock_client, lock_id), None
+    except Exception as e:
+        return None, str(e)
+
+
+def store_lock_passwords(lock, records, now):
+    """Replace one lock's mirror rows with the fetched records"""
+    from main.models import LockKeyboardPassword
+
+    existing = {row.keyboard_pwd_id: row for row in LockKeyboardPassword.objects.filter(lock=lock)}
+    fetched = {}
+    for record in records:
+        pwd_id = str(record.get('keyboardPwdId'))
+        row = existing.get(pwd_id) or LockKeyboardPassword(lock=lock, keyboard_pwd_id=pwd_id)
+        row.pin = str(record.get('keyboardPwd') or '')[:20]
+        row.name = (record.get('keyboardPwdName') or '')[:200]
+        row.pwd_type = record.get('keyboardPwdType')
+        row.start_date = _ms_to_datetime(record.get('startDate'))
+        row.end_date = _ms_to_datetime(record.get('endDate'))
+        row.created_on_lock = _ms_to_datetime(record.get('sendDate'))
+        row.synced_at = now
+        fetched[pwd_id] = row
+
+    fields = ['pin', 'name', 'pwd_type', 'start_date', 'end_date', 'created_on_lock', 'synced_at']
+    with transaction.atomic():
+        LockKeyboardPassword.objects.filter(lock=lock).exclude(keyboard_pwd_id__in=fetched).delete()
+        LockKeyboardPassword.objects.bulk_update([r for r in fetched.values() if r.pk], fields, batch_size=500)
+        LockKeyboardPassword.objects.bulk_create([r for r in fetched.values() if not r.pk], batch_size=500)
+        lock.pins_synced_at = now
+        lock.pins_sync_error = ''
+        lock.save(update_fields=['pins_synced_at', 'pins_sync_error'])
+
+
+def sync_keyboard_password_mirror(ttlock_client, locks, workers):
+    """
+    Refresh the mirror of the given locks
+
+    Args:
+        ttlock_client: TTLockClient
+        locks: TTLock list
+        workers: Locks fetched concurrently
+
+    Returns:
+        dict: synced (lock_ids), failed ({lock_id: error})
+    """
+    result = {'synced': [], 'failed': {}}
+    if not locks:
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(locks))) as executor:
+        fetched = list(executor.map(lambda lock: _fetch_or_error(ttlock_client, lock.lock_id), locks))
+
+    # Database writes stay on the calling thread
+    now = timezone.now()
+    for lock, (records, error) in zip(locks, fetched):
+        if error is not None:
+            lock.pins_sync_error = error[:1000]
+            lock.save(update_fields=['pins_sync_error'])
+            result['failed'][lock.lock_id] = error
+            logger.error(f"Keyboard password sync failed for lock {lock.name} ({lock.lock_id}): {error}")
+            continue
+        store_lock_passwords(lock, records, now)
+        result['synced'].append(lock.lock_id)
+    return result
+
+
+def held_keyboard_passwords():
+    """
+    Keyboard password ids the database accounts for, per lock
+
+    Returns:
+        tuple: (claimed, expected)
+            claimed: {lock_id: set of pwd ids} - everything that is not an
+                orphan (includes PINs waiting for teardown)
+            expected: {lock_id: {pwd_id: owner}} - PINs that must be on the
+                lock (current guests, ready/pending PIN jobs)
+    """
+    from main.models import Guest, PinProvisioningJob, PinTeardownJob, TTLock
+
+    claimed = defaultdict(set)
+    expected = defaultdict(dict)
+    front_door_ids = list(TTLock.objects.filter(is_front_door=True).values_list('lock_id', flat=True))
+
+    def _hold(lock_id, pwd_id, owner):
+        if lock_id is None or not pwd_id:
+            return
+        claimed[lock_id].add(str(pwd_id))
+        expected[lock_id][str(pwd_id)] = owner
+
+    for reservation_number, front_pwd_id, room_pwd_id, room_lock_id in Guest.objects.filter(
+        is_archived=False,
+    ).values_list('reservation_number', 'front_door_pin_id', 'room_pin_id', 'assigned_room__ttlock__lock_id'):
+        owner = f"guest {reservation_number}"
+        for lock_id in front_door_ids:
+            _hold(lock_id, front_pwd_id, owner)
+        _hold(room_lock_id, room_pwd_id, owner)
+
+    for job_id, front_pwd_id, room_pwd_id, room_lock_id in PinProvisioningJob.objects.filter(
+        status__in=['pending', 'ready'],
+    ).values_list('id', 'front_door_pin_id', 'room_pin_id', 'reservation__room__ttlock__lock_id'):
+        owner = f"PIN job {job_id}"
+        for lock_id in front_door_ids:
+            _hold(lock_id, front_pwd_id, owner)
+        _hold(room_lock_id, room_pwd_id, owner)
+
+    # Waiting to be deleted: not orphans, but not expected either
+    for front_lock_id, front_pwd_id, room_lock_id, room_pwd_id in PinTeardownJob.objects.exclude(
+        status='done',
+    ).values_list('front_door_lock_id', 'front_door_pin_id', 'room_lock_id', 'room_pin_id'):
+        if front_lock_id is not None and front_pwd_id:
+            claimed[front_lock_id].add(front_pwd_id)
+        if room_lock_id is not None and room_pwd_id:
+            claimed[room_lock_id].add(room_pwd_id)
+
+    return claimed, expected
+
+
+def diff_keyboard_passwords(mirrored, claimed, expected, held_pins, orphan_cutoff):
+    """
+    Compare the mirror with what the database holds (no queries)
+
+    Args:
+        mirrored: {lock_id: {pwd_id: (pin, created_on_lock)}} for the synced locks
+        claimed: {lock_id: set of pwd ids} (see held_keyboard_passwords)
+        expected: {lock_id: {pwd_id: owner}}
+        held_pins: PIN values in use (pin_utils.active_pins) - extra rooms of
+            a multi-room booking get the guest's PIN without storing its id
+        orphan_cutoff: PINs created on the lock after this aren't orphans yet
+            (the guest/job row may not be saved yet)
+
+    Returns:
+        tuple: (orphans [(lock_id, pwd_id)], missing [(lock_id, pwd_id, owner)])
+    """
+    orphans = []
+    missing = []
+    for lock_id, pins in mirrored.items():
+        held = claimed.get(lock_id, set())
+        for pwd_id, (pin, created_on_lock) in pins.items():
+            if pwd_id in held or pin in held_pins:
+                continue
+            if created_on_lock is None or created_on_lock <= orphan_cutoff:
+                orphans.append((lock_id, pwd_id))
+        for pwd_id, owner in expected.get(lock_id, {}).items():
+            if pwd_id not in pins:
+                missing.append((lock_id, pwd_id, owner))
+    return orphans, missing
+
+
+def reconcile_keyboard_passwords(lock_ids, grace_minutes, now=None):
+    """
+    Flag orphans in the mirror of the given (freshly synced) locks
+
+    Args:
+        lock_ids: TTLock.lock_id values whose mirror is current
+        grace_minutes: Minimum age of a PIN before it can be an orphan
+        now: Current time (default: timezone.now())
+
+    Returns:
+        dict: orphans (LockKeyboardPassword list), missing [(lock_id, pwd_id, owner)]
+    """
+    from main.models import LockKeyboardPassword
+    from main.pin_utils import active_pins
+
+    if now is None:
+        now = timezone.now()
+
+    rows = list(LockKeyboardPassword.objects.filter(lock__lock_id__in=lock_ids).select_related('lock'))
+    mirrored = {lock_id: {} for lock_id in lock_ids}
+    for row in rows:
+        mirrored[row.lock.lock_id][row.keyboard_pwd_id] = (row.pin, row.created_on_lock)
+
+    claimed, expected = held_keyboard_passwords()
+    orphans, missing = diff_keyboard_passwords(
+        mirrored, claimed, expected, active_pins(), now - datetime.timedelta(minutes=grace_minutes)
+    )
+
+    orphan_keys = set(orphans)
+    orphan_rows = [row for row in rows if (row.lock.lock_id, row.keyboard_pwd_id) in orphan_keys]
+    with transaction.atomic():
+        LockKeyboardPassword.objects.filter(lock__lock_id__in=lock_ids).update(is_orphan=False)
+        LockKeyboardPassword.objects.filter(id__in=[row.id for row in orphan_rows]).update(is_orphan=True)
+    for row in orphan_rows:
+        row.is_orphan = True
+
+    return {'orphans': orphan_rows, 'missing': missing}
+
+
+def delete_orphan_pins(ttlock_client, orphans, workers, min_interval):
+    """
+    Delete orphaned timed PINs from their locks
+
+    Permanent PINs (no end date) are never deleted: those are staff/cleaner
+    codes set up outside the app.
+
+    Returns:
+        int: PINs deleted (their mirror rows are removed)
+    """
+    from main.models import LockKeyboardPassword
+
+    timed = [row for row in orphans if row.end_date is not None]
+    if not timed:
+        return 0
+
+    rate_limiter = RateLimiter(min_interval)
+    with ThreadPoolExecutor(max_workers=min(workers, len(timed))) as executor:
+        results = list(executor.map(
+            lambda row: delete_pin_idempotent(ttlock_client, rate_limiter, row.lock.lock_id, row.keyboard_pwd_id),
+            timed,
+        ))
+
+    deleted_ids = []
+    for row, (deleted, error) in zip(timed, results):
+        if deleted:
+            deleted_ids.append(row.id)
+            logger.info(f"Deleted orphaned PIN {row.keyboard_pwd_id} ({row.name or 'unnamed'}) from lock {row.lock.name}")
+        else:
+            logger.error(f"Failed to delete orphaned PIN {row.keyboard_pwd_id} from lock {row.lock.name}: {error}")
+    LockKeyboardPassword.objects.filter(id__in=deleted_ids).delete()
+    return len(deleted_ids)
+
+
+def lock_pin_report():
+    """
+    Lock state for the admin screens, read from the mirror only (no TTLock calls)
+
+    Returns:
+        list: one dict per lock - name, lock_id, is_front_door, synced_at,
+            sync_error, pins [{keyboard_pwd_id, pin, name, start_date,
+            end_date, is_orphan}], missing [{keyboard_pwd_id, owner}]
+    """
+    from main.models import LockKeyboardPassword, TTLock
+
+    locks = list(TTLock.objects.order_by('-is_front_door', 'name'))
+    rows = defaultdict(list)
+    for row in LockKeyboardPassword.objects.select_related('lock'):
+        rows[row.lock.lock_id].append(row)
+
+    _, expected = held_keyboard_passwords()
+
+    report = []
+    for lock in locks:
+        mirrored = {row.keyboard_pwd_id for row in rows[lock.lock_id]}
+        report.append({
+            'name': lock.name,
+            'lock_id': lock.lock_id,
+            'is_front_door': lock.is_front_door,
+            'synced_at': lock.pins_synced_at,
+            'sync_error': lock.pins_sync_error,
+            'pins': [
+                {
+                    'keyboard_pwd_id': row.keyboard_pwd_id,
+                    'pin': row.pin,
+                    'name': row.name,
+                    'start_date': row.start_date,
+                    'end_date': row.end_date,
+                    'is_orphan': row.is_orphan,
+                }
+                for row in rows[lock.lock_id]
+            ],
+            # Only meaningful once the lock has been mirrored
+            'missing': [
+                {'keyboard_pwd_id': pwd_id, 'owner': owner}
+                for pwd_id, owner in expected.get(lock.lock_id, {}).items()
+                if pwd_id not in mirrored
+            ] if lock.pins_synced_at else [],
+        })
+    return report
@@ -0,0 +1,274 @@
+"""
+Room occupancy index (RoomOccupancy)
+
+Each room has one row per year and source (Guest stays, and confirmed
+Reservations of each platform) holding two bitsets over the days of the
+year:
+- nights: bit n set if the night starting on day n is occupied
+- arrivals: bit n set if a stay checks in on day n (platform rows only
+  count unenriched reservations)
+
+Rows are never patched: any change to a room's stays rebuilds that room's
+affected years from Guest/Reservation (main/signals.py on save/delete, the
+iCal sync after its bulk writes). A room-year with no row yet is built the
+first time it is asked for.
+
+Availability questions then cost one query for the room-years involved plus
+bit arithmetic:
+- free_room_ids: rooms with every night of [check_in, check_out) free
+- nights_occupied: occupied nights per room in a month
+- first_free_gap: first run of N free nights from a date
+- rooms_with_arrivals: rooms with an unenriched check-in on a date
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger('main')
+
+# 366 nights fit in 46 bytes
+YEAR_BYTES = 46
+
+
+def _as_date(value):
+    return date.fromisoformat(str(value)) if isinstance(value, str) else value
+
+
+def _to_int(value):
+    return int.from_bytes(bytes(value), 'little') if value else 0
+
+
+def _to_bytes(bits):
+    return bits.to_bytes(YEAR_BYTES, 'little')
+
+
+def _night_mask(start, end, year):
+    """Bits of the nights [start, end) that fall in year"""
+    year_start = date(year, 1, 1)
+    start = max(start, year_start)
+    end = min(end, date(year + 1, 1, 1))
+    if start >= end:
+        return 0
+    return ((1 << (end - start).days) - 1) << (start - year_start).days
+
+
+def _years(start, end):
+    """Years holding the nights [start, end)"""
+    if end <= start:
+        return []
+    return list(range(start.year, (end - timedelta(days=1)).year + 1))
+
+
+def _sources():
+    from main.models import Reservation, RoomOccupancy
+
+    return [RoomOccupancy.GUEST_SOURCE] + [platform for platform, _ in Reservation.PLATFORM_CHOICES]
+
+
+def rebuild_occupancy(room_id, years):
+    """
+    Recompute a room's rows for the given years from its Guests and Reservations
+
+    Args:
+        room_id: Room id
+        years: Years to rebuild
+    """
+    from main.models import Guest, Reservation, Room, RoomOccupancy
+
+    years = sorted(set(years))
+    if not years:
+        return
+    first_day = date(years[0], 1, 1)
+    last_day = date(years[-1] + 1, 1, 1)
+
+    with transaction.atomic():
+        if Room.objects.select_for_update().filter(pk=room_id).first() is None:  # Serialize rebuilds per room
+            return
+
+        stays = [
+            (RoomOccupancy.GUEST_SOURCE, check_in, check_out, True)
+            for check_in, check_out in Guest.objects.filter(
+                assigned_room_id=room_id, check_in_date__lt=last_day, check_out_date__gt=first_day,
+            ).values_list('check_in_date', 'check_out_date')
+        ]
+        stays += [
+            (platform, check_in, check_out, guest_id is None)
+            for platform, check_in, check_out, guest_id in Reservation.objects.filter(
+                room_id=room_id, status='confirmed', check_in_date__lt=last_day, check_out_date__gt=first_day,
+            ).values_list('platform', 'check_in_date', 'check_out_date', 'guest_id')
+        ]
+
+        bits = {(year, source): [0, 0] for year in years for source in _sources()}
+        for source, check_in, check_out, counts_arrival in stays:
+            for year in years:
+                entry = bits.setdefault((year, source), [0, 0])
+                entry[0] |= _night_mask(check_in, check_out, year)
+                if counts_arrival and check_in.year == year:
+                    entry[1] |= 1 << (check_in - date(year, 1, 1)).days
+
+        now = timezone.now()
+        RoomOccupancy.objects.bulk_create(
+            [
+                RoomOccupancy(
+                    room_id=room_id, year=year, source=source,
+                    nights=_to_bytes(nights), arrivals=_to_bytes(arrivals), rebuilt_at=now,
+                )
+                for (year, source), (nights, arrivals) in bits.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['room', 'year', 'source'],
+            update_fields=['nights', 'arrivals', 'rebuilt_at'],
+        )
+
+
+def refresh_occupancy(stays):
+    """
+    Rebuild the room-years touched by some stays (old and new values of a change)
+
+    Args:
+        stays: (room_id, check_in_date, check_out_date) tuples; None entries are ignored
+    """
+    years_by_room = defaultdict(set)
+    for stay in stays:
+        if stay is None or stay[0] is None:
+            continue
+        room_id, check_in, check_out = stay
+        years_by_room[room_id].update(_years(_as_date(check_in), _as_date(check_out)))
+    for room_id, years in years_by_room.items():
+        rebuild_occupancy(room_id, years)
+
+
+def _load(years, room_ids=None):
+    """
+    Occupancy of the given years, building any room-year not indexed yet
+
+    Returns:
+        dict: (room_id, year) -> {source: (nights, arrivals)} as ints
+    """
+    from main.models import Room, RoomOccupancy
+
+    if room_ids is None:
+        room_ids = list(Room.objects.values_list('id', flat=True))
+
+    def fetch():
+        occupancy = {}
+        for room_id, year, source, nights, arrivals in RoomOccupancy.objects.filter(
+            room_id__in=room_ids, year__in=years,
+        ).values_list('room_id', 'year', 'source', 'nights', 'arrivals'):
+            occupancy.setdefault((room_id, year), {})[source] = (_to_int(nights), _to_int(arrivals))
+        return occupancy
+
+    occupancy = fetch()
+    missing = defaultdict(list)
+    for room_id in room_ids:
+        for year in years:
+            if (room_id, year) not in occupancy:
+                missing[room_id].append(year)
+    if missing:
+        for room_id, room_years in missing.items():
+            rebuild_occupancy(room_id, room_years)
+        occupancy = fetch()
+    return occupancy
+
+
+def _occupied(occupancy, room_id, year):
+    """Nights of a room-year occupied by any source"""
+    nights = 0
+    for source_nights, _ in occupancy.get((room_id, year), {}).values():
+        nights |= source_nights
+    return nights
+
+
+def free_room_ids(check_in_date, check_out_date):
+    """
+    Rooms with every night of [check_in_date, check_out_date) free
+
+    Both Guests and confirmed Reservations (enriched or not) occupy a room.
+
+    Returns:
+        list: Room ids
+    """
+    from main.models import Room
+
+    check_in_date = _as_date(check_in_date)
+    check_out_date = _as_date(check_out_date)
+    room_ids = list(Room.objects.values_list('id', flat=True))
+    years = _years(check_in_date, check_out_date)
+    occupancy = _load(years, room_ids)
+    return [
+        room_id for room_id in room_ids
+        if not any(
+            _occupied(occupancy, room_id, year) & _night_mask(check_in_date, check_out_date, year)
+            for year in years
+        )
+    ]
+
+
+def nights_occupied(year, month):
+    """
+    Occupied nights per room in one month
+
+    Returns:
+        dict: room id -> number of occupied nights
+    """
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    mask = _night_mask(start, end, year)
+    occupancy = _load([year])
+    room_ids = {room_id for room_id, _ in occupancy}
+    return {room_id: bin(_occupied(occupancy, room_id, year) & mask).count('1') for room_id in room_ids}
+
+
+def first_free_gap(room_id, start_date, nights, horizon_days=365):
+    """
+    First date from start_date on which the room is free for `nights` nights
+
+    Args:
+        room_id: Room id
+        start_date: Earliest check-in
+        nights: Length of the stay
+        horizon_days: How far ahead to look
+
+    Returns:
+        date or None: None if there is no such gap within the horizon
+    """
+    start_date = _as_date(start_date)
+    end_date = start_date + timedelta(days=horizon_days + nights)
+    years = _years(start_date, end_date)
+    occupancy = _load(years, [room_id])
+
+    # One bitset from Jan 1 of the first year, then drop the nights before start_date
+    occupied = 0
+    for year in years:
+        occupied |= _occupied(occupancy, room_id, year) << (date(year, 1, 1) - date(years[0], 1, 1)).days
+    span = (end_date - start_date).days
+    free = ~(occupied >> (start_date - date(years[0], 1, 1)).days) & ((1 << span) - 1)
+
+    # Bit i of `runs` is set when nights i .. i+nights-1 are all free
+    runs = free
+    for offset in range(1, nights):
+        runs &= free >> offset
+    runs &= (1 << (horizon_days + 1)) - 1
+    if not runs:
+        return None
+    return start_date + timedelta(days=(runs & -runs).bit_length() - 1)
+
+
+def rooms_with_arrivals(check_in_date, platform):
+    """
+    Rooms with an unenriched confirmed reservation of a platform checking in on a date
+
+    Returns:
+        int: Number of rooms
+    """
+    check_in_date = _as_date(check_in_date)
+    bit = 1 << (check_in_date - date(check_in_date.year, 1, 1)).days
+    occupancy = _load([check_in_date.year])
+    return sum(
+        1 for sources in occupancy.values()
+        if sources.get(platform, (0, 0))[1] & bit
+    )
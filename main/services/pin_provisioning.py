@@ -0,0 +1,296 @@
+"""
+PIN Provisioning Service
+Creates the same TTLock PIN on the front door and room lock(s) in parallel,
+rolling back every PIN already created if any lock rejects it
+
+Also holds next-day pre-provisioning: PINs for tomorrow's arrivals are
+created the evening before (valid from check-in time) and kept on an
+unclaimed PinProvisioningJob, so Step 2 of the check-in flow only claims one
+"""
+
+import datetime
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pytz
+from django.utils import timezone
+
+logger = logging.getLogger('main')
+
+# key: caller's handle for the result (e.g. 'front_door', 'room', a room name)
+# label: used in error messages ("Failed to generate <label> PIN: ...")
+PinTarget = namedtuple('PinTarget', ['key', 'lock_id', 'name', 'label'])
+
+
+class PinProvisioningError(Exception):
+    """
+    One or more locks rejected the PIN - PINs created on the others were deleted
+
+    Attributes:
+        failures: dict of target key -> error message
+    """
+
+    def __init__(self, failures, labels):
+        self.failures = failures
+        super().__init__('; '.join(
+            f"Failed to generate {labels[key]} PIN: {error}" for key, error in failures.items()
+        ))
+
+
+def _create_pin(ttlock_client, target, pin, start_time, end_time):
+    """Create one PIN; returns (keyboardPwdId, None) or (None, error message)"""
+    try:
+        response = ttlock_client.generate_temporary_pin(
+            lock_id=str(target.lock_id),
+            pin=pin,
+            start_time=start_time,
+            end_time=end_time,
+            name=target.name,
+        )
+    except Exception as e:
+        return None, str(e)
+
+    if "keyboardPwdId" not in response:
+        return None, response.get('errmsg', 'Unknown error')
+    return response["keyboardPwdId"], None
+
+
+def _delete_pin(ttlock_client, target, keyboard_pwd_id):
+    """Best-effort rollback of one created PIN; returns True if deleted"""
+    try:
+        ttlock_client.delete_pin(lock_id=str(target.lock_id), keyboard_pwd_id=keyboard_pwd_id)
+        logger.info(f"Rolled back {target.label} PIN (Keyboard Password ID: {keyboard_pwd_id})")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to roll back {target.label} PIN (Keyboard Password ID: {keyboard_pwd_id}): {str(e)}")
+        return False
+
+
+def provision_pins(ttlock_client, pin, start_time, end_time, targets):
+    """
+    Create the same PIN on several locks concurrently (all-or-nothing)
+
+    Every lock call is independent, so the front door and N room locks take
+    about as long as the slowest single call instead of their sum.
+
+    Args:
+        ttlock_client: TTLockClient
+        pin: 4-digit PIN
+        start_time: Validity start (ms since epoch)
+        end_time: Validity end (ms since epoch)
+        targets: List of PinTarget
+
+    Returns:
+        dict: target key -> keyboardPwdId
+
+    Raises:
+        PinProvisioningError: If any lock failed (created PINs are rolled back)
+    """
+    if not targets:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        futures = {
+            target: executor.submit(_create_pin, ttlock_client, target, pin, start_time, end_time)
+            for target in targets
+        }
+        results = {target: future.result() for target, future in futures.items()}
+
+    created = {target: pwd_id for target, (pwd_id, error) in results.items() if pwd_id is not None}
+    failures = {target.key: error for target, (pwd_id, error) in results.items() if pwd_id is None}
+
+    if failures:
+        for key, error in failures.items():
+            logger.error(f"PIN generation failed for {key}: {error}")
+        if created:
+            with ThreadPoolExecutor(max_workers=len(created)) as executor:
+                for target, pwd_id in created.items():
+                    executor.submit(_delete_pin, ttlock_client, target, pwd_id)
+        raise PinProvisioningError(failures, {target.key: target.label for target in targets})
+
+    for target, pwd_id in created.items():
+        logger.info(f"Generated {target.label} PIN {pin} (Keyboard Password ID: {pwd_id})")
+
+    return {target.key: pwd_id for target, pwd_id in created.items()}
+
+
+# ---------------------------------------------------------------------------
+# Next-day pre-provisioning
+# ---------------------------------------------------------------------------
+
+def reservation_pin_window(reservation):
+    """
+    Validity window of a pre-provisioned PIN
+
+    Starts at check-in time (early_checkin_time or 2 PM) instead of "now",
+    and ends the day after check-out like the on-demand PINs.
+
+    Returns:
+        tuple: (valid_from, valid_until) aware datetimes
+    """
+    uk_timezone = pytz.timezone("Europe/London")
+    check_in_time = reservation.early_checkin_time or datetime.time(14, 0)
+    check_out_time = reservation.late_checkout_time or datetime.time(11, 0)
+    valid_from = uk_timezone.localize(datetime.datetime.combine(reservation.check_in_date, check_in_time))
+    valid_until = uk_timezone.localize(
+        datetime.datetime.combine(reservation.check_out_date, check_out_time)
+    ) + datetime.timedelta(days=1)
+    return valid_from, valid_until
+
+
+def _job_targets(job, front_door_lock, room_lock):
+    room_name = job.reservation.room.name
+    return [
+        PinTarget('front_door', front_door_lock.lock_id,
+                  f"Front Door - {room_name} - {job.guest_name} - {job.pin}", 'front door'),
+        PinTarget('room', room_lock.lock_id,
+                  f"Room - {room_name} - {job.guest_name} - {job.pin}", 'room'),
+    ]
+
+
+def preprovision_reservation_pins(ttlock_client, reservation, front_door_lock, job=None):
+    """
+    Create (or retry) the pre-provisioned PINs for one reservation
+
+    Args:
+        ttlock_client: TTLockClient
+        reservation: Reservation (room and room.ttlock loaded)
+        front_door_lock: Front door TTLock
+        job: Failed pre-provisioned job to retry (a new one is created if None)
+
+    Returns:
+        PinProvisioningJob: status 'ready' or 'failed'
+    """
+    from main.models import PinProvisioningJob
+    from main.pin_utils import generate_memorable_4digit_pin
+
+    if job is None:
+        job = PinProvisioningJob(
+            reservation=reservation,
+            is_preprovisioned=True,
+            guest_name=reservation.guest_name[:100],
+        )
+    job.reservation = reservation
+    job.valid_from, job.valid_until = reservation_pin_window(reservation)
+    job.pin = generate_memorable_4digit_pin()
+    job.attempts += 1
+
+    try:
+        pin_ids = provision_pins(
+            ttlock_client, job.pin,
+            int(job.valid_from.timestamp() * 1000), int(job.valid_until.timestamp() * 1000),
+            _job_targets(job, front_door_lock, reservation.room.ttlock),
+        )
+    except PinProvisioningError as e:
+        job.status = 'failed'
+        job.pin = ''
+        job.error = str(e)
+    else:
+        job.status = 'ready'
+        job.front_door_pin_id = str(pin_ids['front_door'])
+        job.room_pin_id = str(pin_ids['room'])
+        job.error = ''
+    job.completed_at = timezone.now()
+    job.save()
+    return job
+
+
+def release_preprovisioned_job(ttlock_client, job, front_door_lock):
+    """
+    Delete an unclaimed pre-provisioned job and the lock PINs it holds
+
+    The row is kept (and retried by the next run) if a lock PIN can't be
+    deleted, so no PIN is ever left on a lock without a record of it.
+
+    Returns:
+        bool: True if the job was released
+    """
+    room_lock = job.reservation.room.ttlock
+    pins = []
+    if job.front_door_pin_id:
+        pins.append((PinTarget('front_door', front_door_lock.lock_id, '', 'front door'), job.front_door_pin_id))
+    if job.room_pin_id and room_lock:
+        pins.append((PinTarget('room', room_lock.lock_id, '', 'room'), job.room_pin_id))
+
+    if pins:
+        with ThreadPoolExecutor(max_workers=len(pins)) as executor:
+            deleted = list(executor.map(lambda p: _delete_pin(ttlock_client, *p), pins))
+        if not all(deleted):
+            return False
+
+    job.delete()
+    logger.info(f"Released pre-provisioned PIN job {job.id} for reservation {job.reservation_id}")
+    return True
+
+
+def stale_preprovisioned_jobs(today, reservation_ids=None):
+    """
+    Unclaimed pre-provisioned jobs that must be released
+
+    A job is stale when its reservation was cancelled, checked in some other
+    way (guest linked), its arrival day passed, or its check-in/out times
+    changed since the PINs were created.
+
+    Args:
+        today: Current UK date
+        reservation_ids: Only look at these reservations (default: all)
+
+    Returns:
+        list: PinProvisioningJob (reservation, room and room lock loaded)
+    """
+    from main.models import PinProvisioningJob
+
+    jobs = PinProvisioningJob.objects.filter(
+        is_preprovisioned=True,
+        session_key='',
+    ).select_related('reservation__room__ttlock')
+    if reservation_ids is not None:
+        jobs = jobs.filter(reservation_id__in=reservation_ids)
+
+    stale = []
+    for job in jobs:
+        reservation = job.reservation
+        if (
+            reservation.status != 'confirmed'
+            or reservation.guest_id is not None
+            or reservation.check_in_date < today
+            or (job.status == 'ready' and (job.valid_from, job.valid_until) != reservation_pin_window(reservation))
+        ):
+            stale.append(job)
+    return stale
+
+
+def claim_preprovisioned_job(reservation_id, session_key, guest_name):
+    """
+    Hand a ready pre-provisioned job to a check-in session
+
+    Args:
+        reservation_id: Reservation being checked in
+        session_key: Django session key of the check-in
+        guest_name: Name entered at Step 2
+
+    Returns:
+        PinProvisioningJob or None: The claimed job (status 'ready')
+    """
+    from main.models import PinProvisioningJob
+
+    jobs = PinProvisioningJob.objects.filter(
+        reservation_id=reservation_id,
+        is_preprovisioned=True,
+        session_key='',
+        status='ready',
+    ).select_related('reservation')
+
+    for job in jobs:
+        if (job.valid_from, job.valid_until) != reservation_pin_window(job.reservation):
+            continue  # Times changed after provisioning - released by the next run
+        # Conditional UPDATE: two sessions racing for the same job can't both win
+        if PinProvisioningJob.objects.filter(id=job.id, session_key='').update(
+            session_key=session_key,
+            guest_name=guest_name[:100],
+        ):
+            job.session_key = session_key
+            job.guest_name = guest_name[:100]
+            return job
+    return None
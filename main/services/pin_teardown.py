@@ -0,0 +1,228 @@
+"""
+PIN Teardown Service
+Deletes archived guests' TTLock PINs from the PinTeardownJob queue
+
+archive_past_guests only archives guests and enqueues one job per guest (a
+database-only pass); process_pin_teardowns works the queue here:
+
+- Concurrent: PINs of a batch of jobs are deleted by a thread pool, spaced
+  by a shared rate limit so TTLock isn't hit with a burst
+- Idempotent: a PIN the lock no longer has counts as deleted, and each
+  lock's progress is saved as soon as it completes, so a rerun only repeats
+  the PINs that are still outstanding
+- Resumable: jobs are claimed with a lease; if the worker dies mid-batch
+  (restart, hard time limit) the lease expires and the next run picks the
+  jobs up again
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger('main')
+
+# listKeyboardPwd page size used when checking whether a PIN still exists
+LIST_PAGE_SIZE = 100
+
+
+class RateLimiter:
+    """Spaces calls at least min_interval seconds apart across threads"""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.min_interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+def enqueue_pin_teardown(guest, front_door_lock):
+    """
+    Record the PINs of a guest being archived (call inside the archiving transaction)
+
+    Args:
+        guest: Guest (assigned_room.ttlock loaded), PIN fields not cleared yet
+        front_door_lock: Front door TTLock or None
+
+    Returns:
+        PinTeardownJob or None: None if the guest has no PIN on any lock
+    """
+    from main.models import PinTeardownJob
+
+    room_lock = guest.assigned_room.ttlock if guest.assigned_room_id else None
+    job = PinTeardownJob(
+        guest=guest,
+        reservation_number=guest.reservation_number,
+        pin=guest.front_door_pin or '',
+    )
+    if guest.front_door_pin_id and front_door_lock:
+        job.front_door_lock_id = front_door_lock.lock_id
+        job.front_door_pin_id = str(guest.front_door_pin_id)
+    if guest.room_pin_id and room_lock:
+        job.room_lock_id = room_lock.lock_id
+        job.room_pin_id = str(guest.room_pin_id)
+
+    if not job.front_door_pin_id and not job.room_pin_id:
+        return None
+    job.save()
+    return job
+
+
+def pin_exists(ttlock_client, lock_id, keyboard_pwd_id):
+    """True if the lock still lists the keyboard password"""
+    page_no = 1
+    while True:
+        response = ttlock_client.list_keyboard_passwords(lock_id, page_no=page_no, page_size=LIST_PAGE_SIZE)
+        if any(str(p.get('keyboardPwdId')) == str(keyboard_pwd_id) for p in response.get('list', [])):
+            return True
+        if page_no >= response.get('pages', 1):
+            return False
+        page_no += 1
+
+
+def delete_pin_idempotent(ttlock_client, rate_limiter, lock_id, keyboard_pwd_id):
+    """
+    Delete one PIN, treating a PIN that is already gone as deleted
+
+    TTLock rejects deleting a PIN it no longer has (removed on the lock, or by
+    an earlier run whose result was lost), so a rejected delete is checked
+    against the lock's PIN list before counting as a failure.
+
+    Returns:
+        tuple: (deleted, error message or None)
+    """
+    from main.ttlock_utils import TTLockAPIError
+
+    rate_limiter.wait()
+    try:
+        ttlock_client.delete_pin(lock_id=lock_id, keyboard_pwd_id=keyboard_pwd_id)
+        return True, None
+    except TTLockAPIError as e:
+        delete_error = str(e)
+    except Exception as e:
+        return False, str(e)  # Network / circuit open: the PIN may still be there
+
+    rate_limiter.wait()
+    try:
+        if not pin_exists(ttlock_client, lock_id, keyboard_pwd_id):
+            logger.info(f"PIN {keyboard_pwd_id} already gone from lock {lock_id}")
+            return True, None
+    except Exception as e:
+        return False, f"{delete_error}; existence check failed: {str(e)}"
+    return False, delete_error
+
+
+def claim_pin_teardown_jobs(limit, lease_seconds, now=None):
+    """
+    Claim pending jobs whose lease is free or expired
+
+    Row locks with SKIP LOCKED let concurrent workers claim disjoint batches.
+
+    Returns:
+        list: Claimed PinTeardownJob (leased until now + lease_seconds)
+    """
+    from main.models import PinTeardownJob
+
+    if now is None:
+        now = timezone.now()
+
+    with transaction.atomic():
+        jobs = list(
+            PinTeardownJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .filter(Q(lease_until__isnull=True) | Q(lease_until__lte=now))
+            .order_by('created_at')[:limit]
+        )
+        lease_until = now + timedelta(seconds=lease_seconds)
+        PinTeardownJob.objects.filter(id__in=[job.id for job in jobs]).update(lease_until=lease_until)
+    for job in jobs:
+        job.lease_until = lease_until
+    return jobs
+
+
+def _outstanding_pins(job):
+    """(job, side, lock_id, keyboard_pwd_id) for each PIN of the job not deleted yet"""
+    pins = []
+    if job.front_door_pin_id and not job.front_door_deleted:
+        pins.append((job, 'front_door', job.front_door_lock_id, job.front_door_pin_id))
+    if job.room_pin_id and not job.room_deleted:
+        pins.append((job, 'room', job.room_lock_id, job.room_pin_id))
+    return pins
+
+
+def run_pin_teardowns(ttlock_client, jobs, workers, min_interval, max_attempts, retry_delay):
+    """
+    Delete the outstanding PINs of claimed jobs concurrently
+
+    Only the calling thread touches the database: each finished PIN is saved
+    as it completes, then every job is closed out (done, retried later, or
+    failed after max_attempts).
+
+    Args:
+        ttlock_client: TTLockClient
+        jobs: Claimed PinTeardownJob list
+        workers: Thread pool size
+        min_interval: Seconds between TTLock calls (shared across threads)
+        max_attempts: Attempts before a job is marked failed
+        retry_delay: Seconds before a job with failed PINs is retried
+
+    Returns:
+        dict: counts of done, retrying, failed
+    """
+    from main.models import PinTeardownJob
+
+    pins = [pin for job in jobs for pin in _outstanding_pins(job)]
+    errors = {job.id: [] for job in jobs}
+
+    if pins:
+        rate_limiter = RateLimiter(min_interval)
+        with ThreadPoolExecutor(max_workers=min(workers, len(pins))) as executor:
+            futures = {
+                executor.submit(delete_pin_idempotent, ttlock_client, rate_limiter, lock_id, pwd_id): (job, side, pwd_id)
+                for job, side, lock_id, pwd_id in pins
+            }
+            for future in as_completed(futures):
+                job, side, pwd_id = futures[future]
+                deleted, error = future.result()
+                if deleted:
+                    setattr(job, f'{side}_deleted', True)
+                    PinTeardownJob.objects.filter(id=job.id).update(**{f'{side}_deleted': True})
+                    logger.info(f"Deleted {side.replace('_', ' ')} PIN {pwd_id} for guest {job.reservation_number}")
+                else:
+                    errors[job.id].append(f"{side.replace('_', ' ')}: {error}")
+
+    counts = {'done': 0, 'retrying': 0, 'failed': 0}
+    now = timezone.now()
+    for job in jobs:
+        job.attempts += 1
+        if not errors[job.id]:
+            job.status = 'done'
+            job.error = ''
+            job.lease_until = None
+            job.completed_at = now
+            counts['done'] += 1
+        else:
+            job.error = '; '.join(errors[job.id])
+            if job.attempts >= max_attempts:
+                job.status = 'failed'
+                job.completed_at = now
+                counts['failed'] += 1
+                logger.error(f"🚨 Giving up deleting PINs for guest {job.reservation_number} after {job.attempts} attempts: {job.error}")
+            else:
+                job.lease_until = now + timedelta(seconds=retry_delay)  # Backs off until then
+                counts['retrying'] += 1
+                logger.warning(f"PIN teardown for guest {job.reservation_number} failed (attempt {job.attempts}/{max_attempts}): {job.error}")
+        job.save(update_fields=['attempts', 'status', 'error', 'lease_until', 'completed_at'])
+    return counts
@@ -0,0 +1,100 @@
+"""
+Cross-platform reservation overlap detection
+
+The same room sold on Booking.com and Airbnb for overlapping nights is a
+double booking. Overlaps are found with a sort-and-sweep per room instead of
+comparing every pair of reservations:
+
+- reservations are taken in (room, check-in) order
+- a min-heap holds the stays still "open" at the current check-in, keyed by
+  check-out; stays that ended on or before it are popped
+- every stay left in the heap overlaps the new one
+
+O(n log n + k) for n reservations and k overlapping pairs. The dashboard
+loads only confirmed stays that haven't ended and start within
+OVERLAP_WINDOW_DAYS, in one query, so its cost no longer grows with history.
+"""
+
+import heapq
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('main')
+
+
+def find_overlaps(reservations):
+    """
+    Cross-platform overlapping pairs (no queries)
+
+    Stays are half-open [check_in, check_out): a check-out and a check-in on
+    the same day don't overlap.
+
+    Args:
+        reservations: Reservation-like objects (room_id, platform,
+            check_in_date, check_out_date), in any order
+
+    Returns:
+        list: (earlier, later) pairs, by room then check-in of the later stay
+    """
+    ordered = sorted(reservations, key=lambda r: (r.room_id, r.check_in_date, r.check_out_date))
+    pairs = []
+    room_id = None
+    open_stays = []  # (check_out_date, seq, reservation)
+    for seq, reservation in enumerate(ordered):
+        if reservation.room_id != room_id:
+            room_id = reservation.room_id
+            open_stays = []
+        while open_stays and open_stays[0][0] <= reservation.check_in_date:
+            heapq.heappop(open_stays)
+        for _, _, other in sorted(open_stays, key=lambda item: item[1]):
+            if other.platform != reservation.platform:
+                pairs.append((other, reservation))
+        heapq.heappush(open_stays, (reservation.check_out_date, seq, reservation))
+    return pairs
+
+
+def upcoming_overlaps(room_ids=None, today=None, window_days=None):
+    """
+    Cross-platform overlaps among confirmed stays that haven't ended yet
+
+    One query: confirmed reservations checking out after today and checking
+    in within window_days (default settings.OVERLAP_WINDOW_DAYS).
+
+    Args:
+        room_ids: Limit to these rooms (None for all)
+        today: Reference date (defaults to today)
+        window_days: Days ahead to look at
+
+    Returns:
+        list: (earlier, later) Reservation pairs, room loaded
+    """
+    from main.models import Reservation
+
+    today = today or timezone.localdate()
+    window_days = settings.OVERLAP_WINDOW_DAYS if window_days is None else window_days
+    reservations = Reservation.objects.filter(
+        status='confirmed',
+        check_out_date__gt=today,
+        check_in_date__lt=today + timedelta(days=window_days),
+    )
+    if room_ids is not None:
+        reservations = reservations.filter(room_id__in=room_ids)
+    return find_overlaps(reservations.select_related('room').order_by('room_id', 'check_in_date'))
+
+
+def overlap_warning(first, second):
+    """Dashboard warning dict for one overlapping pair"""
+    from main.models import Reservation
+
+    platforms = dict(Reservation.PLATFORM_CHOICES)
+    return {
+        'room': first.room.name,
+        'platform1': platforms.get(first.platform),
+        'platform2': platforms.get(second.platform),
+        'dates': f"{max(first.check_in_date, second.check_in_date)} to {min(first.check_out_date, second.check_out_date)}",
+        'res1_guest': first.guest_name,
+        'res2_guest': second.guest_name,
+    }
@@ -9,11 +9,10 @@ from django.utils import timezone
 from django.conf import settings
 from twilio.rest import Client
 
-from main.models import Reservation, Room, EnrichmentLog
+from main.models import Reservation, Room, EnrichmentLog, BookingEmail
 from main.enrichment_config import (
     ROOM_NUMBER_TO_NAME,
     EMAIL_SEARCH_LOOKBACK_DAYS,
-    EMAIL_SEARCH_MAX_RESULTS
 )
 
 logger = logging.getLogger('main')
@@ -33,31 +32,28 @@ def mark_email_as_read_by_booking_ref(booking_ref):
     """
     try:
         from main.services.gmail_client import GmailClient
-        from main.services.email_parser import parse_booking_com_email_subject
+        from main.services.booking_email_index import sync_booking_email_index, mark_booking_email_read
 
         gmail = GmailClient()
 
-        # Search recent emails (same generous window as enrichment)
-        emails = gmail.get_recent_booking_emails(
-            max_results=EMAIL_SEARCH_MAX_RESULTS,
-            lookback_days=EMAIL_SEARCH_LOOKBACK_DAYS
-        )
-
-        # Find the email with this booking ref
-        for email_data in emails:
-            subject = email_data['subject']
-            parsed = parse_booking_com_email_subject(subject)
-
-            if not parsed:
-                continue
-
-            email_type, email_booking_ref, check_in_date = parsed
-
-            if email_booking_ref == booking_ref:
-                # Found it! Mark as read
-                gmail.mark_as_read(email_data['id'])
-                logger.info(f"✅ Marked email as read for booking ref {booking_ref}")
-                return True
+        # Look up the indexed email (same generous window as enrichment)
+        cutoff = timezone.now() - timedelta(days=EMAIL_SEARCH_LOOKBACK_DAYS)
+        candidates = BookingEmail.objects.filter(
+            booking_reference=booking_ref,
+            received_at__gte=cutoff
+        ).order_by('-is_unread', '-received_at')
+
+        booking_email = candidates.first()
+        if booking_email is None:
+            # Email may have arrived since the last index sync
+            sync_booking_email_index(gmail)
+            booking_email = candidates.first()
+
+        if booking_email is not None:
+            # Found it! Mark as read
+            mark_booking_email_read(gmail, booking_email.message_id)
+            logger.info(f"✅ Marked email as read for booking ref {booking_ref}")
+            return True
 
         logger.warning(f"⚠️ Email not found in recent emails for booking ref {booking_ref}")
         return False
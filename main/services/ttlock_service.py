@@ -4,7 +4,9 @@ Handles authentication, token refresh, and provides valid tokens for TTLock API
 """
 
 import logging
+import threading
 from datetime import timedelta
+from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 from ttlockwrapper import TTLock as TTLockIOClient
@@ -12,6 +14,64 @@ from main.models import TTLockToken
 
 logger = logging.getLogger('main')
 
+# Refresh tokens that expire within this margin
+TOKEN_REFRESH_MARGIN = timedelta(hours=1)
+
+# Process-wide access token cache: lock operations make no DB query for auth
+# while the cached token is valid. The lock makes refresh single-flight within
+# the process; the TTLockToken row lock (refresh_token) does so across workers.
+_token_cache = {'access_token': None, 'expires_at': None}
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def get_token_cache_stats():
+    """
+    Counters for the per-process TTLock token cache
+
+    Returns:
+        dict: hits, misses, invalidations since the process started
+    """
+    with _token_cache_lock:
+        return dict(_token_cache_stats)
+
+
+def reset_token_cache():
+    """Drop the cached token (next get_access_token() reads the database)"""
+    with _token_cache_lock:
+        _token_cache.update(access_token=None, expires_at=None)
+
+
+def get_access_token(stale_access_token=None):
+    """
+    Valid TTLock access token, from the process cache when possible
+
+    Args:
+        stale_access_token: Token TTLock just rejected (errcode 10003). It is
+            dropped from the cache and refreshed unless another worker
+            already replaced it.
+
+    Returns:
+        str: Access token
+
+    Raises:
+        ValueError: No token stored (run ttlock_get_token)
+    """
+    with _token_cache_lock:
+        if stale_access_token and _token_cache['access_token'] == stale_access_token:
+            _token_cache.update(access_token=None, expires_at=None)
+            _token_cache_stats['invalidations'] += 1
+
+        if _token_cache['access_token'] and _token_cache['expires_at'] > timezone.now() + TOKEN_REFRESH_MARGIN:
+            _token_cache_stats['hits'] += 1
+            return _token_cache['access_token']
+
+        # Miss: other callers in this process wait here instead of refreshing too
+        _token_cache_stats['misses'] += 1
+        token = TTLockService().load_valid_token(stale_access_token)
+        _token_cache.update(access_token=token.access_token, expires_at=token.expires_at)
+        return token.access_token
+
 
 class TTLockService:
     """Service for managing TTLock API tokens and operations"""
@@ -60,6 +120,7 @@ class TTLockService:
                 expires_at=expires_at
             )
             
+            reset_token_cache()
             logger.info(f"Successfully authenticated and stored token (expires: {expires_at})")
             return token
             
@@ -67,72 +128,95 @@ class TTLockService:
             logger.error(f"Authentication failed: {str(e)}")
             raise
 
-    def refresh_token(self) -> TTLockToken:
+    def refresh_token(self, seen_access_token=None) -> TTLockToken:
         """
         Refresh the access token using the refresh token
         Returns updated token from database
+
+        The token row is locked for the refresh, so concurrent workers queue
+        behind one refresh. Pass the access token the caller saw as expiring
+        or rejected: if the row no longer holds it, another worker already
+        refreshed and the row is returned as is.
         """
         try:
-            # Get current token
-            token = TTLockToken.get_latest()
-            
-            if not token:
-                raise ValueError("No token found in database. Please authenticate first.")
-            
-            if not token.refresh_token:
-                raise ValueError("No refresh token available. Please re-authenticate.")
-            
-            logger.info("Refreshing TTLock access token...")
-            
-            # Initialize client
-            client = TTLockIOClient(self.client_id, self.client_secret)
-            
-            # Refresh token
-            response = client.refresh_token(token.refresh_token)
-            
-            if not response or 'access_token' not in response:
-                raise ValueError("Token refresh failed: No access token in response")
-            
-            # Update token data
-            token.access_token = response['access_token']
-            token.refresh_token = response.get('refresh_token', token.refresh_token)
-            
-            # Update expiry
-            expires_in_seconds = response.get('expires_in', 7776000)
-            token.expires_at = timezone.now() + timedelta(seconds=expires_in_seconds)
-            
-            token.save()
-            
-            logger.info(f"Token refreshed successfully (new expiry: {token.expires_at})")
-            return token
-            
+            with transaction.atomic():
+                return self._refresh_locked_token(seen_access_token)
         except Exception as e:
             logger.error(f"Token refresh failed: {str(e)}")
             raise
 
+    def _refresh_locked_token(self, seen_access_token):
+        """Refresh the latest token under a row lock (caller holds a transaction)"""
+        token = TTLockToken.objects.select_for_update().order_by('-created_at').first()
+
+        if not token:
+            raise ValueError("No token found in database. Please authenticate first.")
+
+        if seen_access_token and token.access_token != seen_access_token:
+            logger.info("TTLock token already refreshed by another worker")
+            return token
+
+        if not token.refresh_token:
+            raise ValueError("No refresh token available. Please re-authenticate.")
+
+        logger.info("Refreshing TTLock access token...")
+
+        # Initialize client
+        client = TTLockIOClient(self.client_id, self.client_secret)
+
+        # Refresh token
+        response = client.refresh_token(token.refresh_token)
+
+        if not response or 'access_token' not in response:
+            raise ValueError("Token refresh failed: No access token in response")
+
+        # Update token data
+        token.access_token = response['access_token']
+        token.refresh_token = response.get('refresh_token', token.refresh_token)
+
+        # Update expiry
+        expires_in_seconds = response.get('expires_in', 7776000)
+        token.expires_at = timezone.now() + timedelta(seconds=expires_in_seconds)
+
+        token.save()
+
+        logger.info(f"Token refreshed successfully (new expiry: {token.expires_at})")
+        return token
+
+    def load_valid_token(self, stale_access_token=None) -> TTLockToken:
+        """
+        Latest token from the database, refreshed if expiring or rejected
+
+        Args:
+            stale_access_token: Token TTLock rejected (errcode 10003)
+
+        Returns:
+            TTLockToken
+        """
+        token = TTLockToken.get_latest()
+
+        if not token:
+            raise ValueError(
+                "No token found in database. Please run: "
+                "python manage.py ttlock_get_token --username YOUR_USERNAME --password YOUR_PASSWORD"
+            )
+
+        if token.expires_at <= timezone.now() + TOKEN_REFRESH_MARGIN:
+            logger.info("Token expired or expiring soon, refreshing...")
+            token = self.refresh_token(seen_access_token=token.access_token)
+        elif stale_access_token and token.access_token == stale_access_token:
+            logger.info("Token rejected by TTLock (errcode 10003), refreshing...")
+            token = self.refresh_token(seen_access_token=token.access_token)
+
+        return token
+
     def get_valid_token(self) -> str:
         """
         Get a valid access token, automatically refreshing if expired
-        Returns the access token string
+        Returns the access token string (served from the process-wide cache)
         """
         try:
-            token = TTLockToken.get_latest()
-            
-            if not token:
-                raise ValueError(
-                    "No token found in database. Please run: "
-                    "python manage.py ttlock_get_token --username YOUR_USERNAME --password YOUR_PASSWORD"
-                )
-            
-            # Check if token is expired or expires soon (within 1 hour)
-            buffer_time = timezone.now() + timedelta(hours=1)
-            
-            if token.expires_at <= buffer_time:
-                logger.info("Token expired or expiring soon, refreshing...")
-                token = self.refresh_token()
-            
-            return token.access_token
-            
+            return get_access_token()
         except Exception as e:
             logger.error(f"Failed to get valid token: {str(e)}")
             raise
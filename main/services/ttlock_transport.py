@@ -0,0 +1,274 @@
+"""
+Shared HTTP transport for the TTLock cloud API
+
+Every TTLockClient goes through one per-process transport:
+
+- Pooled keep-alive requests.Session (no TLS handshake per lock call)
+- Connect/read timeouts and an overall deadline per call, so a hung TTLock
+  request can't pin a gunicorn worker past its timeout
+- Exponential backoff with jitter for connection errors, 5xx responses and
+  retryable TTLock errcodes (gateway busy)
+- Circuit breaker: after TTLOCK_CIRCUIT_FAILURE_THRESHOLD consecutive
+  transport failures, calls fail fast with TTLockUnavailable for
+  TTLOCK_CIRCUIT_RESET_SECONDS, then one trial call is let through
+- Per-endpoint latency/error counters (get_transport_stats)
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+logger = logging.getLogger('main')
+
+# HTTP statuses worth retrying (the lock cloud or its load balancer hiccuped)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# TTLock errcodes worth retrying: -3003 = gateway busy, try again later
+RETRYABLE_ERRCODES = {-3003}
+
+
+class TTLockUnavailable(Exception):
+    """The circuit breaker is open - the TTLock cloud is failing, not called"""
+
+
+class _CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)"""
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        """Raise TTLockUnavailable unless a call may go out now"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True  # Exactly one trial call
+                return
+            retry_in = max(0, self.reset_seconds - (time.monotonic() - self.opened_at))
+            raise TTLockUnavailable(f"TTLock API unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("TTLock circuit breaker closed (API reachable again)")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error(f"🚨 TTLock circuit breaker opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()  # (Re)start the cool-down
+
+
+class TTLockTransport:
+    """Pooled, timeout-bounded HTTP transport with retry and circuit breaker"""
+
+    def __init__(self):
+        self.connect_timeout = settings.TTLOCK_CONNECT_TIMEOUT
+        self.read_timeout = settings.TTLOCK_READ_TIMEOUT
+        self.deadline = settings.TTLOCK_REQUEST_DEADLINE
+        self.max_retries = settings.TTLOCK_MAX_RETRIES
+        self.backoff_base = settings.TTLOCK_BACKOFF_BASE
+        self.breaker = _CircuitBreaker(
+            settings.TTLOCK_CIRCUIT_FAILURE_THRESHOLD,
+            settings.TTLOCK_CIRCUIT_RESET_SECONDS,
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=settings.TTLOCK_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _record(self, endpoint, elapsed, error=False, retried=False):
+        with self._stats_lock:
+            stats = self._stats.setdefault(endpoint, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            })
+            if retried:
+                stats['retries'] += 1
+                return
+            elapsed_ms = elapsed * 1000
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+    def stats(self):
+        with self._stats_lock:
+            endpoints = {
+                endpoint: {
+                    'calls': s['calls'],
+                    'errors': s['errors'],
+                    'retries': s['retries'],
+                    'avg_ms': round(s['total_ms'] / s['calls'], 1) if s['calls'] else 0.0,
+                    'max_ms': round(s['max_ms'], 1),
+                }
+                for endpoint, s in self._stats.items()
+            }
+        return {'circuit': self.breaker.state, 'endpoints': endpoints}
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff: random(0, base * 2^attempt)"""
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    def request(self, method, url, endpoint, retry_unsent_only=False, **kwargs):
+        """
+        Send one TTLock API request
+
+        Args:
+            method: 'GET' or 'POST'
+            url: Full URL
+            endpoint: Path used as the metrics key (e.g. '/lock/unlock')
+            retry_unsent_only: Only retry failures where the request never
+                reached TTLock (connect errors) - for non-idempotent calls
+                such as /keyboardPwd/add
+            **kwargs: Passed to requests (params, data, headers)
+
+        Returns:
+            dict: Decoded JSON body (errcode is left for the caller to handle,
+                except retryable ones which are retried here)
+
+        Raises:
+            TTLockUnavailable: Circuit open
+            requests.RequestException: Network error / HTTP error after retries
+        """
+        self.breaker.before_call()
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_started = time.monotonic()
+            result = None
+            try:
+                response = self.session.request(
+                    method, url, timeout=(self.connect_timeout, self.read_timeout), **kwargs
+                )
+                response.raise_for_status()
+                result = response.json()
+            except requests.HTTPError as e:
+                error = e
+                transport_failure = e.response.status_code >= 500
+                retryable = e.response.status_code in RETRYABLE_STATUS_CODES and not retry_unsent_only
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                transport_failure = True
+                retryable = not retry_unsent_only or _request_unsent(e)
+            except ValueError as e:  # Not JSON (proxy error page etc.)
+                error = e
+                transport_failure = True
+                retryable = not retry_unsent_only
+            else:
+                errcode = result.get('errcode') if isinstance(result, dict) else None
+                error = f"errcode {errcode}: {result.get('errmsg', 'Unknown error')}" if errcode in RETRYABLE_ERRCODES else None
+                transport_failure = False
+                retryable = error is not None
+
+            elapsed = time.monotonic() - started
+            if error is None:
+                self.breaker.record_success()
+                self._record(endpoint, elapsed)
+                return result
+
+            if transport_failure:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # The cloud answered - it's up
+
+            # Only retry if the next attempt fits in the deadline even at full timeouts
+            delay = self._backoff(attempt)
+            if (
+                retryable
+                and attempt < self.max_retries
+                and elapsed + delay + self.connect_timeout + self.read_timeout <= self.deadline
+            ):
+                logger.warning(
+                    f"TTLock {endpoint} attempt {attempt + 1} failed after "
+                    f"{(time.monotonic() - attempt_started) * 1000:.0f}ms ({error}), retrying in {delay:.2f}s"
+                )
+                self._record(endpoint, 0, retried=True)
+                time.sleep(delay)
+                attempt += 1
+                try:
+                    self.breaker.before_call()
+                except TTLockUnavailable:
+                    self._record(endpoint, time.monotonic() - started, error=True)
+                    raise
+                continue
+
+            self._record(endpoint, elapsed, error=True)
+            if result is None:
+                raise error
+            # Retryable errcode that never cleared - the caller handles the errcode
+            return result
+
+
+def _request_unsent(error):
+    """True if the request provably never reached TTLock (safe to retry even a PIN add)"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+# One transport per process (keyed by PID: a forked worker must not share sockets)
+_transport = {'pid': None, 'transport': None}
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """The per-process TTLockTransport"""
+    with _transport_lock:
+        if _transport['pid'] != os.getpid():
+            _transport.update(pid=os.getpid(), transport=TTLockTransport())
+        return _transport['transport']
+
+
+def get_transport_stats():
+    """
+    Circuit state and per-endpoint latency counters for this process
+
+    Returns:
+        dict: circuit ('closed'/'open'/'half-open') and endpoints
+            {endpoint: {calls, errors, retries, avg_ms, max_ms}}
+    """
+    return get_transport().stats()
+
+
+def reset_transport():
+    """Drop the transport (next call builds a fresh session, stats and breaker)"""
+    with _transport_lock:
+        _transport.update(pid=None, transport=None)
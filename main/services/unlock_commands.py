@@ -0,0 +1,131 @@
+"""
+Remote unlock command queue (UnlockCommand)
+
+The guest room page no longer calls TTLock inside the request:
+
+1. enqueue_unlock() records a command and dispatches execute_unlock_command
+   to the dedicated 'unlock' queue; the view answers straight away with the
+   command id
+2. The worker claims the command (queued -> running) and sends /lock/unlock
+3. The page polls unlock_status until the command succeeded or failed
+
+Per-guest dedup: while a guest's command for a lock is queued/running, or
+succeeded in the last UNLOCK_DEDUP_SECONDS, another tap by that guest gets
+that same command. Other guests sharing the lock (the front door) always get
+their own. The lock row is locked while checking so two simultaneous taps
+can't both create one. Commands older than UNLOCK_COMMAND_EXPIRY_SECONDS are never executed -
+a door must not open minutes after the guest walked away.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger('main')
+
+
+def enqueue_unlock(lock, guest, door_type):
+    """
+    Queue an unlock of a lock, or return this guest's recent command for it
+
+    Args:
+        lock: TTLock to open
+        guest: Guest asking (None for staff)
+        door_type: 'front' or 'room'
+
+    Returns:
+        tuple: (UnlockCommand, created)
+    """
+    from main.models import TTLock, UnlockCommand
+    from main.tasks import execute_unlock_command
+
+    now = timezone.now()
+    dedup_since = now - timedelta(seconds=settings.UNLOCK_DEDUP_SECONDS)
+
+    with transaction.atomic():
+        TTLock.objects.select_for_update().filter(pk=lock.pk).first()  # Serialize taps per lock
+        recent = UnlockCommand.objects.filter(
+            lock=lock,
+            guest=guest,
+            created_at__gte=now - timedelta(seconds=settings.UNLOCK_COMMAND_EXPIRY_SECONDS),
+        ).filter(
+            Q(status__in=['queued', 'running']) | Q(status='succeeded', completed_at__gte=dedup_since)
+        ).order_by('-created_at').first()
+        if recent is not None:
+            return recent, False
+
+        command = UnlockCommand.objects.create(lock=lock, guest=guest, door_type=door_type)
+        transaction.on_commit(lambda: execute_unlock_command.apply_async(
+            args=[command.id],
+            expires=settings.UNLOCK_COMMAND_EXPIRY_SECONDS,
+        ))
+    return command, True
+
+
+def run_unlock_command(ttlock_client, command_id):
+    """
+    Execute one queued command (at most once, even if the task is redelivered)
+
+    Returns:
+        str: final status ('succeeded', 'failed') or why it was skipped
+    """
+    from main.models import UnlockCommand
+
+    now = timezone.now()
+    claimed = UnlockCommand.objects.filter(
+        id=command_id,
+        status='queued',
+        created_at__gte=now - timedelta(seconds=settings.UNLOCK_COMMAND_EXPIRY_SECONDS),
+    ).update(status='running', started_at=now)
+    if not claimed:
+        # Already run, or too old: fail a stale one so the page stops waiting
+        UnlockCommand.objects.filter(id=command_id, status='queued').update(
+            status='failed', error='Expired before it could be sent', completed_at=now,
+        )
+        return 'skipped'
+
+    command = UnlockCommand.objects.select_related('lock', 'guest').get(id=command_id)
+    guest_ref = command.guest.reservation_number if command.guest else 'staff'
+    try:
+        response = ttlock_client.unlock_lock(lock_id=str(command.lock.lock_id))
+        if "errcode" in response and response["errcode"] != 0:
+            raise Exception(response.get('errmsg', 'Unknown error'))
+    except Exception as e:
+        command.status = 'failed'
+        command.error = str(e)
+        logger.error(f"Failed to unlock {command.door_type} door for guest {guest_ref}: {str(e)}")
+    else:
+        command.status = 'succeeded'
+        logger.info(f"Successfully unlocked {command.door_type} door for guest {guest_ref} (command {command.id})")
+    command.completed_at = timezone.now()
+    command.save(update_fields=['status', 'error', 'completed_at'])
+    return command.status
+
+
+def unlock_status_payload(command):
+    """JSON body for the room page's status poll"""
+    door = 'front door' if command.door_type == 'front' else 'room door'
+    status = command.status
+    # Started by the expiry at the latest and bounded by the TTLock deadline:
+    # still pending after both means no worker took it (or the worker died)
+    gave_up_at = command.created_at + timedelta(
+        seconds=settings.UNLOCK_COMMAND_EXPIRY_SECONDS + settings.TTLOCK_REQUEST_DEADLINE
+    )
+    if status in ('queued', 'running') and timezone.now() > gave_up_at:
+        status = 'failed'
+    payload = {
+        'command_id': command.id,
+        'status': status,
+        'done': status in ('succeeded', 'failed'),
+    }
+    if status == 'succeeded':
+        payload['success'] = f"The {door} has been unlocked for you."
+    elif status == 'failed':
+        payload['error'] = f"Failed to unlock the {door}. Please try again or contact support."
+    else:
+        payload['retry_after_ms'] = 750
+    return payload
@@ -4,9 +4,12 @@ Handles automatic actions when model state changes
 """
 
 import logging
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.db import transaction
 from django.dispatch import receiver
-from main.models import Reservation
+from main.models import Guest, Reservation, Room, PinProvisioningJob
+from main.services.occupancy import refresh_occupancy
+from main.services.dashboard_snapshot import refresh_dashboard_snapshots
 
 logger = logging.getLogger('main')
 
@@ -21,10 +24,13 @@ def track_reservation_status_change(sender, instance, **kwargs):
         try:
             old_instance = Reservation.objects.get(pk=instance.pk)
             instance._old_status = old_instance.status
+            instance._old_occupancy = _reservation_occupancy(old_instance)
         except Reservation.DoesNotExist:
             instance._old_status = None
+            instance._old_occupancy = None
     else:
         instance._old_status = None
+        instance._old_occupancy = None
 
 
 @receiver(post_save, sender=Reservation)
@@ -56,3 +62,84 @@ def handle_reservation_status_change(sender, instance, created, **kwargs):
         else:
             # Unenriched reservation cancelled - no action needed
             logger.info(f"Reservation {instance.id} cancelled (unenriched, no guest linked)")
+
+        # Unclaimed pre-provisioned PINs (next-day arrivals) must come off the locks
+        if PinProvisioningJob.objects.filter(reservation=instance, is_preprovisioned=True, session_key='').exists():
+            from main.tasks import release_preprovisioned_pins
+            transaction.on_commit(lambda: release_preprovisioned_pins.delay([instance.id]))
+
+
+# Occupancy index (main/services/occupancy.py) and dashboard snapshots
+# (main/services/dashboard_snapshot.py): rebuild what a stay left and
+# entered whenever a Guest or Reservation changes it
+
+GUEST_STAY_FIELDS = {'assigned_room', 'assigned_room_id', 'check_in_date', 'check_out_date', 'is_archived'}
+
+
+def _reservation_occupancy(reservation):
+    """What a reservation contributes to the occupancy index and dashboard counts"""
+    return (
+        reservation.room_id, str(reservation.check_in_date), str(reservation.check_out_date),
+        reservation.status, reservation.platform, reservation.guest_id,
+    )
+
+
+def _stay(occupancy):
+    return occupancy[:3] if occupancy else None
+
+
+def _dates(stay):
+    return stay[1:3] if stay else None
+
+
+@receiver(post_save, sender=Reservation)
+def update_occupancy_for_reservation(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_occupancy', None)
+    new = _reservation_occupancy(instance)
+    if created or old != new:
+        refresh_occupancy([_stay(old), _stay(new)])
+        refresh_dashboard_snapshots([_dates(old), _dates(new)])
+
+
+@receiver(pre_save, sender=Guest)
+def track_guest_stay(sender, instance, update_fields=None, **kwargs):
+    """Remember the stay before save (skipped when the save can't change it)"""
+    instance._old_stay = None
+    instance._stay_may_change = update_fields is None or bool(GUEST_STAY_FIELDS & set(update_fields))
+    if instance.pk and instance._stay_may_change:
+        old = Guest.objects.filter(pk=instance.pk).values_list(
+            'assigned_room_id', 'check_in_date', 'check_out_date', 'is_archived',
+        ).first()
+        instance._old_stay = (old[0], str(old[1]), str(old[2]), old[3]) if old else None
+
+
+@receiver(post_save, sender=Guest)
+def update_occupancy_for_guest(sender, instance, created, **kwargs):
+    if not getattr(instance, '_stay_may_change', True):
+        return
+    old = getattr(instance, '_old_stay', None)
+    new = (instance.assigned_room_id, str(instance.check_in_date), str(instance.check_out_date), instance.is_archived)
+    if created or old is None or old[:3] != new[:3]:
+        refresh_occupancy([old[:3] if old else None, new[:3]])
+    if created or old != new:
+        refresh_dashboard_snapshots([_dates(old), _dates(new)])
+
+
+@receiver(post_delete, sender=Guest)
+@receiver(post_delete, sender=Reservation)
+def update_occupancy_after_delete(sender, instance, **kwargs):
+    room_id = instance.assigned_room_id if sender is Guest else instance.room_id
+    stay = (room_id, instance.check_in_date, instance.check_out_date)
+
+    # After commit: when the room itself is being deleted there is nothing left to rebuild
+    def refresh():
+        refresh_occupancy([stay])
+        refresh_dashboard_snapshots([_dates(stay)])
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def update_dashboard_room_count(sender, instance, created=True, **kwargs):
+    if created:
+        transaction.on_commit(refresh_dashboard_snapshots)
@@ -2,8 +2,10 @@
 Celery tasks for PickARooms iCal integration
 """
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -11,10 +13,12 @@ logger = logging.getLogger(__name__)
 @shared_task(bind=True, max_retries=0)
 def poll_all_ical_feeds(self):
     """
-    Main scheduled task - runs every 15 minutes (reduced from 10 min)
+    Main scheduled task - runs every 5 minutes (ICAL_POLL_MIN_INTERVAL)
     Fetches all RoomICalConfig and syncs active platforms (Booking.com and/or Airbnb)
+    whose adaptive next poll time has passed (see ical_service.plan_next_poll)
     """
     from main.models import RoomICalConfig
+    from main.services.ical_service import is_feed_due
 
     logger.info("Starting iCal feed polling...")
 
@@ -24,16 +28,20 @@ def poll_all_ical_feeds(self):
         logger.info("No iCal configurations found")
         return "No configurations"
 
+    if settings.ICAL_CONCURRENT_FETCH:
+        return _poll_all_ical_feeds_concurrently(all_configs)
+
+    now = timezone.now()
     synced_count = 0
     for config in all_configs:
-        # Sync Booking.com if active
-        if config.booking_active and config.booking_ical_url:
+        # Sync Booking.com if active (and due per the adaptive schedule)
+        if config.booking_active and config.booking_ical_url and is_feed_due(config, 'booking', now):
             logger.info(f"Triggering Booking.com sync for room: {config.room.name}")
             sync_room_ical_feed.delay(config.id, platform='booking')
             synced_count += 1
 
-        # Sync Airbnb if active
-        if config.airbnb_active and config.airbnb_ical_url:
+        # Sync Airbnb if active (and due per the adaptive schedule)
+        if config.airbnb_active and config.airbnb_ical_url and is_feed_due(config, 'airbnb', now):
             logger.info(f"Triggering Airbnb sync for room: {config.room.name}")
             sync_room_ical_feed.delay(config.id, platform='airbnb')
             synced_count += 1
@@ -42,6 +50,85 @@ def poll_all_ical_feeds(self):
     return f"Triggered {synced_count} platform sync(s)"
 
 
+def _poll_all_ical_feeds_concurrently(all_configs):
+    """
+    Fetch every active feed in parallel inside this worker, then sync each one
+
+    HTTP is the slow part, so it fans out over a bounded thread pool with one
+    keep-alive session per host; the DB sync then runs sequentially in this
+    thread. No per-feed Celery tasks are enqueued.
+
+    The whole run must finish inside the task time limit, so once
+    ICAL_POLL_TIME_BUDGET seconds have passed, fetches not yet started and
+    syncs not yet run are deferred: their next poll time is untouched, so
+    they are still due on the next tick, and the most overdue feeds go first.
+    """
+    from main.services.ical_service import fetch_feeds_concurrently, is_feed_due, sync_reservations_for_room
+
+    deadline = time.monotonic() + settings.ICAL_POLL_TIME_BUDGET
+    now = timezone.now()
+    jobs = []
+    for config in all_configs:
+        if config.booking_active and config.booking_ical_url and is_feed_due(config, 'booking', now):
+            jobs.append({
+                'key': (config.id, 'booking'),
+                'url': config.booking_ical_url,
+                'etag': config.booking_etag,
+                'last_modified': config.booking_last_modified,
+                'due_at': config.booking_next_poll_at,
+            })
+        if config.airbnb_active and config.airbnb_ical_url and is_feed_due(config, 'airbnb', now):
+            jobs.append({
+                'key': (config.id, 'airbnb'),
+                'url': config.airbnb_ical_url,
+                'etag': config.airbnb_etag,
+                'last_modified': config.airbnb_last_modified,
+                'due_at': config.airbnb_next_poll_at,
+            })
+    # Never-polled feeds first, then the most overdue
+    jobs.sort(key=lambda job: (job['due_at'] is not None, job['due_at'] or now))
+
+    logger.info(f"Fetching {len(jobs)} iCal feed(s) concurrently")
+    fetched = fetch_feeds_concurrently(
+        jobs,
+        max_workers=settings.ICAL_FETCH_MAX_WORKERS,
+        per_host_limit=settings.ICAL_FETCH_PER_HOST_LIMIT,
+        deadline=deadline,
+    )
+
+    synced_count = 0
+    unchanged_count = 0
+    failed_count = 0
+    deferred_count = 0
+    for job in jobs:
+        # Not fetched before the deadline, or no time left to sync it
+        if job['key'] not in fetched or time.monotonic() >= deadline:
+            deferred_count += 1
+            continue
+        config_id, platform = job['key']
+        result = sync_reservations_for_room(config_id, platform=platform, prefetched=fetched[job['key']])
+        if not result['success']:
+            failed_count += 1
+            logger.error(f"Sync failed for config {config_id} ({platform}): {result['errors']}")
+        elif result.get('unchanged'):
+            unchanged_count += 1
+        else:
+            synced_count += 1
+
+    if deferred_count:
+        logger.warning(
+            f"iCal poll time budget ({settings.ICAL_POLL_TIME_BUDGET}s) used up, "
+            f"deferred {deferred_count} feed(s) to the next run"
+        )
+
+    summary = (
+        f"Synced {synced_count}, unchanged {unchanged_count}, failed {failed_count}, "
+        f"deferred {deferred_count} platform feed(s)"
+    )
+    logger.info(summary)
+    return summary
+
+
 @shared_task(bind=True, max_retries=2, default_retry_delay=60)
 def sync_room_ical_feed(self, config_id, platform='booking'):
     """
@@ -58,7 +145,10 @@ def sync_room_ical_feed(self, config_id, platform='booking'):
 
     result = sync_reservations_for_room(config_id, platform=platform)
 
-    if result['success']:
+    if result['success'] and result.get('unchanged'):
+        logger.info(f"Sync skipped for config {config_id} ({platform}): feed unchanged")
+        return "Unchanged"
+    elif result['success']:
         logger.info(
             f"Sync completed for config {config_id} ({platform}): "
             f"{result['created']} created, {result['updated']} updated, "
@@ -162,8 +252,11 @@ def cleanup_old_reservations(self):
     Deletes old cancelled/completed reservations that are no longer needed
     - Cancelled reservations older than 7 days
     - Completed unenriched reservations older than 30 days
+    - Check-in PIN provisioning jobs older than 1 day (abandoned/failed check-ins)
+    - Completed PIN teardown jobs older than 7 days (failed ones are kept for review)
+    - Remote unlock commands older than 7 days
     """
-    from main.models import Reservation
+    from main.models import Reservation, PinProvisioningJob, PinTeardownJob, UnlockCommand
     from datetime import timedelta
 
     logger.info("Running daily cleanup of old reservations...")
@@ -197,6 +290,27 @@ def cleanup_old_reservations(self):
     total_deleted = cancelled_count + completed_count
     logger.info(f"Cleanup complete: {total_deleted} total reservation(s) deleted")
 
+    # Completed check-ins delete their job; leftovers are abandoned or failed.
+    # Unclaimed pre-provisioned jobs still hold lock PINs - preprovision_next_day_pins releases those
+    jobs_deleted, _ = PinProvisioningJob.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=1)
+    ).exclude(is_preprovisioned=True, session_key='').delete()
+    if jobs_deleted:
+        logger.info(f"Deleted {jobs_deleted} stale PIN provisioning job(s)")
+
+    teardowns_deleted, _ = PinTeardownJob.objects.filter(
+        status='done',
+        completed_at__lt=timezone.now() - timedelta(days=7),
+    ).delete()
+    if teardowns_deleted:
+        logger.info(f"Deleted {teardowns_deleted} completed PIN teardown job(s)")
+
+    unlocks_deleted, _ = UnlockCommand.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=7),
+    ).delete()
+    if unlocks_deleted:
+        logger.info(f"Deleted {unlocks_deleted} old unlock command(s)")
+
     return f"Deleted {cancelled_count} cancelled, {completed_count} unenriched (total: {total_deleted})"
 
 
@@ -249,9 +363,10 @@ def cleanup_old_enrichment_logs(self):
 def archive_past_guests(self):
     """
     Task to archive guests whose check-out time has passed
-    - Deletes TTLock PINs (front door + room)
-    - Marks guest as archived
-    - Sends post-stay message
+    - Marks guest as archived and queues a PinTeardownJob for its TTLock PINs
+      (front door + room) in one transaction - no TTLock calls here
+    - Starts process_pin_teardowns to delete the PINs concurrently
+    - Dispatches the post-stay message as its own task
 
     Runs 3 times per day:
     - 12:15 PM UK time: Catches default 11 AM checkouts (15 min buffer)
@@ -262,7 +377,8 @@ def archive_past_guests(self):
     Multi-night stays (e.g., 5 days) will NOT be archived until their actual checkout date
     """
     from main.models import Guest, TTLock
-    from main.ttlock_utils import TTLockClient
+    from main.services.pin_teardown import enqueue_pin_teardown
+    from django.db import transaction
     from datetime import time
     import pytz
     import datetime
@@ -274,21 +390,21 @@ def archive_past_guests(self):
     today = now_time.date()
 
     # Only check guests whose check_out_date is today or earlier (major optimization)
-    guests_to_check = Guest.objects.filter(
+    guests_to_check = list(Guest.objects.filter(
         is_archived=False,
         check_out_date__lte=today
-    ).select_related('assigned_room', 'assigned_room__ttlock')
+    ).select_related('assigned_room', 'assigned_room__ttlock'))
 
-    if not guests_to_check.exists():
+    if not guests_to_check:
         logger.info("No guests need archiving at this time")
         return "No guests to archive"
 
-    logger.info(f"Found {guests_to_check.count()} guest(s) to check for archiving")
+    logger.info(f"Found {len(guests_to_check)} guest(s) to check for archiving")
 
     front_door_lock = TTLock.objects.filter(is_front_door=True).first()
-    ttlock_client = TTLockClient()
 
     archived_count = 0
+    queued_count = 0
     error_count = 0
 
     for guest in guests_to_check:
@@ -306,43 +422,19 @@ def archive_past_guests(self):
 
             logger.info(f"Archiving guest: {guest.full_name} (Res: {guest.reservation_number})")
 
-            # Delete front door PIN
-            if guest.front_door_pin_id and front_door_lock:
-                try:
-                    ttlock_client.delete_pin(
-                        lock_id=front_door_lock.lock_id,
-                        keyboard_pwd_id=guest.front_door_pin_id,
-                    )
-                    logger.info(f"Deleted front door PIN for guest {guest.reservation_number}")
-                except Exception as e:
-                    logger.error(f"Failed to delete front door PIN for guest {guest.reservation_number}: {str(e)}")
-
-            # Delete room PIN
-            room_lock = guest.assigned_room.ttlock
-            if guest.room_pin_id and room_lock:
-                try:
-                    ttlock_client.delete_pin(
-                        lock_id=room_lock.lock_id,
-                        keyboard_pwd_id=guest.room_pin_id,
-                    )
-                    logger.info(f"Deleted room PIN for guest {guest.reservation_number}")
-                except Exception as e:
-                    logger.error(f"Failed to delete room PIN for guest {guest.reservation_number}: {str(e)}")
-
-            # Update guest status
-            guest.front_door_pin = None
-            guest.front_door_pin_id = None
-            guest.room_pin_id = None
-            guest.is_archived = True
-            guest.save()
-
-            # Send post-stay message if the guest has contact info
-            if guest.phone_number or guest.email:
-                try:
-                    guest.send_post_stay_message()
-                    logger.info(f"Sent post-stay message to {guest.full_name}")
-                except Exception as e:
-                    logger.error(f"Failed to send post-stay message to {guest.full_name}: {str(e)}")
+            # Archive + queue the PIN deletion together: no archived guest without a teardown job
+            with transaction.atomic():
+                if enqueue_pin_teardown(guest, front_door_lock):
+                    queued_count += 1
+                guest.front_door_pin = None
+                guest.front_door_pin_id = None
+                guest.room_pin_id = None
+                guest.is_archived = True
+                guest.save()
+
+                # Send post-stay message if the guest has contact info
+                if guest.phone_number or guest.email:
+                    transaction.on_commit(lambda guest_id=guest.id: send_post_stay_message.delay(guest_id))
 
             archived_count += 1
             logger.info(f"Successfully archived guest {guest.full_name} (Res: {guest.reservation_number})")
@@ -351,8 +443,204 @@ def archive_past_guests(self):
             error_count += 1
             logger.error(f"Failed to archive guest {guest.reservation_number}: {str(e)}")
 
-    logger.info(f"Archiving task complete: {archived_count} archived, {error_count} errors")
-    return f"Archived {archived_count} guest(s), {error_count} error(s)"
+    if queued_count:
+        process_pin_teardowns.delay()
+
+    logger.info(f"Archiving task complete: {archived_count} archived, {queued_count} PIN teardown(s) queued, {error_count} errors")
+    return f"Archived {archived_count} guest(s), {queued_count} PIN teardown(s) queued, {error_count} error(s)"
+
+
+@shared_task(bind=True, max_retries=0)
+def process_pin_teardowns(self):
+    """
+    Delete the TTLock PINs of archived guests (PinTeardownJob queue)
+
+    Started by archive_past_guests and every 5 minutes by beat, which resumes
+    jobs whose worker died (expired lease) and retries failed deletions.
+
+    - Claims PIN_TEARDOWN_BATCH_SIZE jobs at a time and deletes their PINs
+      with PIN_TEARDOWN_WORKERS threads, PIN_TEARDOWN_MIN_INTERVAL apart
+    - A PIN that is already gone from the lock counts as deleted
+    - Stops claiming after PIN_TEARDOWN_TIME_BUDGET seconds and re-queues
+      itself, so a busy checkout day never runs into the hard time limit
+    """
+    from main.models import PinTeardownJob
+    from main.ttlock_utils import TTLockClient
+    from main.services.pin_teardown import claim_pin_teardown_jobs, run_pin_teardowns
+    from django.db.models import Q
+    import time
+
+    started = time.monotonic()
+    totals = {'done': 0, 'retrying': 0, 'failed': 0}
+    ttlock_client = None
+
+    while time.monotonic() - started < settings.PIN_TEARDOWN_TIME_BUDGET:
+        jobs = claim_pin_teardown_jobs(settings.PIN_TEARDOWN_BATCH_SIZE, settings.PIN_TEARDOWN_LEASE_SECONDS)
+        if not jobs:
+            break
+        if ttlock_client is None:
+            ttlock_client = TTLockClient()
+        counts = run_pin_teardowns(
+            ttlock_client, jobs,
+            workers=settings.PIN_TEARDOWN_WORKERS,
+            min_interval=settings.PIN_TEARDOWN_MIN_INTERVAL,
+            max_attempts=settings.PIN_TEARDOWN_MAX_ATTEMPTS,
+            retry_delay=settings.PIN_TEARDOWN_RETRY_DELAY,
+        )
+        for key, value in counts.items():
+            totals[key] += value
+    else:
+        # Out of time budget - continue in a fresh task if anything is still claimable
+        if PinTeardownJob.objects.filter(status='pending').filter(
+            Q(lease_until__isnull=True) | Q(lease_until__lte=timezone.now())
+        ).exists():
+            logger.info("PIN teardown time budget used up, re-queuing the rest")
+            process_pin_teardowns.delay()
+
+    if not any(totals.values()):
+        return "Nothing to do"
+
+    logger.info(
+        f"PIN teardown: {totals['done']} done, {totals['retrying']} to retry, {totals['failed']} failed"
+    )
+    return f"PIN teardown: {totals['done']} done, {totals['retrying']} to retry, {totals['failed']} failed"
+
+
+@shared_task(bind=True, max_retries=0)
+def send_post_stay_message(self, guest_id):
+    """
+    Send the post-stay email/SMS of an archived guest
+
+    Dispatched by archive_past_guests so Twilio/SMTP latency stays out of the
+    archiving pass.
+
+    Args:
+        guest_id: ID of the archived Guest
+    """
+    from main.models import Guest
+
+    guest = Guest.objects.select_related('assigned_room').filter(id=guest_id).first()
+    if guest is None:
+        return f"Guest {guest_id} not found"
+
+    try:
+        guest.send_post_stay_message()
+        logger.info(f"Sent post-stay message to {guest.full_name}")
+        return f"Sent post-stay message to guest {guest_id}"
+    except Exception as e:
+        logger.error(f"Failed to send post-stay message to {guest.full_name}: {str(e)}")
+        return f"Error: {str(e)}"
+
+
+@shared_task(bind=True, max_retries=0)
+def execute_unlock_command(self, command_id):
+    """
+    Send one queued remote unlock (UnlockCommand) to TTLock
+
+    Routed to the 'unlock' queue (CELERY_TASK_ROUTES) so a guest at the door
+    never waits behind iCal syncs or email matching. Transient TTLock
+    failures are retried by the transport; commands past
+    UNLOCK_COMMAND_EXPIRY_SECONDS are failed without unlocking.
+
+    Args:
+        command_id: ID of the UnlockCommand
+    """
+    from main.ttlock_utils import TTLockClient
+    from main.services.unlock_commands import run_unlock_command
+
+    return run_unlock_command(TTLockClient(), command_id)
+
+
+@shared_task(bind=True, max_retries=0)
+def sync_lock_keyboard_passwords(self):
+    """
+    Mirror the keyboard passwords of every TTLock and reconcile them
+
+    Runs every 30 minutes. Pages /lock/listKeyboardPwd for all locks
+    concurrently (LOCK_PIN_SYNC_WORKERS) into LockKeyboardPassword, then:
+    - Flags orphans: PINs no guest, PIN job or pending teardown holds
+      (deleted from the lock only if LOCK_PIN_DELETE_ORPHANS is on)
+    - Reports missing PINs: held by a current guest but not on the lock
+    """
+    from main.models import TTLock
+    from main.ttlock_utils import TTLockClient
+    from main.services.lock_pin_mirror import (
+        delete_orphan_pins,
+        reconcile_keyboard_passwords,
+        sync_keyboard_password_mirror,
+    )
+
+    locks = list(TTLock.objects.all())
+    if not locks:
+        return "No locks configured"
+
+    ttlock_client = TTLockClient()
+    result = sync_keyboard_password_mirror(ttlock_client, locks, settings.LOCK_PIN_SYNC_WORKERS)
+    if not result['synced']:
+        return f"Sync failed for all {len(locks)} lock(s)"
+
+    report = reconcile_keyboard_passwords(result['synced'], settings.LOCK_PIN_ORPHAN_GRACE_MINUTES)
+    lock_names = {lock.lock_id: lock.name for lock in locks}
+
+    for lock_id, pwd_id, owner in report['missing']:
+        logger.error(f"🚨 Missing PIN: {owner} holds keyboard password {pwd_id} but it is not on {lock_names[lock_id]}")
+    for row in report['orphans']:
+        logger.warning(f"Orphaned PIN {row.keyboard_pwd_id} ({row.name or 'unnamed'}) on {row.lock.name}")
+
+    deleted = 0
+    if settings.LOCK_PIN_DELETE_ORPHANS and report['orphans']:
+        deleted = delete_orphan_pins(
+            ttlock_client, report['orphans'],
+            workers=settings.PIN_TEARDOWN_WORKERS,
+            min_interval=settings.PIN_TEARDOWN_MIN_INTERVAL,
+        )
+
+    return (
+        f"Synced {len(result['synced'])}/{len(locks)} lock(s): {len(report['orphans'])} orphaned "
+        f"({deleted} deleted), {len(report['missing'])} missing"
+    )
+
+
+@shared_task(bind=True, max_retries=0)
+def rebuild_dashboard_snapshots(self):
+    """
+    Rebuild yesterday's, today's and tomorrow's admin dashboard snapshots
+
+    Runs daily just after midnight. Guest/Reservation hooks keep snapshots
+    current during the day; this catches anything written around them.
+    """
+    from main.services.dashboard_snapshot import rebuild_recent_dashboard_snapshots
+
+    try:
+        rebuilt = rebuild_recent_dashboard_snapshots()
+    except Exception as e:
+        logger.error(f"Dashboard snapshot rebuild failed: {str(e)}")
+        return f"Error: {str(e)}"
+
+    logger.info(f"Rebuilt {rebuilt} dashboard snapshot(s)")
+    return f"Rebuilt {rebuilt} dashboard snapshot(s)"
+
+
+@shared_task(bind=True, max_retries=0)
+def flush_lock_events(self):
+    """
+    Bulk-insert the lock records buffered by the TTLock callback webhook
+
+    Runs every minute, and right away when LOCK_EVENT_FLUSH_SIZE records are
+    waiting. One INSERT per batch of LOCK_EVENT_FLUSH_SIZE records.
+    """
+    from main.services.lock_events import drain_lock_event_buffer
+
+    try:
+        written = drain_lock_event_buffer(settings.LOCK_EVENT_FLUSH_SIZE)
+    except Exception as e:
+        logger.error(f"Lock event flush failed: {str(e)}")
+        return f"Error: {str(e)}"
+
+    if not written:
+        return "Nothing to do"
+    logger.info(f"Stored {written} TTLock lock event(s)")
+    return f"Stored {written} lock event(s)"
 
 
 # =========================
@@ -364,9 +652,8 @@ def trigger_enrichment_workflow(self, reservation_id):
     """
     Triggered when iCal creates a new unenriched reservation
     
-    Simply starts the email search workflow.
-    Collision detection happens in the email search task when multiple emails
-    with the same check-in date are found.
+    Logs the start of the email search and runs the global matcher right away
+    (it also runs periodically, which replaces the old per-reservation retries).
     
     Args:
         reservation_id: ID of newly created Reservation
@@ -400,306 +687,154 @@ def trigger_enrichment_workflow(self, reservation_id):
         }
     )
     
-    search_email_for_reservation.delay(reservation_id, attempt=1)
+    match_unenriched_reservations.delay()
     return "Email search started"
 
 
-@shared_task(bind=True, max_retries=3)
-def search_email_for_reservation(self, reservation_id, attempt=1):
+@shared_task(bind=True, max_retries=0)
+def trigger_enrichment_workflow_batch(self, reservation_ids):
     """
-    Search Gmail for email matching reservation's check-in date
-    
-    Retry schedule:
-    - Attempt 1: Immediate
-    - Attempt 2: 2 min later  
-    - Attempt 3: 5 min later
-    - Attempt 4: 10 min later
-    
-    If not found after 4 attempts → send SMS alert
-    
+    Batched trigger_enrichment_workflow for all reservations created by one iCal sync
+
+    Dispatched once per sync (after commit), so a feed releasing ten bookings
+    logs ten starts and runs the global matcher once.
+
     Args:
-        reservation_id: Reservation ID
-        attempt: Current attempt number (1-4)
+        reservation_ids: IDs of newly created Reservations
     """
-    from main.models import Reservation
-    from main.services.gmail_client import GmailClient
-    from main.services.email_parser import parse_booking_com_email_subject
-    
-    logger.info(f"Email search attempt {attempt}/4 for reservation {reservation_id}")
-    
-    try:
-        reservation = Reservation.objects.select_related('guest').get(id=reservation_id)
-    except Reservation.DoesNotExist:
-        logger.error(f"Reservation {reservation_id} not found")
-        return "Reservation not found"
+    from main.models import Reservation, EnrichmentLog
 
-    # Skip if already enriched (has a Guest object)
-    if reservation.guest is not None:
-        logger.info(f"Reservation {reservation_id} already enriched (has guest) during search")
+    reservations = list(
+        Reservation.objects.select_related('room').filter(id__in=reservation_ids, guest__isnull=True)
+    )
+    if not reservations:
+        logger.info(f"No unenriched reservations left in batch {reservation_ids}, skipping workflow")
         return "Already enriched"
 
-    # Skip if already enriched via multi-room (has booking_ref from sibling task)
-    # This prevents race condition where 2 concurrent tasks both try to enrich same multi-room booking
-    if reservation.booking_reference and len(reservation.booking_reference) >= 5:
-        logger.info(
-            f"Reservation {reservation_id} already has booking_ref '{reservation.booking_reference}' "
-            f"(likely enriched by sibling multi-room task), skipping duplicate processing"
-        )
-        return "Already enriched (multi-room sibling)"
+    logger.info(f"Starting batched email search for {len(reservations)} reservation(s)")
 
-    try:
-        # Smart temporal matching: Search by time window, pick by proximity
-        from main.enrichment_config import (
-            EMAIL_SEARCH_MAX_RESULTS,
-            EMAIL_SEARCH_LOOKBACK_DAYS,
-            EMAIL_TEMPORAL_THRESHOLD_HOURS
+    # Log email search start
+    EnrichmentLog.objects.bulk_create([
+        EnrichmentLog(
+            reservation=reservation,
+            action='email_search_started',
+            booking_reference='',
+            room=reservation.room,
+            method='email_search',
+            details={
+                'check_in_date': str(reservation.check_in_date),
+                'batch_size': len(reservations),
+            }
         )
+        for reservation in reservations
+    ])
 
-        gmail = GmailClient()
-        emails = gmail.get_recent_booking_emails(
-            max_results=EMAIL_SEARCH_MAX_RESULTS,
-            lookback_days=EMAIL_SEARCH_LOOKBACK_DAYS
-        )
+    match_unenriched_reservations.delay()
+    return f"Email search started for {len(reservations)} reservation(s)"
 
-        logger.info(f"Searching {len(emails)} recent emails for reservation {reservation_id} (check-in: {reservation.check_in_date})")
 
-        # Collect all candidate emails matching check-in date
-        matching_emails = []
-        for email_data in emails:
-            subject = email_data['subject']
-            parsed = parse_booking_com_email_subject(subject)
+def _sync_email_index():
+    """
+    Bring the BookingEmail index up to date before matching
 
-            if not parsed:
-                continue
+    An incremental Gmail history sync is usually one API call with no changes.
+    If it fails but the index has synced before, the slightly stale index is
+    still used - logged as an error once it is older than the matcher's grace
+    period (EMAIL_MATCH_ALERT_AFTER_MINUTES), when alerts may be false.
 
-            email_type, booking_ref, check_in_date = parsed
+    Returns:
+        GmailClient: Client for marking matched emails as read
+    """
+    from main.services.gmail_client import GmailClient
+    from main.services.booking_email_index import sync_booking_email_index
+    from main.models import GmailSyncState
+    from main.enrichment_config import EMAIL_MATCH_ALERT_AFTER_MINUTES
+    from datetime import timedelta
 
-            # Skip cancellations
-            if email_type == 'cancellation':
-                continue
+    gmail = GmailClient()
+    try:
+        sync_booking_email_index(gmail)
+    except Exception as e:
+        state = GmailSyncState.get_state()
+        if not state.last_history_id:
+            raise
+        stale_cutoff = timezone.now() - timedelta(minutes=EMAIL_MATCH_ALERT_AFTER_MINUTES)
+        if state.last_synced_at and state.last_synced_at < stale_cutoff:
+            logger.error(
+                f"❌ Booking email index stale since {state.last_synced_at.isoformat()} "
+                f"(sync keeps failing): {str(e)}"
+            )
+        else:
+            logger.warning(f"Booking email index sync failed, using last synced index: {str(e)}")
+    return gmail
 
-            # Treat last-minute bookings as new bookings
-            if email_type == 'new_lastminute':
-                email_type = 'new'
-
-            # Check if check-in date matches
-            if check_in_date == reservation.check_in_date:
-                # Check if this booking_ref already exists in database
-                already_exists = Reservation.objects.filter(
-                    booking_reference=booking_ref,
-                    platform='booking'
-                ).exists()
-
-                if not already_exists:
-                    # Calculate temporal proximity score (seconds difference)
-                    email_arrival = email_data['received_at']
-                    reservation_created = reservation.created_at
-
-                    # Make both timezone-aware for comparison
-                    if email_arrival.tzinfo is None:
-                        from django.utils import timezone as django_tz
-                        email_arrival = django_tz.make_aware(email_arrival)
-                    if reservation_created.tzinfo is None:
-                        from django.utils import timezone as django_tz
-                        reservation_created = django_tz.make_aware(reservation_created)
-
-                    time_diff_seconds = abs((email_arrival - reservation_created).total_seconds())
-                    time_diff_hours = time_diff_seconds / 3600
-
-                    matching_emails.append({
-                        'email_data': email_data,
-                        'booking_ref': booking_ref,
-                        'check_in_date': check_in_date,
-                        'time_diff_seconds': time_diff_seconds,
-                        'time_diff_hours': time_diff_hours,
-                        'email_arrival': email_arrival
-                    })
-        
-        # COLLISION DETECTION: If multiple emails found with same check-in date
-        if len(matching_emails) > 1:
-            # Log temporal info for all collision candidates
-            collision_info = []
-            for m in matching_emails:
-                collision_info.append(
-                    f"{m['booking_ref']} (email arrived {m['time_diff_hours']:.1f}h from iCal sync)"
-                )
 
-            logger.warning(
-                f"COLLISION: Found {len(matching_emails)} emails for check-in date {reservation.check_in_date}. "
-                f"Candidates: {', '.join(collision_info)}"
-            )
+def _alert_email_not_found(reservation):
+    """Grace period passed without a matching email - log and send SMS alert"""
+    from main.enrichment_config import EMAIL_MATCH_ALERT_AFTER_MINUTES
 
-            # Log collision
-            from main.models import EnrichmentLog
-            EnrichmentLog.objects.create(
-                reservation=reservation,
-                action='collision_detected',
-                booking_reference='',
-                room=reservation.room,
-                method='email_collision',
-                details={
-                    'collision_count': len(matching_emails),
-                    'check_in_date': str(reservation.check_in_date),
-                    'booking_refs': [m['booking_ref'] for m in matching_emails],
-                    'temporal_scores': {
-                        m['booking_ref']: f"{m['time_diff_hours']:.2f}h"
-                        for m in matching_emails
-                    }
-                }
-            )
+    logger.warning(
+        f"Email not found {EMAIL_MATCH_ALERT_AFTER_MINUTES} min after iCal sync for reservation {reservation.id}"
+    )
 
-            # TRUE COLLISION: Multiple separate bookings detected
-            logger.error(
-                f"🚨 TRUE COLLISION: Found {len(matching_emails)} DIFFERENT emails "
-                f"for check-in date {reservation.check_in_date}. "
-                f"Sending collision alert SMS."
-            )
+    # Log email not found
+    from main.models import EnrichmentLog
+    EnrichmentLog.objects.create(
+        reservation=reservation,
+        action='email_not_found_alerted',
+        booking_reference='',
+        room=reservation.room,
+        method='email_search',
+        details={
+            'minutes_waited': EMAIL_MATCH_ALERT_AFTER_MINUTES,
+            'check_in_date': str(reservation.check_in_date),
+        }
+    )
 
-            # Send TRUE collision SMS alert
-            send_true_collision_alert.delay(
-                reservation.check_in_date.isoformat(),
-                [m['booking_ref'] for m in matching_emails]
-            )
+    send_email_not_found_alert.delay(reservation.id)
 
-            return f"True collision: {len(matching_emails)} separate bookings found"
 
-        # SINGLE MATCH: Pick the best match using temporal proximity
-        if len(matching_emails) == 1:
-            match = matching_emails[0]
-            email_data = match['email_data']
-            booking_ref = match['booking_ref']
-            check_in_date = match['check_in_date']
-            time_diff_hours = match['time_diff_hours']
+@shared_task(bind=True, max_retries=0)
+def match_unenriched_reservations(self):
+    """
+    Global email matcher - runs every 2 minutes and right after iCal creates bookings
 
-            # Log temporal proximity info
-            logger.info(
-                f"✅ TEMPORAL MATCH: Ref {booking_ref}, Check-in {check_in_date}, "
-                f"Email arrived {time_diff_hours:.2f}h from iCal sync, "
-                f"Unread: {email_data.get('is_unread', False)}"
-            )
+    Matches ALL unenriched Booking.com reservations against ALL unmatched
+    emails in the BookingEmail index in one pass (see main/services/email_matcher.py):
+    - One email for a check-in date -> enrich (all rooms on that date = multi-room)
+    - Several different emails      -> TRUE collision alert (once)
+    - No email after 10 minutes     -> email-not-found alert (once)
 
-            # Sanity check: Warn if email timing seems suspicious
-            if time_diff_hours > EMAIL_TEMPORAL_THRESHOLD_HOURS:
-                logger.warning(
-                    f"⚠️ Temporal anomaly: Email arrived {time_diff_hours:.1f}h from iCal sync "
-                    f"(threshold: {EMAIL_TEMPORAL_THRESHOLD_HOURS}h). This might be delayed sync or wrong match."
-                )
-            
-            # MATCH FOUND! Check if this is a multi-room booking
-            multi_room_reservations = Reservation.objects.filter(
-                check_in_date=check_in_date,
-                platform='booking',
-                status='confirmed',
-                guest__isnull=True,
-                booking_reference=''  # Unenriched
-            )
-            
-            room_count = multi_room_reservations.count()
-            
-            if room_count > 1:
-                # MULTI-ROOM BOOKING - Enrich all rooms with same ref
-                logger.info(f"Multi-room booking detected: {room_count} rooms for {booking_ref}")
-                
-                for res in multi_room_reservations:
-                    res.booking_reference = booking_ref
-                    res.guest_name = f"Guest {booking_ref}"
-                    res.save()
-                
-                # Mark email as read
-                gmail.mark_as_read(email_data['id'])
-                
-                # Log the multi-room enrichment
-                from main.models import EnrichmentLog
-                EnrichmentLog.objects.create(
-                    reservation=reservation,
-                    action='email_found_multi_room',
-                    booking_reference=booking_ref,
-                    room=reservation.room,
-                    method='email_search',
-                    details={
-                        'attempts': attempt,
-                        'room_count': room_count,
-                        'rooms': [r.room.name for r in multi_room_reservations],
-                        'check_in_date': str(check_in_date),
-                    }
-                )
-                
-                logger.info(f"✅ Multi-room enrichment! {room_count} rooms enriched with ref {booking_ref}")
-                
-                # Send confirmation SMS to admin
-                send_multi_room_confirmation_sms.delay(booking_ref, check_in_date.isoformat())
-                
-                return f"Multi-room matched: {booking_ref} ({room_count} rooms)"
-            else:
-                # SINGLE ROOM - Standard enrichment
-                reservation.booking_reference = booking_ref
-                reservation.guest_name = f"Guest {booking_ref}"  # Placeholder
-                reservation.save()
-                
-                # Mark email as read
-                gmail.mark_as_read(email_data['id'])
-                
-                # Log the enrichment
-                from main.models import EnrichmentLog
-                EnrichmentLog.objects.create(
-                    reservation=reservation,
-                    action='email_found_matched',
-                    booking_reference=booking_ref,
-                    room=reservation.room,
-                    method='email_search',
-                    details={
-                        'attempts': attempt,
-                        'check_in_date': str(reservation.check_in_date),
-                    }
-                )
-                
-                logger.info(f"✅ Email found! Enriched reservation {reservation_id} with ref {booking_ref}")
-                return f"Matched: {booking_ref}"
-        
-        # Email not found - schedule retry or send alert
-        if attempt < 4:
-            # Schedule next attempt
-            retry_delays = {
-                1: 120,   # 2 min after attempt 1
-                2: 180,   # 3 min after attempt 2 (5 min total)
-                3: 300,   # 5 min after attempt 3 (10 min total)
-            }
-            countdown = retry_delays.get(attempt, 120)
-            
-            logger.info(f"Email not found, scheduling attempt {attempt + 1} in {countdown}s")
-            search_email_for_reservation.apply_async(
-                args=[reservation_id, attempt + 1],
-                countdown=countdown
-            )
-            return f"Retry scheduled: attempt {attempt + 1}"
-        else:
-            # All attempts exhausted - send SMS alert
-            logger.warning(f"Email not found after 4 attempts for reservation {reservation_id}")
-            
-            # Log email not found
-            from main.models import EnrichmentLog
-            EnrichmentLog.objects.create(
-                reservation=reservation,
-                action='email_not_found_alerted',
-                booking_reference='',
-                room=reservation.room,
-                method='email_search',
-                details={
-                    'attempts': 4,
-                    'check_in_date': str(reservation.check_in_date),
-                }
-            )
-            
-            send_email_not_found_alert.delay(reservation_id)
-            return "Email not found - alert sent"
-    
+    The BookingEmail index is synced first on every run, even with nothing to
+    match, so mark-as-read and collision checks see new emails without a
+    separate index sync task.
+    """
+    from main.services.email_matcher import run_email_matcher, unenriched_reservations
+
+    try:
+        gmail = _sync_email_index()
+
+        # Nothing waiting - index is current, nothing to match
+        if not unenriched_reservations().exists():
+            return "No unenriched reservations"
+
+        result = run_email_matcher(gmail)
     except Exception as e:
-        logger.error(f"Error searching email for reservation {reservation_id}: {str(e)}")
-        # Retry on error
-        if attempt < 4:
-            self.retry(countdown=60, exc=e)
+        logger.error(f"Error in email matcher: {str(e)}")
         return f"Error: {str(e)}"
 
+    logger.info(f"Email matcher: {result}")
+    return result
+
+
+# DEPRECATED (replaced by match_unenriched_reservations): kept so retries
+# already queued with a countdown still run - they now trigger one global pass.
+@shared_task(bind=True, max_retries=0)
+def search_email_for_reservation(self, reservation_id, attempt=1):
+    """DEPRECATED: per-reservation email search - runs the global matcher instead"""
+    match_unenriched_reservations.delay()
+    return "Delegated to global email matcher"
+
 
 # DEPRECATED FUNCTION REMOVED (Oct 30, 2025)
 # send_collision_alert_ical() was removed because it caused false collision alerts.
@@ -714,7 +849,7 @@ def search_email_for_reservation(self, reservation_id, attempt=1):
 # - send_multi_room_confirmation_sms() is called instead (has emojis, shows ref)
 # 
 # TRUE COLLISIONS (multiple separate bookings) are extremely rare and will be
-# detected when search_email_for_reservation() finds multiple DIFFERENT emails
+# detected when match_unenriched_reservations() finds multiple DIFFERENT emails
 # with the same check-in date. In that case, send_true_collision_alert() is called.
 # 
 # See commit 8ecdcc1 for the fix that made this function obsolete.
@@ -941,49 +1076,48 @@ def send_email_not_found_alert(self, reservation_id):
 # =========================
 
 @shared_task(bind=True, max_retries=1)
-def generate_checkin_pin_background(self, session_key):
+def generate_checkin_pin_background(self, job_id):
     """
     Generate TTLock PINs in background while guest fills parking info (Step 3)
-    Stores PIN in session for instant retrieval at Step 4 (Confirm)
+    Stores the result on a PinProvisioningJob for instant retrieval at Step 4 (Confirm)
     
     This provides a seamless UX - by the time guest reaches Step 4,
     the PIN is already ready (no waiting/loading spinner).
     
     Args:
-        session_key (str): Django session key to store PIN results
+        job_id (int): PinProvisioningJob ID created by checkin_details
     """
-    from django.contrib.sessions.models import Session
-    from django.contrib.sessions.backends.db import SessionStore
-    from main.models import Reservation, TTLock
+    from main.models import PinProvisioningJob, TTLock
     from main.ttlock_utils import TTLockClient
     from main.pin_utils import generate_memorable_4digit_pin
+    from main.services.pin_provisioning import provision_pins, PinTarget
     import pytz
     import datetime
     
-    logger.info(f"Starting background PIN generation for session {session_key}")
+    # Messages queued before the job table existed carry a session key - the
+    # guest's Step 4 page can't see their result any more, so just drop them
+    if not str(job_id).isdigit():
+        logger.warning(f"Ignoring legacy session-based PIN generation request ({job_id})")
+        return "Legacy request ignored"
+
+    logger.info(f"Starting background PIN generation for job {job_id}")
     
     try:
-        # Get session data
-        logger.info(f"Looking for session with key: {session_key}")
-        session = Session.objects.get(session_key=session_key)
-        logger.info(f"Session found, decoding data...")
-        session_data = session.get_decoded()
-        logger.info(f"Session data keys: {session_data.keys()}")
-        flow_data = session_data.get('checkin_flow', {})
-        logger.info(f"Flow data: {flow_data}")
-        
-        if not flow_data:
-            logger.error(f"No checkin_flow data found in session {session_key}")
-            logger.error(f"Available session data: {list(session_data.keys())}")
-            return "No flow data"
-        
-        reservation_id = flow_data.get('reservation_id')
-        if not reservation_id:
-            logger.error(f"No reservation_id in checkin_flow for session {session_key}")
-            return "No reservation_id"
-        
-        reservation = Reservation.objects.select_related('room', 'room__ttlock').get(id=reservation_id)
-        
+        job = PinProvisioningJob.objects.select_related(
+            'reservation__room__ttlock'
+        ).get(id=job_id)
+    except PinProvisioningJob.DoesNotExist:
+        logger.error(f"PIN provisioning job {job_id} not found")
+        return "Job not found"
+
+    if job.status != 'pending':
+        logger.info(f"PIN provisioning job {job_id} already {job.status}, skipping")
+        return f"Already {job.status}"
+
+    reservation = job.reservation
+    guest_name = job.guest_name or 'Guest'
+
+    try:
         # Get locks
         front_door_lock = TTLock.objects.filter(is_front_door=True).first()
         room_lock = reservation.room.ttlock
@@ -1010,88 +1144,174 @@ def generate_checkin_pin_background(self, session_key):
         
         ttlock_client = TTLockClient()
         
-        # Generate front door PIN
-        front_door_response = ttlock_client.generate_temporary_pin(
-            lock_id=str(front_door_lock.lock_id),
-            pin=pin,
-            start_time=start_time,
-            end_time=end_time,
-            name=f"Front Door - {reservation.room.name} - {flow_data.get('full_name', 'Guest')} - {pin}"
-        )
-        
-        if "keyboardPwdId" not in front_door_response:
-            raise Exception(f"Front door PIN generation failed: {front_door_response.get('errmsg', 'Unknown error')}")
-        
-        keyboard_pwd_id_front = front_door_response["keyboardPwdId"]
+        # Generate front door + room PINs in parallel (all-or-nothing)
+        pin_ids = provision_pins(ttlock_client, pin, start_time, end_time, [
+            PinTarget('front_door', front_door_lock.lock_id,
+                      f"Front Door - {reservation.room.name} - {guest_name} - {pin}", 'front door'),
+            PinTarget('room', room_lock.lock_id,
+                      f"Room - {reservation.room.name} - {guest_name} - {pin}", 'room'),
+        ])
+        keyboard_pwd_id_front = pin_ids['front_door']
+        keyboard_pwd_id_room = pin_ids['room']
         
-        # Generate room PIN
-        room_response = ttlock_client.generate_temporary_pin(
-            lock_id=str(room_lock.lock_id),
+        # ✅ Store on the job (single-row UPDATE, no session decode/encode)
+        PinProvisioningJob.objects.filter(id=job.id).update(
+            status='ready',
             pin=pin,
-            start_time=start_time,
-            end_time=end_time,
-            name=f"Room - {reservation.room.name} - {flow_data.get('full_name', 'Guest')} - {pin}"
+            front_door_pin_id=str(keyboard_pwd_id_front),
+            room_pin_id=str(keyboard_pwd_id_room),
+            completed_at=timezone.now(),
         )
         
-        if "keyboardPwdId" not in room_response:
-            # Rollback front door PIN
-            try:
-                ttlock_client.delete_pin(
-                    lock_id=str(front_door_lock.lock_id),
-                    keyboard_pwd_id=keyboard_pwd_id_front
-                )
-            except Exception as e:
-                logger.error(f"Failed to rollback front door PIN: {str(e)}")
-            
-            raise Exception(f"Room PIN generation failed: {room_response.get('errmsg', 'Unknown error')}")
-        
-        keyboard_pwd_id_room = room_response["keyboardPwdId"]
-        
-        # ✅ Store in session
-        flow_data['pin_generated'] = True
-        flow_data['pin'] = pin
-        flow_data['front_door_pin_id'] = keyboard_pwd_id_front
-        flow_data['room_pin_id'] = keyboard_pwd_id_room
-        
-        session_data['checkin_flow'] = flow_data
-        
-        # Use SessionStore to properly encode and save the session
-        session_store = SessionStore(session_key=session_key)
-        session_store.update(session_data)
-        session_store.save()
-        
-        logger.info(f"✅ Background PIN generated successfully for session {session_key}: {pin}")
+        logger.info(f"✅ Background PIN generated successfully for job {job.id}: {pin}")
         return f"PIN generated: {pin}"
         
-    except Reservation.DoesNotExist:
-        logger.error(f"Reservation not found for session {session_key}")
-        error_msg = "Reservation not found"
-    except Session.DoesNotExist:
-        logger.error(f"Session {session_key} not found")
-        error_msg = "Session expired"
     except Exception as e:
-        logger.error(f"Failed to generate PIN for session {session_key}: {str(e)}")
+        logger.error(f"Failed to generate PIN for job {job.id}: {str(e)}")
         error_msg = str(e)
     
-    # ❌ Mark as failed in session
-    try:
-        session = Session.objects.get(session_key=session_key)
-        session_data = session.get_decoded()
-        flow_data = session_data.get('checkin_flow', {})
-        flow_data['pin_generated'] = False
-        flow_data['pin_error'] = error_msg
-        session_data['checkin_flow'] = flow_data
-        
-        # Use SessionStore to properly encode and save the session
-        session_store = SessionStore(session_key=session_key)
-        session_store.update(session_data)
-        session_store.save()
-        
-        logger.info(f"Marked PIN generation as failed in session {session_key}")
-    except Exception as e:
-        logger.error(f"Failed to update session with error: {str(e)}")
+    # ❌ Mark job as failed
+    PinProvisioningJob.objects.filter(id=job.id).update(
+        status='failed',
+        error=error_msg,
+        completed_at=timezone.now(),
+    )
+    logger.info(f"Marked PIN provisioning job {job.id} as failed")
     
     return f"Failed: {error_msg}"
 
+
+def _release_preprovisioned_jobs(ttlock_client, front_door_lock, jobs):
+    """Release unclaimed pre-provisioned jobs; returns (released, kept for retry)"""
+    from main.services.pin_provisioning import release_preprovisioned_job
+
+    released = kept = 0
+    for job in jobs:
+        if release_preprovisioned_job(ttlock_client, job, front_door_lock):
+            released += 1
+        else:
+            kept += 1
+    return released, kept
+
+
+@shared_task(bind=True, max_retries=0)
+def preprovision_next_day_pins(self):
+    """
+    Create front door + room PINs for tomorrow's arrivals ahead of time
+
+    Runs every 15 minutes. From PIN_PREPROVISION_HOUR (UK) it provisions
+    confirmed, unenriched reservations arriving tomorrow, valid from their
+    check-in time. Step 2 of the check-in flow then claims the ready job
+    instead of calling TTLock while the guest waits.
+
+    - Retry: failed reservations are retried on later runs, up to
+      PIN_PREPROVISION_MAX_ATTEMPTS (check-in falls back to on-demand PINs)
+    - Rate limit: PIN_PREPROVISION_MIN_INTERVAL seconds between reservations
+    - Cleanup: unclaimed PINs of cancelled, checked-in, past or re-timed
+      reservations are deleted from the locks on every run
+    """
+    from main.models import Reservation, PinProvisioningJob, TTLock
+    from main.ttlock_utils import TTLockClient
+    from main.services.pin_provisioning import preprovision_reservation_pins, stale_preprovisioned_jobs
+    import pytz
+    import datetime
+    import time
+
+    uk_timezone = pytz.timezone("Europe/London")
+    now_uk_time = timezone.now().astimezone(uk_timezone)
+    today = now_uk_time.date()
+    tomorrow = today + datetime.timedelta(days=1)
+
+    to_provision = []
+    if now_uk_time.hour >= settings.PIN_PREPROVISION_HOUR:
+        reservations = list(
+            Reservation.objects.filter(
+                status='confirmed',
+                guest__isnull=True,
+                check_in_date=tomorrow,
+                room__ttlock__isnull=False,
+            ).select_related('room__ttlock')
+        )
+        existing = {
+            job.reservation_id: job
+            for job in PinProvisioningJob.objects.filter(
+                reservation__in=reservations,
+                is_preprovisioned=True,
+            )
+        }
+        for reservation in reservations:
+            job = existing.get(reservation.id)
+            if job is None or (
+                job.status == 'failed'
+                and not job.session_key
+                and job.attempts < settings.PIN_PREPROVISION_MAX_ATTEMPTS
+            ):
+                to_provision.append((reservation, job))
+
+    # Nothing to do on most runs - don't touch TTLock at all
+    stale_jobs = stale_preprovisioned_jobs(today)
+    if not to_provision and not stale_jobs:
+        return "Nothing to do"
+
+    front_door_lock = TTLock.objects.filter(is_front_door=True).first()
+    if not front_door_lock:
+        logger.error("Front door lock not configured - skipping PIN pre-provisioning")
+        return "Front door lock not configured"
+
+    ttlock_client = TTLockClient()
+
+    released, kept = _release_preprovisioned_jobs(ttlock_client, front_door_lock, stale_jobs)
+    if released or kept:
+        logger.info(f"Released {released} unclaimed pre-provisioned PIN job(s), {kept} kept for retry")
+
+    ready = failed = 0
+    for i, (reservation, job) in enumerate(to_provision):
+        if i:
+            time.sleep(settings.PIN_PREPROVISION_MIN_INTERVAL)
+        job = preprovision_reservation_pins(ttlock_client, reservation, front_door_lock, job=job)
+        if job.status == 'ready':
+            ready += 1
+            logger.info(f"🔑 Pre-provisioned PIN for reservation {reservation.id} ({reservation.room.name}, arriving {tomorrow})")
+        else:
+            failed += 1
+            logger.warning(
+                f"Pre-provisioning failed for reservation {reservation.id} "
+                f"(attempt {job.attempts}/{settings.PIN_PREPROVISION_MAX_ATTEMPTS}): {job.error}"
+            )
+
+    return f"Pre-provisioned {ready}, failed {failed}, released {released}"
+
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def release_preprovisioned_pins(self, reservation_ids):
+    """
+    Delete unclaimed pre-provisioned PINs of reservations that were just cancelled
+
+    Dispatched by the iCal sync and the reservation post_save signal so a
+    cancelled booking's PIN doesn't stay on the locks until the next
+    preprovision_next_day_pins run.
+    """
+    from main.models import TTLock
+    from main.ttlock_utils import TTLockClient
+    from main.services.pin_provisioning import stale_preprovisioned_jobs
+    import pytz
+
+    today = timezone.now().astimezone(pytz.timezone("Europe/London")).date()
+    stale_jobs = stale_preprovisioned_jobs(today, reservation_ids)
+    if not stale_jobs:
+        return "Nothing to release"
+
+    front_door_lock = TTLock.objects.filter(is_front_door=True).first()
+    if not front_door_lock:
+        logger.error("Front door lock not configured - cannot release pre-provisioned PINs")
+        return "Front door lock not configured"
+
+    released, kept = _release_preprovisioned_jobs(TTLockClient(), front_door_lock, stale_jobs)
+    if kept:
+        # Lock unreachable - try again shortly (the periodic run is the backstop)
+        raise self.retry()
+
+    return f"Released {released} pre-provisioned PIN job(s)"
+
 # Import Ticketmaster event polling tasks
 from main.ticketmaster_tasks import poll_ticketmaster_events, check_new_important_events
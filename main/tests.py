@@ -1,3 +1,1962 @@
-from django.test import TestCase
+import json
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import httplib2
+import requests
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from googleapiclient.discovery import build
+
+from main.services import gmail_client
+from main.services.booking_email_index import sync_booking_email_index
+from main.services.email_matcher import plan_email_matches
+from main.services.gmail_client import GmailClient
+from main.services import ttlock_service
+from main.services.ttlock_transport import TTLockTransport, TTLockUnavailable
+from main.services import pin_provisioning
+from main.services.pin_provisioning import PinProvisioningError, PinTarget, provision_pins, reservation_pin_window
+from main.services.pin_teardown import RateLimiter, claim_pin_teardown_jobs, delete_pin_idempotent, run_pin_teardowns
+from main.services.lock_pin_mirror import diff_keyboard_passwords
+from main.services.unlock_commands import enqueue_unlock, run_unlock_command, unlock_status_payload
+from main.services import lock_events
+from main.services.lock_events import drain_lock_event_buffer, first_entries, parse_callback, write_lock_events
+from main.services.reservation_overlaps import find_overlaps
+from main.services import occupancy
+from main.services import dashboard_snapshot
+from main.ttlock_utils import TTLockAPIError
+from main.dashboard_helpers import calculate_dashboard_stats
+from main import pin_utils
+from main import tasks
+from main.enrichment_config import EMAIL_INDEX_MAX_FETCH_ATTEMPTS
+from main.models import (
+    BookingEmail, GmailSyncState, Guest, LockEvent, LockKeyboardPassword, PinProvisioningJob, PinTeardownJob, Reservation,
+    Room, RoomICalConfig, TTLock, UnlockCommand,
+)
+
+from main.services import ical_service
+from main.services.ical_service import (
+    _parse_ical_with_icalendar,
+    _StreamParseError,
+    iter_vevents,
+    parse_ical,
+)
+
+
+def _calendar(*events, newline='\r\n'):
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Test//EN']
+    for event in events:
+        lines.append('BEGIN:VEVENT')
+        lines.extend(event)
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return newline.join(lines) + newline
+
+
+BOOKING_FEED = _calendar(
+    [
+        'DTSTART;VALUE=DATE:20301101',
+        'DTEND;VALUE=DATE:20301104',
+        'UID:f1d2c3b4a5@booking.com',
+        'SUMMARY:CLOSED - Not available',
+    ],
+    [
+        'DTSTART;VALUE=DATE:20301110',
+        'DTEND;VALUE=DATE:20301112',
+        'UID:a9b8c7d6e5@booking.com',
+        'SUMMARY:Booking.com Reservation 5282674483',
+        'STATUS:confirmed',
+    ],
+)
+
+AIRBNB_FEED = _calendar(
+    [
+        'DTSTAMP:20301001T120000Z',
+        'DTSTART;VALUE=DATE:20301201',
+        'DTEND;VALUE=DATE:20301205',
+        'SUMMARY:Reserved',
+        'UID:1418fb94e984-1f1b8a1ba1a4c6d1a1c4c1c1c1c1c1c1@airbnb.com',
+        'DESCRIPTION:Reservation URL: https://www.airbnb.com/hosting/reservations/details/HMKHKPPZT',
+        ' Q\\nPhone Number (Last 4 Digits): 1234',
+    ],
+    [
+        'DTSTART;VALUE=DATE:20301220',
+        'DTEND;VALUE=DATE:20301222',
+        'SUMMARY:Airbnb (Not available)',
+        'UID:7f4c2b0f0c2e-aa@airbnb.com',
+        'STATUS:CANCELLED',
+    ],
+)
+
+EDGE_CASE_FEED = _calendar(
+    # Long folded SUMMARY with escaped characters
+    [
+        'UID:folded-1',
+        'SUMMARY:Guest\\, Name\\; with escapes and a very long summary that gets fo',
+        ' lded across lines 1234567890',
+        'DTSTART;VALUE=DATE:20300105',
+        'DTEND;VALUE=DATE:20300107',
+    ],
+    # Timed values in UTC and with a TZID param
+    [
+        'UID:timed-1',
+        'SUMMARY:Timed',
+        'DTSTART:20300210T150000Z',
+        'DTEND;TZID=Europe/London:20300212T110000',
+    ],
+    # Nested VALARM must not leak its properties into the event
+    [
+        'UID:alarm-1',
+        'SUMMARY:With alarm',
+        'DTSTART;VALUE=DATE:20300301',
+        'DTEND;VALUE=DATE:20300302',
+        'BEGIN:VALARM',
+        'ACTION:DISPLAY',
+        'SUMMARY:Alarm summary',
+        'STATUS:CANCELLED',
+        'TRIGGER:-PT15M',
+        'END:VALARM',
+    ],
+    # Missing DTEND - skipped by both parsers
+    [
+        'UID:missing-end',
+        'SUMMARY:Broken',
+        'DTSTART;VALUE=DATE:20300401',
+    ],
+)
+
+
+class ParseICalParityTests(SimpleTestCase):
+    """The streaming extractor must return exactly what the icalendar parser did."""
+
+    FIELDS = ('uid', 'summary', 'dtstart', 'dtend', 'status')
+
+    def assertParity(self, feed):
+        streamed = list(iter_vevents(feed))
+        legacy = _parse_ical_with_icalendar(feed)
+        self.assertEqual(
+            [{f: e[f] for f in self.FIELDS} for e in streamed],
+            [{f: e[f] for f in self.FIELDS} for e in legacy],
+        )
+        return streamed
+
+    def test_booking_feed(self):
+        events = self.assertParity(BOOKING_FEED)
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[1]['dtstart'], date(2030, 11, 10))
+        self.assertEqual(events[1]['status'], 'CONFIRMED')
+
+    def test_airbnb_feed(self):
+        events = self.assertParity(AIRBNB_FEED)
+        self.assertEqual([e['status'] for e in events], ['CONFIRMED', 'CANCELLED'])
+
+    def test_edge_cases(self):
+        events = self.assertParity(EDGE_CASE_FEED)
+        self.assertEqual([e['uid'] for e in events], ['folded-1', 'timed-1', 'alarm-1'])
+        self.assertTrue(events[0]['summary'].startswith('Guest, Name; with escapes'))
+        self.assertEqual(events[2]['summary'], 'With alarm')
+
+    def test_lf_line_endings(self):
+        self.assertParity(_calendar(*[['UID:lf', 'SUMMARY:LF', 'DTSTART;VALUE=DATE:20300101', 'DTEND;VALUE=DATE:20300102']], newline='\n'))
+
+    def test_empty_calendar(self):
+        self.assertEqual(self.assertParity(_calendar()), [])
+
+    def test_raw_is_sliced_from_input(self):
+        events = list(iter_vevents(BOOKING_FEED))
+        for event in events:
+            self.assertIn(event['raw'], BOOKING_FEED)
+            self.assertTrue(event['raw'].startswith('BEGIN:VEVENT'))
+            self.assertTrue(event['raw'].endswith('END:VEVENT'))
+            self.assertIn(event['uid'], event['raw'])
+
+    def test_parse_ical_uses_streaming_result(self):
+        self.assertEqual(parse_ical(BOOKING_FEED), list(iter_vevents(BOOKING_FEED)))
+
+
+class ParseICalFallbackTests(SimpleTestCase):
+
+    def test_unterminated_event_raises_stream_error(self):
+        feed = BOOKING_FEED.replace('END:VEVENT\r\nEND:VCALENDAR', 'END:VCALENDAR')
+        with self.assertRaises(_StreamParseError):
+            list(iter_vevents(feed))
+
+    def test_unsupported_date_falls_back_to_icalendar(self):
+        feed = _calendar(['UID:x', 'SUMMARY:Odd', 'DTSTART;VALUE=DATE:2030-01-01', 'DTEND;VALUE=DATE:20300102'])
+        with self.assertRaises(_StreamParseError):
+            list(iter_vevents(feed))
+        # parse_ical hands it to icalendar instead of guessing
+        self.assertEqual(parse_ical(feed), _parse_ical_with_icalendar(feed))
+
+    def test_not_a_calendar_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            parse_ical('<html>Service unavailable</html>')
+
+    def test_fallback_result_is_used(self):
+        with mock.patch.object(ical_service, 'iter_vevents', side_effect=_StreamParseError('forced')):
+            events = parse_ical(BOOKING_FEED)
+        self.assertEqual([e['uid'] for e in events], ['f1d2c3b4a5@booking.com', 'a9b8c7d6e5@booking.com'])
+
+
+def _stay_event(uid, summary, check_in, check_out):
+    """VEVENT lines for an all-day stay"""
+    return [
+        f'DTSTART;VALUE=DATE:{check_in:%Y%m%d}',
+        f'DTEND;VALUE=DATE:{check_out:%Y%m%d}',
+        f'UID:{uid}',
+        f'SUMMARY:{summary}',
+    ]
+
+
+class ICalSyncTestMixin:
+    """A room with an active Booking.com feed, synced from prefetched feed bodies"""
+
+    def setUp(self):
+        self.room = Room.objects.create(name='Room 1', video_url='https://example.com/room-1')
+        self.config = RoomICalConfig.objects.create(
+            room=self.room, booking_ical_url='https://ical.booking.com/v1/export?t=room-1', booking_active=True,
+        )
+
+    def _fetched(self, feed, etag='"v1"', last_modified='Mon, 01 Dec 2025 10:00:00 GMT'):
+        return {'not_modified': False, 'data': feed, 'etag': etag, 'last_modified': last_modified}
+
+    def _sync(self, *events, config=None, **fetched):
+        config = config or self.config
+        return ical_service.sync_reservations_for_room(config.id, 'booking', prefetched=self._fetched(_calendar(*events), **fetched))
+
+    def _reservation(self, uid, check_in, check_out, booking_reference='', **fields):
+        fields.setdefault('room', self.room)
+        fields.setdefault('guest_name', 'CLOSED - Not available')
+        return Reservation.objects.create(
+            ical_uid=uid, booking_reference=booking_reference,
+            check_in_date=check_in, check_out_date=check_out, **fields,
+        )
+
+
+class SyncReservationsForRoomTests(ICalSyncTestMixin, TestCase):
+
+    def test_query_count_does_not_grow_with_events(self):
+        def events(count, prefix):
+            start = date(2030, 1, 1)
+            return [
+                _stay_event(f'{prefix}-{i}@booking.com', f'Booking.com Reservation 55926{i:05d}',
+                            start + timedelta(days=3 * i), start + timedelta(days=3 * i + 2))
+                for i in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as five:
+            result = self._sync(*events(5, 'a'))
+        self.assertEqual(result['created'], 5)
+
+        other_room = Room.objects.create(name='Room 2', video_url='https://example.com/room-2')
+        other_config = RoomICalConfig.objects.create(
+            room=other_room, booking_ical_url='https://ical.booking.com/v1/export?t=room-2', booking_active=True,
+        )
+        with self.assertNumQueries(len(five.captured_queries)):
+            result = self._sync(*events(50, 'b'), config=other_config)
+        self.assertEqual(result['created'], 50)
+
+    def test_xls_row_is_relinked_by_booking_ref(self):
+        xls = self._reservation('xls_5592652301_20300105', date(2030, 1, 5), date(2030, 1, 7), '5592652301', guest_name='Jane Doe')
+
+        result = self._sync(_stay_event('ev1@booking.com', 'Booking.com Reservation 5592652301', date(2030, 1, 5), date(2030, 1, 8)))
+
+        self.assertEqual((result['created'], result['updated'], result['cancelled']), (0, 1, 0))
+        xls.refresh_from_db()
+        self.assertEqual(xls.ical_uid, 'ev1@booking.com')
+        self.assertEqual(xls.check_out_date, date(2030, 1, 8))
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_collision_with_enriched_booking_skips_placeholder(self):
+        # Case A: dates already held by a row with a booking_ref
+        self._reservation('xls_5592652301_20300105', date(2030, 1, 5), date(2030, 1, 7), '5592652301', guest_name='Jane Doe')
+
+        result = self._sync(_stay_event('closed@booking.com', 'CLOSED - Not available', date(2030, 1, 5), date(2030, 1, 7)))
+
+        self.assertEqual((result['created'], result['updated']), (0, 0))
+        self.assertFalse(Reservation.objects.filter(ical_uid='closed@booking.com').exists())
+
+    def test_collision_placeholder_is_replaced_by_event_with_booking_ref(self):
+        # Case B: placeholder (blocked from the other platform) takes the event's booking_ref
+        placeholder = self._reservation('blocked@airbnb.com', date(2030, 1, 5), date(2030, 1, 7), platform='airbnb')
+
+        result = self._sync(_stay_event('ev1@booking.com', 'Booking.com Reservation 5592652301', date(2030, 1, 5), date(2030, 1, 7)))
+
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        placeholder.refresh_from_db()
+        self.assertEqual(placeholder.booking_reference, '5592652301')
+        self.assertEqual(placeholder.guest_name, 'Booking.com Reservation 5592652301')
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_collision_between_placeholders_updates_existing_row(self):
+        # Case C: neither side has a booking_ref
+        placeholder = self._reservation('blocked@airbnb.com', date(2030, 1, 5), date(2030, 1, 7), platform='airbnb', guest_name='Airbnb (Not available)')
+
+        result = self._sync(_stay_event('closed@booking.com', 'CLOSED - Not available', date(2030, 1, 5), date(2030, 1, 7)))
+
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        placeholder.refresh_from_db()
+        self.assertEqual(placeholder.guest_name, 'CLOSED - Not available')
+        self.assertEqual(placeholder.booking_reference, '')
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_rows_missing_from_feed_are_cancelled_except_xls(self):
+        xls = self._reservation('xls_5592652301_20300105', date(2030, 1, 5), date(2030, 1, 7), '5592652301')
+        gone = self._reservation('gone@booking.com', date(2030, 2, 5), date(2030, 2, 7))
+
+        result = self._sync(_stay_event('ev1@booking.com', 'CLOSED - Not available', date(2030, 3, 5), date(2030, 3, 7)))
+
+        self.assertEqual((result['created'], result['cancelled']), (1, 1))
+        xls.refresh_from_db()
+        gone.refresh_from_db()
+        self.assertEqual(xls.status, 'confirmed')
+        self.assertEqual(gone.status, 'cancelled')
+
+    def test_cancelling_enriched_reservation_dispatches_handler_on_commit(self):
+        guest = Guest.objects.create(
+            full_name='Jane Doe', reservation_number='5592652301', assigned_room=self.room,
+            check_in_date=date(2030, 1, 5), check_out_date=date(2030, 1, 7),
+        )
+        enriched = self._reservation('ev1@booking.com', date(2030, 1, 5), date(2030, 1, 7), '5592652301', guest=guest)
+
+        with mock.patch('main.tasks.handle_reservation_cancellation.delay') as delay, \
+                mock.patch('main.tasks.trigger_enrichment_workflow_batch.delay'):
+            with self.captureOnCommitCallbacks() as callbacks:
+                result = self._sync(_stay_event('ev2@booking.com', 'CLOSED - Not available', date(2030, 3, 5), date(2030, 3, 7)))
+            delay.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(result['cancelled'], 1)
+        delay.assert_called_once_with(enriched.pk)
+
+    def test_one_enrichment_batch_dispatched_on_commit_per_sync(self):
+        events = [
+            _stay_event(f'ev{i}@booking.com', f'Booking.com Reservation 559265230{i}', date(2030, 1, 1 + 3 * i), date(2030, 1, 3 + 3 * i))
+            for i in range(3)
+        ]
+        with mock.patch('main.tasks.trigger_enrichment_workflow_batch.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._sync(*events)
+                delay.assert_not_called()
+
+            delay.assert_called_once()
+            self.assertCountEqual(delay.call_args.args[0], Reservation.objects.values_list('id', flat=True))
+
+            # Same bookings with new dates: updates only, nothing to enrich
+            delay.reset_mock()
+            events[0] = _stay_event('ev0@booking.com', 'Booking.com Reservation 5592652300', date(2030, 1, 1), date(2030, 1, 2))
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                result = self._sync(*events)
+
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        self.assertEqual(callbacks, [])
+        delay.assert_not_called()
+
+    def test_occupancy_and_dashboard_snapshot_follow_bulk_writes(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        stay = (tomorrow, tomorrow + timedelta(days=2))
+        self.assertIn(self.room.id, occupancy.free_room_ids(*stay))  # Indexes the room-year
+        self.assertEqual(dashboard_snapshot.get_dashboard_stats(tomorrow)['checking_in_today'], 0)  # Builds the snapshot
+
+        with mock.patch('main.tasks.trigger_enrichment_workflow_batch.delay'):
+            self._sync(_stay_event('ev1@booking.com', 'Booking.com Reservation 5592652301', *stay))
+
+        self.assertNotIn(self.room.id, occupancy.free_room_ids(*stay))
+        self.assertEqual(dashboard_snapshot.get_dashboard_stats(tomorrow)['checking_in_today'], 1)
+
+
+class ICalConditionalFetchTests(ICalSyncTestMixin, TestCase):
+
+    def _response(self, status, text='', headers=None):
+        return mock.Mock(status_code=status, text=text, headers=headers or {}, raise_for_status=mock.Mock())
+
+    def test_conditional_headers_sent_and_304_keeps_validators(self):
+        session = mock.Mock()
+        session.get.return_value = self._response(304)
+
+        result = ical_service.fetch_ical_feed_conditional(
+            'https://ical.booking.com/x', etag='"v1"', last_modified='Mon, 01 Dec 2025 10:00:00 GMT', session=session,
+        )
+
+        sent = session.get.call_args.kwargs['headers']
+        self.assertEqual(sent, {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Dec 2025 10:00:00 GMT'})
+        self.assertEqual(result, {
+            'not_modified': True, 'data': None,
+            'etag': '"v1"', 'last_modified': 'Mon, 01 Dec 2025 10:00:00 GMT',
+        })
+
+    def test_200_returns_body_and_new_validators(self):
+        session = mock.Mock()
+        session.get.return_value = self._response(200, BOOKING_FEED, {'ETag': '"v2"'})
+
+        result = ical_service.fetch_ical_feed_conditional('https://ical.booking.com/x', etag='"v1"', session=session)
+
+        self.assertEqual(result, {'not_modified': False, 'data': BOOKING_FEED, 'etag': '"v2"', 'last_modified': ''})
+
+    def test_not_modified_feed_skips_parsing_and_stores_validators(self):
+        fetched = {'not_modified': True, 'data': None, 'etag': '"v1"', 'last_modified': 'Mon, 01 Dec 2025 10:00:00 GMT'}
+        with mock.patch.object(ical_service, 'parse_ical') as parse:
+            result = ical_service.sync_reservations_for_room(self.config.id, 'booking', prefetched=fetched)
+
+        parse.assert_not_called()
+        self.assertTrue(result['unchanged'])
+        self.config.refresh_from_db()
+        self.assertEqual((self.config.booking_etag, self.config.booking_last_modified), ('"v1"', 'Mon, 01 Dec 2025 10:00:00 GMT'))
+        self.assertEqual(self.config.booking_last_sync_status, 'Unchanged: not modified (304)')
+
+    def test_unchanged_content_hash_skips_sync(self):
+        RoomICalConfig.objects.filter(pk=self.config.pk).update(booking_content_hash=ical_service.compute_ical_hash(BOOKING_FEED))
+
+        with mock.patch.object(ical_service, 'parse_ical') as parse:
+            result = ical_service.sync_reservations_for_room(self.config.id, 'booking', prefetched=self._fetched(BOOKING_FEED))
+
+        parse.assert_not_called()
+        self.assertTrue(result['unchanged'])
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_successful_sync_stores_validators_and_hash(self):
+        result = ical_service.sync_reservations_for_room(self.config.id, 'booking', prefetched=self._fetched(BOOKING_FEED))
+
+        self.assertEqual((result['created'], result['errors']), (2, []))
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.booking_etag, '"v1"')
+        self.assertEqual(self.config.booking_content_hash, ical_service.compute_ical_hash(BOOKING_FEED))
+
+    def test_validators_not_stored_when_sync_had_errors(self):
+        RoomICalConfig.objects.filter(pk=self.config.pk).update(booking_etag='"v0"', booking_content_hash='stale')
+
+        with mock.patch.object(ical_service, 'extract_booking_reference', side_effect=ValueError('boom')), \
+                self.assertLogs('main', level='ERROR'):
+            result = ical_service.sync_reservations_for_room(self.config.id, 'booking', prefetched=self._fetched(BOOKING_FEED))
+
+        self.assertEqual(len(result['errors']), 2)
+        self.config.refresh_from_db()
+        self.assertEqual((self.config.booking_etag, self.config.booking_last_modified, self.config.booking_content_hash), ('', '', ''))
+
+
+class PlanNextPollTests(SimpleTestCase):
+    now = datetime(2030, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+    def _config(self, interval=900, last_changed_at=None, errors=0, next_poll_at=None):
+        return SimpleNamespace(
+            room=None,
+            booking_poll_interval=interval,
+            booking_last_changed_at=last_changed_at,
+            booking_consecutive_errors=errors,
+            booking_next_poll_at=next_poll_at,
+        )
+
+    def _plan(self, config, outcome, arrivals_soon=False):
+        with mock.patch.object(ical_service, 'has_arrivals_soon', return_value=arrivals_soon):
+            return ical_service.plan_next_poll(config, 'booking', outcome, self.now)
+
+    def test_unchanged_quiet_feed_doubles_up_to_max(self):
+        intervals = []
+        config = self._config(interval=900)
+        for _ in range(5):
+            plan = self._plan(config, 'unchanged')
+            config.booking_poll_interval = plan['booking_poll_interval']
+            intervals.append(plan['booking_poll_interval'])
+
+        self.assertEqual(intervals, [1800, 3600, 7200, 7200, 7200])
+        self.assertEqual(plan['booking_next_poll_at'], self.now + timedelta(seconds=7200))
+        self.assertEqual(plan['booking_consecutive_errors'], 0)
+
+    def test_arrivals_soon_caps_backoff(self):
+        plan = self._plan(self._config(interval=3600), 'unchanged', arrivals_soon=True)
+        self.assertEqual(plan['booking_poll_interval'], ical_service.ICAL_POLL_ARRIVALS_MAX_INTERVAL)
+
+    def test_recent_change_keeps_feed_at_min_interval(self):
+        config = self._config(interval=3600, last_changed_at=self.now - timedelta(hours=1))
+        plan = self._plan(config, 'unchanged')
+        self.assertEqual(plan['booking_poll_interval'], ical_service.ICAL_POLL_MIN_INTERVAL)
+
+        # Outside the recent-change window the normal backoff applies again
+        config.booking_last_changed_at = self.now - timedelta(hours=ical_service.ICAL_POLL_RECENT_CHANGE_HOURS + 1)
+        self.assertEqual(self._plan(config, 'unchanged')['booking_poll_interval'], 7200)
+
+    def test_change_resets_interval_and_errors(self):
+        plan = self._plan(self._config(interval=7200, errors=3), 'changed')
+
+        self.assertEqual(plan['booking_poll_interval'], ical_service.ICAL_POLL_MIN_INTERVAL)
+        self.assertEqual(plan['booking_last_changed_at'], self.now)
+        self.assertEqual(plan['booking_consecutive_errors'], 0)
+
+    def test_errors_back_off_exponentially_up_to_cap(self):
+        intervals = []
+        config = self._config(interval=300)
+        for _ in range(5):
+            plan = self._plan(config, 'error')
+            config.booking_consecutive_errors = plan['booking_consecutive_errors']
+            intervals.append(plan['booking_poll_interval'])
+
+        self.assertEqual(intervals, [900, 1800, 3600, 3600, 3600])
+        self.assertEqual(plan['booking_consecutive_errors'], 5)
+
+    def test_is_feed_due(self):
+        self.assertTrue(ical_service.is_feed_due(self._config(), 'booking', self.now))
+        self.assertTrue(ical_service.is_feed_due(self._config(next_poll_at=self.now), 'booking', self.now))
+        self.assertFalse(ical_service.is_feed_due(self._config(next_poll_at=self.now + timedelta(seconds=1)), 'booking', self.now))
+
+
+class FakeFeedSession:
+    """requests.Session stand-in recording in-flight requests per host"""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
+
+    def get(self, url, headers=None, timeout=None):
+        return self.tracker.get(url)
+
+
+class FeedTracker:
+    """Serves BOOKING_FEED for every URL except failing ones, tracking per-host concurrency"""
+
+    def __init__(self, failing=(), delay=0):
+        self.failing = set(failing)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.sessions = []
+
+    def session(self):
+        session = FakeFeedSession(self)
+        self.sessions.append(session)
+        return session
+
+    def get(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+            self.max_in_flight[host] = max(self.max_in_flight.get(host, 0), self.in_flight[host])
+        try:
+            time.sleep(self.delay)
+            if url in self.failing:
+                raise requests.ConnectionError(f"Connection refused: {url}")
+            return mock.Mock(status_code=200, text=BOOKING_FEED, headers={}, raise_for_status=mock.Mock())
+        finally:
+            with self.lock:
+                self.in_flight[host] -= 1
+
+
+class FetchFeedsConcurrentlyTests(SimpleTestCase):
+
+    def _jobs(self, host, count):
+        return [{'key': (host, i), 'url': f'https://{host}/feed?t={i}'} for i in range(count)]
+
+    def test_per_host_limit_and_one_session_per_host(self):
+        tracker = FeedTracker(delay=0.02)
+        jobs = self._jobs('ical.booking.com', 6) + self._jobs('www.airbnb.com', 6)
+        with mock.patch.object(ical_service.requests, 'Session', tracker.session):
+            results = ical_service.fetch_feeds_concurrently(jobs, max_workers=8, per_host_limit=2)
+
+        self.assertEqual(len(tracker.sessions), 2)
+        self.assertEqual(tracker.max_in_flight, {'ical.booking.com': 2, 'www.airbnb.com': 2})
+        self.assertTrue(all(result['data'] == BOOKING_FEED for result in results.values()))
+
+    def test_failed_feed_is_returned_not_raised(self):
+        tracker = FeedTracker(failing={'https://ical.booking.com/feed?t=1'})
+        with mock.patch.object(ical_service.requests, 'Session', tracker.session), self.assertLogs('main', level='ERROR'):
+            results = ical_service.fetch_feeds_concurrently(self._jobs('ical.booking.com', 3))
+
+        self.assertIsInstance(results[('ical.booking.com', 1)], requests.ConnectionError)
+        self.assertEqual(results[('ical.booking.com', 0)]['data'], BOOKING_FEED)
+        self.assertEqual(results[('ical.booking.com', 2)]['data'], BOOKING_FEED)
+
+    def test_jobs_after_deadline_are_not_started(self):
+        tracker = FeedTracker()
+        with mock.patch.object(ical_service.requests, 'Session', tracker.session):
+            results = ical_service.fetch_feeds_concurrently(self._jobs('ical.booking.com', 3), deadline=time.monotonic() - 1)
+
+        self.assertEqual(results, {})
+        self.assertEqual(tracker.max_in_flight, {})
+
+
+@override_settings(ICAL_FETCH_MAX_WORKERS=4, ICAL_FETCH_PER_HOST_LIMIT=2, ICAL_POLL_TIME_BUDGET=200)
+class PollICalFeedsConcurrentlyTests(TestCase):
+
+    def setUp(self):
+        self.configs = [
+            RoomICalConfig.objects.create(
+                room=Room.objects.create(name=f'Room {i}', video_url=f'https://example.com/room-{i}'),
+                booking_ical_url=f'https://ical.booking.com/v1/export?t=room-{i}',
+                booking_active=True,
+            )
+            for i in (1, 2)
+        ]
+
+    def _poll(self):
+        return tasks._poll_all_ical_feeds_concurrently(RoomICalConfig.objects.select_related('room'))
+
+    def test_one_feed_failing_does_not_affect_the_others(self):
+        tracker = FeedTracker(failing={self.configs[1].booking_ical_url})
+        with mock.patch.object(ical_service.requests, 'Session', tracker.session), self.assertLogs('main', level='ERROR'):
+            summary = self._poll()
+
+        self.assertEqual(summary, "Synced 1, unchanged 0, failed 1, deferred 0 platform feed(s)")
+        self.assertEqual(Reservation.objects.filter(room=self.configs[0].room).count(), 2)
+        failed = RoomICalConfig.objects.get(pk=self.configs[1].pk)
+        self.assertTrue(failed.booking_last_sync_status.startswith('Error:'))
+        self.assertEqual(failed.booking_consecutive_errors, 1)
+
+    def test_syncs_past_time_budget_are_deferred_most_overdue_first(self):
+        RoomICalConfig.objects.filter(pk=self.configs[0].pk).update(booking_next_poll_at=timezone.now() - timedelta(minutes=5))
+        clock = [0]
+        synced = []
+
+        def sync(config_id, platform, prefetched):
+            synced.append(config_id)
+            clock[0] += 500  # Blows the whole budget
+            return {'success': True, 'unchanged': False, 'created': 0, 'updated': 0, 'cancelled': 0, 'errors': []}
+
+        fetched = {(config.id, 'booking'): {} for config in self.configs}
+        with mock.patch.object(ical_service, 'fetch_feeds_concurrently', return_value=fetched), \
+                mock.patch.object(ical_service, 'sync_reservations_for_room', side_effect=sync), \
+                mock.patch.object(tasks.time, 'monotonic', side_effect=lambda: clock[0]), \
+                self.assertLogs('main', level='WARNING'):
+            summary = self._poll()
+
+        # Never-polled feed first; the overdue one waits for the next tick
+        self.assertEqual(synced, [self.configs[1].id])
+        self.assertEqual(summary, "Synced 1, unchanged 0, failed 0, deferred 1 platform feed(s)")
+
+
+class CheckinPinStatusViewTests(TestCase):
+
+    def setUp(self):
+        self.client = Client(HTTP_HOST='localhost')
+        room = Room.objects.create(name='Room 1', video_url='https://example.com/room-1')
+        self.reservation = Reservation.objects.create(
+            room=room, ical_uid='ev1@booking.com', booking_reference='5592652301', guest_name='Jane Doe',
+            check_in_date=timezone.localdate() + timedelta(days=1), check_out_date=timezone.localdate() + timedelta(days=3),
+        )
+
+    def _start_flow(self, **flow):
+        session = self.client.session
+        session['checkin_flow'] = {'reservation_id': self.reservation.id, 'booking_ref': '5592652301', 'step': 1, **flow}
+        session.save()
+        return session.session_key
+
+    def _submit_details(self):
+        with mock.patch('main.checkin_views.generate_checkin_pin_background.delay') as delay:
+            response = self.client.post(reverse('checkin_details'), {
+                'full_name': 'Jane Doe', 'phone_number': '+447911123456', 'country_code': '+44',
+            })
+        self.assertRedirects(response, reverse('checkin_parking'), fetch_redirect_response=False)
+        return delay
+
+    def _status(self):
+        response = self.client.get(reverse('checkin_pin_status'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_details_step_creates_job_and_starts_generation(self):
+        session_key = self._start_flow()
+        delay = self._submit_details()
+
+        job = PinProvisioningJob.objects.get()
+        self.assertEqual((job.session_key, job.guest_name, job.status), (session_key, 'Jane Doe', 'pending'))
+        delay.assert_called_once_with(job.id)
+        self.assertEqual(self.client.session['checkin_flow']['pin_job_id'], job.id)
+
+    def test_details_step_claims_ready_preprovisioned_job(self):
+        valid_from, valid_until = pin_provisioning.reservation_pin_window(self.reservation)
+        job = PinProvisioningJob.objects.create(
+            reservation=self.reservation, is_preprovisioned=True, status='ready', pin='4826',
+            valid_from=valid_from, valid_until=valid_until,
+        )
+        session_key = self._start_flow()
+        delay = self._submit_details()
+
+        delay.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual((job.session_key, job.guest_name), (session_key, 'Jane Doe'))
+        self.assertEqual(PinProvisioningJob.objects.count(), 1)
+        self.assertTrue(self._status()['ready'])
+
+    def test_pending_job_asks_to_poll_again(self):
+        session_key = self._start_flow()
+        job = PinProvisioningJob.objects.create(reservation=self.reservation, session_key=session_key)
+        self._start_flow(pin_job_id=job.id)
+
+        self.assertEqual(self._status(), {'ready': False, 'failed': False, 'error': None, 'retry_after_ms': 1000})
+
+    def test_ready_and_failed_jobs(self):
+        session_key = self._start_flow()
+        job = PinProvisioningJob.objects.create(reservation=self.reservation, session_key=session_key, status='ready', pin='4826')
+        self._start_flow(pin_job_id=job.id)
+        status = self._status()
+        self.assertEqual((status['ready'], status['failed'], status['error']), (True, False, None))
+
+        PinProvisioningJob.objects.filter(pk=job.pk).update(status='failed', error='Lock offline')
+        status = self._status()
+        self.assertEqual((status['ready'], status['failed'], status['error']), (False, True, 'Lock offline'))
+
+    def test_job_of_another_session_is_not_visible(self):
+        job = PinProvisioningJob.objects.create(reservation=self.reservation, session_key='someone-else', status='ready')
+        self._start_flow(pin_job_id=job.id)
+
+        status = self._status()
+        self.assertEqual((status['ready'], status['failed']), (False, True))
+
+    def test_legacy_session_keys_are_ignored(self):
+        # Results used to be written into the session by the task
+        self._start_flow(pin_generated=True, pin='4826', pin_error=None)
+
+        status = self._status()
+        self.assertEqual((status['ready'], status['failed'], status['error']), (False, True, 'PIN generation was not started'))
+
+
+class FakeGmailTransport:
+    """
+    httplib2.Http stand-in serving messages.list, messages.get and the batch endpoint
+
+    Records every HTTP round-trip in self.requests as (method, uri).
+    """
+
+    def __init__(self, messages, failures=None):
+        # messages: {message_id: (subject, date header, from, label_ids)}
+        # failures: {message_id: [HTTP status, ...]} answered (in order) before the message itself
+        self.messages = messages
+        self.failures = {message_id: list(statuses) for message_id, statuses in (failures or {}).items()}
+        self.requests = []
+
+    def _message(self, message_id, query):
+        subject, date_str, sender, labels = self.messages[message_id]
+        wanted = query.get('metadataHeaders', [])
+        headers = [
+            {'name': name, 'value': value}
+            for name, value in (('Subject', subject), ('Date', date_str), ('From', sender))
+            if name in wanted
+        ]
+        return {'id': message_id, 'labelIds': labels, 'payload': {'headers': headers}}
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        self.requests.append((method, uri))
+        parsed = urlparse(uri)
+
+        if parsed.path == '/batch':
+            boundary = 'fake_batch_boundary'
+            parts = []
+            for content_id, path in re.findall(r'Content-ID: <([^>]+)>.*?GET (\S+) HTTP', body.decode() if isinstance(body, bytes) else body, re.S):
+                part = urlparse(path)
+                message_id = part.path.rsplit('/', 1)[-1]
+                query = parse_qs(part.query)
+                if self.failures.get(message_id):
+                    code = self.failures[message_id].pop(0)
+                    status, payload = f'{code} Error', {'error': {'code': code, 'message': 'Error'}}
+                elif message_id in self.messages:
+                    status, payload = '200 OK', self._message(message_id, query)
+                else:
+                    status, payload = '404 Not Found', {'error': {'code': 404, 'message': 'Not Found'}}
+                parts.append(
+                    f'--{boundary}\r\nContent-Type: application/http\r\n'
+                    f'Content-ID: <response-{content_id}>\r\n\r\n'
+                    f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n'
+                )
+            content = ''.join(parts) + f'--{boundary}--'
+            return httplib2.Response({'status': '200', 'content-type': f'multipart/mixed; boundary={boundary}'}), content.encode()
+
+        if parsed.path.endswith('/messages'):
+            payload = {'messages': [{'id': message_id} for message_id in self.messages]}
+            return httplib2.Response({'status': '200'}), json.dumps(payload).encode()
+
+        raise AssertionError(f"Unexpected Gmail request: {method} {uri}")
+
+
+@override_settings(GMAIL_BATCH_SIZE=50)
+class GmailClientBatchFetchTests(SimpleTestCase):
+
+    def _client(self, count=3, batch_size=None, failures=None, **overrides):
+        messages = {
+            f'msg{i}': (
+                f'Booking.com - New booking! (55926523{i:02d}, Saturday, 20 December 2025)',
+                f'Mon, {i + 1:02d} Dec 2025 10:00:00 +0000',
+                'Booking.com <noreply@booking.com>',
+                ['INBOX', 'UNREAD'] if i % 2 == 0 else ['INBOX'],
+            )
+            for i in range(count)
+        }
+        messages.update(overrides)
+        transport = FakeGmailTransport(messages, failures)
+        service = build('gmail', 'v1', http=transport, static_discovery=True)
+        return GmailClient(service=service, batch_size=batch_size), transport
+
+    def _gets(self, transport):
+        return [uri for method, uri in transport.requests if '/messages/' in uri]
+
+    def test_recent_emails_use_one_batch_round_trip(self):
+        gmail, transport = self._client(count=5)
+        emails = gmail.get_recent_booking_emails(max_results=10, lookback_days=30)
+
+        self.assertEqual(len(emails), 5)
+        # One list call + one batch call, no per-message GETs
+        self.assertEqual([uri.split('?')[0].rsplit('/', 1)[-1] for _, uri in transport.requests], ['messages', 'batch'])
+        self.assertEqual(self._gets(transport), [])
+        # Unread first, then newest first
+        self.assertEqual([e['id'] for e in emails], ['msg4', 'msg2', 'msg0', 'msg3', 'msg1'])
+        self.assertTrue(emails[0]['is_unread'])
+        self.assertEqual(emails[0]['received_at'].day, 5)
+
+    def test_batches_are_split_by_batch_size(self):
+        gmail, transport = self._client(count=5, batch_size=2)
+        emails = gmail.get_unread_booking_emails()
+
+        self.assertEqual(len(emails), 5)
+        self.assertEqual(sum(1 for _, uri in transport.requests if uri.endswith('/batch')), 3)
+
+    def test_batch_size_defaults_to_setting(self):
+        with override_settings(GMAIL_BATCH_SIZE=7):
+            gmail, _ = self._client()
+        self.assertEqual(gmail.batch_size, 7)
+
+    def test_metadata_format_and_headers_requested(self):
+        gmail, transport = self._client(count=1)
+        captured = []
+        original = transport.request
+
+        def capture(uri, method='GET', body=None, headers=None, **kwargs):
+            if uri.endswith('/batch'):
+                captured.append(body.decode() if isinstance(body, bytes) else body)
+            return original(uri, method, body, headers, **kwargs)
+
+        transport.request = capture
+        gmail.get_recent_booking_emails()
+
+        self.assertIn('format=metadata', captured[0])
+        self.assertIn('metadataHeaders=Subject', captured[0])
+        self.assertIn('metadataHeaders=Date', captured[0])
+        self.assertNotIn('format=full', captured[0])
+
+    def test_failed_and_subjectless_messages_are_skipped(self):
+        gmail, transport = self._client(count=2, blank=('', 'Mon, 01 Dec 2025 10:00:00 +0000', 'noreply@booking.com', []))
+        listed = [{'id': message_id} for message_id in [*transport.messages, 'gone']]
+        with self.assertLogs('main', level='ERROR'):
+            emails = gmail._emails_from_messages(listed)
+
+        self.assertEqual(sorted(e['id'] for e in emails), ['msg0', 'msg1'])
+
+    def test_get_booking_emails_filters_sender(self):
+        gmail, _ = self._client(count=1, other=('Hello', 'Mon, 01 Dec 2025 10:00:00 +0000', 'friend@example.com', ['UNREAD']))
+        emails = gmail.get_booking_emails(['msg0', 'other'])
+
+        self.assertEqual([e['id'] for e in emails], ['msg0'])
+
+    @mock.patch('main.services.gmail_client.time.sleep')
+    def test_rate_limited_and_server_errors_are_retried(self, sleep):
+        gmail, transport = self._client(count=3, failures={'msg1': [429], 'msg2': [503, 500]})
+        emails = gmail.get_booking_emails(['msg0', 'msg1', 'msg2'])
+
+        self.assertEqual([e['id'] for e in emails], ['msg0', 'msg1', 'msg2'])
+        self.assertEqual(sum(1 for _, uri in transport.requests if uri.endswith('/batch')), 3)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1, 2])
+
+    @mock.patch('main.services.gmail_client.time.sleep')
+    def test_items_still_failing_after_retries_are_raised(self, sleep):
+        gmail, transport = self._client(count=3, failures={'msg1': [429] * gmail_client.BATCH_RETRY_ATTEMPTS})
+        with self.assertLogs('main', level='ERROR'):
+            with self.assertRaises(gmail_client.GmailFetchIncomplete) as raised:
+                gmail.get_booking_emails(['msg0', 'msg1', 'msg2', 'gone'])
+
+        # 404 is "gone", 429 is retried until the attempts run out
+        self.assertEqual(raised.exception.failed_ids, {'msg1'})
+        self.assertEqual(sum(1 for _, uri in transport.requests if uri.endswith('/batch')), gmail_client.BATCH_RETRY_ATTEMPTS)
+
+    @mock.patch('main.services.gmail_client.time.sleep')
+    def test_permanent_errors_are_skipped_not_retried(self, sleep):
+        gmail, transport = self._client(count=3, failures={'msg1': [403], 'msg2': [400]})
+        with self.assertLogs('main', level='ERROR') as logs:
+            emails = gmail.get_recent_booking_emails()
+
+        self.assertEqual([e['id'] for e in emails], ['msg0'])
+        self.assertEqual(sum(1 for _, uri in transport.requests if uri.endswith('/batch')), 1)
+        self.assertTrue(any('msg1' in line and 'skipping' in line for line in logs.output))
+        sleep.assert_not_called()
+
+
+class BookingEmailIndexSyncTests(TestCase):
+
+    def setUp(self):
+        GmailSyncState.objects.create(pk=1, last_history_id='100')
+        self.gmail = mock.Mock(spec=GmailClient)
+        self.gmail.list_history_changes.return_value = (
+            {'added': {'msg1', 'msg2'}, 'deleted': set(), 'unread': {}}, '200',
+        )
+
+    def _email(self, message_id):
+        return {
+            'id': message_id,
+            'subject': 'Booking.com - New booking! (5592652301, Saturday, 20 December 2025)',
+            'received_at': datetime.now(dt_timezone.utc),
+            'is_unread': True,
+        }
+
+    def test_history_id_moves_once_every_new_message_is_fetched(self):
+        self.gmail.get_booking_emails.return_value = [self._email('msg1')]
+        result = sync_booking_email_index(self.gmail)
+
+        self.assertEqual(result['upserted'], 1)
+        self.assertEqual(set(self.gmail.get_booking_emails.call_args.args[0]), {'msg1', 'msg2'})
+        self.assertEqual(GmailSyncState.get_state().last_history_id, '200')
+
+    def test_failed_fetch_keeps_history_id(self):
+        self.gmail.get_booking_emails.side_effect = gmail_client.GmailFetchIncomplete({'msg2'})
+        with self.assertRaises(gmail_client.GmailFetchIncomplete):
+            sync_booking_email_index(self.gmail)
+
+        self.assertEqual(GmailSyncState.get_state().last_history_id, '100')
+        self.assertFalse(BookingEmail.objects.exists())
+
+    def test_checkpoint_moved_by_another_worker_is_not_overwritten(self):
+        def concurrent_sync(message_ids):
+            GmailSyncState.objects.filter(pk=1).update(last_history_id='300')
+            return [self._email('msg1')]
+
+        self.gmail.get_booking_emails.side_effect = concurrent_sync
+        with self.assertLogs('main', level='INFO'):
+            result = sync_booking_email_index(self.gmail)
+
+        self.assertEqual(result['mode'], 'skipped')
+        self.assertEqual(GmailSyncState.get_state().last_history_id, '300')
+        self.assertFalse(BookingEmail.objects.exists())
+
+    def test_message_failing_on_every_run_is_skipped_after_max_attempts(self):
+        def fetch(message_ids):
+            if 'msg2' in message_ids:
+                raise gmail_client.GmailFetchIncomplete({'msg2'})
+            return [self._email(message_id) for message_id in message_ids]
+
+        self.gmail.get_booking_emails.side_effect = fetch
+        with self.assertLogs('main', level='ERROR') as logs:
+            for _ in range(EMAIL_INDEX_MAX_FETCH_ATTEMPTS):
+                with self.assertRaises(gmail_client.GmailFetchIncomplete):
+                    sync_booking_email_index(self.gmail)
+        self.assertIn('msg2', logs.output[-1])
+        self.assertEqual(GmailSyncState.get_state().last_history_id, '100')
+
+        result = sync_booking_email_index(self.gmail)
+
+        self.assertEqual(result['upserted'], 1)
+        state = GmailSyncState.get_state()
+        self.assertEqual(state.last_history_id, '200')
+        self.assertEqual(state.failed_fetches, {'msg2': EMAIL_INDEX_MAX_FETCH_ATTEMPTS})
+        self.assertEqual(list(BookingEmail.objects.values_list('message_id', flat=True)), ['msg1'])
+
+    def test_failure_count_resets_once_message_is_fetched(self):
+        GmailSyncState.objects.filter(pk=1).update(failed_fetches={'msg2': 2})
+        self.gmail.get_booking_emails.return_value = [self._email('msg1'), self._email('msg2')]
+
+        sync_booking_email_index(self.gmail)
+
+        self.assertEqual(GmailSyncState.get_state().failed_fetches, {})
+
+    @mock.patch('main.services.booking_email_index.sync_booking_email_index')
+    @mock.patch('main.services.gmail_client.GmailClient')
+    def test_stale_index_is_logged_as_error_by_matcher(self, _gmail_class, sync):
+        sync.side_effect = gmail_client.GmailFetchIncomplete({'msg2'})
+        GmailSyncState.objects.filter(pk=1).update(last_synced_at=timezone.now() - timedelta(hours=1))
+
+        with self.assertLogs('main.tasks', level='ERROR') as logs:
+            tasks._sync_email_index()
+        self.assertIn('stale', logs.output[0])
+
+        GmailSyncState.objects.filter(pk=1).update(last_synced_at=timezone.now())
+        with self.assertLogs('main.tasks', level='WARNING') as logs:
+            tasks._sync_email_index()
+        self.assertTrue(all(line.startswith('WARNING') for line in logs.output))
+
+
+class GmailServiceCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        gmail_client.reset_service_cache()
+        self.stats_before = gmail_client.get_service_cache_stats()
+        self.creds = mock.Mock(refresh_token='refresh', valid=True)
+        self.creds.expiry = datetime.now(dt_timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+        self.builds = 0
+
+        def fake_authenticate(client):
+            self.builds += 1
+            client.service = object()
+            client.creds = self.creds
+
+        patcher = mock.patch.object(GmailClient, '_authenticate', fake_authenticate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(gmail_client.reset_service_cache)
+
+    def delta(self):
+        after = gmail_client.get_service_cache_stats()
+        return {key: after[key] - self.stats_before[key] for key in after}
+
+    def test_service_is_built_once_per_process(self):
+        first = GmailClient()
+        second = GmailClient()
+
+        self.assertIs(first.service, second.service)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(self.delta(), {'hits': 1, 'misses': 1, 'refreshes': 0})
+
+    def test_credentials_refreshed_when_close_to_expiry(self):
+        GmailClient()
+        self.creds.expiry = datetime.now(dt_timezone.utc).replace(tzinfo=None) + timedelta(minutes=1)
+        with mock.patch.object(GmailClient, '_save_token') as save_token:
+            GmailClient()
+
+        self.creds.refresh.assert_called_once()
+        save_token.assert_called_once_with(self.creds)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(self.delta(), {'hits': 1, 'misses': 1, 'refreshes': 1})
+
+    def test_failed_refresh_drops_cache(self):
+        GmailClient()
+        self.creds.valid = False
+        self.creds.refresh.side_effect = Exception('invalid_grant')
+        with self.assertRaises(Exception), self.assertLogs('main', level='ERROR'):
+            GmailClient()
+
+        self.creds.refresh.side_effect = None
+        self.creds.valid = True
+        GmailClient()
+        self.assertEqual(self.builds, 2)
+
+    def test_forked_process_rebuilds(self):
+        GmailClient()
+        with mock.patch.object(gmail_client.os, 'getpid', return_value=-1):
+            GmailClient()
+        self.assertEqual(self.builds, 2)
+
+
+class PlanEmailMatchesTests(SimpleTestCase):
+    SYNCED_AT = datetime(2030, 5, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+    def reservation(self, pk, check_in, minutes=0):
+        return SimpleNamespace(id=pk, check_in_date=check_in, created_at=self.SYNCED_AT + timedelta(minutes=minutes))
+
+    def email(self, ref, check_in, minutes=0, message_id=None):
+        return SimpleNamespace(
+            message_id=message_id or f'm-{ref}',
+            booking_reference=ref,
+            check_in_date=check_in,
+            received_at=self.SYNCED_AT + timedelta(minutes=minutes),
+            is_unread=True,
+        )
+
+    def test_single_email_matches_all_rooms_on_date(self):
+        d = date(2030, 6, 1)
+        plan = plan_email_matches(
+            [self.reservation(1, d), self.reservation(2, d, minutes=1)],
+            [self.email('5000000001', d, minutes=3)],
+            existing_refs=set(),
+        )
+        self.assertEqual(len(plan['matched']), 1)
+        self.assertEqual([r.id for r in plan['matched'][0]['reservations']], [1, 2])
+        self.assertAlmostEqual(plan['matched'][0]['time_diff_hours'], 0.05)
+        self.assertEqual(plan['collisions'], [])
+
+    def test_existing_refs_are_not_candidates(self):
+        d = date(2030, 6, 1)
+        plan = plan_email_matches(
+            [self.reservation(1, d)],
+            [self.email('5000000001', d), self.email('5000000002', d, minutes=90)],
+            existing_refs={'5000000001'},
+        )
+        self.assertEqual(plan['matched'][0]['email'].booking_reference, '5000000002')
+
+    def test_different_refs_same_date_are_a_collision_ranked_by_proximity(self):
+        d = date(2030, 6, 1)
+        plan = plan_email_matches(
+            [self.reservation(1, d)],
+            [self.email('5000000001', d, minutes=-600), self.email('5000000002', d, minutes=5)],
+            existing_refs=set(),
+        )
+        self.assertEqual(plan['matched'], [])
+        self.assertEqual([e.booking_reference for e in plan['collisions'][0]['emails']], ['5000000002', '5000000001'])
+
+    def test_repeat_emails_for_one_ref_are_not_a_collision(self):
+        d = date(2030, 6, 1)
+        plan = plan_email_matches(
+            [self.reservation(1, d)],
+            [self.email('5000000001', d, minutes=2, message_id='new'), self.email('5000000001', d, minutes=300, message_id='mod')],
+            existing_refs=set(),
+        )
+        self.assertEqual(plan['collisions'], [])
+        self.assertEqual(plan['matched'][0]['email'].message_id, 'new')
+
+    def test_dates_without_emails_are_unmatched(self):
+        plan = plan_email_matches(
+            [self.reservation(1, date(2030, 6, 1)), self.reservation(2, date(2030, 6, 2))],
+            [self.email('5000000001', date(2030, 6, 2))],
+            existing_refs=set(),
+        )
+        self.assertEqual([r.id for r in plan['unmatched']], [1])
+        self.assertEqual(plan['matched'][0]['check_in_date'], date(2030, 6, 2))
+
+
+class FakeTTLockClient:
+    """Records PIN calls; lock IDs in `fail` return an error, in `raises` raise"""
+
+    def __init__(self, fail=(), raises=(), barrier=None):
+        self.fail = set(fail)
+        self.raises = set(raises)
+        self.barrier = barrier
+        self.deleted = []
+        self._next_id = 100
+        self._lock = threading.Lock()
+
+    def generate_temporary_pin(self, lock_id, pin, start_time, end_time, name=None, add_type=2):
+        if self.barrier:
+            # Only passes once every lock call is in flight at the same time
+            self.barrier.wait(timeout=5)
+        if lock_id in self.raises:
+            raise ConnectionError('timed out')
+        if lock_id in self.fail:
+            return {'errcode': -3, 'errmsg': 'lock offline'}
+        with self._lock:
+            self._next_id += 1
+            return {'keyboardPwdId': self._next_id}
+
+    def delete_pin(self, lock_id, keyboard_pwd_id):
+        with self._lock:
+            self.deleted.append((lock_id, keyboard_pwd_id))
+        return {'errcode': 0}
+
+
+class ProvisionPinsTests(SimpleTestCase):
+    targets = [
+        PinTarget('front_door', 1, 'Front Door', 'front door'),
+        PinTarget('room_a', 2, 'Room A', 'room (A)'),
+        PinTarget('room_b', 3, 'Room B', 'room (B)'),
+    ]
+
+    def test_creates_pin_on_every_lock_concurrently(self):
+        client = FakeTTLockClient(barrier=threading.Barrier(len(self.targets)))
+        pin_ids = provision_pins(client, '1234', 0, 1, self.targets)
+        self.assertEqual(set(pin_ids), {'front_door', 'room_a', 'room_b'})
+        self.assertEqual(len(set(pin_ids.values())), 3)
+        self.assertEqual(client.deleted, [])
+
+    def test_failure_rolls_back_created_pins(self):
+        client = FakeTTLockClient(fail={'3'})
+        with self.assertLogs('main', level='ERROR'):
+            with self.assertRaises(PinProvisioningError) as ctx:
+                provision_pins(client, '1234', 0, 1, self.targets)
+        self.assertEqual(ctx.exception.failures, {'room_b': 'lock offline'})
+        self.assertEqual(str(ctx.exception), 'Failed to generate room (B) PIN: lock offline')
+        self.assertEqual(sorted(lock_id for lock_id, _ in client.deleted), ['1', '2'])
+
+    def test_exception_counts_as_failure(self):
+        client = FakeTTLockClient(raises={'1'})
+        with self.assertLogs('main', level='ERROR'):
+            with self.assertRaises(PinProvisioningError) as ctx:
+                provision_pins(client, '1234', 0, 1, self.targets[:2])
+        self.assertEqual(ctx.exception.failures, {'front_door': 'timed out'})
+        self.assertEqual([lock_id for lock_id, _ in client.deleted], ['2'])
+
+
+class ReservationPinWindowTests(SimpleTestCase):
+    def test_defaults_to_2pm_check_in_and_day_after_11am_check_out(self):
+        reservation = SimpleNamespace(
+            check_in_date=date(2030, 7, 1), check_out_date=date(2030, 7, 3),
+            early_checkin_time=None, late_checkout_time=None,
+        )
+        valid_from, valid_until = reservation_pin_window(reservation)
+        # BST: 14:00 London is 13:00 UTC
+        self.assertEqual(valid_from.astimezone(dt_timezone.utc), datetime(2030, 7, 1, 13, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(valid_until.astimezone(dt_timezone.utc), datetime(2030, 7, 4, 10, 0, tzinfo=dt_timezone.utc))
+
+    def test_uses_reservation_times(self):
+        reservation = SimpleNamespace(
+            check_in_date=date(2030, 1, 10), check_out_date=date(2030, 1, 11),
+            early_checkin_time=datetime(2000, 1, 1, 12, 0).time(),
+            late_checkout_time=datetime(2000, 1, 1, 13, 30).time(),
+        )
+        valid_from, valid_until = reservation_pin_window(reservation)
+        self.assertEqual(valid_from.astimezone(dt_timezone.utc), datetime(2030, 1, 10, 12, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(valid_until.astimezone(dt_timezone.utc), datetime(2030, 1, 12, 13, 30, tzinfo=dt_timezone.utc))
+
+
+def _http_response(status, body=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body if body is not None else {}).encode()
+    return response
+
+
+@override_settings(
+    TTLOCK_CONNECT_TIMEOUT=1, TTLOCK_READ_TIMEOUT=1, TTLOCK_REQUEST_DEADLINE=30,
+    TTLOCK_MAX_RETRIES=2, TTLOCK_BACKOFF_BASE=0, TTLOCK_POOL_SIZE=2,
+    TTLOCK_CIRCUIT_FAILURE_THRESHOLD=3, TTLOCK_CIRCUIT_RESET_SECONDS=60,
+)
+class TTLockTransportTests(SimpleTestCase):
+    url = 'https://ttlock.invalid/v3/lock/unlock'
+
+    def setUp(self):
+        self.transport = TTLockTransport()
+        patcher = mock.patch.object(self.transport.session, 'request')
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_5xx_and_busy_gateway_then_succeeds(self):
+        self.send.side_effect = [
+            _http_response(503),
+            _http_response(200, {'errcode': -3003, 'errmsg': 'gateway busy'}),
+            _http_response(200, {'errcode': 0}),
+        ]
+        with self.assertLogs('main', level='WARNING'):
+            result = self.transport.request('POST', self.url, '/lock/unlock')
+        self.assertEqual(result, {'errcode': 0})
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual(self.send.call_args.kwargs['timeout'], (1, 1))
+        stats = self.transport.stats()['endpoints']['/lock/unlock']
+        self.assertEqual((stats['calls'], stats['errors'], stats['retries']), (1, 0, 2))
+
+    def test_non_idempotent_call_is_not_retried_after_read_timeout(self):
+        self.send.side_effect = requests.ReadTimeout('read timed out')
+        with self.assertRaises(requests.ReadTimeout):
+            self.transport.request('POST', self.url, '/keyboardPwd/add', retry_unsent_only=True)
+        self.assertEqual(self.send.call_count, 1)
+
+    def test_circuit_opens_and_fails_fast(self):
+        self.send.side_effect = requests.ConnectionError('connection reset')
+        with self.assertLogs('main', level='WARNING'):
+            with self.assertRaises(requests.ConnectionError):
+                self.transport.request('GET', self.url, '/lock/queryStatus')
+        self.assertEqual(self.send.call_count, 3)  # Third failure opens the circuit
+        self.assertEqual(self.transport.stats()['circuit'], 'open')
+
+        with self.assertRaises(TTLockUnavailable):
+            self.transport.request('GET', self.url, '/lock/queryStatus')
+        self.assertEqual(self.send.call_count, 3)
+
+    def test_deadline_stops_retries(self):
+        self.transport.deadline = 1.5  # Not enough for a second attempt at full timeouts
+        self.send.side_effect = [_http_response(502), _http_response(200, {'errcode': 0})]
+        with self.assertRaises(requests.HTTPError):
+            self.transport.request('POST', self.url, '/lock/unlock')
+        self.assertEqual(self.send.call_count, 1)
+
+
+class TTLockTokenCacheTests(SimpleTestCase):
+    def setUp(self):
+        ttlock_service.reset_token_cache()
+        self.addCleanup(ttlock_service.reset_token_cache)
+        self.tokens = iter(['token-1', 'token-2'])
+        patcher = mock.patch.object(ttlock_service.TTLockService, 'load_valid_token', autospec=True, side_effect=self._load)
+        self.load = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _load(self, service, stale_access_token=None):
+        return SimpleNamespace(access_token=next(self.tokens), expires_at=datetime.now(dt_timezone.utc) + timedelta(days=30))
+
+    def test_token_is_loaded_once_per_process(self):
+        self.assertEqual(ttlock_service.get_access_token(), 'token-1')
+        self.assertEqual(ttlock_service.get_access_token(), 'token-1')
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_concurrent_cold_callers_load_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(ttlock_service.get_access_token())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['token-1'] * 8)
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_rejected_token_is_invalidated_once(self):
+        ttlock_service.get_access_token()
+        self.assertEqual(ttlock_service.get_access_token(stale_access_token='token-1'), 'token-2')
+        self.assertEqual(self.load.call_args.args[1], 'token-1')
+        # A second caller still holding the old token gets the new one without another reload
+        self.assertEqual(ttlock_service.get_access_token(stale_access_token='token-1'), 'token-2')
+        self.assertEqual(self.load.call_count, 2)
+
+
+class DeletePinIdempotentTests(SimpleTestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.limiter = RateLimiter(0)
+
+    def test_deleted(self):
+        self.assertEqual(delete_pin_idempotent(self.client, self.limiter, 1, '55'), (True, None))
+        self.client.list_keyboard_passwords.assert_not_called()
+
+    def test_rejected_delete_of_missing_pin_counts_as_deleted(self):
+        self.client.delete_pin.side_effect = TTLockAPIError('TTLock API error: gone', -1)
+        self.client.list_keyboard_passwords.side_effect = [
+            {'list': [{'keyboardPwdId': 1}], 'pages': 2},
+            {'list': [{'keyboardPwdId': 2}], 'pages': 2},
+        ]
+        self.assertEqual(delete_pin_idempotent(self.client, self.limiter, 1, '55'), (True, None))
+        self.assertEqual(self.client.list_keyboard_passwords.call_count, 2)
+
+    def test_rejected_delete_of_present_pin_fails(self):
+        self.client.delete_pin.side_effect = TTLockAPIError('TTLock API error: busy', -2012)
+        self.client.list_keyboard_passwords.return_value = {'list': [{'keyboardPwdId': 55}], 'pages': 1}
+        self.assertEqual(delete_pin_idempotent(self.client, self.limiter, 1, '55'), (False, 'TTLock API error: busy'))
+
+    def test_network_error_fails_without_existence_check(self):
+        self.client.delete_pin.side_effect = requests.ConnectionError('reset')
+        deleted, error = delete_pin_idempotent(self.client, self.limiter, 1, '55')
+        self.assertFalse(deleted)
+        self.client.list_keyboard_passwords.assert_not_called()
+
+    def test_rate_limiter_spaces_calls(self):
+        limiter = RateLimiter(0.05)
+        with mock.patch('main.services.pin_teardown.time.sleep') as sleep:
+            for _ in range(3):
+                limiter.wait()
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertGreater(delays[1], delays[0])
+
+
+class PinTeardownQueueTests(TestCase):
+    LEASE = 600
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.ttlock = mock.Mock()
+
+    def _job(self, number, **fields):
+        fields.setdefault('front_door_lock_id', 1)
+        fields.setdefault('front_door_pin_id', f'f{number}')
+        fields.setdefault('room_lock_id', 2)
+        fields.setdefault('room_pin_id', f'r{number}')
+        return PinTeardownJob.objects.create(reservation_number=str(number), **fields)
+
+    def _claim(self, limit=10, at=None):
+        return claim_pin_teardown_jobs(limit, self.LEASE, now=at or self.now)
+
+    def _run(self, jobs, max_attempts=3, retry_delay=300):
+        return run_pin_teardowns(
+            self.ttlock, jobs, workers=2, min_interval=0, max_attempts=max_attempts, retry_delay=retry_delay,
+        )
+
+    def test_claimed_jobs_are_leased_to_one_worker(self):
+        first, second, third = self._job(1), self._job(2), self._job(3)
+        self._job(4, status='done')
+
+        claimed = self._claim(limit=2)
+        self.assertEqual([job.id for job in claimed], [first.id, second.id])
+        first.refresh_from_db()
+        self.assertEqual(first.lease_until, self.now + timedelta(seconds=self.LEASE))
+
+        # A second worker running now only gets what is left
+        self.assertEqual([job.id for job in self._claim()], [third.id])
+        self.assertEqual(self._claim(), [])
+
+    def test_dead_workers_jobs_are_reclaimed_after_lease_expires(self):
+        job = self._job(1)
+        self._claim()  # Worker dies without finishing
+
+        self.assertEqual(self._claim(at=self.now + timedelta(seconds=self.LEASE - 1)), [])
+        reclaimed = self._claim(at=self.now + timedelta(seconds=self.LEASE))
+        self.assertEqual([j.id for j in reclaimed], [job.id])
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_claim_skips_rows_locked_by_other_workers(self):
+        self._job(1)
+        with CaptureQueriesContext(connection) as queries:
+            self._claim()
+        self.assertTrue(any('SKIP LOCKED' in query['sql'] for query in queries.captured_queries))
+
+    def test_failed_deletion_is_retried_after_delay_keeping_progress(self):
+        job = self._job(1)
+        def delete_pin(lock_id, keyboard_pwd_id):
+            if keyboard_pwd_id == 'r1':
+                raise requests.ConnectionError('reset')
+
+        self.ttlock.delete_pin.side_effect = delete_pin
+
+        with self.assertLogs('main', level='WARNING'):
+            counts = self._run(self._claim(), retry_delay=300)
+
+        self.assertEqual(counts, {'done': 0, 'retrying': 1, 'failed': 0})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertTrue(job.front_door_deleted)
+        self.assertFalse(job.room_deleted)
+        self.assertGreaterEqual(job.lease_until, self.now + timedelta(seconds=300))
+        self.assertEqual(self._claim(at=job.lease_until - timedelta(seconds=1)), [])
+
+        # Retry only repeats the room PIN
+        self.ttlock.delete_pin.reset_mock(side_effect=True)
+        counts = self._run(self._claim(at=job.lease_until))
+
+        self.assertEqual(counts, {'done': 1, 'retrying': 0, 'failed': 0})
+        self.ttlock.delete_pin.assert_called_once_with(lock_id=2, keyboard_pwd_id='r1')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.lease_until), ('done', 2, None))
+
+    def test_job_fails_after_max_attempts(self):
+        job = self._job(1, attempts=2)
+        self.ttlock.delete_pin.side_effect = requests.ConnectionError('reset')
+
+        with self.assertLogs('main', level='ERROR'):
+            counts = self._run(self._claim(), max_attempts=3)
+
+        self.assertEqual(counts, {'done': 0, 'retrying': 0, 'failed': 1})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIsNotNone(job.completed_at)
+        self.assertIn('reset', job.error)
+        self.assertEqual(self._claim(at=self.now + timedelta(days=1)), [])
+
+
+class MemorablePinTests(SimpleTestCase):
+    def test_pin_space_excludes_patterns(self):
+        for pin in ('1111', '1234', '8765', '1212'):
+            self.assertNotIn(pin, pin_utils.MEMORABLE_PINS)
+        self.assertIn('1357', pin_utils.MEMORABLE_PINS)
+        self.assertEqual(len(set(pin_utils.MEMORABLE_PINS)), len(pin_utils.MEMORABLE_PINS))
+
+    def test_never_returns_an_active_pin(self):
+        active = set(pin_utils.MEMORABLE_PINS[:-1])
+        self.assertEqual(pin_utils.generate_memorable_4digit_pin(exclude=active), pin_utils.MEMORABLE_PINS[-1])
+
+    def test_exhausted_space_raises(self):
+        with self.assertRaises(ValueError):
+            pin_utils.generate_memorable_4digit_pin(exclude=set(pin_utils.MEMORABLE_PINS))
+
+
+class DiffKeyboardPasswordsTests(SimpleTestCase):
+    def setUp(self):
+        self.now = datetime(2026, 3, 1, 12, 0, tzinfo=dt_timezone.utc)
+        self.old = self.now - timedelta(days=2)
+        self.cutoff = self.now - timedelta(minutes=30)
+
+    def test_orphans_and_missing(self):
+        mirrored = {
+            1: {'10': ('4827', self.old), '11': ('5931', self.old), '12': ('6042', self.now)},
+            2: {'20': ('4827', self.old)},
+        }
+        claimed = {1: {'10'}, 2: {'20'}}
+        expected = {1: {'10': 'guest A', '13': 'guest B'}, 2: {'20': 'guest A'}}
+        orphans, missing = diff_keyboard_passwords(mirrored, claimed, expected, set(), self.cutoff)
+        # '12' is too new to judge, '13' never made it onto lock 1
+        self.assertEqual(orphans, [(1, '11')])
+        self.assertEqual(missing, [(1, '13', 'guest B')])
+
+    def test_pin_value_in_use_is_not_an_orphan(self):
+        # Extra room of a multi-room booking: guest's PIN, id not stored
+        mirrored = {3: {'30': ('4827', self.old)}}
+        orphans, missing = diff_keyboard_passwords(mirrored, {}, {}, {'4827'}, self.cutoff)
+        self.assertEqual((orphans, missing), ([], []))
+
+    def test_unsynced_locks_are_not_reported(self):
+        orphans, missing = diff_keyboard_passwords({}, {}, {1: {'10': 'guest A'}}, set(), self.cutoff)
+        self.assertEqual((orphans, missing), ([], []))
+
+
+class UnlockStatusPayloadTests(SimpleTestCase):
+    def _command(self, status, age_seconds=0):
+        command = SimpleNamespace(
+            id=7, door_type='front', status=status,
+            created_at=datetime.now(dt_timezone.utc) - timedelta(seconds=age_seconds),
+        )
+        return unlock_status_payload(command)
+
+    def test_pending_command_asks_to_poll_again(self):
+        payload = self._command('queued')
+        self.assertFalse(payload['done'])
+        self.assertIn('retry_after_ms', payload)
+
+    def test_finished_command_carries_message(self):
+        self.assertEqual(self._command('succeeded')['success'], "The front door has been unlocked for you.")
+        self.assertIn('error', self._command('failed'))
+
+    @override_settings(UNLOCK_COMMAND_EXPIRY_SECONDS=60, TTLOCK_REQUEST_DEADLINE=20)
+    def test_abandoned_command_reports_failure(self):
+        payload = self._command('running', age_seconds=120)
+        self.assertTrue(payload['done'])
+        self.assertEqual(payload['status'], 'failed')
+
+
+class UnlockCommandQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        room = Room.objects.create(name='U1', video_url='https://example.com/video')
+        cls.front_door = TTLock.objects.create(lock_id=9001, name='Front door', is_front_door=True)
+        cls.alice = Guest.objects.create(full_name='Alice', reservation_number='1000000001', assigned_room=room)
+        cls.bob = Guest.objects.create(full_name='Bob', reservation_number='1000000002', assigned_room=room)
+
+    def setUp(self):
+        patcher = mock.patch('main.tasks.execute_unlock_command.apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enqueue(self, guest):
+        with self.captureOnCommitCallbacks(execute=True):
+            return enqueue_unlock(self.front_door, guest, 'front')
+
+    def test_repeated_tap_returns_the_pending_command(self):
+        first, created = self._enqueue(self.alice)
+        again, created_again = self._enqueue(self.alice)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.id, first.id)
+        self.apply_async.assert_called_once()
+        self.assertEqual(self.apply_async.call_args.kwargs['args'], [first.id])
+
+    def test_other_guests_on_a_shared_lock_get_their_own_command(self):
+        alice_command, _ = self._enqueue(self.alice)
+        bob_command, created = self._enqueue(self.bob)
+
+        self.assertTrue(created)
+        self.assertNotEqual(bob_command.id, alice_command.id)
+        self.assertEqual(self.apply_async.call_count, 2)
+
+    @override_settings(UNLOCK_DEDUP_SECONDS=5)
+    def test_tap_after_dedup_window_creates_new_command(self):
+        first, _ = self._enqueue(self.alice)
+        UnlockCommand.objects.filter(id=first.id).update(
+            status='succeeded', completed_at=timezone.now() - timedelta(seconds=10),
+        )
+
+        second, created = self._enqueue(self.alice)
+
+        self.assertTrue(created)
+        self.assertNotEqual(second.id, first.id)
+
+    def test_command_runs_once_when_task_is_redelivered(self):
+        command, _ = self._enqueue(self.alice)
+        ttlock_client = mock.Mock()
+        ttlock_client.unlock_lock.return_value = {'errcode': 0}
+
+        with self.assertLogs('main', level='INFO'):
+            self.assertEqual(run_unlock_command(ttlock_client, command.id), 'succeeded')
+        self.assertEqual(run_unlock_command(ttlock_client, command.id), 'skipped')
+
+        ttlock_client.unlock_lock.assert_called_once_with(lock_id='9001')
+        command.refresh_from_db()
+        self.assertEqual(command.status, 'succeeded')
+
+    @override_settings(UNLOCK_COMMAND_EXPIRY_SECONDS=60)
+    def test_expired_queued_command_is_failed_not_sent(self):
+        command, _ = self._enqueue(self.alice)
+        UnlockCommand.objects.filter(id=command.id).update(created_at=timezone.now() - timedelta(seconds=120))
+        ttlock_client = mock.Mock()
+
+        self.assertEqual(run_unlock_command(ttlock_client, command.id), 'skipped')
+
+        ttlock_client.unlock_lock.assert_not_called()
+        command.refresh_from_db()
+        self.assertEqual(command.status, 'failed')
+        self.assertIsNotNone(command.completed_at)
+
+
+class ParseCallbackTests(SimpleTestCase):
+    RECORD = {
+        'lockId': 9001, 'recordType': 4, 'success': 1, 'keyboardPwd': '4827',
+        'lockDate': 1760000000000, 'serverDate': 1760000001000, 'electricQuantity': 80,
+    }
+
+    def test_form_encoded_records(self):
+        post = {'lockId': '9001', 'notifyType': '1', 'records': json.dumps([self.RECORD])}
+        events = parse_callback('', post)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['lock_id'], 9001)
+        self.assertEqual(events[0]['keyboard_pwd'], '4827')
+        self.assertEqual(events[0]['occurred_at'], 1760000000000)
+        self.assertEqual(events[0]['received_at'], 1760000001000)
+        self.assertTrue(events[0]['success'])
+
+    def test_json_body(self):
+        record = dict(self.RECORD, success=0)
+        del record['lockId']
+        events = parse_callback(json.dumps({'lockId': 9002, 'records': [record]}))
+        self.assertEqual(events[0]['lock_id'], 9002)
+        self.assertFalse(events[0]['success'])
+
+    def test_malformed_records_are_skipped(self):
+        records = [self.RECORD, {'lockId': 9001}, dict(self.RECORD, lockDate='soon'), 'junk']
+        self.assertEqual(len(parse_callback(json.dumps({'records': records}))), 1)
+        self.assertEqual(parse_callback('not json'), [])
+
+
+class LockEventStoreTests(TestCase):
+    LOCK_ID = 9001
+
+    def _event(self, pin='4827', at=datetime(2030, 1, 5, 15, 0, tzinfo=dt_timezone.utc), **fields):
+        ms = int(at.timestamp() * 1000)
+        event = {
+            'lock_id': self.LOCK_ID, 'record_type': LockEvent.KEYBOARD_PWD_UNLOCK, 'keyboard_pwd': pin,
+            'keyboard_pwd_id': '', 'success': True, 'username': '', 'battery': 80,
+            'occurred_at': ms, 'received_at': ms,
+        }
+        event.update(fields)
+        return event
+
+    def test_pin_unlock_gets_keyboard_pwd_id_from_mirror(self):
+        lock = TTLock.objects.create(lock_id=self.LOCK_ID, name='Front door', is_front_door=True)
+        LockKeyboardPassword.objects.create(lock=lock, keyboard_pwd_id='555', pin='4827', synced_at=timezone.now())
+
+        write_lock_events([self._event(), self._event(pin='1357', keyboard_pwd_id='777', at=datetime(2030, 1, 5, 16, 0, tzinfo=dt_timezone.utc))])
+
+        self.assertEqual(
+            dict(LockEvent.objects.values_list('keyboard_pwd', 'keyboard_pwd_id')),
+            {'4827': '555', '1357': '777'},
+        )
+
+    def test_retried_callback_is_stored_once(self):
+        write_lock_events([self._event()])
+        write_lock_events([self._event(), self._event(pin='1357')])
+
+        self.assertEqual(LockEvent.objects.count(), 2)
+
+    def test_failed_batch_is_pushed_back_to_buffer(self):
+        raw = [json.dumps(self._event()).encode()]
+        redis_client = mock.Mock()
+        redis_client.pipeline.return_value.execute.return_value = [raw, True]
+
+        with mock.patch.object(lock_events, '_redis', return_value=redis_client), \
+                mock.patch.object(lock_events, 'write_lock_events', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                drain_lock_event_buffer(10)
+
+        redis_client.rpush.assert_called_once_with(lock_events.BUFFER_KEY, *raw)
+        self.assertFalse(LockEvent.objects.exists())
+
+    def test_buffer_is_drained_in_batches(self):
+        raw = [json.dumps(self._event(pin=pin)).encode() for pin in ('1111', '2222', '3333')]
+        redis_client = mock.Mock()
+        redis_client.pipeline.return_value.execute.side_effect = [[raw[:2], True], [raw[2:], True]]
+
+        with mock.patch.object(lock_events, '_redis', return_value=redis_client):
+            self.assertEqual(drain_lock_event_buffer(2), 3)
+
+        redis_client.rpush.assert_not_called()
+        self.assertEqual(LockEvent.objects.count(), 3)
+
+    def test_first_entries_respect_each_guests_stay_when_pins_are_reused(self):
+        room = Room.objects.create(name='E1', video_url='https://example.com/video')
+        earlier = Guest.objects.create(
+            full_name='Earlier', reservation_number='2000000001', assigned_room=room, front_door_pin='4827',
+            check_in_date=date(2030, 1, 1), check_out_date=date(2030, 1, 3),
+        )
+        later = Guest.objects.create(
+            full_name='Later', reservation_number='2000000002', assigned_room=room, front_door_pin='4827',
+            check_in_date=date(2030, 1, 10), check_out_date=date(2030, 1, 12),
+        )
+        no_entry = Guest.objects.create(
+            full_name='No entry', reservation_number='2000000003', assigned_room=room, front_door_pin='1357',
+            check_in_date=date(2030, 1, 10), check_out_date=date(2030, 1, 12),
+        )
+
+        def at(day, hour):
+            return timezone.make_aware(datetime(2030, 1, day, hour))
+
+        write_lock_events([
+            self._event(at=at(2, 18)),
+            self._event(at=at(1, 16)),  # Earlier guest's first entry
+            self._event(at=at(7, 12)),  # Between the stays - neither guest
+            self._event(at=at(10, 15), success=False),
+            self._event(at=at(10, 17)),  # Later guest's first entry
+            self._event(pin='1357', at=at(9, 12)),  # Before that guest's stay
+        ])
+
+        entries = first_entries([earlier, later, no_entry])
+
+        self.assertEqual(entries, {earlier.id: at(1, 16), later.id: at(10, 17)})
+
+
+class FindOverlapsTests(SimpleTestCase):
+    def _stay(self, name, room_id, platform, check_in_day, nights):
+        check_in = date(2026, 3, 1) + timedelta(days=check_in_day)
+        return SimpleNamespace(
+            guest_name=name, room_id=room_id, platform=platform,
+            check_in_date=check_in, check_out_date=check_in + timedelta(days=nights),
+        )
+
+    def _names(self, reservations):
+        return [(first.guest_name, second.guest_name) for first, second in find_overlaps(reservations)]
+
+    def test_cross_platform_overlap_found_regardless_of_order(self):
+        stays = [
+            self._stay('airbnb', 1, 'airbnb', 3, 2),
+            self._stay('long', 1, 'booking', 0, 10),
+            self._stay('other room', 2, 'airbnb', 0, 10),
+        ]
+        self.assertEqual(self._names(stays), [('long', 'airbnb')])
+
+    def test_same_platform_and_back_to_back_stays_are_not_overlaps(self):
+        stays = [
+            self._stay('a', 1, 'booking', 0, 3),
+            self._stay('b', 1, 'booking', 1, 3),
+            self._stay('c', 1, 'airbnb', 4, 2),  # checks in the day b checks out
+        ]
+        self.assertEqual(self._names(stays), [])
+
+    def test_matches_pairwise_comparison(self):
+        stays = [
+            self._stay(f'r{i}', i % 2, 'booking' if i % 3 else 'airbnb', (i * 7) % 20, 1 + i % 4)
+            for i in range(40)
+        ]
+        expected = {
+            frozenset((a.guest_name, b.guest_name))
+            for i, a in enumerate(stays) for b in stays[i + 1:]
+            if a.room_id == b.room_id and a.platform != b.platform
+            and a.check_in_date < b.check_out_date and b.check_in_date < a.check_out_date
+        }
+        self.assertEqual({frozenset(pair) for pair in self._names(stays)}, expected)
+        self.assertEqual(len(self._names(stays)), len(expected))
+
+
+class OccupancyBitsetTests(SimpleTestCase):
+    def test_stay_across_new_year_is_split_between_years(self):
+        check_in, check_out = date(2025, 12, 30), date(2026, 1, 2)
+        self.assertEqual(occupancy._years(check_in, check_out), [2025, 2026])
+        self.assertEqual(occupancy._night_mask(check_in, check_out, 2025), 0b11 << 363)
+        self.assertEqual(occupancy._night_mask(check_in, check_out, 2026), 0b1)
+        self.assertEqual(occupancy._years(check_in, check_in), [])
+
+    def test_first_free_gap_skips_runs_that_are_too_short(self):
+        year = 2026
+        # Nights of Jan 1-4 and Jan 6-9 occupied: Jan 5 is a single free night, free again from Jan 10
+        booked = occupancy._night_mask(date(year, 1, 1), date(year, 1, 5), year) | \
+            occupancy._night_mask(date(year, 1, 6), date(year, 1, 10), year)
+        loaded = {(1, year): {'guest': (booked, 0)}, (1, year + 1): {}}
+        with mock.patch.object(occupancy, '_load', return_value=loaded):
+            self.assertEqual(occupancy.first_free_gap(1, date(year, 1, 1), 1), date(year, 1, 5))
+            self.assertEqual(occupancy.first_free_gap(1, date(year, 1, 1), 2), date(year, 1, 10))
+            self.assertIsNone(occupancy.first_free_gap(1, date(year, 1, 1), 2, horizon_days=5))
+
+
+class DashboardStatsTests(TestCase):
+
+    def setUp(self):
+        self.today = date.today()
+        self.rooms = [
+            Room.objects.create(name=f'D{i}', video_url=f'https://example.com/d{i}') for i in range(1, 5)
+        ]
+        self.number = 3000000000
+
+    def _guest(self, room, check_in_offset, check_out_offset, **fields):
+        self.number += 1
+        return Guest.objects.create(
+            full_name='Guest', reservation_number=str(self.number), assigned_room=room,
+            check_in_date=self.today + timedelta(days=check_in_offset),
+            check_out_date=self.today + timedelta(days=check_out_offset),
+            **fields,
+        )
+
+    def _reservation(self, room, check_in_offset, check_out_offset, **fields):
+        self.number += 1
+        return Reservation.objects.create(
+            ical_uid=f'{self.number}@booking.com', room=room, guest_name='CLOSED - Not available',
+            check_in_date=self.today + timedelta(days=check_in_offset),
+            check_out_date=self.today + timedelta(days=check_out_offset),
+            **fields,
+        )
+
+    def test_counts_guests_and_unenriched_reservations(self):
+        r1, r2, r3, r4 = self.rooms
+        staying = self._guest(r1, -2, 1)
+        self._guest(r1, -1, 2)  # Same room twice: one occupied room
+        self._guest(r2, 0, 2)  # Arriving
+        self._guest(r3, -3, 0)  # Departing (still in house today)
+        self._guest(r4, -1, 1, is_archived=True)
+        self._guest(r4, 5, 7)  # Future
+        self._reservation(r4, 0, 3)  # Unenriched, arriving
+        self._reservation(r4, -1, 1, platform='airbnb')  # Unenriched, in stay
+        self._reservation(r4, 0, 2, status='cancelled')
+        self._reservation(r1, -2, 1, guest=staying)  # Enriched: counted as its guest
+
+        self.assertEqual(calculate_dashboard_stats(self.today), {
+            'in_house': 3,
+            'checking_in_today': 2,
+            'checking_out_today': 1,
+            'total_rooms': 4,
+            'occupied_rooms': 3,
+            'pending_checkins': 2,
+        })
+
+    def test_guest_save_refreshes_todays_snapshot(self):
+        guest = self._guest(self.rooms[0], -5, -3)
+        self.assertEqual(dashboard_snapshot.get_dashboard_stats(self.today)['in_house'], 0)  # Builds the snapshot
+
+        guest.check_out_date = self.today + timedelta(days=1)
+        guest.save()
+        self.assertEqual(dashboard_snapshot.get_dashboard_stats(self.today)['in_house'], 1)
+
+        guest.is_archived = True
+        guest.save()
+        self.assertEqual(dashboard_snapshot.get_dashboard_stats(self.today)['in_house'], 0)
+
+
+class RefreshDashboardSnapshotsTests(SimpleTestCase):
+    def _refresh(self, existing, stays):
+        with mock.patch('main.models.DailyDashboardSnapshot.objects') as objects, \
+                mock.patch.object(dashboard_snapshot, 'rebuild_dashboard_snapshot') as rebuild:
+            objects.filter.return_value.values_list.return_value.filter.return_value = existing
+            dashboard_snapshot.refresh_dashboard_snapshots(stays, today=date(2026, 5, 1))
+        return [call.args[0] for call in rebuild.call_args_list]
+
+    def test_only_dates_inside_a_changed_stay_are_rebuilt(self):
+        existing = [date(2026, 5, 1), date(2026, 5, 3), date(2026, 5, 6)]
+        stays = [('2026-05-01', '2026-05-02'), (date(2026, 5, 5), date(2026, 5, 6))]
+        self.assertEqual(self._refresh(existing, stays), [date(2026, 5, 1), date(2026, 5, 6)])
+
+    def test_no_stays_rebuilds_nothing(self):
+        self.assertEqual(self._refresh([date(2026, 5, 1)], [None]), [])
+
+
+@mock.patch('main.views.admin_dashboard.RESERVATIONS_PAGE_SIZE', 2)
+class AllReservationsApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+
+        cls.user = User.objects.create_superuser('reservations-admin', 'admin@example.com', 'pw')
+        cls.room = Room.objects.create(name='R1', video_url='https://example.com/video')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.today = date.today()
+
+    def _reservation(self, uid, check_in, nights=2, **fields):
+        fields.setdefault('guest_name', 'CLOSED - Not available')
+        return Reservation.objects.create(
+            ical_uid=uid, room=self.room, check_in_date=check_in, check_out_date=check_in + timedelta(days=nights), **fields,
+        )
+
+    def _get(self, **params):
+        response = self.client.get(reverse('all_reservations_api'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _ids(self, **params):
+        return [row['id'] for row in self._get(**params)['results']]
+
+    def test_cursor_continues_across_equal_check_in_dates(self):
+        check_in = self.today + timedelta(days=5)
+        expected = [self._reservation(f'same-day-{i}', check_in).id for i in range(5)]
+
+        pages = [self._get()]
+        while pages[-1]['next_cursor']:
+            pages.append(self._get(cursor=pages[-1]['next_cursor']))
+
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        self.assertEqual([row['id'] for page in pages for row in page['results']], sorted(expected))
+        self.assertEqual(pages[0]['next_cursor'], f"{check_in.isoformat()}:{sorted(expected)[1]}")
+
+    def test_total_only_on_first_page(self):
+        for i in range(3):
+            self._reservation(f'r{i}', self.today + timedelta(days=i))
+
+        first = self._get()
+        self.assertEqual(first['total'], 3)
+        self.assertNotIn('total', self._get(cursor=first['next_cursor']))
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('nonsense', '2030-01-01:abc', '2030-13-01:1', '2030-01-01:1:2'):
+            response = self.client.get(reverse('all_reservations_api'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    def test_old_reservations_need_show_all_or_search(self):
+        old = self._reservation('old', self.today - timedelta(days=30), booking_reference='5592652301')
+        upcoming = self._reservation('upcoming', self.today + timedelta(days=1))
+
+        self.assertEqual(self._ids(), [upcoming.id])
+        self.assertEqual(self._ids(show_all='true'), [old.id, upcoming.id])
+        self.assertEqual(self._ids(search='92652'), [old.id])
+
+    def test_search_matches_enriched_guest_name(self):
+        guest = Guest.objects.create(
+            full_name='Jane Doe', reservation_number='5592652301', assigned_room=self.room,
+            check_in_date=self.today, check_out_date=self.today + timedelta(days=2),
+        )
+        enriched = self._reservation('enriched', self.today, guest=guest, booking_reference='5592652301')
+        self._reservation('other', self.today, guest_name='John Smith')
+
+        data = self._get(search='jane')
+        self.assertEqual([row['id'] for row in data['results']], [enriched.id])
+        self.assertEqual(data['results'][0]['guest_name'], 'Jane Doe')
+        self.assertTrue(data['results'][0]['is_enriched'])
+
+    def test_enrichment_filter(self):
+        guest = Guest.objects.create(
+            full_name='Jane Doe', reservation_number='5592652301', assigned_room=self.room,
+            check_in_date=self.today, check_out_date=self.today + timedelta(days=2),
+        )
+        enriched = self._reservation('enriched', self.today, guest=guest)
+        pending = self._reservation('pending', self.today + timedelta(days=1))
+
+        self.assertEqual(self._ids(enrichment='enriched'), [enriched.id])
+        self.assertEqual(self._ids(enrichment='unenriched'), [pending.id])
+        self.assertEqual(self._ids(), [enriched.id, pending.id])
+
+
+class PendingEnrichmentsPageQueryCountTests(TestCase):
+    """The page must not issue queries per reservation or per enrichment log"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+        from main.models import Room
+
+        cls.user = User.objects.create_superuser('enrichment-admin', 'admin@example.com', 'pw')
+        cls.room = Room.objects.create(name='Q1', video_url='https://example.com/video')
+
+    def _add_bookings(self, start, count):
+        from main.models import EnrichmentLog, Reservation
+
+        for i in range(start, start + count):
+            check_in = date(2030, 1, 1) + timedelta(days=i)
+            pending = Reservation.objects.create(
+                ical_uid=f'pending-{i}', room=self.room, platform='booking', guest_name='CLOSED',
+                check_in_date=check_in, check_out_date=check_in + timedelta(days=1),
+            )
+            EnrichmentLog.objects.create(
+                reservation=pending, action='email_search_started', booking_reference='',
+                details={'attempt': 3},
+            )
+            enriched = Reservation.objects.create(
+                ical_uid=f'enriched-{i}', room=self.room, platform='booking', guest_name='Guest',
+                booking_reference=f'{6000000000 + i}',
+                check_in_date=check_in, check_out_date=check_in + timedelta(days=1),
+            )
+            EnrichmentLog.objects.create(
+                reservation=enriched, action='email_found_matched',
+                booking_reference=enriched.booking_reference, room=self.room,
+            )
+
+    def _render(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin-page/pending-enrichments/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.user)
+        self._add_bookings(0, 1)
+        response, baseline = self._render()
+        self.assertEqual(response.context['unenriched_reservations'][0]['status'], "Searching Email (Attempt 3/4)")
+
+        self._add_bookings(1, 5)
+        response, queries = self._render()
+        self.assertEqual(len(response.context['unenriched_reservations']), 6)
+        self.assertEqual(len(response.context['enriched_reservations']), 6)
+        self.assertEqual(queries, baseline)
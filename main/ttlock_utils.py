@@ -1,4 +1,3 @@
-import requests
 import os
 import json
 from django.utils import timezone
@@ -8,6 +7,15 @@ import logging
 # Set up logging
 logger = logging.getLogger(__name__)
 
+
+class TTLockAPIError(Exception):
+    """TTLock answered with a non-zero errcode"""
+
+    def __init__(self, message, errcode):
+        self.errcode = errcode
+        super().__init__(message)
+
+
 class TTLockClient:
     def __init__(self, use_service=True):
         self.base_url = settings.TTLOCK_BASE_URL  # For API calls (e.g., https://euapi.sciener.com/v3)
@@ -16,13 +24,14 @@ class TTLockClient:
         self.client_secret = os.environ.get("SCIENER_CLIENT_SECRET")
         
         # Try to use TTLockService for automatic token management
+        # (process-wide cache: no DB query or service construction per client)
+        self.token_managed = False
         if use_service:
             try:
-                from main.services import TTLockService
-                service = TTLockService()
-                self.access_token = service.get_valid_token()
+                from main.services.ttlock_service import get_access_token
+                self.access_token = get_access_token()
                 self.refresh_token = None  # Handled by service
-                logger.info("Using TTLockService for token management")
+                self.token_managed = True
                 return
             except Exception as e:
                 logger.warning(f"TTLockService unavailable, falling back to legacy method: {str(e)}")
@@ -61,6 +70,21 @@ class TTLockClient:
         except Exception as e:
             logger.error(f"Failed to save tokens to file: {str(e)}")
 
+    # Adding a PIN isn't idempotent - only retried if the request never reached TTLock
+    NON_IDEMPOTENT_ENDPOINTS = {"/keyboardPwd/add"}
+
+    def _send(self, method, url, endpoint, headers, params):
+        """Send through the shared pooled transport (timeouts, retry, circuit breaker)"""
+        from main.services.ttlock_transport import get_transport
+
+        return get_transport().request(
+            method, url, endpoint,
+            retry_unsent_only=endpoint in self.NON_IDEMPOTENT_ENDPOINTS,
+            headers=headers,
+            params=params if method == "GET" else None,
+            data=params if method == "POST" else None,
+        )
+
     def _make_request(self, method, endpoint, data=None, use_oauth_url=False):
         """Helper method to make API requests to TTLock."""
         base_url = self.oauth_base_url if use_oauth_url else self.base_url
@@ -83,9 +107,7 @@ class TTLockClient:
             for key, value in data.items():
                 params[key] = str(value)
 
-        response = requests.request(method, url, headers=headers, params=params if method == "GET" else None, data=params if method == "POST" else None)
-        response.raise_for_status()
-        result = response.json()
+        result = self._send(method, url, endpoint, headers, params)
 
         # Check for TTLock-specific errors
         if "errcode" in result and result["errcode"] != 0:
@@ -97,20 +119,24 @@ class TTLockClient:
                 headers["Authorization"] = f"Bearer {self.access_token}"
                 params["accessToken"] = self.access_token
                 # Retry the request
-                response = requests.request(method, url, headers=headers, params=params if method == "GET" else None, data=params if method == "POST" else None)
-                response.raise_for_status()
-                result = response.json()
+                result = self._send(method, url, endpoint, headers, params)
                 if "errcode" in result and result["errcode"] != 0:
                     error_msg = result.get("errmsg", "Unknown error")
                     logger.error(f"TTLock API error after retry: {error_msg} (errcode: {result['errcode']})")
-                    raise Exception(f"TTLock API error after retry: {error_msg} (errcode: {result['errcode']})")
+                    raise TTLockAPIError(f"TTLock API error after retry: {error_msg} (errcode: {result['errcode']})", result['errcode'])
             else:
-                raise Exception(f"TTLock API error: {error_msg} (errcode: {result['errcode']})")
+                raise TTLockAPIError(f"TTLock API error: {error_msg} (errcode: {result['errcode']})", result['errcode'])
 
         return result
 
     def refresh_access_token(self):
         """Refresh the access token using the refresh token."""
+        if self.token_managed:
+            # Drop the rejected token from the cache; refreshed once across workers
+            from main.services.ttlock_service import get_access_token
+            self.access_token = get_access_token(stale_access_token=self.access_token)
+            return self.access_token
+
         url = f"{self.oauth_base_url}/oauth/token"
         data = {
             "client_id": self.client_id,
@@ -120,9 +146,8 @@ class TTLockClient:
         }
         
         # Make direct request without using _make_request to avoid recursion
-        response = requests.post(url, data=data)
-        response.raise_for_status()
-        result = response.json()
+        from main.services.ttlock_transport import get_transport
+        result = get_transport().request("POST", url, "/oauth/token", data=data)
 
         # Update tokens in the instance
         self.access_token = result.get("access_token")
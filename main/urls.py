@@ -24,11 +24,13 @@ urlpatterns = [
     
     path('enrich-reservation/', views.enrich_reservation, name='enrich_reservation'),
     path('room/<str:room_token>/', views.room_detail, name='room_detail'),
+    path('room/<str:room_token>/unlock/<int:command_id>/', views.unlock_status, name='unlock_status'),  # AJAX endpoint
     path("report_pin_issue/", report_pin_issue, name="report_pin_issue"),
     path("rebook/", views.rebook_guest, name="rebook_guest"),
     path('explore-manchester/', views.explore_manchester, name='explore_manchester'),
     path('contact/', views.contact, name='contact'),
     path('admin-page/', views.admin_page, name='admin_page'),
+    path('admin-page/dashboard-stats/', views.dashboard_stats, name='dashboard_stats'),
     path('admin-page/login/', views.AdminLoginView.as_view(), name='admin_login'),
     path('logout/', LogoutView.as_view(next_page='/'), name='logout'),
     path('unauthorized/', views.unauthorized, name='unauthorized'),
@@ -39,11 +41,15 @@ urlpatterns = [
     path('admin-page/delete-guest/<int:guest_id>/', views.delete_guest, name='delete_guest'),
     path('admin-page/available-rooms/', views.available_rooms, name='available_rooms'),
     path('admin-page/give-access/', views.give_access, name='give_access'),
+    path('admin-page/ttlock-metrics/', views.ttlock_metrics, name='ttlock_metrics'),
+    path('admin-page/lock-pins/', views.lock_pins, name='lock_pins'),
+    path('admin-page/lock-activity/', views.lock_activity, name='lock_activity'),
     path('admin-page/user-management/', views.user_management, name='user_management'),
     path('room-management/', views.room_management, name='room_management'),
     path('edit-room/<int:room_id>/', views.edit_room, name='edit_room'),
     path('admin-page/past-guests/', views.past_guests, name='past_guests'),
     path('admin-page/all-reservations/', views.all_reservations, name='all_reservations'),
+    path('admin-page/all-reservations/api/', views.all_reservations_api, name='all_reservations_api'),
     path('admin-page/delete-reservation/<int:reservation_id>/', views.delete_reservation, name='delete_reservation'),
     path('admin-page/bulk-delete-reservations/', views.bulk_delete_reservations, name='bulk_delete_reservations'),
     path('admin-page/message-templates/', views.message_templates, name='message_templates'),
@@ -44,6 +44,7 @@ from .guest import (
     checkin_legacy,
     enrich_reservation,
     room_detail,
+    unlock_status,
     report_pin_issue,
 )
 
@@ -51,8 +52,10 @@ from .guest import (
 from .admin_dashboard import (
     AdminLoginView,
     admin_page,
+    dashboard_stats,
     available_rooms,
     all_reservations,
+    all_reservations_api,
     delete_reservation,
     bulk_delete_reservations,
     past_guests,
@@ -75,6 +78,9 @@ from .admin_rooms import (
     room_management,
     edit_room,
     give_access,
+    ttlock_metrics,
+    lock_pins,
+    lock_activity,
 )
 
 # Admin user management
@@ -123,12 +129,15 @@ __all__ = [
     'checkin_legacy',
     'enrich_reservation',
     'room_detail',
+    'unlock_status',
     'report_pin_issue',
     # Admin dashboard
     'AdminLoginView',
     'admin_page',
+    'dashboard_stats',
     'available_rooms',
     'all_reservations',
+    'all_reservations_api',
     'delete_reservation',
     'bulk_delete_reservations',
     'past_guests',
@@ -145,6 +154,9 @@ __all__ = [
     'room_management',
     'edit_room',
     'give_access',
+    'ttlock_metrics',
+    'lock_pins',
+    'lock_activity',
     # Admin users
     'user_management',
     'audit_logs',
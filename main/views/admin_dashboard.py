@@ -51,6 +51,9 @@ from main.models import (
 from main.views.base import get_available_rooms
 from main.ttlock_utils import TTLockClient
 from main.pin_utils import generate_memorable_4digit_pin, add_wakeup_prefix
+from main.services.pin_provisioning import provision_pins, PinTarget, PinProvisioningError
+from main.services.reservation_overlaps import upcoming_overlaps, overlap_warning
+from main.services.dashboard_snapshot import get_dashboard_stats
 from main.phone_utils import normalize_phone_to_e164, validate_phone_number
 from main.dashboard_helpers import get_current_guests_data, build_entries_list, get_guest_status, get_night_progress
 from main.services.sms_reply_handler import handle_sms_room_assignment
@@ -305,41 +308,20 @@ def admin_page(request):
 
             ttlock_client = TTLockClient()
             try:
-                # Generate PIN for front door
-                front_door_response = ttlock_client.generate_temporary_pin(
-                    lock_id=front_door_lock.lock_id,
-                    pin=pin,
-                    start_time=start_time,
-                    end_time=end_time,
-                    name=f"Front Door - {room.name} - {full_name} - {pin}",
-                )
-                if "keyboardPwdId" not in front_door_response:
-                    logger.error(f"Failed to generate front door PIN for guest {reservation_number}: {front_door_response.get('errmsg', 'Unknown error')}")
-                    messages.error(request, f"Failed to generate front door PIN: {front_door_response.get('errmsg', 'Unknown error')}")
-                    return redirect('admin_page')
-                keyboard_pwd_id_front = front_door_response["keyboardPwdId"]
-
-                # Generate the same PIN for the room lock
-                room_response = ttlock_client.generate_temporary_pin(
-                    lock_id=room_lock.lock_id,
-                    pin=pin,
-                    start_time=start_time,
-                    end_time=end_time,
-                    name=f"Room - {room.name} - {full_name} - {pin}",
-                )
-                if "keyboardPwdId" not in room_response:
-                    logger.error(f"Failed to generate room PIN for guest {reservation_number}: {room_response.get('errmsg', 'Unknown error')}")
-                    # Roll back the front door PIN
-                    try:
-                        ttlock_client.delete_pin(
-                            lock_id=front_door_lock.lock_id,
-                            keyboard_pwd_id=keyboard_pwd_id_front,
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to roll back front door PIN for guest {reservation_number}: {str(e)}")
-                    messages.error(request, f"Failed to generate room PIN: {room_response.get('errmsg', 'Unknown error')}")
+                # Generate the same PIN for the front door and room lock in parallel
+                try:
+                    pin_ids = provision_pins(ttlock_client, pin, start_time, end_time, [
+                        PinTarget('front_door', front_door_lock.lock_id,
+                                  f"Front Door - {room.name} - {full_name} - {pin}", 'front door'),
+                        PinTarget('room', room_lock.lock_id,
+                                  f"Room - {room.name} - {full_name} - {pin}", 'room'),
+                    ])
+                except PinProvisioningError as e:
+                    logger.error(f"Failed to generate PINs for guest {reservation_number}: {str(e)}")
+                    messages.error(request, str(e))
                     return redirect('admin_page')
-                keyboard_pwd_id_room = room_response["keyboardPwdId"]
+                keyboard_pwd_id_front = pin_ids['front_door']
+                keyboard_pwd_id_room = pin_ids['room']
 
                 # Create the guest with the generated PIN
                 guest = Guest.objects.create(
@@ -391,34 +373,13 @@ def admin_page(request):
             ical_configs[room.id] = None
 
     # Detect overlapping reservations (different platforms, same room, overlapping dates)
-    overlapping_warnings = []
+    # One query + sweep over upcoming stays (see main/services/reservation_overlaps.py)
+    overlapping_warnings = [
+        overlap_warning(first, second)
+        for first, second in upcoming_overlaps(room_ids=[room.id for room in available_rooms])
+    ]
 
-    for room in available_rooms:
-        # Get all confirmed reservations for this room
-        reservations = Reservation.objects.filter(
-            room=room,
-            status='confirmed'
-        ).order_by('check_in_date')
-
-        # Check for overlaps between different platforms
-        for i, res1 in enumerate(reservations):
-            for res2 in reservations[i+1:]:
-                # Only check if different platforms
-                if res1.platform != res2.platform:
-                    # Check if date ranges overlap
-                    if (res1.check_in_date < res2.check_out_date and
-                        res2.check_in_date < res1.check_out_date):
-                        warning = {
-                            'room': room.name,
-                            'platform1': dict(Reservation.PLATFORM_CHOICES).get(res1.platform),
-                            'platform2': dict(Reservation.PLATFORM_CHOICES).get(res2.platform),
-                            'dates': f"{max(res1.check_in_date, res2.check_in_date)} to {min(res1.check_out_date, res2.check_out_date)}",
-                            'res1_guest': res1.guest_name,
-                            'res2_guest': res2.guest_name,
-                        }
-                        overlapping_warnings.append(warning)
-
-        return render(request, 'main/admin_page.html', {
+    return render(request, 'main/admin_page.html', {
         'rooms': available_rooms,
         'guests': guests,
         'todays_entries': todays_entries,
@@ -430,6 +391,12 @@ def admin_page(request):
         'overlapping_warnings': overlapping_warnings,
     })
 
+@login_required(login_url='/admin-page/login/')
+@user_passes_test(lambda user: user.has_perm('main.view_admin_dashboard'), login_url='/unauthorized/')
+def dashboard_stats(request):
+    """Dashboard summary stats for today (polled by the admin page header)"""
+    return JsonResponse(get_dashboard_stats(date.today()))
+
 # 3. available_rooms (line ~1384)
 @login_required(login_url='/admin-page/login/')
 @user_passes_test(lambda user: user.is_superuser, login_url='/unauthorized/')
@@ -459,152 +426,176 @@ def all_reservations(request):
     - Enrichment filter (Enriched/Unenriched)
     - Date range filter
     - Search by booking reference or guest name
-    - JavaScript pagination (10 per page)
+    - Rows are fetched page by page from all_reservations_api (25 per page)
     """
-    from datetime import datetime as dt
+    filters = _reservation_filters(request)
+    return render(request, 'main/all_reservations.html', {
+        'platform_filter': filters['platform'],
+        'status_filter': filters['status'],
+        'enrichment_filter': filters['enrichment'],
+        'date_from': filters['date_from'],
+        'date_to': filters['date_to'],
+        'search_query': filters['search'],
+        'show_all': filters['show_all'],
+        # Read by static/js/all_reservations.js (0 stands in for the row id in the URLs)
+        'reservations_config': {
+            'api_url': f"{reverse('all_reservations_api')}?{request.GET.urlencode()}",
+            'urls': {
+                'guest_details': reverse('guest_details', args=[0]),
+                'edit_reservation': reverse('edit_reservation', args=[0]),
+                'manual_checkin': reverse('manual_checkin_reservation', args=[0]),
+                'delete_reservation': reverse('delete_reservation', args=[0]),
+            },
+            'labels': {
+                'view': _("View"),
+                'edit': _("Edit"),
+                'check_in': _("Check In"),
+                'delete': _("Delete"),
+                'of': _("of"),
+            },
+        },
+    })
 
-    # Get filter parameters
-    platform_filter = request.GET.get('platform', 'all')
-    status_filter = request.GET.get('status', 'all')
-    enrichment_filter = request.GET.get('enrichment', 'all')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-    search_query = request.GET.get('search', '')
-    quick_filter = request.GET.get('quick', '')
-    show_all = request.GET.get('show_all', '')  # New: show all reservations (including old)
 
-    today = date.today()
+# Rows per all_reservations_api page
+RESERVATIONS_PAGE_SIZE = 25
+
+
+def _reservation_filters(request):
+    """all_reservations filter parameters from the query string"""
+    return {
+        'platform': request.GET.get('platform', 'all'),
+        'status': request.GET.get('status', 'all'),
+        'enrichment': request.GET.get('enrichment', 'all'),
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+        'search': request.GET.get('search', ''),
+        'quick': request.GET.get('quick', ''),
+        'show_all': request.GET.get('show_all', ''),  # Show all reservations (including old)
+    }
+
+
+def _filtered_reservations(filters, today):
+    """Reservations matching the all_reservations filters, ordered by (check_in_date, id)"""
+    from datetime import datetime as dt
+
     yesterday = today - timedelta(days=1)
 
     # DEFAULT: Show relevant reservations (current, upcoming, recently checked out)
     # UNLESS search query is provided (then show all matching results)
     # UNLESS show_all=true (then show everything)
-    if search_query:
-        # Search mode: Show ALL reservations matching search (no date filter)
-        reservations = Reservation.objects.all().select_related('room', 'guest')
-    elif show_all:
-        # Show all mode: Show everything
-        reservations = Reservation.objects.all().select_related('room', 'guest')
-    elif quick_filter == 'today':
+    if filters['search'] or filters['show_all']:
+        reservations = Reservation.objects.all()
+    elif filters['quick'] == 'today':
         # Show reservations active today (check_in <= today <= check_out)
-        reservations = Reservation.objects.filter(
-            check_in_date__lte=today,
-            check_out_date__gte=today
-        ).select_related('room', 'guest')
-    elif quick_filter == 'tomorrow':
+        reservations = Reservation.objects.filter(check_in_date__lte=today, check_out_date__gte=today)
+    elif filters['quick'] == 'tomorrow':
         # Show reservations active tomorrow
         tomorrow = today + timedelta(days=1)
-        reservations = Reservation.objects.filter(
-            check_in_date__lte=tomorrow,
-            check_out_date__gte=tomorrow
-        ).select_related('room', 'guest')
+        reservations = Reservation.objects.filter(check_in_date__lte=tomorrow, check_out_date__gte=tomorrow)
     else:
         # DEFAULT VIEW: Show current guests + upcoming + recently checked out (last 1 day)
         reservations = Reservation.objects.filter(
             Q(check_out_date__gte=yesterday) |  # Currently staying OR checked out in last 1 day
             Q(check_in_date__gte=today)  # OR checking in today or future
-        ).select_related('room', 'guest')
-
-    # Order by check-in date (nearest first)
-    reservations = reservations.order_by('check_in_date')
-
-    # Apply platform filter
-    if platform_filter != 'all':
-        reservations = reservations.filter(platform=platform_filter)
-
-    # Apply status filter
-    if status_filter != 'all':
-        reservations = reservations.filter(status=status_filter)
+        )
 
-    # Apply enrichment filter
-    if enrichment_filter == 'enriched':
+    if filters['platform'] != 'all':
+        reservations = reservations.filter(platform=filters['platform'])
+    if filters['status'] != 'all':
+        reservations = reservations.filter(status=filters['status'])
+    if filters['enrichment'] == 'enriched':
         reservations = reservations.filter(guest__isnull=False)
-    elif enrichment_filter == 'unenriched':
+    elif filters['enrichment'] == 'unenriched':
         reservations = reservations.filter(guest__isnull=True)
 
-    # Apply date range filter (only when not using quick filters or default view)
-    if date_from or date_to:
-        if date_from:
+    for param, lookup in (('date_from', 'check_in_date__gte'), ('date_to', 'check_in_date__lte')):
+        if filters[param]:
             try:
-                date_from_obj = dt.strptime(date_from, '%Y-%m-%d').date()
-                reservations = reservations.filter(check_in_date__gte=date_from_obj)
+                reservations = reservations.filter(**{lookup: dt.strptime(filters[param], '%Y-%m-%d').date()})
             except ValueError:
                 pass
 
-        if date_to:
-            try:
-                date_to_obj = dt.strptime(date_to, '%Y-%m-%d').date()
-                reservations = reservations.filter(check_in_date__lte=date_to_obj)
-            except ValueError:
-                pass
-
-    # Apply search filter (searches all reservations regardless of date)
-    if search_query:
+    # Search covers all reservations regardless of date
+    if filters['search']:
         reservations = reservations.filter(
-            Q(booking_reference__icontains=search_query) |
-            Q(guest_name__icontains=search_query) |
-            Q(guest__full_name__icontains=search_query)
+            Q(booking_reference__icontains=filters['search']) |
+            Q(guest_name__icontains=filters['search']) |
+            Q(guest__full_name__icontains=filters['search'])
         )
 
-    # Get today's date for visual indicators
+    # Nearest check-in first; id breaks ties so the keyset cursor is unique
+    return reservations.order_by('check_in_date', 'id')
+
+
+def _reservation_row(reservation, today):
+    """JSON row for the all_reservations table"""
+    if reservation.check_in_date > today:
+        time_status = 'upcoming'
+    elif reservation.check_in_date <= today <= reservation.check_out_date:
+        time_status = 'current'
+    else:
+        time_status = 'past'
+
+    is_enriched = reservation.guest_id is not None
+    return {
+        'id': reservation.id,
+        'booking_reference': reservation.booking_reference,
+        'guest_name': reservation.guest.full_name if is_enriched else reservation.guest_name,
+        'room': reservation.room.name,
+        'check_in_date': reservation.check_in_date.isoformat(),
+        'check_out_date': reservation.check_out_date.isoformat(),
+        'early_checkin_time': reservation.early_checkin_time.strftime('%I:%M %p') if reservation.early_checkin_time else None,
+        'late_checkout_time': reservation.late_checkout_time.strftime('%I:%M %p') if reservation.late_checkout_time else None,
+        'platform': reservation.platform,
+        'status': reservation.status,
+        'time_status': time_status,
+        'is_enriched': is_enriched,
+        'guest_id': reservation.guest_id,
+    }
+
+
+@login_required(login_url='/admin-page/login/')
+@user_passes_test(lambda user: user.has_perm('main.view_admin_dashboard'), login_url='/unauthorized/')
+def all_reservations_api(request):
+    """
+    One page of all_reservations rows as JSON (same filters as the page)
+
+    Keyset pagination on (check_in_date, id): ?cursor=<date>:<id> continues
+    after that row, so every page costs the same however deep it is. The
+    total is only counted for the first page.
+    """
     today = date.today()
+    reservations = _filtered_reservations(_reservation_filters(request), today)
 
-    # Prepare reservation list with enriched data
-    reservations_data = []
-    for reservation in reservations:
-        # Determine status badge
-        if reservation.check_in_date > today:
-            time_status = 'upcoming'
-            time_badge = 'Upcoming'
-        elif reservation.check_in_date <= today <= reservation.check_out_date:
-            time_status = 'current'
-            time_badge = 'Current'
-        else:
-            time_status = 'past'
-            time_badge = 'Past'
-
-        # Platform badge
-        if reservation.platform == 'booking':
-            platform_badge = '📘 Booking.com'
-        elif reservation.platform == 'airbnb':
-            platform_badge = '🏠 Airbnb'
-        else:
-            platform_badge = '👤 Manual'
-
-        # Enrichment status
-        is_enriched = reservation.guest is not None
-        enrichment_status = 'Checked In' if is_enriched else 'Pending'
-        guest_name = reservation.guest.full_name if is_enriched else reservation.guest_name or 'N/A'
-
-        reservations_data.append({
-            'id': reservation.id,
-            'booking_reference': reservation.booking_reference,
-            'guest_name': guest_name,
-            'room': reservation.room.name,
-            'check_in_date': reservation.check_in_date,
-            'check_out_date': reservation.check_out_date,
-            'platform': reservation.platform,
-            'platform_badge': platform_badge,
-            'status': reservation.status,
-            'time_status': time_status,
-            'time_badge': time_badge,
-            'is_enriched': is_enriched,
-            'enrichment_status': enrichment_status,
-            'guest_id': reservation.guest.id if is_enriched else None,
-            'early_checkin_time': reservation.early_checkin_time,
-            'late_checkout_time': reservation.late_checkout_time,
-        })
+    cursor = request.GET.get('cursor', '')
+    if cursor:
+        try:
+            cursor_date, cursor_id = cursor.split(':')
+            cursor_date, cursor_id = date.fromisoformat(cursor_date), int(cursor_id)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        reservations = reservations.filter(
+            Q(check_in_date__gt=cursor_date) | Q(check_in_date=cursor_date, id__gt=cursor_id)
+        )
 
-    return render(request, 'main/all_reservations.html', {
-        'reservations': reservations,  # Pass queryset directly (room data via select_related)
-        'platform_filter': platform_filter,
-        'status_filter': status_filter,
-        'enrichment_filter': enrichment_filter,
-        'date_from': date_from,
-        'date_to': date_to,
-        'search_query': search_query,
-        'today': today,
-    })
+    page = list(
+        reservations.select_related('room', 'guest').only(
+            'id', 'booking_reference', 'guest_name', 'check_in_date', 'check_out_date',
+            'early_checkin_time', 'late_checkout_time', 'platform', 'status',
+            'room__name', 'guest__full_name',
+        )[:RESERVATIONS_PAGE_SIZE + 1]
+    )
+    has_more = len(page) > RESERVATIONS_PAGE_SIZE
+    page = page[:RESERVATIONS_PAGE_SIZE]
+
+    payload = {
+        'results': [_reservation_row(reservation, today) for reservation in page],
+        'next_cursor': f"{page[-1].check_in_date.isoformat()}:{page[-1].id}" if has_more else None,
+    }
+    if not cursor:
+        payload['total'] = reservations.count()
+    return JsonResponse(payload)
 
 # 5. delete_reservation (line ~2314)
 @login_required(login_url='/admin-page/login/')
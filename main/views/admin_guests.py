@@ -51,6 +51,7 @@ from main.models import (
 from main.views.base import get_available_rooms
 from main.ttlock_utils import TTLockClient
 from main.pin_utils import generate_memorable_4digit_pin, add_wakeup_prefix
+from main.services.pin_provisioning import provision_pins, PinTarget, PinProvisioningError
 from main.phone_utils import normalize_phone_to_e164, validate_phone_number
 from main.dashboard_helpers import get_current_guests_data, build_entries_list, get_guest_status, get_night_progress
 from main.services.sms_reply_handler import handle_sms_room_assignment
@@ -124,46 +125,26 @@ def edit_guest(request, guest_id):
             end_time = int(end_date.timestamp() * 1000)
 
             try:
-                # Generate new PIN for front door
-                front_door_response = ttlock_client.generate_temporary_pin(
-                    lock_id=front_door_lock.lock_id,
-                    pin=new_pin,
-                    start_time=start_time,
-                    end_time=end_time,
-                    name=f"Front Door - {guest.assigned_room.name} - {guest.full_name} - {new_pin}",
-                )
-                if "keyboardPwdId" not in front_door_response:
-                    logger.error(f"Failed to generate new front door PIN for guest {guest.reservation_number}: {front_door_response.get('errmsg', 'Unknown error')}")
-                    messages.error(request, f"Failed to generate new front door PIN: {front_door_response.get('errmsg', 'Unknown error')}")
-                    return redirect('edit_guest', guest_id=guest.id)
-                guest.front_door_pin = new_pin
-                guest.front_door_pin_id = front_door_response["keyboardPwdId"]
-
-                # Generate the same PIN for the room lock
-                room_response = ttlock_client.generate_temporary_pin(
-                    lock_id=room_lock.lock_id,
-                    pin=new_pin,
-                    start_time=start_time,
-                    end_time=end_time,
-                    name=f"Room - {guest.assigned_room.name} - {guest.full_name} - {new_pin}",
-                )
-                if "keyboardPwdId" not in room_response:
-                    logger.error(f"Failed to generate new room PIN for guest {guest.reservation_number}: {room_response.get('errmsg', 'Unknown error')}")
-                    # Roll back the front door PIN
-                    try:
-                        ttlock_client.delete_pin(
-                            lock_id=front_door_lock.lock_id,
-                            keyboard_pwd_id=guest.front_door_pin_id,
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to roll back new front door PIN for guest {guest.reservation_number}: {str(e)}")
+                # Generate the new PIN for the front door and room lock in parallel
+                try:
+                    pin_ids = provision_pins(ttlock_client, new_pin, start_time, end_time, [
+                        PinTarget('front_door', front_door_lock.lock_id,
+                                  f"Front Door - {guest.assigned_room.name} - {guest.full_name} - {new_pin}", 'new front door'),
+                        PinTarget('room', room_lock.lock_id,
+                                  f"Room - {guest.assigned_room.name} - {guest.full_name} - {new_pin}", 'new room'),
+                    ])
+                except PinProvisioningError as e:
+                    logger.error(f"Failed to generate new PINs for guest {guest.reservation_number}: {str(e)}")
+                    # Old PINs were deleted above - don't keep pointing at them
                     guest.front_door_pin = None
                     guest.front_door_pin_id = None
                     guest.room_pin_id = None
                     guest.save()
-                    messages.error(request, f"Failed to generate new room PIN: {room_response.get('errmsg', 'Unknown error')}")
+                    messages.error(request, str(e))
                     return redirect('edit_guest', guest_id=guest.id)
-                guest.room_pin_id = room_response["keyboardPwdId"]
+                guest.front_door_pin = new_pin
+                guest.front_door_pin_id = pin_ids['front_door']
+                guest.room_pin_id = pin_ids['room']
                 guest.save()
                 AuditLog.objects.create(
                     user=request.user,
@@ -291,46 +272,26 @@ def edit_guest(request, guest_id):
                         ) + timedelta(days=1)
                         end_time = int(end_date.timestamp() * 1000)
 
-                        # Generate new PIN for front door
-                        front_door_response = ttlock_client.generate_temporary_pin(
-                            lock_id=front_door_lock.lock_id,
-                            pin=new_pin,
-                            start_time=start_time,
-                            end_time=end_time,
-                            name=f"Front Door - {Room.objects.get(id=new_room_id).name} - {guest.full_name} - {new_pin}",
-                        )
-                        if "keyboardPwdId" not in front_door_response:
-                            logger.error(f"Failed to generate new front door PIN for guest {guest.reservation_number} after room change: {front_door_response.get('errmsg', 'Unknown error')}")
-                            messages.error(request, f"Failed to generate new front door PIN: {front_door_response.get('errmsg', 'Unknown error')}")
-                            return redirect('edit_guest', guest_id=guest.id)
-                        guest.front_door_pin = new_pin
-                        guest.front_door_pin_id = front_door_response["keyboardPwdId"]
-
-                        # Generate the same PIN for the room lock
-                        room_response = ttlock_client.generate_temporary_pin(
-                            lock_id=new_room_lock.lock_id,
-                            pin=new_pin,
-                            start_time=start_time,
-                            end_time=end_time,
-                            name=f"Room - {Room.objects.get(id=new_room_id).name} - {guest.full_name} - {new_pin}",
-                        )
-                        if "keyboardPwdId" not in room_response:
-                            logger.error(f"Failed to generate new room PIN for guest {guest.reservation_number} after room change: {room_response.get('errmsg', 'Unknown error')}")
-                            # Roll back the front door PIN
-                            try:
-                                ttlock_client.delete_pin(
-                                    lock_id=front_door_lock.lock_id,
-                                    keyboard_pwd_id=guest.front_door_pin_id,
-                                )
-                            except Exception as e:
-                                logger.error(f"Failed to roll back new front door PIN for guest {guest.reservation_number}: {str(e)}")
+                        # Generate the new PIN for the front door and new room lock in parallel
+                        new_room_name = Room.objects.get(id=new_room_id).name
+                        try:
+                            pin_ids = provision_pins(ttlock_client, new_pin, start_time, end_time, [
+                                PinTarget('front_door', front_door_lock.lock_id,
+                                          f"Front Door - {new_room_name} - {guest.full_name} - {new_pin}", 'new front door'),
+                                PinTarget('room', new_room_lock.lock_id,
+                                          f"Room - {new_room_name} - {guest.full_name} - {new_pin}", 'new room'),
+                            ])
+                        except PinProvisioningError as e:
+                            logger.error(f"Failed to generate new PINs for guest {guest.reservation_number} after room change: {str(e)}")
                             guest.front_door_pin = None
                             guest.front_door_pin_id = None
                             guest.room_pin_id = None
                             guest.save()
-                            messages.error(request, f"Failed to generate new room PIN: {room_response.get('errmsg', 'Unknown error')}")
+                            messages.error(request, str(e))
                             return redirect('edit_guest', guest_id=guest.id)
-                        guest.room_pin_id = room_response["keyboardPwdId"]
+                        guest.front_door_pin = new_pin
+                        guest.front_door_pin_id = pin_ids['front_door']
+                        guest.room_pin_id = pin_ids['room']
                         AuditLog.objects.create(
                             user=request.user,
                             action="Guest PIN Regenerated (Room Change)",
@@ -655,38 +616,20 @@ def manual_checkin_reservation(request, reservation_id):
 
             ttlock_client = TTLockClient()
 
-            # Generate front door PIN
-            front_door_response = ttlock_client.generate_temporary_pin(
-                lock_id=front_door_lock.lock_id,
-                pin=pin,
-                start_time=start_time,
-                end_time=end_time,
-                name=f"Front Door - {reservation.room.name} - {full_name} - {pin}",
-            )
-            if "keyboardPwdId" not in front_door_response:
-                logger.error(f"Failed to generate front door PIN: {front_door_response.get('errmsg', 'Unknown error')}")
-                messages.error(request, f"Failed to generate front door PIN: {front_door_response.get('errmsg', 'Unknown error')}")
-                return redirect('manual_checkin_reservation', reservation_id=reservation.id)
-            keyboard_pwd_id_front = front_door_response["keyboardPwdId"]
-
-            # Generate room PIN
-            room_response = ttlock_client.generate_temporary_pin(
-                lock_id=room_lock.lock_id,
-                pin=pin,
-                start_time=start_time,
-                end_time=end_time,
-                name=f"Room - {reservation.room.name} - {full_name} - {pin}",
-            )
-            if "keyboardPwdId" not in room_response:
-                logger.error(f"Failed to generate room PIN: {room_response.get('errmsg', 'Unknown error')}")
-                # Roll back front door PIN
-                try:
-                    ttlock_client.delete_pin(lock_id=front_door_lock.lock_id, keyboard_pwd_id=keyboard_pwd_id_front)
-                except Exception as e:
-                    logger.error(f"Failed to roll back front door PIN: {str(e)}")
-                messages.error(request, f"Failed to generate room PIN: {room_response.get('errmsg', 'Unknown error')}")
+            # Generate front door + room PINs in parallel
+            try:
+                pin_ids = provision_pins(ttlock_client, pin, start_time, end_time, [
+                    PinTarget('front_door', front_door_lock.lock_id,
+                              f"Front Door - {reservation.room.name} - {full_name} - {pin}", 'front door'),
+                    PinTarget('room', room_lock.lock_id,
+                              f"Room - {reservation.room.name} - {full_name} - {pin}", 'room'),
+                ])
+            except PinProvisioningError as e:
+                logger.error(f"Failed to generate PINs for reservation {reservation.id}: {str(e)}")
+                messages.error(request, str(e))
                 return redirect('manual_checkin_reservation', reservation_id=reservation.id)
-            keyboard_pwd_id_room = room_response["keyboardPwdId"]
+            keyboard_pwd_id_front = pin_ids['front_door']
+            keyboard_pwd_id_room = pin_ids['room']
 
             # Create guest with PIN
             guest = Guest.objects.create(
@@ -846,46 +789,26 @@ def manage_checkin_checkout(request, guest_id):
             end_time = int(end_date.timestamp() * 1000)
 
             try:
-                # Generate new PIN for front door
-                front_door_response = ttlock_client.generate_temporary_pin(
-                    lock_id=front_door_lock.lock_id,
-                    pin=new_pin,
-                    start_time=start_time,
-                    end_time=end_time,
-                    name=f"Front Door - {guest.assigned_room.name} - {guest.full_name} - {new_pin}",
-                )
-                if "keyboardPwdId" not in front_door_response:
-                    logger.error(f"Failed to generate new front door PIN for guest {guest.reservation_number}: {front_door_response.get('errmsg', 'Unknown error')}")
-                    messages.error(request, f"Failed to generate new front door PIN: {front_door_response.get('errmsg', 'Unknown error')}")
-                    return redirect('manage_checkin_checkout', guest_id=guest.id)
-                guest.front_door_pin = new_pin
-                guest.front_door_pin_id = front_door_response["keyboardPwdId"]
-
-                # Generate the same PIN for the room lock
-                room_response = ttlock_client.generate_temporary_pin(
-                    lock_id=room_lock.lock_id,
-                    pin=new_pin,
-                    start_time=start_time,
-                    end_time=end_time,
-                    name=f"Room - {guest.assigned_room.name} - {guest.full_name} - {new_pin}",
-                )
-                if "keyboardPwdId" not in room_response:
-                    logger.error(f"Failed to generate new room PIN for guest {guest.reservation_number}: {room_response.get('errmsg', 'Unknown error')}")
-                    # Roll back the front door PIN
-                    try:
-                        ttlock_client.delete_pin(
-                            lock_id=front_door_lock.lock_id,
-                            keyboard_pwd_id=guest.front_door_pin_id,
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to roll back new front door PIN for guest {guest.reservation_number}: {str(e)}")
+                # Generate the new PIN for the front door and room lock in parallel
+                try:
+                    pin_ids = provision_pins(ttlock_client, new_pin, start_time, end_time, [
+                        PinTarget('front_door', front_door_lock.lock_id,
+                                  f"Front Door - {guest.assigned_room.name} - {guest.full_name} - {new_pin}", 'new front door'),
+                        PinTarget('room', room_lock.lock_id,
+                                  f"Room - {guest.assigned_room.name} - {guest.full_name} - {new_pin}", 'new room'),
+                    ])
+                except PinProvisioningError as e:
+                    logger.error(f"Failed to generate new PINs for guest {guest.reservation_number}: {str(e)}")
+                    # Old PINs were deleted above - don't keep pointing at them
                     guest.front_door_pin = None
                     guest.front_door_pin_id = None
                     guest.room_pin_id = None
                     guest.save()
-                    messages.error(request, f"Failed to generate new room PIN: {room_response.get('errmsg', 'Unknown error')}")
+                    messages.error(request, str(e))
                     return redirect('manage_checkin_checkout', guest_id=guest.id)
-                guest.room_pin_id = room_response["keyboardPwdId"]
+                guest.front_door_pin = new_pin
+                guest.front_door_pin_id = pin_ids['front_door']
+                guest.room_pin_id = pin_ids['room']
                 guest.save()
                 AuditLog.objects.create(
                     user=request.user,
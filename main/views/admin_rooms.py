@@ -49,6 +49,9 @@ from main.models import (
     PendingEnrichment, EnrichmentLog, CheckInAnalytics
 )
 from main.ttlock_utils import TTLockClient
+from main.services.ttlock_transport import get_transport_stats
+from main.services.lock_pin_mirror import lock_pin_report
+from main.services.lock_events import first_entries, lock_usage
 from main.pin_utils import generate_memorable_4digit_pin, add_wakeup_prefix
 from main.phone_utils import normalize_phone_to_e164, validate_phone_number
 from main.dashboard_helpers import get_current_guests_data, build_entries_list, get_guest_status, get_night_progress
@@ -384,7 +387,6 @@ def give_access(request):
             door_type = request.POST.get("door_type")
 
             client = TTLockClient()
-            max_retries = 3
 
             if door_type in ["front", "room"] and "guest_id" in request.POST:
                 # Handle guest-specific unlock
@@ -403,34 +405,24 @@ def give_access(request):
                 messages.warning(request, "Invalid unlock request. Please try again.")
                 return redirect('give_access')
 
-            for attempt in range(max_retries):
-                try:
-                    unlock_response = client.unlock_lock(lock_id=str(lock.lock_id))
-                    if "errcode" in unlock_response and unlock_response["errcode"] != 0:
-                        error_msg = unlock_response.get('errmsg', 'Unknown error')
-                        logger.error(f"Failed to unlock {door_type} (Lock ID: {lock.lock_id}): {error_msg}")
-                        if attempt == max_retries - 1:
-                            if door_type in ["front", "room"]:
-                                messages.error(request, f"Failed to unlock the {door_type} door for {guest.full_name}. Please try again or contact support.")
-                            else:
-                                messages.error(request, f"Failed to unlock {door_type.replace('manual_', '')} door. Please try again or contact support.")
-                        else:
-                            continue
-                    else:
-                        if door_type in ["front", "room"]:
-                            messages.success(request, f"The {door_type} door has been unlocked for {guest.full_name}.")
-                        else:
-                            messages.success(request, f"The {door_type.replace('manual_', '')} door has been unlocked.")
-                        break
-                except Exception as e:
-                    logger.error(f"Failed to unlock {door_type} (Lock ID: {lock.lock_id}): {str(e)}")
-                    if attempt == max_retries - 1:
-                        if door_type in ["front", "room"]:
-                            messages.error(request, f"Failed to unlock the {door_type} door for {guest.full_name}. Please try again or contact support.")
-                        else:
-                            messages.error(request, f"Failed to unlock {door_type.replace('manual_', '')} door. Please try again or contact support.")
-                    else:
-                        continue
+            # Transient TTLock failures are retried (with backoff, within a deadline) by the transport
+            if door_type in ["front", "room"]:
+                door_name = f"the {door_type} door for {guest.full_name}"
+            else:
+                door_name = f"{door_type.replace('manual_', '')} door"
+            try:
+                unlock_response = client.unlock_lock(lock_id=str(lock.lock_id))
+                if "errcode" in unlock_response and unlock_response["errcode"] != 0:
+                    error_msg = unlock_response.get('errmsg', 'Unknown error')
+                    logger.error(f"Failed to unlock {door_type} (Lock ID: {lock.lock_id}): {error_msg}")
+                    messages.error(request, f"Failed to unlock {door_name}. Please try again or contact support.")
+                elif door_type in ["front", "room"]:
+                    messages.success(request, f"The {door_type} door has been unlocked for {guest.full_name}.")
+                else:
+                    messages.success(request, f"The {door_type.replace('manual_', '')} door has been unlocked.")
+            except Exception as e:
+                logger.error(f"Failed to unlock {door_type} (Lock ID: {lock.lock_id}): {str(e)}")
+                messages.error(request, f"Failed to unlock {door_name}. Please try again or contact support.")
 
         except TTLock.DoesNotExist:
             logger.error(f"Lock with ID {lock_id} not configured in the database.")
@@ -452,3 +444,39 @@ def give_access(request):
 
 # Apply rate limit to the entire view, but we'll check 'limited' only for POST
 give_access = ratelimit(key='user', rate='6/m', method='POST', block=True)(give_access)
+
+
+@login_required(login_url='/admin-page/login/')
+@user_passes_test(lambda user: user.has_perm('main.manage_rooms'), login_url='/unauthorized/')
+def ttlock_metrics(request):
+    """TTLock transport circuit state and per-endpoint latency (this web process only)"""
+    return JsonResponse(get_transport_stats())
+
+
+@login_required(login_url='/admin-page/login/')
+@user_passes_test(lambda user: user.has_perm('main.manage_rooms'), login_url='/unauthorized/')
+def lock_pins(request):
+    """PINs on every lock, orphans and missing PINs - from the mirror, not TTLock live"""
+    return JsonResponse({'locks': lock_pin_report()})
+
+
+@login_required(login_url='/admin-page/login/')
+@user_passes_test(lambda user: user.has_perm('main.manage_rooms'), login_url='/unauthorized/')
+def lock_activity(request):
+    """Per-lock usage (last ?days=, default 7) and first entry of current guests - from callback events"""
+    try:
+        days = max(1, min(int(request.GET.get('days', 7)), 90))
+    except ValueError:
+        days = 7
+    current_guests = Guest.objects.filter(
+        is_archived=False, check_in_date__lte=date.today(), check_out_date__gte=date.today(),
+    ).exclude(front_door_pin__isnull=True).exclude(front_door_pin='')
+    entries = first_entries(current_guests)
+    return JsonResponse({
+        'days': days,
+        'locks': lock_usage(timezone.now() - timedelta(days=days)),
+        'first_entries': [
+            {'reservation_number': guest.reservation_number, 'first_entry_at': entries.get(guest.id)}
+            for guest in current_guests
+        ],
+    })
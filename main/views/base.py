@@ -53,6 +53,7 @@ from main.pin_utils import generate_memorable_4digit_pin, add_wakeup_prefix
 from main.phone_utils import normalize_phone_to_e164, validate_phone_number
 from main.dashboard_helpers import get_current_guests_data, build_entries_list, get_guest_status, get_night_progress
 from main.services.sms_reply_handler import handle_sms_room_assignment
+from main.services.occupancy import free_room_ids
 from main.enrichment_config import WHITELISTED_SMS_NUMBERS
 
 logger = logging.getLogger('main')
@@ -62,12 +63,5 @@ def unauthorized(request):
     return render(request, 'main/unauthorized.html')
 
 def get_available_rooms(check_in_date, check_out_date):
-    check_in_date = date.fromisoformat(str(check_in_date)) if isinstance(check_in_date, str) else check_in_date
-    check_out_date = date.fromisoformat(str(check_out_date)) if isinstance(check_out_date, str) else check_out_date
-
-    conflicting_guests = Guest.objects.filter(
-        Q(check_in_date__lt=check_out_date) & Q(check_out_date__gt=check_in_date)
-    )
-
-    conflicting_rooms = conflicting_guests.values_list('assigned_room', flat=True)
-    return Room.objects.exclude(id__in=conflicting_rooms)
+    # Rooms free of guests and confirmed reservations, from the occupancy index
+    return Room.objects.filter(id__in=free_room_ids(check_in_date, check_out_date))
@@ -189,7 +189,12 @@ def pending_enrichments_page(request):
     Displays reservations awaiting enrichment with real-time status tracking
     """
     from main.models import Reservation, EnrichmentLog, PendingEnrichment
-    from django.db.models import Q
+    from django.db.models import OuterRef, Q, Subquery
+    from django.db.models.fields.json import KT
+
+    # Latest enrichment log of each reservation, as two subquery annotations
+    # (one query for the whole list instead of one per reservation)
+    latest_logs = EnrichmentLog.objects.filter(reservation=OuterRef('pk')).order_by('-timestamp')
 
     # Get unenriched reservations (booking_reference is empty string for unenriched)
     unenriched = Reservation.objects.filter(
@@ -197,29 +202,32 @@ def pending_enrichments_page(request):
         status='confirmed',
         guest__isnull=True,
         booking_reference=''
-    ).select_related('room').order_by('check_in_date')
+    ).select_related('room').annotate(
+        latest_enrichment_action=Subquery(latest_logs.values('action')[:1]),
+        latest_enrichment_attempt=Subquery(latest_logs.annotate(attempt=KT('details__attempt')).values('attempt')[:1]),
+    ).order_by('check_in_date')
 
     # Build unenriched data with enrichment status
     unenriched_data = []
     for reservation in unenriched:
-        # Get latest enrichment log for this reservation
-        latest_log = EnrichmentLog.objects.filter(
-            reservation=reservation
-        ).order_by('-timestamp').first()
+        latest_action = reservation.latest_enrichment_action
 
         # Determine status badge
-        if latest_log:
-            if latest_log.action == 'email_search_started':
-                attempt = latest_log.details.get('attempt', 1) if isinstance(latest_log.details, dict) else 1
+        if latest_action:
+            if latest_action == 'email_search_started':
+                try:
+                    attempt = int(reservation.latest_enrichment_attempt or 1)
+                except ValueError:
+                    attempt = 1
                 status = f"Searching Email (Attempt {attempt}/4)"
                 badge_class = 'warning' if attempt <= 2 else 'orange'
-            elif latest_log.action == 'email_not_found_alerted':
+            elif latest_action == 'email_not_found_alerted':
                 status = "Email Not Found - SMS Sent"
                 badge_class = 'danger'
-            elif latest_log.action == 'collision_detected':
+            elif latest_action == 'collision_detected':
                 status = "Collision Detected - SMS Sent"
                 badge_class = 'info'
-            elif latest_log.action == 'email_found_multi_room':
+            elif latest_action == 'email_found_multi_room':
                 status = "Multi-Room Booking - Confirmation Sent"
                 badge_class = 'purple'
             else:
@@ -240,7 +248,7 @@ def pending_enrichments_page(request):
             'platform': 'Booking.com',
             'status': status,
             'badge_class': badge_class,
-            'latest_log': latest_log,
+            'latest_action': latest_action,
         })
 
             # Get recently enriched reservations (last 20)
@@ -256,26 +264,28 @@ def pending_enrichments_page(request):
         ]
     ).select_related('reservation', 'room').order_by('-timestamp')[:20]
 
-    # Build enriched data from logs
-    enriched_data = []
+    # Build enriched data from logs (one log per booking ref, newest first)
+    unique_logs = []
     seen_booking_refs = set()  # Avoid duplicates
-    
     for log in recent_enrichment_logs:
-        # Skip if we've already added this booking ref
-        if log.booking_reference in seen_booking_refs:
-            continue
-        
-        seen_booking_refs.add(log.booking_reference)
-        
-        # Get the reservation for this booking ref
-        reservation = Reservation.objects.filter(
-            booking_reference=log.booking_reference,
-            platform='booking'
-        ).select_related('room').first()
-        
+        if log.booking_reference not in seen_booking_refs:
+            seen_booking_refs.add(log.booking_reference)
+            unique_logs.append(log)
+
+    # Reservations of those booking refs in one query (latest check-in per ref, as .first() did)
+    reservations_by_ref = {}
+    for reservation in Reservation.objects.filter(
+        booking_reference__in=seen_booking_refs,
+        platform='booking'
+    ).select_related('room').order_by('-check_in_date', 'pk'):
+        reservations_by_ref.setdefault(reservation.booking_reference, reservation)
+
+    enriched_data = []
+    for log in unique_logs:
+        reservation = reservations_by_ref.get(log.booking_reference)
         if not reservation:
             continue
-        
+
         # Determine method from log action
         if log.action == 'email_found_matched':
             method = "Auto (Email)"
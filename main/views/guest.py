@@ -46,10 +46,12 @@ from twilio.rest import Client
 from main.models import (
     Guest, Room, ReviewCSVUpload, TTLock, AuditLog, GuestIDUpload,
     PopularEvent, Reservation, RoomICalConfig, MessageTemplate,
-    PendingEnrichment, EnrichmentLog, CheckInAnalytics
+    PendingEnrichment, EnrichmentLog, CheckInAnalytics, UnlockCommand
 )
 from main.ttlock_utils import TTLockClient
+from main.services.unlock_commands import enqueue_unlock, unlock_status_payload
 from main.pin_utils import generate_memorable_4digit_pin, add_wakeup_prefix
+from main.services.pin_provisioning import provision_pins, PinTarget, PinProvisioningError
 from main.phone_utils import normalize_phone_to_e164, validate_phone_number
 from main.dashboard_helpers import get_current_guests_data, build_entries_list, get_guest_status, get_night_progress
 from main.services.sms_reply_handler import handle_sms_room_assignment
@@ -123,47 +125,21 @@ def checkin_legacy(request):
                     end_time = int(end_date.timestamp() * 1000)
                     pin = generate_memorable_4digit_pin()  # 4-digit memorable PIN
 
-                    # Generate PIN for front door
-                    front_door_response = client.generate_temporary_pin(
-                        lock_id=str(front_door_lock.lock_id),
-                        pin=pin,
-                        start_time=start_time,
-                        end_time=end_time,
-                        name=f"Front Door - {guest.assigned_room.name} - {guest.full_name} - {pin}",
-                    )
-                    if "keyboardPwdId" not in front_door_response:
-                        logger.error(f"Failed to generate front door PIN for guest {guest.reservation_number}: {front_door_response.get('errmsg', 'Unknown error')}")
-                        messages.error(request, f"Failed to generate front door PIN: {front_door_response.get('errmsg', 'Unknown error')}")
+                    # Generate the same PIN for the front door and room lock in parallel
+                    try:
+                        pin_ids = provision_pins(client, pin, start_time, end_time, [
+                            PinTarget('front_door', front_door_lock.lock_id,
+                                      f"Front Door - {guest.assigned_room.name} - {guest.full_name} - {pin}", 'front door'),
+                            PinTarget('room', room_lock.lock_id,
+                                      f"Room - {guest.assigned_room.name} - {guest.full_name} - {pin}", 'room'),
+                        ])
+                    except PinProvisioningError as e:
+                        logger.error(f"Failed to generate PINs for guest {guest.reservation_number}: {str(e)}")
+                        messages.error(request, str(e))
                         return redirect("checkin")
                     guest.front_door_pin = pin
-                    guest.front_door_pin_id = front_door_response["keyboardPwdId"]
-                    logger.info(f"Generated front door PIN {pin} for guest {guest.reservation_number} (Keyboard Password ID: {front_door_response['keyboardPwdId']})")
-
-                    # Generate the same PIN for the room lock
-                    room_response = client.generate_temporary_pin(
-                        lock_id=str(room_lock.lock_id),
-                        pin=pin,
-                        start_time=start_time,
-                        end_time=end_time,
-                        name=f"Room - {guest.assigned_room.name} - {guest.full_name} - {pin}",
-                    )
-                    if "keyboardPwdId" not in room_response:
-                        logger.error(f"Failed to generate room PIN for guest {guest.reservation_number}: {room_response.get('errmsg', 'Unknown error')}")
-                        try:
-                            client.delete_pin(
-                                lock_id=str(front_door_lock.lock_id),
-                                keyboard_pwd_id=guest.front_door_pin_id,
-                            )
-                            logger.info(f"Rolled back front door PIN for guest {guest.reservation_number}")
-                        except Exception as e:
-                            logger.error(f"Failed to roll back front door PIN for guest {guest.reservation_number}: {str(e)}")
-                        guest.front_door_pin = None
-                        guest.front_door_pin_id = None
-                        guest.save()
-                        messages.error(request, f"Failed to generate room PIN: {room_response.get('errmsg', 'Unknown error')}")
-                        return redirect("checkin")
-                    guest.room_pin_id = room_response["keyboardPwdId"]
-                    logger.info(f"Generated room PIN {pin} for guest {guest.reservation_number} (Keyboard Password ID: {room_response['keyboardPwdId']})")
+                    guest.front_door_pin_id = pin_ids['front_door']
+                    guest.room_pin_id = pin_ids['room']
                     guest.save()
 
                     # Unlock the front door remotely
@@ -457,83 +433,26 @@ def enrich_reservation(request):
                 end_time = int(end_date.timestamp() * 1000)
                 pin = generate_memorable_4digit_pin()  # 4-digit memorable PIN
 
-                # Generate PIN for front door
-                front_door_response = client.generate_temporary_pin(
-                    lock_id=str(front_door_lock.lock_id),
-                    pin=pin,
-                    start_time=start_time,
-                    end_time=end_time,
-                    name=f"Front Door - {guest.assigned_room.name} - {guest.full_name} - {pin}",
-                )
-                if "keyboardPwdId" not in front_door_response:
-                    logger.error(f"Failed to generate front door PIN for guest {guest.reservation_number}: {front_door_response.get('errmsg', 'Unknown error')}")
-                    messages.error(request, f"Failed to generate front door PIN: {front_door_response.get('errmsg', 'Unknown error')}")
-                    # Transaction will rollback automatically
-                    if 'reservation_to_enrich' in request.session:
-                        del request.session['reservation_to_enrich']
-                    return redirect("checkin")
-                guest.front_door_pin = pin
-                guest.front_door_pin_id = front_door_response["keyboardPwdId"]
-                logger.info(f"Generated front door PIN {pin} for guest {guest.reservation_number} (Keyboard Password ID: {front_door_response['keyboardPwdId']})")
-
-                # MULTI-ROOM: Generate the same PIN for ALL room locks
-                room_pin_ids = []
-                failed_rooms = []
-                
-                for res in all_reservations:
-                    room_lock = res.room.ttlock
-                    if not room_lock:
-                        logger.warning(f"No TTLock assigned to room {res.room.name} - skipping PIN generation")
-                        failed_rooms.append(res.room.name)
-                        continue
-                    
-                    room_response = client.generate_temporary_pin(
-                        lock_id=str(room_lock.lock_id),
-                        pin=pin,
-                        start_time=start_time,
-                        end_time=end_time,
-                        name=f"Room - {res.room.name} - {guest.full_name} - {pin}",
-                    )
-                    
-                    if "keyboardPwdId" not in room_response:
-                        logger.error(f"Failed to generate room PIN for {res.room.name}: {room_response.get('errmsg', 'Unknown error')}")
-                        failed_rooms.append(res.room.name)
-                    else:
-                        room_pin_ids.append({
-                            'room_name': res.room.name,
-                            'pin_id': room_response["keyboardPwdId"]
-                        })
-                        logger.info(f"Generated room PIN {pin} for {res.room.name} (Keyboard Password ID: {room_response['keyboardPwdId']})")
-                
+                # MULTI-ROOM: Generate the same PIN for the front door and ALL room locks in parallel
+                failed_rooms = [res.room.name for res in all_reservations if not res.room.ttlock]
                 if failed_rooms:
-                    # Rollback: Delete all created PINs
-                    logger.error(f"Failed to generate PINs for rooms: {', '.join(failed_rooms)}. Rolling back...")
-                    try:
-                        client.delete_pin(
-                            lock_id=str(front_door_lock.lock_id),
-                            keyboard_pwd_id=guest.front_door_pin_id,
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to roll back front door PIN: {str(e)}")
-                    
-                    for pin_info in room_pin_ids:
-                        try:
-                            # Find the room lock to delete PIN
-                            for res in all_reservations:
-                                if res.room.name == pin_info['room_name'] and res.room.ttlock:
-                                    client.delete_pin(
-                                        lock_id=str(res.room.ttlock.lock_id),
-                                        keyboard_pwd_id=pin_info['pin_id'],
-                                    )
-                                    break
-                        except Exception as e:
-                            logger.error(f"Failed to roll back room PIN for {pin_info['room_name']}: {str(e)}")
-                    
                     # Raise exception to trigger transaction rollback
-                    raise Exception(f"Failed to generate PINs for rooms: {', '.join(failed_rooms)}")
-                
+                    raise Exception(f"No TTLock assigned to rooms: {', '.join(failed_rooms)}")
+
+                targets = [PinTarget('front_door', front_door_lock.lock_id,
+                                     f"Front Door - {guest.assigned_room.name} - {guest.full_name} - {pin}", 'front door')]
+                targets += [
+                    PinTarget(res.id, res.room.ttlock.lock_id,
+                              f"Room - {res.room.name} - {guest.full_name} - {pin}", f"room ({res.room.name})")
+                    for res in all_reservations
+                ]
+                # Raises PinProvisioningError (after deleting any created PINs) -> transaction rollback
+                pin_ids = provision_pins(client, pin, start_time, end_time, targets)
+
+                guest.front_door_pin = pin
+                guest.front_door_pin_id = pin_ids['front_door']
                 # Store the first room's PIN ID (for backward compatibility with Guest.room_pin_id field)
-                guest.room_pin_id = room_pin_ids[0]['pin_id'] if room_pin_ids else None
+                guest.room_pin_id = pin_ids[targets[1].key] if len(targets) > 1 else None
                 guest.save()
                 
         except TTLock.DoesNotExist:
@@ -542,6 +461,12 @@ def enrich_reservation(request):
             if 'reservation_to_enrich' in request.session:
                 del request.session['reservation_to_enrich']
             return redirect("checkin")
+        except PinProvisioningError as e:
+            logger.error(f"Failed to generate PIN for guest (transaction rolled back): {str(e)}")
+            messages.error(request, str(e))
+            if 'reservation_to_enrich' in request.session:
+                del request.session['reservation_to_enrich']
+            return redirect("checkin")
         except Exception as e:
             logger.error(f"Failed to generate PIN for guest (transaction rolled back): {str(e)}")
             messages.error(request, f"Failed to generate PIN: {str(e)}")
@@ -765,56 +690,26 @@ def room_detail(request, room_token):
             try:
                 front_door_lock = TTLock.objects.get(is_front_door=True)
                 room_lock = guest.assigned_room.ttlock
-                client = TTLockClient()
-                max_retries = 3
                 door_type = request.POST.get("door_type")
 
                 if door_type == "front":
-                    for attempt in range(max_retries):
-                        try:
-                            unlock_response = client.unlock_lock(lock_id=str(front_door_lock.lock_id))
-                            if "errcode" in unlock_response and unlock_response["errcode"] != 0:
-                                logger.error(f"Failed to unlock front door for guest {guest.reservation_number}: {unlock_response.get('errmsg', 'Unknown error')}")
-                                if attempt == max_retries - 1:
-                                    return JsonResponse({"error": "Failed to unlock the front door. Please try again or contact support."}, status=400)
-                                else:
-                                    logger.info(f"Retrying unlock front door for guest {guest.reservation_number} (attempt {attempt + 1}/{max_retries})")
-                                    continue
-                            else:
-                                logger.info(f"Successfully unlocked front door for guest {guest.reservation_number}")
-                                return JsonResponse({"success": "The front door has been unlocked for you."})
-                        except Exception as e:
-                            logger.error(f"Failed to unlock front door for guest {guest.reservation_number}: {str(e)}")
-                            if attempt == max_retries - 1:
-                                return JsonResponse({"error": "Failed to unlock the front door. Please try again or contact support."}, status=400)
-                            else:
-                                logger.info(f"Retrying unlock front door for guest {guest.reservation_number} (attempt {attempt + 1}/{max_retries})")
-                                continue
+                    lock = front_door_lock
                 elif door_type == "room" and room_lock:
-                    for attempt in range(max_retries):
-                        try:
-                            unlock_response = client.unlock_lock(lock_id=str(room_lock.lock_id))
-                            if "errcode" in unlock_response and unlock_response["errcode"] != 0:
-                                logger.error(f"Failed to unlock room door for guest {guest.reservation_number}: {unlock_response.get('errmsg', 'Unknown error')}")
-                                if attempt == max_retries - 1:
-                                    return JsonResponse({"error": "Failed to unlock the room door. Please try again or contact support."}, status=400)
-                                else:
-                                    logger.info(f"Retrying unlock room door for guest {guest.reservation_number} (attempt {attempt + 1}/{max_retries})")
-                                    continue
-                            else:
-                                logger.info(f"Successfully unlocked room door for guest {guest.reservation_number}")
-                                return JsonResponse({"success": "The room door has been unlocked for you."})
-                        except Exception as e:
-                            logger.error(f"Failed to unlock room door for guest {guest.reservation_number}: {str(e)}")
-                            if attempt == max_retries - 1:
-                                return JsonResponse({"error": "Failed to unlock the room door. Please try again or contact support."}, status=400)
-                            else:
-                                logger.info(f"Retrying unlock room door for guest {guest.reservation_number} (attempt {attempt + 1}/{max_retries})")
-                                continue
+                    lock = room_lock
                 else:
                     logger.warning(f"Invalid door_type or no room lock assigned for guest {guest.reservation_number}")
                     return JsonResponse({"error": "Invalid unlock request or no room lock assigned. Please contact support."}, status=400)
 
+                # Queued for the unlock worker - the page polls unlock_status for the result
+                command, created = enqueue_unlock(lock, guest, door_type)
+                if created:
+                    logger.info(f"Queued {door_type} door unlock {command.id} for guest {guest.reservation_number}")
+                else:
+                    logger.info(f"Reusing unlock {command.id} of {door_type} door for guest {guest.reservation_number} (repeat tap)")
+                payload = unlock_status_payload(command)
+                payload['status_url'] = reverse('unlock_status', kwargs={'room_token': room_token, 'command_id': command.id})
+                return JsonResponse(payload, status=202)
+
             except TTLock.DoesNotExist:
                 logger.error("Front door lock not configured in the database.")
                 return JsonResponse({"error": "Front door lock not configured. Please contact support."}, status=400)
@@ -839,6 +734,28 @@ def room_detail(request, room_token):
 room_detail = ratelimit(key='ip', rate='6/m', method='POST', block=True)(room_detail)
 
 
+def unlock_status(request, room_token, command_id):
+    """
+    AJAX endpoint polled by the room page after an unlock tap
+    Returns JSON with the command status (and the message once done)
+    """
+    reservation_number = request.session.get("reservation_number", None)
+    guest = Guest.objects.filter(secure_token=room_token).first()
+    if not guest or not reservation_number or guest.reservation_number != reservation_number:
+        return JsonResponse({"error": "Unauthorized."}, status=403)
+
+    # Any command on the guest's own doors (a repeat tap may reuse another guest's front door command)
+    lock_ids = [lock_id for lock_id in (
+        TTLock.objects.filter(is_front_door=True).values_list('id', flat=True).first(),
+        guest.assigned_room.ttlock_id,
+    ) if lock_id]
+    command = UnlockCommand.objects.filter(id=command_id, lock_id__in=lock_ids).first()
+    if command is None:
+        return JsonResponse({"error": "Unlock request not found."}, status=404)
+
+    return JsonResponse(unlock_status_payload(command))
+
+
 # 4. report_pin_issue (line ~906)
 @ratelimit(key='ip', rate='3/m', method='POST', block=True)
 def report_pin_issue(request):
@@ -32,7 +32,6 @@ import uuid
 import pytz
 import datetime as dt
 import re
-import json
 import os
 import sys
 import time as time_module
@@ -56,6 +55,7 @@ from main.pin_utils import generate_memorable_4digit_pin, add_wakeup_prefix
 from main.phone_utils import normalize_phone_to_e164, validate_phone_number
 from main.dashboard_helpers import get_current_guests_data, build_entries_list, get_guest_status, get_night_progress
 from main.services.sms_reply_handler import handle_sms_room_assignment
+from main.services.lock_events import parse_callback, buffer_lock_events
 from main.enrichment_config import WHITELISTED_SMS_NUMBERS
 
 logger = logging.getLogger('main')
@@ -63,24 +63,21 @@ logger = logging.getLogger('main')
 
 @csrf_exempt
 def ttlock_callback(request):
-    """Handle callback events from TTLock API."""
+    """
+    Handle callback events from TTLock API.
+
+    Lock records are parsed and buffered for bulk insertion into LockEvent
+    (see main.services.lock_events) - no database write in the request.
+    """
     if request.method == 'POST':
         try:
-            # Log the headers, query parameters, and body
-            headers = dict(request.headers)
-            query_params = dict(request.GET)
             body = request.body.decode('utf-8')
-            # Try to parse the body as JSON for better readability
-            try:
-                body_json = json.loads(body)
-            except json.JSONDecodeError:
-                body_json = body
-            logger.info(
-                f"Received TTLock callback - "
-                f"Headers: {headers}, "
-                f"Query Params: {query_params}, "
-                f"Body: {body_json}"
-            )
+            events = parse_callback(body, request.POST)
+            if events:
+                buffer_lock_events(events)
+                logger.info(f"Received TTLock callback: {len(events)} lock record(s) for lock(s) {sorted({e['lock_id'] for e in events})}")
+            else:
+                logger.info(f"Received TTLock callback without lock records - Query Params: {dict(request.GET)}, Body: {body[:500]}")
             return HttpResponse(status=200)
         except Exception as e:
             logger.error(f"Error processing TTLock callback: {str(e)}")
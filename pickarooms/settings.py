@@ -90,6 +90,46 @@ TTLOCK_BASE_URL = os.environ.get("TTLOCK_BASE_URL", "https://euapi.sciener.com/v
 TTLOCK_OAUTH_BASE_URL = os.environ.get("TTLOCK_OAUTH_BASE_URL", "https://euapi.sciener.com")  # For OAuth endpoints
 TTLOCK_CALLBACK_URL = os.environ.get("TTLOCK_CALLBACK_URL", "https://pickarooms-495ab160017c.herokuapp.com/api/callback")
 
+# TTLock HTTP transport (main/services/ttlock_transport.py)
+# Worst case per lock call is bounded by TTLOCK_REQUEST_DEADLINE (below gunicorn's 30s timeout)
+TTLOCK_CONNECT_TIMEOUT = float(os.environ.get("TTLOCK_CONNECT_TIMEOUT", "3.05"))
+TTLOCK_READ_TIMEOUT = float(os.environ.get("TTLOCK_READ_TIMEOUT", "10"))
+TTLOCK_REQUEST_DEADLINE = float(os.environ.get("TTLOCK_REQUEST_DEADLINE", "20"))
+TTLOCK_MAX_RETRIES = int(os.environ.get("TTLOCK_MAX_RETRIES", "2"))
+TTLOCK_BACKOFF_BASE = float(os.environ.get("TTLOCK_BACKOFF_BASE", "0.5"))  # Seconds, doubled per retry (full jitter)
+TTLOCK_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("TTLOCK_CIRCUIT_FAILURE_THRESHOLD", "5"))
+TTLOCK_CIRCUIT_RESET_SECONDS = float(os.environ.get("TTLOCK_CIRCUIT_RESET_SECONDS", "30"))
+TTLOCK_POOL_SIZE = int(os.environ.get("TTLOCK_POOL_SIZE", "10"))  # Keep-alive connections per process
+
+# Next-day PIN pre-provisioning (main.tasks.preprovision_next_day_pins)
+PIN_PREPROVISION_HOUR = int(os.environ.get("PIN_PREPROVISION_HOUR", "18"))  # UK hour from which tomorrow's arrivals are provisioned
+PIN_PREPROVISION_MAX_ATTEMPTS = int(os.environ.get("PIN_PREPROVISION_MAX_ATTEMPTS", "3"))  # Per reservation, then check-in falls back to on-demand
+PIN_PREPROVISION_MIN_INTERVAL = float(os.environ.get("PIN_PREPROVISION_MIN_INTERVAL", "1.0"))  # Seconds between reservations (TTLock API rate limit)
+
+# Checkout PIN teardown queue (main.tasks.process_pin_teardowns)
+PIN_TEARDOWN_WORKERS = int(os.environ.get("PIN_TEARDOWN_WORKERS", "4"))  # Concurrent TTLock delete calls
+PIN_TEARDOWN_MIN_INTERVAL = float(os.environ.get("PIN_TEARDOWN_MIN_INTERVAL", "0.2"))  # Seconds between TTLock calls (rate limit)
+PIN_TEARDOWN_BATCH_SIZE = int(os.environ.get("PIN_TEARDOWN_BATCH_SIZE", "20"))  # Guests claimed per batch
+PIN_TEARDOWN_TIME_BUDGET = int(os.environ.get("PIN_TEARDOWN_TIME_BUDGET", "150"))  # Seconds per task run before it re-queues itself (hard limit is 300)
+PIN_TEARDOWN_LEASE_SECONDS = int(os.environ.get("PIN_TEARDOWN_LEASE_SECONDS", "600"))  # Claimed jobs of a dead worker are picked up again after this
+PIN_TEARDOWN_RETRY_DELAY = int(os.environ.get("PIN_TEARDOWN_RETRY_DELAY", "300"))  # Seconds before a failed deletion is retried
+PIN_TEARDOWN_MAX_ATTEMPTS = int(os.environ.get("PIN_TEARDOWN_MAX_ATTEMPTS", "5"))  # Then the job is marked failed
+
+# Keyboard password mirror + reconciliation (main.tasks.sync_lock_keyboard_passwords)
+LOCK_PIN_SYNC_WORKERS = int(os.environ.get("LOCK_PIN_SYNC_WORKERS", "4"))  # Locks paged concurrently
+LOCK_PIN_ORPHAN_GRACE_MINUTES = int(os.environ.get("LOCK_PIN_ORPHAN_GRACE_MINUTES", "30"))  # Newer PINs may not have their guest/job row yet
+LOCK_PIN_DELETE_ORPHANS = os.environ.get("LOCK_PIN_DELETE_ORPHANS", "False") == "True"  # Report only unless enabled (timed PINs only)
+
+# Remote unlock command queue (main.services.unlock_commands)
+UNLOCK_DEDUP_SECONDS = int(os.environ.get("UNLOCK_DEDUP_SECONDS", "10"))  # Taps on the same lock within this reuse one command
+UNLOCK_COMMAND_EXPIRY_SECONDS = int(os.environ.get("UNLOCK_COMMAND_EXPIRY_SECONDS", "60"))  # Older queued commands are never executed
+
+# Cross-platform double booking warnings (main.services.reservation_overlaps)
+OVERLAP_WINDOW_DAYS = int(os.environ.get("OVERLAP_WINDOW_DAYS", "365"))  # Only stays checking in within this many days are compared
+
+# TTLock callback event store (main.services.lock_events)
+LOCK_EVENT_FLUSH_SIZE = int(os.environ.get("LOCK_EVENT_FLUSH_SIZE", "200"))  # Buffered records that trigger an immediate bulk insert (else every minute)
+
 # Ticketmaster API Configuration
 TICKETMASTER_CONSUMER_KEY = os.environ.get("TICKETMASTER_CONSUMER_KEY")
 TICKETMASTER_CONSUMER_SECRET = os.environ.get("TICKETMASTER_CONSUMER_SECRET")
@@ -207,6 +247,9 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 # If not set or empty, all unread Booking.com emails will be processed
 GMAIL_LABEL_FILTER = os.environ.get("GMAIL_LABEL_FILTER", "").strip()
 
+# Messages per Gmail batch HTTP request when fetching email headers (Gmail allows up to 100)
+GMAIL_BATCH_SIZE = int(os.environ.get("GMAIL_BATCH_SIZE", "50"))
+
 # ✅ reCAPTCHA Configuration
 RECAPTCHA_PUBLIC_KEY = os.environ.get("RECAPTCHA_PUBLIC_KEY")
 RECAPTCHA_PRIVATE_KEY = os.environ.get("RECAPTCHA_PRIVATE_KEY")
@@ -361,14 +404,26 @@ CELERY_BEAT_SCHEDULE = {
     # REMOVED: poll-booking-com-emails (deprecated Oct 29, 2025)
     # Old email-driven flow removed in favor of iCal-driven enrichment
 
-    # iCal feed polling - Reduced from 10min to 15min
-    'poll-ical-feeds-every-15-minutes': {
+    # iCal feed polling - Adaptive per feed (see ICAL_POLL_* in main/enrichment_config.py)
+    # The task ticks every 5 minutes but only syncs feeds whose next poll time has passed
+    'poll-ical-feeds-every-5-minutes': {
         'task': 'main.tasks.poll_all_ical_feeds',
-        'schedule': 900.0,  # Every 15 minutes (reduced from 10 min)
+        'schedule': 300.0,  # Every 5 minutes (= ICAL_POLL_MIN_INTERVAL)
         'options': {
             'expires': 300,  # Task expires after 5 minutes if not picked up
         }
     },
+    # Email enrichment - global matcher for all unenriched Booking.com reservations
+    # (replaces per-reservation retry chains; also triggered right after iCal syncs)
+    # Each run first syncs the BookingEmail index from Gmail history, which is
+    # what keeps the index warm - there is no separate index sync beat
+    'match-unenriched-reservations': {
+        'task': 'main.tasks.match_unenriched_reservations',
+        'schedule': 120.0,  # Every 2 minutes
+        'options': {
+            'expires': 120,
+        }
+    },
     # Archive past guests - Midday check (12:15 PM)
     'archive-past-guests-midday': {
         'task': 'main.tasks.archive_past_guests',
@@ -393,6 +448,53 @@ CELERY_BEAT_SCHEDULE = {
             'expires': 600,
         }
     },
+    # Next-day PIN pre-provisioning - every 15 minutes
+    # Provisions tomorrow's arrivals from PIN_PREPROVISION_HOUR (retrying failures on
+    # later runs) and releases unclaimed PINs of cancelled/changed reservations
+    'preprovision-next-day-pins': {
+        'task': 'main.tasks.preprovision_next_day_pins',
+        'schedule': 900.0,  # Every 15 minutes
+        'options': {
+            'expires': 900,
+        }
+    },
+    # Checkout PIN teardown - every 5 minutes
+    # archive_past_guests queues the work and starts it right away; this resumes
+    # jobs left by a restarted worker and retries failed deletions
+    'process-pin-teardowns': {
+        'task': 'main.tasks.process_pin_teardowns',
+        'schedule': 300.0,  # Every 5 minutes
+        'options': {
+            'expires': 300,
+        }
+    },
+    # Keyboard password mirror - every 30 minutes
+    # Mirrors the PINs on every lock and flags orphaned / missing PINs
+    'sync-lock-keyboard-passwords': {
+        'task': 'main.tasks.sync_lock_keyboard_passwords',
+        'schedule': 1800.0,  # Every 30 minutes
+        'options': {
+            'expires': 1800,
+        }
+    },
+    # TTLock callback events - every minute
+    # Bulk-inserts the lock records buffered by the callback webhook
+    'flush-lock-events': {
+        'task': 'main.tasks.flush_lock_events',
+        'schedule': 60.0,  # Every minute
+        'options': {
+            'expires': 60,
+        }
+    },
+    # Dashboard snapshots - Daily at 00:05
+    # Safety-net rebuild of yesterday/today/tomorrow (hooks keep them current during the day)
+    'rebuild-dashboard-snapshots-daily': {
+        'task': 'main.tasks.rebuild_dashboard_snapshots',
+        'schedule': crontab(hour=0, minute=5),  # Daily at 00:05
+        'options': {
+            'expires': 1800,
+        }
+    },
     # Cleanup old reservations - Daily at 3:00 AM
     'cleanup-old-reservations-daily': {
         'task': 'main.tasks.cleanup_old_reservations',
@@ -419,6 +521,17 @@ CELERY_BEAT_SCHEDULE = {
     },
 }
 
+# iCal polling mode
+# When enabled, poll_all_ical_feeds fetches every active feed concurrently inside
+# one worker (bounded thread pool, keep-alive session per host) and syncs the
+# results itself, instead of enqueueing one sync_room_ical_feed task per feed.
+ICAL_CONCURRENT_FETCH = os.environ.get('ICAL_CONCURRENT_FETCH', 'False') == 'True'
+ICAL_FETCH_MAX_WORKERS = int(os.environ.get('ICAL_FETCH_MAX_WORKERS', '8'))
+ICAL_FETCH_PER_HOST_LIMIT = int(os.environ.get('ICAL_FETCH_PER_HOST_LIMIT', '2'))
+# Seconds one concurrent poll may spend before deferring the remaining syncs to the next
+# run - kept under CELERY_TASK_SOFT_TIME_LIMIT, since the per-feed DB syncs run in sequence
+ICAL_POLL_TIME_BUDGET = int(os.environ.get('ICAL_POLL_TIME_BUDGET', '200'))
+
 # Store task results in Django database
 CELERY_RESULT_BACKEND = 'django-db'
 CELERY_CACHE_BACKEND = 'django-cache'
@@ -430,3 +543,10 @@ CELERY_TASK_REJECT_ON_WORKER_LOST = True  # Reject tasks if worker crashes
 CELERY_TASK_TIME_LIMIT = 300  # Hard limit: 5 minutes per task
 CELERY_TASK_SOFT_TIME_LIMIT = 240  # Soft limit: 4 minutes per task
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 100  # Restart worker after 100 tasks to prevent memory leaks
+
+# Remote unlocks get their own queue: a guest at the door never waits behind
+# syncs. The 'unlock' process consumes only this queue; the general worker also
+# consumes it as a fallback (see Procfile)
+CELERY_TASK_ROUTES = {
+    'main.tasks.execute_unlock_command': {'queue': 'unlock'},
+}
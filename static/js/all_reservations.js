@@ -1,125 +1,195 @@
 // All Reservations Page - JavaScript
-// Handles pagination (25 per page) and bulk selection
+// Fetches rows page by page (25 per page) from all_reservations_api and handles bulk selection
 
 document.addEventListener("DOMContentLoaded", function () {
-    const rowsPerPage = 25; // Changed from 10 to 25
-    let currentPage = 1;
+    const config = JSON.parse(document.getElementById("reservations-config").textContent);
+    const rowsPerPage = 25; // RESERVATIONS_PAGE_SIZE in admin_dashboard.py
 
     const tbody = document.getElementById("reservations-tbody");
-    const rows = Array.from(document.querySelectorAll(".reservation-row"));
     const totalCount = document.getElementById("total-count");
     const showingInfo = document.getElementById("showing-info");
     const paginationControls = document.getElementById("pagination-controls");
+    const csrfToken = document.querySelector("#bulk-delete-form input[name='csrfmiddlewaretoken']").value;
+
+    // Keyset pagination: cursors[i] fetches page i + 1 (the first page has no cursor)
+    const cursors = [""];
+    let currentPage = 1;
+    let nextCursor = null;
+    let total = null;
+
+    // Selected reservation ids, kept across pages
+    const selectedIds = new Set();
+
+    function el(tag, attrs, children) {
+        const node = document.createElement(tag);
+        Object.entries(attrs || {}).forEach(([key, value]) => {
+            if (key === "text") {
+                node.textContent = value;
+            } else {
+                node.setAttribute(key, value);
+            }
+        });
+        (children || []).forEach(child => child && node.appendChild(child));
+        return node;
+    }
 
-    const totalRows = rows.length;
-    const totalPages = Math.ceil(totalRows / rowsPerPage);
+    function url(name, id) {
+        return config.urls[name].replace(/\/0\/$/, `/${id}/`);
+    }
 
-    // Display specific page
-    function displayPage(page) {
-        currentPage = page;
+    function formatDate(isoDate) {
+        return new Date(isoDate + "T00:00:00").toLocaleDateString("en-GB", { day: "2-digit", month: "short", year: "numeric" });
+    }
 
-        // Hide all rows
-        rows.forEach(row => row.style.display = "none");
+    function dateCell(isoDate, time) {
+        const cell = el("td", { text: formatDate(isoDate) });
+        if (time) {
+            cell.appendChild(el("br"));
+            cell.appendChild(el("small", { text: time }));
+        }
+        return cell;
+    }
 
-        // Calculate range
-        const start = (page - 1) * rowsPerPage;
-        const end = Math.min(start + rowsPerPage, totalRows);
+    function badge(className, text) {
+        return el("span", { class: className, text: text });
+    }
 
-        // Show rows for current page
-        for (let i = start; i < end; i++) {
-            rows[i].style.display = "";
+    function buildRow(reservation) {
+        let selectCell;
+        if (!reservation.is_enriched) {
+            const checkbox = el("input", { type: "checkbox", class: "reservation-checkbox", value: reservation.id });
+            checkbox.checked = selectedIds.has(String(reservation.id));
+            checkbox.addEventListener("change", function () {
+                this.checked ? selectedIds.add(this.value) : selectedIds.delete(this.value);
+                updateSelectionUI();
+            });
+            selectCell = el("td", {}, [checkbox]);
+        } else {
+            selectCell = el("td", { text: "—" });
         }
 
-        // Update showing info
-        if (totalRows === 0) {
-            showingInfo.textContent = "0";
+        const platform = {
+            booking: badge("platform-badge platform-booking", "📘 Booking"),
+            airbnb: badge("platform-badge platform-airbnb", "🏠 Airbnb"),
+        }[reservation.platform];
+
+        const status = {
+            confirmed: badge("badge badge-confirmed", "✓ Confirmed"),
+            cancelled: badge("badge badge-cancelled", "✗ Cancelled"),
+        }[reservation.status];
+
+        const timeStatus = {
+            upcoming: badge("badge badge-upcoming", "Upcoming"),
+            current: badge("badge badge-current", "● Current"),
+            past: badge("badge badge-past", "Past"),
+        }[reservation.time_status];
+
+        let actions;
+        if (reservation.is_enriched) {
+            actions = el("td", {}, [
+                el("a", { href: url("guest_details", reservation.guest_id), class: "action-link", text: config.labels.view }),
+            ]);
         } else {
-            showingInfo.textContent = `${start + 1}-${end} of ${totalRows}`;
+            const deleteForm = el("form", { method: "POST", action: url("delete_reservation", reservation.id), style: "display: inline;" }, [
+                el("input", { type: "hidden", name: "csrfmiddlewaretoken", value: csrfToken }),
+                el("button", { type: "submit", class: "delete-btn", text: config.labels.delete }),
+            ]);
+            deleteForm.addEventListener("submit", event => {
+                if (!confirm("Delete this reservation?")) event.preventDefault();
+            });
+            actions = el("td", {}, [
+                el("a", { href: url("edit_reservation", reservation.id), class: "action-link", text: config.labels.edit }),
+                document.createTextNode(" "),
+                el("a", { href: url("manual_checkin", reservation.id), class: "action-link", text: config.labels.check_in }),
+                document.createTextNode(" "),
+                deleteForm,
+            ]);
         }
 
-        // Update pagination controls
-        renderPaginationControls();
+        return el("tr", { class: "reservation-row", "data-reservation-id": reservation.id }, [
+            selectCell,
+            el("td", {}, [el("strong", { text: reservation.booking_reference })]),
+            reservation.is_enriched
+                ? el("td", {}, [el("strong", { text: reservation.guest_name })])
+                : el("td", { text: reservation.guest_name || "—" }),
+            el("td", {}, [platform]),
+            el("td", { text: reservation.room }),
+            dateCell(reservation.check_in_date, reservation.early_checkin_time),
+            dateCell(reservation.check_out_date, reservation.late_checkout_time),
+            el("td", {}, [status]),
+            el("td", {}, [timeStatus]),
+            el("td", {}, [
+                reservation.is_enriched
+                    ? badge("badge badge-enriched", "✓ Enriched")
+                    : badge("badge badge-unenriched", "⚠ Pending"),
+            ]),
+            actions,
+        ]);
+    }
 
-        // Update checkbox states after page change
-        updateSelectionUI();
+    // Fetch and display a page
+    function loadPage(page) {
+        const cursor = cursors[page - 1];
+        const separator = config.api_url.includes("?") ? "&" : "?";
+        const pageUrl = cursor ? `${config.api_url}${separator}cursor=${encodeURIComponent(cursor)}` : config.api_url;
+
+        fetch(pageUrl)
+            .then(response => response.json())
+            .then(data => {
+                currentPage = page;
+                nextCursor = data.next_cursor;
+                if (nextCursor && cursors.length === page) {
+                    cursors.push(nextCursor);
+                }
+                if (data.total !== undefined) {
+                    total = data.total;
+                    totalCount.textContent = total;
+                }
+
+                tbody.innerHTML = "";
+                if (data.results.length === 0) {
+                    tbody.appendChild(document.getElementById("reservations-empty-row").content.cloneNode(true));
+                    showingInfo.textContent = "0";
+                } else {
+                    data.results.forEach(reservation => tbody.appendChild(buildRow(reservation)));
+                    const start = (page - 1) * rowsPerPage + 1;
+                    const end = start + data.results.length - 1;
+                    showingInfo.textContent = total !== null
+                        ? `${start}-${end} ${config.labels.of} ${total}`
+                        : `${start}-${end}`;
+                }
+
+                renderPaginationControls();
+                updateSelectionUI();
+            })
+            .catch(error => console.error("Error fetching reservations:", error));
     }
 
     // Render pagination controls
     function renderPaginationControls() {
         paginationControls.innerHTML = "";
 
-        if (totalPages <= 1) {
+        if (currentPage === 1 && !nextCursor) {
             return; // No pagination needed
         }
 
-        // Previous button
         const prevBtn = document.createElement("button");
         prevBtn.textContent = "← Previous";
         prevBtn.disabled = currentPage === 1;
-        prevBtn.addEventListener("click", () => displayPage(currentPage - 1));
+        prevBtn.addEventListener("click", () => loadPage(currentPage - 1));
         paginationControls.appendChild(prevBtn);
 
-        // Page numbers logic
-        const maxVisiblePages = 7;
-        let startPage = Math.max(1, currentPage - Math.floor(maxVisiblePages / 2));
-        let endPage = Math.min(totalPages, startPage + maxVisiblePages - 1);
-
-        if (endPage - startPage < maxVisiblePages - 1) {
-            startPage = Math.max(1, endPage - maxVisiblePages + 1);
-        }
+        const pageLabel = document.createElement("span");
+        pageLabel.textContent = total !== null ? `${currentPage} / ${Math.ceil(total / rowsPerPage)}` : currentPage;
+        paginationControls.appendChild(pageLabel);
 
-        // First page
-        if (startPage > 1) {
-            const firstBtn = document.createElement("button");
-            firstBtn.textContent = "1";
-            firstBtn.addEventListener("click", () => displayPage(1));
-            paginationControls.appendChild(firstBtn);
-
-            if (startPage > 2) {
-                const ellipsis = document.createElement("span");
-                ellipsis.textContent = "...";
-                paginationControls.appendChild(ellipsis);
-            }
-        }
-
-        // Page number buttons
-        for (let i = startPage; i <= endPage; i++) {
-            const pageBtn = document.createElement("button");
-            pageBtn.textContent = i;
-            pageBtn.classList.toggle("active", i === currentPage);
-            pageBtn.addEventListener("click", () => displayPage(i));
-            paginationControls.appendChild(pageBtn);
-        }
-
-        // Last page
-        if (endPage < totalPages) {
-            if (endPage < totalPages - 1) {
-                const ellipsis = document.createElement("span");
-                ellipsis.textContent = "...";
-                paginationControls.appendChild(ellipsis);
-            }
-
-            const lastBtn = document.createElement("button");
-            lastBtn.textContent = totalPages;
-            lastBtn.addEventListener("click", () => displayPage(totalPages));
-            paginationControls.appendChild(lastBtn);
-        }
-
-        // Next button
         const nextBtn = document.createElement("button");
         nextBtn.textContent = "Next →";
-        nextBtn.disabled = currentPage === totalPages;
-        nextBtn.addEventListener("click", () => displayPage(currentPage + 1));
+        nextBtn.disabled = !nextCursor;
+        nextBtn.addEventListener("click", () => loadPage(currentPage + 1));
         paginationControls.appendChild(nextBtn);
     }
 
-    // Initialize pagination
-    if (totalRows > 0) {
-        displayPage(1);
-    } else {
-        showingInfo.textContent = "0";
-    }
-
     // ===== Bulk Delete Functionality =====
     const bulkActionsDiv = document.getElementById('bulk-actions');
     const selectedCountSpan = document.getElementById('selected-count');
@@ -129,24 +199,14 @@ document.addEventListener("DOMContentLoaded", function () {
     const selectAllBtn = document.getElementById('select-all-btn');
     const deselectAllBtn = document.getElementById('deselect-all-btn');
 
-    // Get all checkboxes
-    function getAllCheckboxes() {
-        return Array.from(document.querySelectorAll('.reservation-checkbox'));
-    }
-
-    // Get visible checkboxes on current page
+    // Checkboxes of the page on screen
     function getVisibleCheckboxes() {
-        return getAllCheckboxes().filter(cb => {
-            const row = cb.closest('tr');
-            return row && row.style.display !== 'none';
-        });
+        return Array.from(document.querySelectorAll('.reservation-checkbox'));
     }
 
     // Update selection UI
     function updateSelectionUI() {
-        const allCheckboxes = getAllCheckboxes();
-        const selectedCheckboxes = allCheckboxes.filter(cb => cb.checked);
-        const count = selectedCheckboxes.length;
+        const count = selectedIds.size;
 
         // Update count
         selectedCountSpan.textContent = count;
@@ -163,7 +223,7 @@ document.addEventListener("DOMContentLoaded", function () {
         // Update header checkbox
         const visibleCheckboxes = getVisibleCheckboxes();
         const visibleChecked = visibleCheckboxes.filter(cb => cb.checked).length;
-        
+
         if (visibleCheckboxes.length > 0) {
             selectAllHeaderCheckbox.checked = visibleChecked === visibleCheckboxes.length;
             selectAllHeaderCheckbox.indeterminate = visibleChecked > 0 && visibleChecked < visibleCheckboxes.length;
@@ -174,43 +234,37 @@ document.addEventListener("DOMContentLoaded", function () {
 
         // Update hidden inputs
         selectedIdsContainer.innerHTML = '';
-        selectedCheckboxes.forEach(cb => {
+        selectedIds.forEach(id => {
             const input = document.createElement('input');
             input.type = 'hidden';
             input.name = 'reservation_ids';
-            input.value = cb.value;
+            input.value = id;
             selectedIdsContainer.appendChild(input);
         });
     }
 
-    // Individual checkbox change
-    getAllCheckboxes().forEach(checkbox => {
-        checkbox.addEventListener('change', updateSelectionUI);
-    });
-
-    // Header checkbox (select/deselect visible)
-    selectAllHeaderCheckbox.addEventListener('change', function() {
-        const visibleCheckboxes = getVisibleCheckboxes();
-        visibleCheckboxes.forEach(cb => {
-            cb.checked = this.checked;
+    function setVisible(checked) {
+        getVisibleCheckboxes().forEach(cb => {
+            cb.checked = checked;
+            checked ? selectedIds.add(cb.value) : selectedIds.delete(cb.value);
         });
         updateSelectionUI();
-    });
+    }
 
-    // Select all button (all pages)
-    selectAllBtn.addEventListener('click', function() {
-        getAllCheckboxes().forEach(cb => cb.checked = true);
-        updateSelectionUI();
+    // Header checkbox and select all button (page on screen)
+    selectAllHeaderCheckbox.addEventListener('change', function () {
+        setVisible(this.checked);
     });
+    selectAllBtn.addEventListener('click', () => setVisible(true));
 
-    // Deselect all button
-    deselectAllBtn.addEventListener('click', function() {
-        getAllCheckboxes().forEach(cb => cb.checked = false);
+    // Deselect all button (every page)
+    deselectAllBtn.addEventListener('click', function () {
+        selectedIds.clear();
+        getVisibleCheckboxes().forEach(cb => cb.checked = false);
         updateSelectionUI();
     });
 
-    // Initial update
-    updateSelectionUI();
+    loadPage(1);
 });
 
 // Confirm bulk delete